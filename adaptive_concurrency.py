@@ -0,0 +1,196 @@
+# -*- coding: utf-8 -*-
+"""
+自适应并发控制
+进程数、FFmpeg 并发数在任务开始时按机器配置一次性决定，运行中不再变化：
+识别是瓶颈时十几个预处理进程把 audio_queue 填满后全部阻塞；预处理是瓶颈时识别进程（GPU）空转。
+
+这里在任务运行中周期性采样各队列深度，并结合预处理/识别/后处理上报的阶段耗时（stage 事件），
+逐步增减预处理进程、后处理进程和 FFmpeg 并发许可：
+
+- audio_queue 持续接近满：识别是瓶颈，减少预处理进程和 FFmpeg 许可，把 CPU 让给识别
+- audio_queue 持续接近空且还有待处理文件：预处理是瓶颈，FFmpeg 耗时占比高时先加 FFmpeg 许可，否则加预处理进程
+- result_queue 持续积压：增加后处理进程；长时间空闲后回收多加的进程
+
+每次调整后冷却若干个采样周期，避免来回振荡。本模块只做决策，进程的启停由 ProcessingController 执行。
+"""
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+# 队列占用率阈值
+HIGH_WATER = 0.75
+LOW_WATER = 0.10
+# 连续多少个采样周期满足条件才调整
+SUSTAIN_TICKS = 2
+# 调整后的冷却周期数
+COOLDOWN_TICKS = 2
+# 后处理队列空闲多少个周期后回收多加的进程
+POST_IDLE_TICKS = 6
+# FFmpeg 耗时占预处理总耗时的比例超过该值时，视为受 FFmpeg 并发限制
+FFMPEG_BOUND_SHARE = 0.5
+# 阶段耗时的指数滑动平均系数
+_EWMA_ALPHA = 0.3
+
+
+@dataclass
+class ConcurrencyLimits:
+    """各项可调参数的上下限"""
+    pre_min: int = 1
+    pre_max: int = 4
+    post_min: int = 1
+    post_max: int = 6
+    ffmpeg_min: int = 1
+    ffmpeg_max: int = 4
+
+
+@dataclass
+class QueueSample:
+    """一次采样时的队列深度和在岗进程数"""
+    task_depth: int
+    audio_depth: int
+    audio_capacity: int
+    result_depth: int
+    result_capacity: int
+    pre_workers: int
+    post_workers: int
+    recognition_workers: int = 1
+
+
+class StageTimings:
+    """各阶段每个文件耗时的滑动平均（秒）"""
+
+    def __init__(self):
+        self._values: Dict[str, float] = {}
+
+    def add(self, key: str, seconds: Optional[float]):
+        if seconds is None or seconds < 0:
+            return
+        old = self._values.get(key)
+        self._values[key] = seconds if old is None else old + _EWMA_ALPHA * (seconds - old)
+
+    def get(self, key: str) -> Optional[float]:
+        return self._values.get(key)
+
+
+class SemaphoreThrottle:
+    """
+    运行中调整 FFmpeg 信号量的许可数
+    增加：先归还之前扣留的许可，不够时 release 新许可；减少：非阻塞地取走许可并扣留（取不到时下次再试）
+    """
+
+    def __init__(self, semaphore, permits: int):
+        self.semaphore = semaphore
+        self.permits = permits  # 目标许可数
+        self._held = 0  # 已扣留的许可
+        self._pending = 0  # 尚未取到、待扣留的许可
+
+    def resize(self, target: int):
+        delta = target - self.permits
+        self.permits = target
+        if delta > 0:
+            cancel = min(delta, self._pending)
+            self._pending -= cancel
+            delta -= cancel
+            while delta > 0:
+                if self._held > 0:
+                    self._held -= 1
+                self.semaphore.release()
+                delta -= 1
+        elif delta < 0:
+            self._pending += -delta
+            self.poll()
+
+    def poll(self):
+        """尝试扣留待减少的许可（FFmpeg 进程结束归还许可后才能取到）"""
+        while self._pending > 0 and self.semaphore.acquire(False):
+            self._pending -= 1
+            self._held += 1
+
+
+class AdaptiveConcurrency:
+    """按队列深度和阶段耗时决定并发调整，sample() 返回 [(目标, 增量, 原因), ...]"""
+
+    def __init__(self, ffmpeg_permits: int, limits: ConcurrencyLimits, post_baseline: int):
+        self.limits = limits
+        self.ffmpeg_permits = ffmpeg_permits
+        self.post_baseline = post_baseline
+        self.timings = StageTimings()
+        self._audio_fill = deque(maxlen=SUSTAIN_TICKS)
+        self._result_fill = deque(maxlen=SUSTAIN_TICKS)
+        self._post_idle = 0
+        self._cooldown = 0
+        self.last_sample_at = 0.0
+
+    def observe(self, event: dict):
+        """记录一条 stage 事件（格式见 stage_telemetry.stage_event）"""
+        stage = event.get("stage")
+        self.timings.add(f"{stage}.total", event.get("total"))
+        if stage == "pre":
+            timings = event.get("timings") or {}
+            ffmpeg_s = (timings.get("extract") or 0.0) + (timings.get("cfr") or 0.0)
+            self.timings.add("pre.ffmpeg", ffmpeg_s)
+
+    def _ffmpeg_share(self) -> float:
+        total = self.timings.get("pre.total")
+        ffmpeg_s = self.timings.get("pre.ffmpeg")
+        if not total or ffmpeg_s is None:
+            return 0.0
+        return ffmpeg_s / total
+
+    def _pre_outpaces_asr(self, sample: QueueSample) -> bool:
+        """按阶段耗时估算：预处理吞吐已明显超过识别吞吐时，再加预处理进程也无济于事"""
+        pre_s = self.timings.get("pre.total")
+        asr_s = self.timings.get("asr.total")
+        if not pre_s or not asr_s:
+            return False
+        pre_rate = sample.pre_workers / pre_s
+        asr_rate = max(1, sample.recognition_workers) / asr_s
+        return pre_rate >= asr_rate * 1.2
+
+    def sample(self, sample: QueueSample) -> List[Tuple[str, int, str]]:
+        self.last_sample_at = time.monotonic()
+        audio_fill = sample.audio_depth / sample.audio_capacity if sample.audio_capacity > 0 else 0.0
+        result_fill = sample.result_depth / sample.result_capacity if sample.result_capacity > 0 else 0.0
+        self._audio_fill.append(audio_fill)
+        self._result_fill.append(result_fill)
+        self._post_idle = self._post_idle + 1 if sample.result_depth == 0 else 0
+
+        if self._cooldown > 0:
+            self._cooldown -= 1
+            return []
+        sustained = len(self._audio_fill) == SUSTAIN_TICKS
+        if not sustained:
+            return []
+
+        limits = self.limits
+        ffmpeg_share = self._ffmpeg_share()
+        actions = []
+
+        if min(self._audio_fill) >= HIGH_WATER:
+            reason = f"识别是瓶颈（audio_queue {sample.audio_depth}/{sample.audio_capacity}）"
+            if sample.pre_workers > limits.pre_min:
+                actions.append(("pre", -1, reason))
+            if self.ffmpeg_permits > limits.ffmpeg_min:
+                actions.append(("ffmpeg", -1, reason))
+        elif max(self._audio_fill) <= LOW_WATER and sample.task_depth > 0:
+            reason = (f"预处理是瓶颈（audio_queue {sample.audio_depth}/{sample.audio_capacity}，"
+                      f"FFmpeg耗时占比 {ffmpeg_share:.0%}）")
+            if (ffmpeg_share >= FFMPEG_BOUND_SHARE and self.ffmpeg_permits < limits.ffmpeg_max
+                    and self.ffmpeg_permits < sample.pre_workers):
+                actions.append(("ffmpeg", 1, reason))
+            elif sample.pre_workers < limits.pre_max and not self._pre_outpaces_asr(sample):
+                actions.append(("pre", 1, reason))
+
+        if min(self._result_fill) >= HIGH_WATER and sample.post_workers < limits.post_max:
+            actions.append(("post", 1, f"后处理积压（result_queue {sample.result_depth}/{sample.result_capacity}）"))
+        elif self._post_idle >= POST_IDLE_TICKS and sample.post_workers > max(self.post_baseline, limits.post_min):
+            actions.append(("post", -1, "后处理队列长时间空闲，回收多加的进程"))
+            self._post_idle = 0
+
+        for target, delta, _ in actions:
+            if target == "ffmpeg":
+                self.ffmpeg_permits += delta
+        if actions:
+            self._cooldown = COOLDOWN_TICKS
+        return actions
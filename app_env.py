@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+"""
+运行环境设置（不依赖Qt）
+模型缓存目录和线程相关环境变量，GUI 与无界面批处理入口共用
+"""
+import os
+import sys
+import multiprocessing
+from pathlib import Path
+
+
+def get_project_root() -> Path:
+    """获取项目根目录（兼容打包后的环境）"""
+    if getattr(sys, 'frozen', False):
+        # 打包后的环境
+        return Path(sys.executable).parent
+    # 开发环境
+    return Path(__file__).parent
+
+
+def setup_model_cache():
+    """设置模型缓存目录和性能优化环境变量"""
+    cache_dir = get_project_root() / "model_cache" / "modelscope"
+    cache_dir.mkdir(parents=True, exist_ok=True)
+
+    # 设置所有相关的缓存环境变量，与download_models.py保持一致
+    env_vars = {
+        'MODELSCOPE_CACHE': str(cache_dir),
+        'HF_HOME': str(cache_dir),
+        'TRANSFORMERS_CACHE': str(cache_dir),
+        'HF_DATASETS_CACHE': str(cache_dir),
+        'TORCH_HOME': str(cache_dir),
+    }
+
+    for key, value in env_vars.items():
+        os.environ[key] = value
+
+    # 性能优化：控制PyTorch/BLAS线程数，防止与FFmpeg争抢CPU
+    # 每个ASR进程内部使用单线程，避免过度并发
+    threading_vars = {
+        'OMP_NUM_THREADS': '1',
+        'OPENBLAS_NUM_THREADS': '1',
+        'MKL_NUM_THREADS': '1',
+        'VECLIB_MAXIMUM_THREADS': '1',
+        'NUMEXPR_NUM_THREADS': '1',
+    }
+
+    for key, value in threading_vars.items():
+        os.environ.setdefault(key, value)
+
+    # 仅在主进程中打印一次
+    if multiprocessing.current_process().name == 'MainProcess':
+        print(f"[FOLDER] 模型缓存路径已设置为: {cache_dir}")
+
+    return cache_dir
@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+"""
+跨文件批量识别
+大量短音频（语音备忘录、几十秒的短视频）单独调用 model.generate 时，
+VAD 切出的片段远填不满 batch_size_s，模型大部分时间在空转。
+
+做法：在很短的时间窗口内从 audio_queue 凑齐若干个短音频，
+用足够长的静音间隔拼接成一条波形，一次 generate 完成 VAD+识别+标点，
+再按各文件在拼接波形中的时间区间把 sentence_info 拆回每个文件。
+静音间隔大于 max_end_silence_time，保证 VAD 一定在文件边界处断开。
+"""
+import re
+import time
+import queue
+from typing import Callable, List, Tuple
+
+# 拼接时插入的静音间隔（秒），需大于 VAD 的 max_end_silence_time(0.8s)
+BATCH_GAP_SECONDS = 2.0
+
+# 可计数的"字"：一个汉字或一个连续的字母数字串，其余非空白字符视为标点
+_UNIT_RE = re.compile(r"[A-Za-z0-9']+|[^\W_A-Za-z0-9]")
+
+
+def collect_batch(audio_queue, first_task: dict, is_batchable: Callable[[dict], bool],
+                  task_seconds: Callable[[dict], float], max_files: int = 8,
+                  max_seconds: float = 300.0, window_s: float = 0.2) -> Tuple[list, list, bool]:
+    """
+    以 first_task 为起点，在 window_s 时间窗口内继续从队列取任务凑成一批
+
+    Returns:
+        (batch, deferred, got_sentinel)
+        batch: 可合并识别的任务
+        deferred: 取到但不适合合并的任务（长音频），由调用方单独处理
+        got_sentinel: 是否取到了结束信号 None
+    """
+    batch = [first_task]
+    deferred = []
+    total = task_seconds(first_task)
+    deadline = time.monotonic() + window_s
+
+    while len(batch) < max_files and total < max_seconds:
+        remaining = deadline - time.monotonic()
+        try:
+            task = audio_queue.get(timeout=remaining) if remaining > 0 else audio_queue.get_nowait()
+        except queue.Empty:
+            break
+        if task is None:
+            return batch, deferred, True
+        seconds = task_seconds(task)
+        if is_batchable(task) and total + seconds <= max_seconds:
+            batch.append(task)
+            total += seconds
+        else:
+            # 不合并的任务不再等待，立即交回调用方
+            deferred.append(task)
+            break
+    return batch, deferred, False
+
+
+def concat_waveforms(waveforms: list, sample_rate: int = 16000,
+                     gap_s: float = BATCH_GAP_SECONDS) -> Tuple[object, List[Tuple[int, int]]]:
+    """
+    用静音间隔拼接多条 float32 波形
+
+    Returns:
+        (merged, spans) spans 为每个文件在拼接波形中的 [start_ms, end_ms)
+    """
+    import numpy as np
+
+    gap = np.zeros(int(gap_s * sample_rate), dtype=np.float32)
+    parts = []
+    spans = []
+    cursor = 0
+    for idx, wav in enumerate(waveforms):
+        if idx > 0:
+            parts.append(gap)
+            cursor += len(gap)
+        start_ms = cursor * 1000 // sample_rate
+        parts.append(np.asarray(wav, dtype=np.float32))
+        cursor += len(wav)
+        spans.append((start_ms, cursor * 1000 // sample_rate))
+    merged = np.concatenate(parts) if parts else np.zeros(0, dtype=np.float32)
+    return merged, spans
+
+
+def _span_index(spans: List[Tuple[int, int]], ms: float) -> int:
+    """返回时间点所属文件的下标（落在静音间隔内时归入前一个文件）"""
+    for idx in range(len(spans) - 1, -1, -1):
+        if ms >= spans[idx][0]:
+            return idx
+    return 0
+
+
+def _split_text_by_units(text: str, counts: List[int]) -> List[str] | None:
+    """
+    按"字"的个数把一句文本切成若干段，标点跟随前一个字
+    文本中可计数的字与 timestamp 个数对不上时返回 None
+    """
+    units = list(_UNIT_RE.finditer(text))
+    if len(units) != sum(counts):
+        return None
+    pieces = []
+    pos = 0
+    consumed = 0
+    for i, count in enumerate(counts):
+        consumed += count
+        if i == len(counts) - 1 or consumed >= len(units):
+            cut = len(text)
+        else:
+            # 切在下一段第一个字之前，中间的标点归前一段
+            cut = units[consumed].start()
+        pieces.append(text[pos:cut].strip())
+        pos = cut
+    return pieces
+
+
+def _shift_sentence(sentence: dict, offset_ms: int) -> dict:
+    shifted = dict(sentence)
+    shifted['start'] = max(0, shifted['start'] - offset_ms)
+    shifted['end'] = max(shifted['start'], shifted['end'] - offset_ms)
+    if shifted.get('timestamp'):
+        shifted['timestamp'] = [[max(0, s - offset_ms), max(0, e - offset_ms)] for s, e in shifted['timestamp']]
+    return shifted
+
+
+def join_sentence_text(pieces: List[str]) -> str:
+    """拼接句子文本，字母数字相邻时补一个空格"""
+    text = ''
+    for piece in pieces:
+        if text and piece and text[-1].isascii() and text[-1].isalnum() and piece[0].isascii() and piece[0].isalnum():
+            text += ' '
+        text += piece
+    return text
+
+
+def split_batch_result(rec_result: list, spans: List[Tuple[int, int]], keys: List[str]) -> List[list]:
+    """
+    把拼接波形的识别结果按文件拆分，时间戳换算回各文件自身的时间轴
+
+    跨越文件边界的句子（标点模型没有在边界处断句）按逐字时间戳切开；
+    逐字时间戳不可用时整句归入句子中点所在的文件。
+    """
+    per_file = [[] for _ in spans]
+    first = rec_result[0] if rec_result and isinstance(rec_result, list) else {}
+    sentences = first.get('sentence_info') or []
+
+    for sentence in sentences:
+        stamps = sentence.get('timestamp') or []
+        owners = [_span_index(spans, (s + e) / 2) for s, e in stamps]
+
+        if owners and len(set(owners)) > 1:
+            # 句子跨越文件边界：按字所属文件分组
+            groups = []
+            for owner, stamp in zip(owners, stamps):
+                if groups and groups[-1][0] == owner:
+                    groups[-1][1].append(stamp)
+                else:
+                    groups.append((owner, [stamp]))
+            texts = _split_text_by_units(sentence.get('text', ''), [len(g[1]) for g in groups])
+            if texts is not None:
+                for (owner, group_stamps), text in zip(groups, texts):
+                    if not text:
+                        continue
+                    piece = dict(sentence, text=text, timestamp=group_stamps,
+                                 start=group_stamps[0][0], end=group_stamps[-1][1])
+                    per_file[owner].append(_shift_sentence(piece, spans[owner][0]))
+                continue
+
+        owner = _span_index(spans, (sentence['start'] + sentence['end']) / 2)
+        per_file[owner].append(_shift_sentence(sentence, spans[owner][0]))
+
+    results = []
+    for idx, file_sentences in enumerate(per_file):
+        timestamps = [stamp for s in file_sentences for stamp in (s.get('timestamp') or [])]
+        results.append([{
+            'key': keys[idx],
+            'text': join_sentence_text([s.get('text', '') for s in file_sentences]),
+            'timestamp': timestamps,
+            'sentence_info': file_sentences,
+        }])
+    return results
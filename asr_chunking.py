@@ -0,0 +1,238 @@
+# -*- coding: utf-8 -*-
+"""
+长音频分段识别
+整段音频交给 model.generate 时，波形、全部 VAD 片段和完整 sentence_info 同时驻留内存，
+几个小时的会议录音会占用数 GB。这里按固定长度的窗口逐段识别：
+
+- 每个窗口比步长多读 overlap 秒，只提交结束时间落在 [窗口起点, 窗口终点 - overlap] 内的句子；
+- 跨越提交边界的句子不提交，下一个窗口从最后一个已提交句子的结束时间开始，重新完整识别它；
+- 已提交的句子立即追加写入 JSONL 暂存文件（每行一句），同时追加写入同名 .srt 字幕，识别进程内存不随时长增长。
+
+暂存文件放在任务缓存目录（model_cache/job_cache/<源文件路径哈希>/）中。后处理阶段直接复制已写好的字幕，
+文本和 JSON 逐句从暂存文件流式写出，不把整份识别结果读入内存。
+"""
+import json
+import shutil
+from pathlib import Path
+from typing import Callable, Iterator, List, TextIO
+
+from asr_batching import join_sentence_text
+from asr_engine import PCM_SAMPLE_RATE, PCM_BYTES_PER_SECOND
+
+
+def wav_window_reader(wav_path: str) -> tuple:
+    """
+    打开提取出的 WAV，返回 (read_pcm, total_ms, close)
+    read_pcm(start_ms, duration_ms) 只读取所需区间的 PCM 字节
+    """
+    import wave
+    wav_file = wave.open(str(wav_path), 'rb')
+    n_frames = wav_file.getnframes()
+
+    def read_pcm(start_ms: int, duration_ms: int) -> bytes:
+        start = min(n_frames, start_ms * PCM_SAMPLE_RATE // 1000)
+        wav_file.setpos(start)
+        return wav_file.readframes(duration_ms * PCM_SAMPLE_RATE // 1000)
+
+    return read_pcm, n_frames * 1000 // PCM_SAMPLE_RATE, wav_file.close
+
+
+def pcm_window_reader(pcm: bytes) -> tuple:
+    """内存 PCM 的窗口读取器，返回值同 wav_window_reader（切片不复制整段数据）"""
+    view = memoryview(pcm)
+
+    def read_pcm(start_ms: int, duration_ms: int) -> bytes:
+        start = start_ms * PCM_BYTES_PER_SECOND // 1000 // 2 * 2
+        end = start + duration_ms * PCM_BYTES_PER_SECOND // 1000 // 2 * 2
+        return bytes(view[start:end])
+
+    return read_pcm, len(pcm) * 1000 // PCM_BYTES_PER_SECOND, view.release
+
+
+def _shift(sentence: dict, offset_ms: int) -> dict:
+    shifted = dict(sentence)
+    shifted['start'] = sentence['start'] + offset_ms
+    shifted['end'] = sentence['end'] + offset_ms
+    if sentence.get('timestamp'):
+        shifted['timestamp'] = [[s + offset_ms, e + offset_ms] for s, e in sentence['timestamp']]
+    return shifted
+
+
+def recognize_chunked(read_pcm: Callable[[int, int], bytes], total_ms: int,
+                      recognize_pcm: Callable[[bytes], list],
+                      on_sentences: Callable[[List[dict], int], None],
+                      window_s: float = 600.0, overlap_s: float = 30.0) -> int:
+    """
+    逐窗口识别整段音频
+
+    Args:
+        read_pcm: 读取 [start_ms, start_ms + duration_ms) 的 PCM 字节
+        total_ms: 音频总时长（毫秒）
+        recognize_pcm: 识别一段 PCM，返回 model.generate 格式的结果
+        on_sentences: 每个窗口完成后回调 (已提交的句子（绝对时间）, 已完成到的毫秒数)
+        window_s: 每个窗口的提交步长（秒）
+        overlap_s: 窗口尾部的重叠长度（秒），应大于最长句子
+
+    Returns:
+        提交的句子总数
+    """
+    window_ms = int(window_s * 1000)
+    overlap_ms = int(overlap_s * 1000)
+    start_ms = 0
+    committed_total = 0
+
+    while start_ms < total_ms:
+        end_ms = min(total_ms, start_ms + window_ms + overlap_ms)
+        is_last = end_ms >= total_ms
+        commit_limit = end_ms if is_last else end_ms - overlap_ms
+
+        rec_result = recognize_pcm(read_pcm(start_ms, end_ms - start_ms))
+        first = rec_result[0] if rec_result and isinstance(rec_result, list) else {}
+        sentences = [_shift(s, start_ms) for s in (first.get('sentence_info') or [])]
+
+        committed = []
+        for sentence in sentences:
+            if not is_last and sentence['end'] > commit_limit:
+                break
+            committed.append(sentence)
+
+        if is_last:
+            next_start = total_ms
+        elif committed:
+            next_start = committed[-1]['end']
+        elif sentences and sentences[0]['start'] > start_ms:
+            # 第一句就跨越了提交边界：从这句开头重新开窗
+            next_start = sentences[0]['start']
+        elif sentences:
+            # 单句超过整个窗口（极少见），直接提交避免原地循环
+            committed.append(sentences[0])
+            next_start = sentences[0]['end']
+        else:
+            next_start = commit_limit
+        next_start = max(next_start, start_ms + 1000)
+
+        on_sentences(committed, min(next_start, total_ms))
+        committed_total += len(committed)
+        start_ms = next_start
+
+    return committed_total
+
+
+def format_srt_time(ms: int) -> str:
+    """将毫秒转换为SRT时间格式"""
+    seconds, milliseconds = divmod(ms, 1000)
+    minutes, seconds = divmod(seconds, 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{int(hours):02d}:{int(minutes):02d}:{int(seconds):02d},{int(milliseconds):03d}"
+
+
+def write_srt_sentences(f: TextIO, sentences: List[dict], first_index: int = 1):
+    """按 sentence_info 写出 SRT 条目，序号按句子计（空文本的句子不写出但占用序号）"""
+    for i, sentence in enumerate(sentences, first_index):
+        text = sentence.get('text', '').strip()
+        if text:
+            f.write(f"{i}\n")
+            f.write(f"{format_srt_time(sentence['start'])} --> {format_srt_time(sentence['end'])}\n")
+            f.write(f"{text}\n\n")
+
+
+def spool_srt_path(path: str) -> Path:
+    """暂存文件旁边同步写出的字幕"""
+    return Path(path).with_suffix('.srt')
+
+
+class SentenceSpool:
+    """已提交句子的 JSONL 暂存文件和增量字幕（追加写入，每个窗口 flush 一次）"""
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.count = 0
+        self._file = open(self.path, 'w', encoding='utf-8')
+        self._srt = open(spool_srt_path(self.path), 'w', encoding='utf-8')
+
+    def append(self, sentences: List[dict]):
+        for sentence in sentences:
+            self._file.write(json.dumps(sentence, ensure_ascii=False))
+            self._file.write('\n')
+        write_srt_sentences(self._srt, sentences, self.count + 1)
+        self.count += len(sentences)
+        self._file.flush()
+        self._srt.flush()
+
+    def close(self):
+        self._file.close()
+        self._srt.close()
+
+
+def iter_spooled_sentences(path: str) -> Iterator[dict]:
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+
+def spool_has_sentences(path: str) -> bool:
+    return next(iter_spooled_sentences(path), None) is not None
+
+
+def iter_spooled_lines(path: str) -> Iterator[str]:
+    """逐句读出文本（与 sentence_info 生成的全文相同：每句一行）"""
+    for sentence in iter_spooled_sentences(path):
+        yield sentence.get('text', '').strip()
+
+
+def write_spooled_srt(path: str, output_path: str):
+    """写出字幕：复制识别时已写好的字幕，没有时（例如旧版本留下的暂存文件）逐句重新生成"""
+    srt_path = spool_srt_path(path)
+    if srt_path.exists():
+        shutil.copyfile(srt_path, output_path)
+        return
+    with open(output_path, 'w', encoding='utf-8') as f:
+        index = 1
+        for sentence in iter_spooled_sentences(path):
+            write_srt_sentences(f, [sentence], index)
+            index += 1
+
+
+def write_spooled_json(path: str, key: str, output_path: str):
+    """逐句写出与 load_spooled_result 结构相同的 JSON（每个字段各读一遍暂存文件）"""
+    with open(output_path, 'w', encoding='utf-8') as f:
+        f.write('[{"key": ' + json.dumps(key, ensure_ascii=False) + ', "text": ')
+        f.write(json.dumps(join_sentence_text([s.get('text', '') for s in iter_spooled_sentences(path)]),
+                           ensure_ascii=False))
+        f.write(', "timestamp": [')
+        first = True
+        for sentence in iter_spooled_sentences(path):
+            for stamp in sentence.get('timestamp') or []:
+                f.write(('' if first else ', ') + json.dumps(stamp))
+                first = False
+        f.write('], "sentence_info": [')
+        for i, sentence in enumerate(iter_spooled_sentences(path)):
+            f.write((',\n  ' if i else '\n  ') + json.dumps(sentence, ensure_ascii=False))
+        f.write('\n]}]')
+
+
+def remove_spool(path: str):
+    """删除暂存文件和增量字幕（任务缓存中的子目录为空时一并删除）"""
+    for file_path in (Path(path), spool_srt_path(path)):
+        try:
+            file_path.unlink()
+        except OSError:
+            pass
+    try:
+        Path(path).parent.rmdir()
+    except OSError:
+        pass
+
+
+def load_spooled_result(path: str, key: str = "") -> list:
+    """把暂存文件还原成与 model.generate 相同结构的识别结果"""
+    sentences = list(iter_spooled_sentences(path))
+    return [{
+        'key': key,
+        'text': join_sentence_text([s.get('text', '') for s in sentences]),
+        'timestamp': [stamp for s in sentences for stamp in (s.get('timestamp') or [])],
+        'sentence_info': sentences,
+    }]
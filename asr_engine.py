@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+"""
+FunASR 识别引擎
+封装模型加载和 generate 调用，识别工作进程与常驻引擎服务（engine_service）共用
+"""
+from typing import Callable, List, Optional
+
+from asr_batching import concat_waveforms, split_batch_result
+
+# 提取音频的统一格式：16kHz 单声道 pcm_s16le
+PCM_SAMPLE_RATE = 16000
+PCM_BYTES_PER_SECOND = PCM_SAMPLE_RATE * 2
+
+# 模型与识别参数签名：识别结果缓存的指纹包含它，更换模型或参数后旧缓存自动失效
+MODEL_SIGNATURE = "paraformer-zh+fsmn-vad+ct-punc;sentence_timestamp;max_end_silence_time=800"
+
+
+def pcm_to_waveform(pcm: bytes):
+    """s16le PCM 字节 -> float32 波形（[-1, 1]），可直接传给 model.generate"""
+    import numpy as np
+    return np.frombuffer(pcm, dtype=np.int16).astype(np.float32) / 32768.0
+
+
+def load_wav_waveform(path: str):
+    """读取提取出的 16kHz 单声道 16bit WAV 为 float32 波形"""
+    import wave
+    with wave.open(str(path), 'rb') as wav_file:
+        if wav_file.getsampwidth() != 2 or wav_file.getnchannels() != 1 or wav_file.getframerate() != PCM_SAMPLE_RATE:
+            raise ValueError(f"WAV格式不是16kHz单声道16bit: {path}")
+        return pcm_to_waveform(wav_file.readframes(wav_file.getnframes()))
+
+
+class RecognitionEngine:
+    """paraformer-zh + fsmn-vad + ct-punc 识别引擎，构造时加载模型"""
+
+    def __init__(self, device: str = "cpu", log: Optional[Callable[[str], None]] = None, threads: int = 0):
+        """threads: CPU 模式下的计算线程数（0 表示使用 FunASR 默认值）"""
+        from funasr import AutoModel
+
+        self.device = device
+        log = log or (lambda message: None)
+        extra = {}
+        if device != 'cuda' and threads > 0:
+            extra['ncpu'] = threads
+            log(f"⚙️ 识别线程数: {threads}")
+
+        # GPU优化配置
+        if device == 'cuda':
+            import torch
+            # 设置GPU优化
+            torch.backends.cudnn.benchmark = True
+            torch.backends.cudnn.deterministic = False
+
+            # 检测GPU内存并设置最优批处理大小
+            gpu_memory_gb = torch.cuda.get_device_properties(0).total_memory / (1024**3)
+            if gpu_memory_gb >= 24:
+                self.batch_size_s = 25  # 高端GPU
+            elif gpu_memory_gb >= 12:
+                self.batch_size_s = 18  # 中端GPU
+            elif gpu_memory_gb >= 8:
+                self.batch_size_s = 12  # 入门GPU
+            else:
+                self.batch_size_s = 8
+            log(f"🚀 GPU优化: 显存 {gpu_memory_gb:.1f}GB, 批处理大小 {self.batch_size_s}")
+        else:
+            self.batch_size_s = 15
+
+        log("🔄 FunASR模型加载中...")
+        self.model = AutoModel(
+            model="paraformer-zh",
+            vad_model="fsmn-vad",
+            punc_model="ct-punc",
+            device=device,
+            batch_size=self.batch_size_s,  # 动态批处理大小
+            max_end_silence_time=800,
+            **extra
+        )
+        log("✅ 识别引擎加载成功。")
+
+    def recognize(self, model_input) -> list:
+        """识别单个输入（音频文件路径或 float32 波形）"""
+        return self.model.generate(
+            input=model_input,
+            batch_size_s=self.batch_size_s,  # 使用动态批处理大小
+            sentence_timestamp=True,
+            disable_pbar=True,  # 禁用进度条，避免多进程环境下的错误
+            disable_log=True,   # 禁用额外日志
+            max_end_silence_time=800
+        )
+
+    def recognize_merged(self, waveforms: list, keys: List[str]) -> List[list]:
+        """多个短音频拼接后一次识别，返回与 waveforms 一一对应的识别结果"""
+        merged, spans = concat_waveforms(waveforms, PCM_SAMPLE_RATE)
+        rec_result = self.recognize(merged)
+        return split_batch_result(rec_result, spans, keys)
+
+    def release(self):
+        """释放模型和GPU缓存"""
+        self.model = None
+        if self.device == 'cuda':
+            try:
+                import torch
+                torch.cuda.empty_cache()
+            except Exception:
+                pass
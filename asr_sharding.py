@@ -0,0 +1,244 @@
+# -*- coding: utf-8 -*-
+"""
+CPU 并行分段识别
+CPU 模式下只有一个识别进程，且每个进程 OMP_NUM_THREADS=1，一个几小时的长文件只能用到一个核心。
+这里把一个文件的识别拆到多个进程上：
+
+1. 协调者（识别进程）对整段音频运行一次 fsmn-vad，得到语音片段（按 10 分钟窗口流式读取）
+2. 相邻片段按语音时长凑成分片，分片的 PCM 经 segment 队列分发给 N 个分段识别进程（只加载 paraformer-zh）
+3. 各分片的逐字结果按时间顺序合并，整段文本只运行一次 ct-punc，再按标点切句生成 sentence_info
+
+输出结构与 model.generate(sentence_timestamp=True) 相同，后处理无需区分。
+"""
+import time
+import uuid
+import queue
+from typing import Callable, List, Optional, Tuple
+
+from asr_batching import _UNIT_RE, join_sentence_text
+from asr_engine import pcm_to_waveform
+
+# 每个分片的语音时长（秒），分片越小负载越均衡
+SHARD_SECONDS = 60.0
+# VAD 流式读取的窗口长度（秒）
+VAD_WINDOW_S = 600.0
+# 跨 VAD 窗口的片段合并后的最大长度（毫秒），与 fsmn-vad 的 max_single_segment_time 一致
+_MAX_SEGMENT_MS = 60000
+# 每个分段识别进程最多同时排队的分片数
+_INFLIGHT_PER_WORKER = 2
+# 每个分段识别进程（paraformer-zh）的内存占用估计（GB）
+_WORKER_MEMORY_GB = 1.5
+
+
+def plan_segment_workers(requested: int, device: str = "cpu") -> int:
+    """
+    实际启动的分段识别进程数：只用于 CPU，受 CPU 核心数和可用内存限制
+    requested 为 -1 时使用本机 CPU 校准得到的进程数；返回 0 表示不启用（不足 2 个进程时并行没有意义）
+    """
+    if device != "cpu" or (requested < 2 and requested != -1):
+        return 0
+    if requested == -1:
+        # 按本机 CPU 校准结果：校准的进程数 × 线程数 即可用的并行度
+        from cpu_calibration import load_calibration
+        best = (load_calibration() or {}).get('best') or {}
+        requested = int(best.get('processes', 0))
+        if requested < 2:
+            return 0
+    import os
+    import psutil
+    available_gb = psutil.virtual_memory().available / (1024 ** 3)
+    workers = min(requested, os.cpu_count() or 1, int(available_gb / _WORKER_MEMORY_GB))
+    return workers if workers >= 2 else 0
+
+
+def load_segment_model(device: str = "cpu", threads: int = 0):
+    """分段识别进程使用的模型：只有 paraformer-zh（VAD 和标点由协调者统一处理）"""
+    from funasr import AutoModel
+    extra = {'ncpu': threads} if threads > 0 else {}
+    return AutoModel(model="paraformer-zh", device=device, **extra)
+
+
+def recognize_segment_pcms(model, pcms: List[bytes]) -> List[Tuple[str, list]]:
+    """识别一个分片内的各个语音片段，返回 [(原始文本, 逐字时间戳), ...]（时间相对片段起点）"""
+    waveforms = [pcm_to_waveform(pcm) for pcm in pcms]
+    results = model.generate(input=waveforms, disable_pbar=True, disable_log=True)
+    segments = []
+    for idx in range(len(waveforms)):
+        item = results[idx] if results and idx < len(results) else {}
+        segments.append((item.get('text', '') or '', item.get('timestamp') or []))
+    return segments
+
+
+def detect_speech_segments(vad_model, read_pcm: Callable[[int, int], bytes], total_ms: int,
+                           window_s: float = VAD_WINDOW_S) -> List[List[int]]:
+    """
+    逐窗口运行 fsmn-vad，返回整段音频的语音片段 [[start_ms, end_ms], ...]
+    被窗口边界切开的片段在不超过最大长度时重新合并
+    """
+    window_ms = int(window_s * 1000)
+    segments: List[List[int]] = []
+    for start_ms in range(0, total_ms, window_ms):
+        pcm = read_pcm(start_ms, min(window_ms, total_ms - start_ms))
+        if not pcm:
+            break
+        result = vad_model.generate(input=pcm_to_waveform(pcm), disable_pbar=True, disable_log=True)
+        value = result[0].get('value') if result else None
+        for beg, end in value or []:
+            beg, end = int(beg) + start_ms, int(end) + start_ms
+            if (segments and beg <= start_ms + 10 and segments[-1][1] >= start_ms - 10
+                    and end - segments[-1][0] <= _MAX_SEGMENT_MS):
+                segments[-1][1] = end
+            elif end > beg:
+                segments.append([beg, end])
+    return segments
+
+
+def plan_shards(segments: List[List[int]], shard_s: float = SHARD_SECONDS) -> List[List[List[int]]]:
+    """相邻片段按语音时长凑成分片"""
+    shard_ms = int(shard_s * 1000)
+    shards = []
+    current, current_ms = [], 0
+    for segment in segments:
+        current.append(segment)
+        current_ms += segment[1] - segment[0]
+        if current_ms >= shard_ms:
+            shards.append(current)
+            current, current_ms = [], 0
+    if current:
+        shards.append(current)
+    return shards
+
+
+def _segment_units(text: str, stamps: list, offset_ms: int, end_ms: int) -> Tuple[List[str], List[list]]:
+    """片段文本拆成字，时间戳换算到整段时间轴；个数对不上时在片段内均匀分配"""
+    units = [m.group(0) for m in _UNIT_RE.finditer(text)]
+    if len(stamps) == len(units):
+        return units, [[s + offset_ms, e + offset_ms] for s, e in stamps]
+    step = (end_ms - offset_ms) / max(len(units), 1)
+    return units, [[int(offset_ms + i * step), int(offset_ms + (i + 1) * step)] for i in range(len(units))]
+
+
+def build_sentence_info(punc_text: str, stamps: List[list]) -> Optional[List[dict]]:
+    """
+    按标点切句：每个标点结束一句（与 FunASR sentence_timestamp 的粒度一致）
+    标点文本中的字数与时间戳个数对不上时返回 None
+    """
+    units = list(_UNIT_RE.finditer(punc_text))
+    if len(units) != len(stamps):
+        return None
+    sentences = []
+    first_unit, pos = 0, 0
+    for idx, unit in enumerate(units):
+        next_start = units[idx + 1].start() if idx + 1 < len(units) else len(punc_text)
+        if punc_text[unit.end():next_start].strip() or idx == len(units) - 1:
+            sentences.append({
+                'text': punc_text[pos:next_start].strip(),
+                'start': stamps[first_unit][0],
+                'end': stamps[idx][1],
+                'timestamp': stamps[first_unit:idx + 1],
+            })
+            first_unit, pos = idx + 1, next_start
+    return sentences
+
+
+class ShardedRecognizer:
+    """协调者：VAD、分发分片、合并结果并统一加标点（运行在识别进程中）"""
+
+    def __init__(self, job_queue, result_queue, workers: int, log: Optional[Callable[[str], None]] = None,
+                 shard_s: float = SHARD_SECONDS):
+        from model_registry import get_model
+
+        self.job_queue = job_queue
+        self.result_queue = result_queue
+        self.workers = max(1, workers)
+        self.shard_s = shard_s
+        self.log = log or (lambda message: None)
+        self.last_timings = {}  # 最近一个文件的 VAD / 标点耗时（秒）
+        self.log("🔄 并行分段识别：加载 VAD 和标点模型...")
+        # 经模型注册表取用：同一识别进程内重建协调者时不再重复加载
+        self.vad_model = get_model("fsmn_vad", self.log)
+        self.punc_model = get_model("ct_punc", self.log)
+
+    def recognize(self, read_pcm: Callable[[int, int], bytes], total_ms: int, key: str = "",
+                  on_progress: Optional[Callable[[int, int], None]] = None, timeout_s: float = 600.0) -> list:
+        """
+        识别整段音频，返回 model.generate 格式的结果
+
+        Args:
+            on_progress: 每完成一个分片回调 (已完成分片数, 分片总数)
+            timeout_s: 等待单个分片结果的最长时间，超时视为分段识别进程不可用
+        """
+        t_vad = time.time()
+        segments = detect_speech_segments(self.vad_model, read_pcm, total_ms)
+        shards = plan_shards(segments, self.shard_s)
+        self.last_timings = {"vad": time.time() - t_vad}
+        speech_s = sum(end - beg for beg, end in segments) / 1000.0
+        self.log(f"      - 并行分段识别: {len(segments)} 个语音片段（{speech_s / 60:.1f} 分钟语音）, "
+                 f"{len(shards)} 个分片, {self.workers} 个进程, VAD 用时 {time.time() - t_vad:.1f}s")
+
+        job_id = uuid.uuid4().hex
+        shard_results: List[Optional[list]] = [None] * len(shards)
+        next_shard, done = 0, 0
+        max_inflight = self.workers * _INFLIGHT_PER_WORKER
+
+        while done < len(shards):
+            while next_shard < len(shards) and next_shard - done < max_inflight:
+                segs = shards[next_shard]
+                self.job_queue.put({
+                    'job': job_id,
+                    'index': next_shard,
+                    'pcm': [read_pcm(beg, end - beg) for beg, end in segs],
+                })
+                next_shard += 1
+            try:
+                reply = self.result_queue.get(timeout=timeout_s)
+            except queue.Empty:
+                raise TimeoutError(f"{timeout_s:.0f}秒内没有收到分段识别结果")
+            if reply.get('job') != job_id:
+                continue  # 之前放弃的文件迟到的结果
+            if reply.get('error'):
+                raise RuntimeError(f"分段识别进程出错: {reply['error']}")
+            shard_results[reply['index']] = reply['segments']
+            done += 1
+            if on_progress is not None:
+                on_progress(done, len(shards))
+
+        return self._merge(shards, shard_results, key)
+
+    def _merge(self, shards, shard_results, key: str) -> list:
+        units: List[str] = []
+        stamps: List[list] = []
+        per_segment = []  # 标点对齐失败时按 VAD 片段输出
+        for segs, results in zip(shards, shard_results):
+            for (beg, end), (text, seg_stamps) in zip(segs, results):
+                seg_units, seg_stamps = _segment_units(text, seg_stamps, beg, end)
+                if not seg_units:
+                    continue
+                units.extend(seg_units)
+                stamps.extend(seg_stamps)
+                per_segment.append((seg_units, seg_stamps))
+
+        if not units:
+            return [{'key': key, 'text': '', 'timestamp': [], 'sentence_info': []}]
+
+        punc_text = ''
+        sentences = None
+        t_punc = time.time()
+        try:
+            punc_result = self.punc_model.generate(input=" ".join(units), disable_pbar=True, disable_log=True)
+            punc_text = punc_result[0].get('text', '') if punc_result else ''
+            sentences = build_sentence_info(punc_text, stamps)
+        except Exception as e:
+            self.log(f"      - ⚠️ 标点恢复失败: {e}")
+        self.last_timings["punctuation"] = time.time() - t_punc
+        if sentences is None:
+            self.log("      - ⚠️ 标点结果与时间戳未对齐，按语音片段切句")
+            sentences = [{
+                'text': join_sentence_text(seg_units),
+                'start': seg_stamps[0][0],
+                'end': seg_stamps[-1][1],
+                'timestamp': seg_stamps,
+            } for seg_units, seg_stamps in per_segment]
+            punc_text = "".join(s['text'] for s in sentences)
+
+        return [{'key': key, 'text': punc_text, 'timestamp': stamps, 'sentence_info': sentences}]
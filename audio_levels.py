@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+"""
+音频电平分析（进程内，NumPy 向量化）
+替代提取音频后再启动一次 ffmpeg volumedetect（只看前10秒、还要占用 FFmpeg 信号量）：
+直接在刚生成的 16kHz s16le PCM 上计算整段文件的 RMS/dBFS，并给出逐窗口能量，
+供后续阶段复用（例如识别前跳过全程静音的文件）。
+
+dBFS 定义与 volumedetect 一致：mean_volume = 10*log10(mean(x^2))，x 归一化到 [-1, 1]。
+"""
+from dataclasses import dataclass, field, asdict
+from typing import List, Optional
+
+from asr_engine import PCM_SAMPLE_RATE
+
+# 数字静音的下限，与 volumedetect 一致
+SILENCE_FLOOR_DB = -91.0
+# 低于该电平的窗口视为静音
+SILENT_WINDOW_DB = -50.0
+# 流式读取 WAV 的块长度（秒），必须是窗口长度的整数倍
+_READ_BLOCK_S = 60
+
+
+@dataclass
+class AudioLevels:
+    duration_s: float = 0.0
+    mean_volume_db: float = SILENCE_FLOOR_DB  # 整段平均电平
+    max_volume_db: float = SILENCE_FLOOR_DB  # 峰值电平
+    window_s: float = 1.0
+    window_rms_db: List[float] = field(default_factory=list)  # 每个窗口的 RMS 电平
+    silent_ratio: float = 1.0  # 静音窗口占比
+
+    @property
+    def is_silent(self) -> bool:
+        """整段音频是否基本为静音（平均电平低于 -60dB 或没有任何非静音窗口）"""
+        return self.mean_volume_db < -60 or self.silent_ratio >= 1.0
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+def _to_db(mean_square: float) -> float:
+    import math
+    if mean_square <= 0:
+        return SILENCE_FLOOR_DB
+    return max(SILENCE_FLOOR_DB, 10.0 * math.log10(mean_square))
+
+
+class _LevelAccumulator:
+    """分块累加电平统计，内存占用只与块大小有关"""
+
+    def __init__(self, window_s: float):
+        self.window_s = window_s
+        self.window_samples = max(1, int(window_s * PCM_SAMPLE_RATE))
+        self.sum_squares = 0.0
+        self.n_samples = 0
+        self.peak = 0.0
+        self.window_db: List[float] = []
+
+    def add(self, samples):
+        """samples: int16 数组（长度应为窗口整数倍，最后一块除外）"""
+        import numpy as np
+        if samples.size == 0:
+            return
+        x = samples.astype(np.float32) / 32768.0
+        squares = x * x
+        self.sum_squares += float(squares.sum(dtype=np.float64))
+        self.n_samples += x.size
+        self.peak = max(self.peak, float(np.abs(x).max()))
+
+        n_full = x.size // self.window_samples
+        window_ms = []
+        if n_full:
+            window_ms.append(squares[:n_full * self.window_samples].reshape(n_full, self.window_samples).mean(axis=1))
+        if x.size % self.window_samples:
+            window_ms.append(np.array([squares[n_full * self.window_samples:].mean()]))
+        if window_ms:
+            ms = np.concatenate(window_ms)
+            db = np.full(ms.shape, SILENCE_FLOOR_DB, dtype=np.float64)
+            positive = ms > 0
+            db[positive] = np.maximum(SILENCE_FLOOR_DB, 10.0 * np.log10(ms[positive]))
+            self.window_db.extend(round(float(v), 1) for v in db)
+
+    def result(self) -> AudioLevels:
+        if self.n_samples == 0:
+            return AudioLevels(window_s=self.window_s)
+        silent = sum(1 for v in self.window_db if v < SILENT_WINDOW_DB)
+        return AudioLevels(
+            duration_s=self.n_samples / PCM_SAMPLE_RATE,
+            mean_volume_db=round(_to_db(self.sum_squares / self.n_samples), 1),
+            max_volume_db=round(_to_db(self.peak * self.peak), 1),
+            window_s=self.window_s,
+            window_rms_db=self.window_db,
+            silent_ratio=silent / len(self.window_db) if self.window_db else 1.0,
+        )
+
+
+def analyze_pcm_levels(pcm: bytes, window_s: float = 1.0) -> AudioLevels:
+    """分析内存中的 s16le PCM"""
+    import numpy as np
+    acc = _LevelAccumulator(window_s)
+    samples = np.frombuffer(pcm, dtype=np.int16, count=len(pcm) // 2)
+    block = acc.window_samples * max(1, int(_READ_BLOCK_S / window_s))
+    for start in range(0, samples.size, block):
+        acc.add(samples[start:start + block])
+    return acc.result()
+
+
+def analyze_wav_levels(wav_path: str, window_s: float = 1.0) -> Optional[AudioLevels]:
+    """流式分析提取出的 16kHz 单声道 WAV（整段文件）"""
+    import wave
+    import numpy as np
+    acc = _LevelAccumulator(window_s)
+    block_frames = acc.window_samples * max(1, int(_READ_BLOCK_S / window_s))
+    with wave.open(str(wav_path), 'rb') as wav_file:
+        if wav_file.getsampwidth() != 2 or wav_file.getnchannels() != 1:
+            return None
+        while True:
+            data = wav_file.readframes(block_frames)
+            if not data:
+                break
+            acc.add(np.frombuffer(data, dtype=np.int16))
+    return acc.result()
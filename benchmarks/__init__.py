@@ -0,0 +1,14 @@
+# -*- coding: utf-8 -*-
+"""
+可复现的性能基准
+用 FFmpeg lavfi 在本地生成合成测试媒体（CFR/VFR 视频、静音、纯音、类语音噪声、长/短时长），
+分别测量流水线各步骤（ffprobe 探测、CFR 转换、音频提取、电平分析、SRT/JSON/DOCX 写出、内置字幕对齐、队列传输）
+以及可选的端到端批处理耗时，结果写成 JSON，并可与保存的基线比较以发现性能回退。
+
+用法:
+    python -m benchmarks                      # 生成语料（已存在时复用）并运行各步骤基准
+    python -m benchmarks --quick              # 跳过长时长语料，减少重复次数
+    python -m benchmarks --save-baseline      # 把本次结果保存为 benchmarks/baseline.json
+    python -m benchmarks --compare            # 与基线比较，有步骤变慢超过阈值时退出码为 1
+    python -m benchmarks --e2e                # 另外运行一次端到端批处理（需要识别模型）
+"""
@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+"""
+合成测试语料
+全部由 FFmpeg lavfi 源生成，不依赖任何外部媒体文件；生成结果记录在 manifest.json 中，
+参数未变化时直接复用已生成的文件。
+"""
+import json
+from dataclasses import dataclass, asdict, field
+from pathlib import Path
+from typing import List, Optional
+
+from utils import run_silent
+
+# 测试图像源（带时间码的彩条，编码负担与真实画面相近）
+_VIDEO_SRC = "testsrc2=size=640x360:rate=30"
+# 类语音信号：粉红噪声按约 4Hz 调幅（音节节奏），整体电平与人声相近
+_SPEECHLIKE_SRC = "anoisesrc=color=pink:amplitude=0.3:sample_rate=48000"
+_SPEECHLIKE_FILTER = "tremolo=f=4:d=0.9"
+# 每 60 帧丢弃 15 帧并保留原时间戳，得到平均帧率与标称帧率不一致的 VFR 视频
+_VFR_FILTER = "select='lt(mod(n\\,60)\\,45)'"
+
+
+@dataclass
+class MediaSpec:
+    """一个合成测试文件"""
+    name: str
+    duration_s: float
+    kind: str  # cfr / vfr / silence / tone / speechlike / video_only
+    video: bool = True
+    audio: bool = True
+    long: bool = False  # --quick 时跳过
+    tags: List[str] = field(default_factory=list)
+
+
+CORPUS = [
+    MediaSpec("short_cfr_5s.mp4", 5, "cfr", tags=["short"]),
+    MediaSpec("cfr_60s.mp4", 60, "cfr"),
+    MediaSpec("vfr_60s.mp4", 60, "vfr", tags=["vfr"]),
+    MediaSpec("video_only_10s.mp4", 10, "video_only", audio=False),
+    MediaSpec("silence_120s.m4a", 120, "silence", video=False),
+    MediaSpec("tone_120s.wav", 120, "tone", video=False),
+    MediaSpec("speechlike_300s.m4a", 300, "speechlike", video=False),
+    MediaSpec("speechlike_1800s.m4a", 1800, "speechlike", video=False, long=True, tags=["long"]),
+    MediaSpec("cfr_900s.mp4", 900, "cfr", long=True, tags=["long"]),
+]
+
+
+def _audio_source(spec: MediaSpec) -> Optional[str]:
+    if not spec.audio:
+        return None
+    if spec.kind == "silence":
+        return "anullsrc=channel_layout=stereo:sample_rate=48000"
+    if spec.kind == "tone":
+        return "sine=frequency=1000:sample_rate=44100"
+    if spec.kind == "speechlike":
+        return f"{_SPEECHLIKE_SRC},{_SPEECHLIKE_FILTER}"
+    # 视频自带的音轨：440Hz 纯音叠加类语音噪声（lavfi 多链图的输出必须标记为 out0）
+    return f"sine=frequency=440:sample_rate=48000,volume=0.2[s];{_SPEECHLIKE_SRC},{_SPEECHLIKE_FILTER}[n];[s][n]amix=inputs=2[out0]"
+
+
+def build_generate_command(ffmpeg_cmd: str, spec: MediaSpec, output: Path) -> list:
+    """生成一个合成测试文件的 FFmpeg 命令"""
+    cmd = [ffmpeg_cmd, "-nostdin", "-hide_banner", "-loglevel", "error", "-y"]
+    if spec.video:
+        cmd += ["-f", "lavfi", "-i", _VIDEO_SRC]
+    audio_src = _audio_source(spec)
+    if audio_src:
+        cmd += ["-f", "lavfi", "-i", audio_src]
+    cmd += ["-t", str(spec.duration_s)]
+    if spec.video:
+        if spec.kind == "vfr":
+            cmd += ["-vf", _VFR_FILTER, "-vsync", "vfr"]
+        cmd += ["-c:v", "libx264", "-preset", "ultrafast", "-pix_fmt", "yuv420p"]
+    if audio_src:
+        if output.suffix == ".wav":
+            cmd += ["-c:a", "pcm_s16le"]
+        else:
+            cmd += ["-c:a", "aac", "-b:a", "96k"]
+    cmd.append(str(output))
+    return cmd
+
+
+def generate_corpus(media_dir: Path, ffmpeg_cmd: str, quick: bool = False,
+                    log=print) -> List[dict]:
+    """
+    生成（或复用）测试语料
+
+    Returns:
+        [{"name", "path", "duration_s", "kind", "video", "audio", "tags"}, ...]
+    """
+    media_dir.mkdir(parents=True, exist_ok=True)
+    manifest_path = media_dir / "manifest.json"
+    try:
+        manifest = json.loads(manifest_path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        manifest = {}
+
+    items = []
+    for spec in CORPUS:
+        if quick and spec.long:
+            continue
+        output = media_dir / spec.name
+        entry = asdict(spec)
+        if not (output.exists() and manifest.get(spec.name) == entry):
+            log(f"⚙️ 生成测试媒体 {spec.name}（{spec.duration_s:.0f}s, {spec.kind}）...")
+            result = run_silent(build_generate_command(ffmpeg_cmd, spec, output), check=False)
+            if result.returncode != 0 or not output.exists():
+                raise RuntimeError(f"生成 {spec.name} 失败: {result.stderr.strip()[-300:]}")
+            manifest[spec.name] = entry
+            manifest_path.write_text(json.dumps(manifest, ensure_ascii=False, indent=2), encoding="utf-8")
+        items.append(dict(entry, path=str(output)))
+    return items
@@ -0,0 +1,193 @@
+# -*- coding: utf-8 -*-
+"""
+基准入口：生成语料、运行各步骤基准、保存结果并与基线比较
+"""
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import List, Optional
+
+BENCH_DIR = Path(__file__).resolve().parent
+DEFAULT_MEDIA_DIR = BENCH_DIR / "media"
+DEFAULT_RESULTS_DIR = BENCH_DIR / "results"
+DEFAULT_BASELINE = BENCH_DIR / "baseline.json"
+
+# 中位数变慢超过该比例视为回退
+DEFAULT_THRESHOLD = 0.20
+# 绝对差值小于该值（秒）时忽略，避免毫秒级步骤的抖动误报
+NOISE_FLOOR_S = 0.02
+
+STEPS = ("probe", "cfr", "extract", "levels", "writers", "sync", "transport", "spawn")
+
+
+def _git_revision() -> Optional[str]:
+    try:
+        result = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=str(BENCH_DIR.parent),
+                                stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True, timeout=10)
+        return result.stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def _ffmpeg_version(ffmpeg_cmd: str) -> Optional[str]:
+    from utils import run_silent
+    try:
+        first_line = run_silent([ffmpeg_cmd, "-version"], check=False).stdout.splitlines()[0]
+        return first_line.strip()
+    except (OSError, IndexError):
+        return None
+
+
+def environment_info(ffmpeg_cmd: str) -> dict:
+    import psutil
+    return {
+        "revision": _git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "physical_cores": psutil.cpu_count(logical=False),
+        "memory_gb": round(psutil.virtual_memory().total / (1024 ** 3), 1),
+        "ffmpeg": _ffmpeg_version(ffmpeg_cmd),
+    }
+
+
+def record_key(record: dict) -> str:
+    return f"{record['step']}|{record['media'] or '-'}"
+
+
+def compare(current: dict, baseline: dict, threshold: float = DEFAULT_THRESHOLD) -> List[dict]:
+    """
+    按 步骤|媒体 对比中位数耗时
+
+    Returns:
+        [{"key", "baseline", "current", "ratio", "regression"}, ...]
+    """
+    base_records = {record_key(r): r for r in baseline.get("records", [])}
+    rows = []
+    for record in current.get("records", []):
+        key = record_key(record)
+        base = base_records.get(key)
+        if base is None:
+            continue
+        before = base["seconds"]["median"]
+        after = record["seconds"]["median"]
+        ratio = after / before if before > 0 else None
+        regression = ratio is not None and ratio > 1 + threshold and after - before > NOISE_FLOOR_S
+        rows.append({"key": key, "baseline": before, "current": after,
+                     "ratio": round(ratio, 3) if ratio is not None else None, "regression": regression})
+    return rows
+
+
+def run_benchmarks(steps, quick: bool, repeat: int, media_dir: Path, e2e: bool = False,
+                   device: str = "cpu", log=print) -> dict:
+    from ffmpeg_manager import get_ffmpeg_path, get_ffprobe_path
+    from benchmarks import stages
+    from benchmarks.corpus import generate_corpus
+
+    ffmpeg_cmd = get_ffmpeg_path()
+    ffprobe_cmd = get_ffprobe_path()
+    t_start = time.time()
+    corpus = generate_corpus(media_dir, ffmpeg_cmd, quick=quick, log=log)
+    writer_durations = [600.0, 3600.0] if quick else [600.0, 3600.0, 4 * 3600.0]
+
+    runners = {
+        "probe": lambda: stages.bench_probe(corpus, ffprobe_cmd, repeat),
+        "cfr": lambda: stages.bench_cfr(corpus, ffmpeg_cmd, repeat),
+        "extract": lambda: stages.bench_extract(corpus, ffmpeg_cmd, repeat),
+        "levels": lambda: stages.bench_levels(corpus, ffmpeg_cmd, repeat),
+        "writers": lambda: stages.bench_writers(writer_durations, repeat),
+        "sync": lambda: stages.bench_sync(writer_durations, repeat),
+        "transport": lambda: stages.bench_transport(repeat),
+        "spawn": lambda: stages.bench_spawn(repeat),
+    }
+    records = []
+    for step in steps:
+        log(f"⚙️ 基准: {step}")
+        for record in runners[step]():
+            records.append(record)
+            rtf_txt = f", RTF {record['rtf']:.4f}" if record.get('rtf') is not None else ""
+            log(f"   - {record_key(record)}: 中位数 {record['seconds']['median']:.4f}s{rtf_txt}")
+    if e2e:
+        log("⚙️ 基准: end_to_end（运行完整批处理）")
+        for record in stages.bench_end_to_end(corpus, 1, device):
+            records.append(record)
+            log(f"   - {record_key(record)}: {record['seconds']['median']:.1f}s, RTF {record['rtf']:.4f}")
+
+    return {
+        "created_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "quick": quick,
+        "repeat": repeat,
+        "elapsed_s": round(time.time() - t_start, 1),
+        "environment": environment_info(ffmpeg_cmd),
+        "records": records,
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    import argparse
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description="流水线各步骤的性能基准")
+    parser.add_argument("--quick", action="store_true", help="跳过长时长语料，每项只重复 1 次")
+    parser.add_argument("--repeat", type=int, default=0, help="每项重复次数（默认 3，--quick 时 1）")
+    parser.add_argument("--steps", default=",".join(STEPS), help=f"要运行的步骤，逗号分隔（{','.join(STEPS)}）")
+    parser.add_argument("--e2e", action="store_true", help="另外运行端到端批处理（需要识别模型）")
+    parser.add_argument("--device", choices=["cpu", "cuda"], default="cpu", help="端到端基准的识别设备")
+    parser.add_argument("--media-dir", default=str(DEFAULT_MEDIA_DIR), help="合成语料目录")
+    parser.add_argument("--output", help="结果 JSON 路径（默认 benchmarks/results/<时间>.json）")
+    parser.add_argument("--baseline", default=str(DEFAULT_BASELINE), help="基线 JSON 路径")
+    parser.add_argument("--save-baseline", action="store_true", help="把本次结果保存为基线")
+    parser.add_argument("--compare", action="store_true", help="与基线比较，有回退时退出码为 1")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="回退判定阈值（默认 0.2 即慢 20%%）")
+    args = parser.parse_args(argv)
+
+    steps = [s.strip() for s in args.steps.split(",") if s.strip()]
+    unknown = [s for s in steps if s not in STEPS]
+    if unknown:
+        parser.error(f"未知步骤: {', '.join(unknown)}")
+    repeat = args.repeat or (1 if args.quick else 3)
+
+    from ffmpeg_manager import ensure_ffmpeg_is_ready
+    if not ensure_ffmpeg_is_ready():
+        print("❌ 未找到 FFmpeg，无法生成测试媒体")
+        return 2
+
+    result = run_benchmarks(steps, args.quick, repeat, Path(args.media_dir), e2e=args.e2e, device=args.device)
+
+    output = Path(args.output) if args.output else DEFAULT_RESULTS_DIR / f"{time.strftime('%Y%m%d_%H%M%S')}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(result, ensure_ascii=False, indent=2), encoding="utf-8")
+    print(f"✅ 结果已保存: {output}")
+
+    exit_code = 0
+    baseline_path = Path(args.baseline)
+    if args.compare:
+        try:
+            baseline = json.loads(baseline_path.read_text(encoding="utf-8"))
+        except (OSError, ValueError) as e:
+            print(f"⚠️ 无法读取基线 {baseline_path}: {e}")
+            baseline = None
+        if baseline is not None:
+            rows = compare(result, baseline, args.threshold)
+            print(f"⚙️ 与基线比较（{baseline.get('environment', {}).get('revision')} @ {baseline.get('created_at')}）:")
+            for row in rows:
+                mark = "❌" if row["regression"] else "  "
+                print(f" {mark} {row['key']}: {row['baseline']:.4f}s -> {row['current']:.4f}s (x{row['ratio']})")
+            regressions = [row for row in rows if row["regression"]]
+            if regressions:
+                print(f"❌ {len(regressions)} 项变慢超过 {args.threshold:.0%}")
+                exit_code = 1
+            else:
+                print("✅ 没有发现性能回退")
+
+    if args.save_baseline:
+        baseline_path.write_text(json.dumps(result, ensure_ascii=False, indent=2), encoding="utf-8")
+        print(f"✅ 已保存为基线: {baseline_path}")
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
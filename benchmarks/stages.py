@@ -0,0 +1,309 @@
+# -*- coding: utf-8 -*-
+"""
+各流水线步骤的独立基准
+每个基准返回若干条记录 {"step", "media", "media_s", "seconds": {...}, "rtf"}，
+FFmpeg 命令与流水线使用同一组参数构造函数（build_cfr_args / build_extract_args / build_ffprobe_command）。
+"""
+import json
+import os
+import shutil
+import statistics
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, List, Optional
+
+from utils import run_silent, run_ffmpeg_to_bytes
+
+
+def measure(fn: Callable[[], object], repeat: int, setup: Optional[Callable[[], object]] = None) -> dict:
+    """运行 repeat 次并统计耗时（setup 在每次计时前调用，不计入耗时）"""
+    samples = []
+    for _ in range(max(1, repeat)):
+        if setup is not None:
+            setup()
+        t_start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - t_start)
+    return {
+        "min": round(min(samples), 4),
+        "median": round(statistics.median(samples), 4),
+        "mean": round(statistics.fmean(samples), 4),
+        "repeat": len(samples),
+    }
+
+
+def _record(step: str, media: Optional[dict], seconds: dict, **extra) -> dict:
+    media_s = media["duration_s"] if media else None
+    record = {
+        "step": step,
+        "media": media["name"] if media else None,
+        "media_s": media_s,
+        "seconds": seconds,
+        "rtf": round(seconds["median"] / media_s, 5) if media_s else None,
+    }
+    record.update(extra)
+    return record
+
+
+def _check(result, what: str):
+    if result.returncode != 0:
+        raise RuntimeError(f"{what} 失败: {(result.stderr or '').strip()[-300:]}")
+
+
+def bench_probe(corpus: List[dict], ffprobe_cmd: str, repeat: int) -> List[dict]:
+    """ffprobe 探测：冷（每次新的探测缓存）和热（命中探测缓存）"""
+    from probe_cache import ProbeCache, probe_media
+
+    records = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for media in corpus:
+            caches = []
+
+            def fresh_cache():
+                if caches:
+                    caches.pop().close()
+                caches.append(ProbeCache(str(Path(tmp) / f"probe_{time.monotonic_ns()}.db")))
+
+            def probe():
+                data, _label, error = probe_media(media["path"], ffprobe_cmd, cache=caches[-1])
+                if data is None:
+                    raise RuntimeError(f"ffprobe 失败: {error}")
+
+            records.append(_record("probe.cold", media, measure(probe, repeat, setup=fresh_cache)))
+            records.append(_record("probe.cached", media, measure(probe, repeat)))
+            caches.pop().close()
+    return records
+
+
+def bench_cfr(corpus: List[dict], ffmpeg_cmd: str, repeat: int) -> List[dict]:
+    """VFR 转 CFR（CPU 编码路径）"""
+    from pipeline_workers import build_cfr_args
+
+    records = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for media in corpus:
+            if media["kind"] != "vfr":
+                continue
+            target = str(Path(tmp) / "cfr.mp4")
+            cmd = [ffmpeg_cmd, "-nostdin", "-hide_banner", "-loglevel", "error"] + build_cfr_args(media["path"], target, 30)
+            records.append(_record("cfr", media, measure(lambda: _check(run_silent(cmd), "CFR 转换"), repeat)))
+    return records
+
+
+def bench_extract(corpus: List[dict], ffmpeg_cmd: str, repeat: int) -> List[dict]:
+    """音频提取：写 WAV 文件和内存 PCM 两种模式"""
+    from pipeline_workers import build_extract_args
+
+    records = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for media in corpus:
+            if not media["audio"]:
+                continue
+            wav_path = str(Path(tmp) / "extracted.wav")
+            wav_cmd = [ffmpeg_cmd, "-nostdin", "-hide_banner", "-loglevel", "error"] + build_extract_args(media["path"], wav_path)
+            records.append(_record("extract.wav", media, measure(lambda: _check(run_silent(wav_cmd), "音频提取"), repeat)))
+
+            def extract_pcm():
+                rc, data, err = run_ffmpeg_to_bytes(build_extract_args(media["path"]), ffmpeg_path=ffmpeg_cmd)
+                if rc != 0 or not data:
+                    raise RuntimeError(f"音频提取失败: {err}")
+            records.append(_record("extract.pcm", media, measure(extract_pcm, repeat)))
+    return records
+
+
+def bench_levels(corpus: List[dict], ffmpeg_cmd: str, repeat: int) -> List[dict]:
+    """提取后的电平分析（进程内）"""
+    from audio_levels import analyze_pcm_levels
+    from pipeline_workers import build_extract_args
+
+    records = []
+    for media in corpus:
+        if not media["audio"]:
+            continue
+        rc, pcm, err = run_ffmpeg_to_bytes(build_extract_args(media["path"]), ffmpeg_path=ffmpeg_cmd)
+        if rc != 0:
+            raise RuntimeError(f"音频提取失败: {err}")
+        records.append(_record("levels", media, measure(lambda: analyze_pcm_levels(pcm), repeat)))
+    return records
+
+
+def synthetic_result(media_s: float, sentence_s: float = 4.0) -> list:
+    """按媒体时长生成 model.generate 格式的识别结果（每句约 sentence_s 秒、每秒约 4 个字）"""
+    sentences = []
+    text_parts = []
+    timestamps = []
+    start_ms = 0
+    total_ms = int(media_s * 1000)
+    step_ms = int(sentence_s * 1000)
+    while start_ms < total_ms:
+        end_ms = min(start_ms + step_ms, total_ms)
+        chars = max(1, (end_ms - start_ms) // 250)
+        text = ("测试语音识别结果" * (chars // 8 + 1))[:chars] + "。"
+        stamps = [[start_ms + i * 250, start_ms + (i + 1) * 250] for i in range(chars)]
+        sentences.append({'text': text, 'start': start_ms, 'end': end_ms, 'timestamp': stamps})
+        text_parts.append(text)
+        timestamps.extend(stamps)
+        start_ms = end_ms
+    return [{'key': 'benchmark', 'text': "".join(text_parts), 'timestamp': timestamps, 'sentence_info': sentences}]
+
+
+def bench_writers(durations_s: List[float], repeat: int) -> List[dict]:
+    """输出文件写出：SRT、JSON、TXT、DOCX（未安装 python-docx 时跳过）"""
+    from pipeline_workers import _write_srt_from_result
+    try:
+        import docx
+    except ImportError:
+        docx = None
+
+    records = []
+    with tempfile.TemporaryDirectory() as tmp:
+        out_dir = Path(tmp)
+        for media_s in durations_s:
+            rec_result = synthetic_result(media_s)
+            media = {"name": f"synthetic_{int(media_s)}s", "duration_s": media_s}
+            full_text = "\n".join(s['text'] for s in rec_result[0]['sentence_info'])
+
+            def write_json():
+                with open(out_dir / "out.json", 'w', encoding='utf-8') as f:
+                    json.dump(rec_result, f, ensure_ascii=False, indent=2)
+
+            def write_txt():
+                with open(out_dir / "out.txt", 'w', encoding='utf-8') as f:
+                    f.write(full_text)
+
+            def write_docx():
+                document = docx.Document()
+                document.add_heading("benchmark", level=1)
+                document.add_paragraph(full_text)
+                document.save(str(out_dir / "out.docx"))
+
+            sentences = len(rec_result[0]['sentence_info'])
+            records.append(_record("write.srt", media, measure(
+                lambda: _write_srt_from_result(rec_result, str(out_dir / "out.srt")), repeat), sentences=sentences))
+            records.append(_record("write.json", media, measure(write_json, repeat), sentences=sentences))
+            records.append(_record("write.txt", media, measure(write_txt, repeat), sentences=sentences))
+            if docx is not None:
+                records.append(_record("write.docx", media, measure(write_docx, repeat), sentences=sentences))
+    return records
+
+
+def bench_sync(durations_s: List[float], repeat: int, shift_ms: int = 1500) -> List[dict]:
+    """内置字幕对齐：识别时间戳与参考语音轨（句子区间整体推后 shift_ms）的 FFT 互相关"""
+    from subtitle_sync import TRACK_RATE, native_align
+
+    records = []
+    for media_s in durations_s:
+        sentences = synthetic_result(media_s)[0]['sentence_info']
+        track = bytearray(int(media_s * TRACK_RATE) + 1)
+        for sentence in sentences:
+            # 句子之间留出 0.5 秒停顿，避免语音轨全为 1
+            first = (sentence['start'] + shift_ms) * TRACK_RATE // 1000
+            last = min(len(track), (sentence['end'] - 500 + shift_ms) * TRACK_RATE // 1000)
+            track[first:last] = b'\x01' * max(0, last - first)
+        media = {"name": f"synthetic_{int(media_s)}s", "duration_s": media_s}
+        results = []
+        seconds = measure(lambda: results.append(native_align(bytes(track), sentences)), repeat)
+        records.append(_record("sync.native", media, seconds, offset_ms=results[-1].offset_ms))
+    return records
+
+
+def _queue_consumer(q, count: int, ready, done):
+    """传输基准的消费进程：取到预热任务后发出就绪信号，再取出 count 个任务后发出完成信号"""
+    q.get()
+    ready.set()
+    for _ in range(count):
+        q.get()
+    done.set()
+
+
+def bench_transport(repeat: int, payload_s: float = 600.0, count: int = 8) -> List[dict]:
+    """
+    识别任务经 audio_queue 跨进程传输的耗时（内存音频模式下任务携带整段 PCM）
+    返回每个任务的平均传输时间
+    """
+    import multiprocessing
+    from asr_engine import PCM_BYTES_PER_SECOND
+
+    ctx = multiprocessing.get_context('spawn')
+    records = []
+    for label, pcm_bytes in (("transport.path", 0), ("transport.pcm", int(payload_s * PCM_BYTES_PER_SECOND))):
+        task = {
+            "original_path": "/bench/file.mp4",
+            "audio_path": None if pcm_bytes else "/bench/file_extracted.wav",
+            "audio_pcm": os.urandom(pcm_bytes) if pcm_bytes else None,
+            "media_s": payload_s,
+        }
+        samples = []
+        for _ in range(max(1, repeat)):
+            q = ctx.Queue(maxsize=4)
+            ready, done = ctx.Event(), ctx.Event()
+            consumer = ctx.Process(target=_queue_consumer, args=(q, count, ready, done), daemon=True)
+            consumer.start()
+            q.put({"warmup": True})  # 等消费进程启动完成后再计时
+            ready.wait(timeout=60)
+            t_start = time.perf_counter()
+            for _ in range(count):
+                q.put(task)
+            done.wait(timeout=300)
+            samples.append((time.perf_counter() - t_start) / count)
+            consumer.join(timeout=5)
+        seconds = {
+            "min": round(min(samples), 5),
+            "median": round(statistics.median(samples), 5),
+            "mean": round(statistics.fmean(samples), 5),
+            "repeat": len(samples),
+        }
+        records.append(_record(label, None, seconds, payload_mb=round(pcm_bytes / 1024 / 1024, 1)))
+    return records
+
+
+def bench_spawn(repeat: int) -> List[dict]:
+    """各阶段子进程的启动开销（经 worker_bootstrap 启动，附带导入预算检查结果）"""
+    from worker_bootstrap import STAGES, measure_stage_imports
+
+    records = []
+    for stage in STAGES:
+        reports = []
+        seconds = measure(lambda: reports.append(measure_stage_imports(stage)), repeat)
+        report = reports[-1]
+        if "error" in report:
+            raise RuntimeError(f"{stage} 阶段导入失败: {report['error']}")
+        records.append(_record(f"spawn.{stage}", None, seconds, import_s=report["seconds"],
+                               modules=report["modules"], violations=report["violations"]))
+    return records
+
+
+def bench_end_to_end(corpus: List[dict], repeat: int, device: str = "cpu") -> List[dict]:
+    """对整套语料运行一次无界面批处理（需要识别模型），记录总耗时和各步骤汇总"""
+    from funasr_batch import run_batch
+    from pipeline_config import ProcessingConfig
+
+    records = []
+    with tempfile.TemporaryDirectory() as tmp:
+        # 输出文件写在媒体旁边：复制到临时目录，避免污染语料目录
+        input_files = []
+        for media in corpus:
+            target = Path(tmp) / media["name"]
+            shutil.copy2(media["path"], target)
+            input_files.append(str(target))
+        config = ProcessingConfig(
+            input_files=input_files,
+            device=device,
+            enable_resume=False,
+            transcription_cache=False,
+            generate_srt=True,
+            generate_json=True,
+        )
+        stage_timings = {}
+
+        def run():
+            summary = run_batch(config, log=lambda message: None)
+            if summary.failed:
+                raise RuntimeError(f"端到端批处理有 {summary.failed} 个文件失败: {summary.failures[:3]}")
+            stage_timings.update(summary.stage_timings)
+
+        seconds = measure(run, repeat)
+        media = {"name": "corpus", "duration_s": sum(m["duration_s"] for m in corpus)}
+        records.append(_record("end_to_end", media, seconds, files=len(corpus), stage_timings=stage_timings))
+    return records
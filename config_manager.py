@@ -25,7 +25,9 @@ class UserConfig:
     ffsubsync_enabled: bool = True
     ffsubsync_vad: str = "silero"
     ffsubsync_max_offset: int = 60
+    subtitle_sync_backend: str = "ffsubsync"
     enable_resume: bool = True
+    persistent_engine: bool = False
 
     # 窗口设置
     window_width: int = 900
@@ -60,7 +62,9 @@ class ConfigManager:
         self.config.ffsubsync_enabled = self.settings.value("ffsubsync_enabled", True, type=bool)
         self.config.ffsubsync_vad = self.settings.value("ffsubsync_vad", "silero", type=str)
         self.config.ffsubsync_max_offset = self.settings.value("ffsubsync_max_offset", 60, type=int)
+        self.config.subtitle_sync_backend = self.settings.value("subtitle_sync_backend", "ffsubsync", type=str)
         self.config.enable_resume = self.settings.value("enable_resume", True, type=bool)
+        self.config.persistent_engine = self.settings.value("persistent_engine", False, type=bool)
 
         # 窗口设置
         self.config.window_width = self.settings.value("window_width", 900, type=int)
@@ -89,7 +93,9 @@ class ConfigManager:
         self.settings.setValue("ffsubsync_enabled", config.ffsubsync_enabled)
         self.settings.setValue("ffsubsync_vad", config.ffsubsync_vad)
         self.settings.setValue("ffsubsync_max_offset", config.ffsubsync_max_offset)
+        self.settings.setValue("subtitle_sync_backend", config.subtitle_sync_backend)
         self.settings.setValue("enable_resume", config.enable_resume)
+        self.settings.setValue("persistent_engine", config.persistent_engine)
 
         # 窗口设置
         self.settings.setValue("window_width", config.window_width)
@@ -0,0 +1,258 @@
+# -*- coding: utf-8 -*-
+"""
+CPU 识别布局校准
+识别进程数和每个进程的计算线程数以前是按核心数/内存猜的分档表。这里实际测量：
+在一段短音频上，用不同的 进程数 × 线程数 组合并发运行 model.generate，
+取总吞吐量（每秒墙钟时间处理的音频秒数）最高的组合，按机器保存到 model_cache/cpu_calibration.json，
+之后 PerformanceConfig.recognition_layout('cpu') 直接使用测得的结果。
+
+用法:
+    python cpu_calibration.py            # 运行校准并保存
+    python cpu_calibration.py --show     # 查看本机已保存的结果
+"""
+import os
+import sys
+import json
+import time
+import platform
+import multiprocessing
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+from app_env import get_project_root
+
+# 校准音频长度（秒）
+CLIP_SECONDS = 20.0
+# 每个布局每个进程重复识别的次数
+REPEATS = 2
+# 每个完整识别进程（VAD + paraformer + 标点）的内存占用估计（GB）
+ENGINE_MEMORY_GB = 2.0
+# 候选的单进程线程数
+THREAD_CHOICES = (1, 2, 4, 8)
+
+
+def default_calibration_path() -> Path:
+    return get_project_root() / "model_cache" / "cpu_calibration.json"
+
+
+def machine_key() -> str:
+    """标识一台机器（model_cache 可能在多台机器间共享，结果按机器分别保存）"""
+    import psutil
+    memory_gb = round(psutil.virtual_memory().total / (1024 ** 3))
+    return f"{platform.node()}|{platform.machine()}|{platform.processor()}|{os.cpu_count()}|{memory_gb}GB"
+
+
+def load_calibration(path: Optional[Path] = None) -> Optional[dict]:
+    """读取本机的校准结果，没有时返回 None"""
+    path = Path(path) if path else default_calibration_path()
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f).get(machine_key())
+    except (OSError, ValueError):
+        return None
+
+
+def save_calibration(result: dict, path: Optional[Path] = None):
+    path = Path(path) if path else default_calibration_path()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        data = {}
+    data[machine_key()] = result
+    tmp_path = path.with_suffix('.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+def candidate_layouts(physical_cores: int, max_processes: int) -> List[Tuple[int, int]]:
+    """进程数 × 线程数 不超过物理核心数的候选组合"""
+    layouts = []
+    for threads in THREAD_CHOICES:
+        if threads > physical_cores:
+            break
+        processes = 1
+        while processes <= max_processes and processes * threads <= physical_cores:
+            layouts.append((processes, threads))
+            processes *= 2
+        # 正好占满全部核心的组合
+        full = min(max_processes, physical_cores // threads)
+        if full >= 1 and (full, threads) not in layouts:
+            layouts.append((full, threads))
+    return layouts
+
+
+def _calibration_clip():
+    """
+    校准用的音频：优先使用模型自带的示例音频（modelscope 下载的模型目录中的 example/*.wav），
+    循环拼接到 CLIP_SECONDS；找不到时生成类语音的调幅噪声
+    """
+    import numpy as np
+    from asr_engine import PCM_SAMPLE_RATE, load_wav_waveform
+
+    target = int(CLIP_SECONDS * PCM_SAMPLE_RATE)
+    model_dir = get_project_root() / "model_cache" / "modelscope"
+    for wav_path in sorted(model_dir.glob("**/example/*.wav")):
+        try:
+            example = load_wav_waveform(str(wav_path))
+        except Exception:
+            continue
+        if len(example) == 0:
+            continue
+        gap = np.zeros(int(0.3 * PCM_SAMPLE_RATE), dtype=np.float32)
+        unit = np.concatenate([example, gap])
+        return np.tile(unit, target // len(unit) + 1)[:target], wav_path.name
+
+    rng = np.random.default_rng(0)
+    t = np.arange(target) / PCM_SAMPLE_RATE
+    envelope = (np.sin(2 * np.pi * 3.0 * t) > -0.3).astype(np.float32) * (0.5 + 0.5 * np.sin(2 * np.pi * 0.4 * t))
+    noise = rng.standard_normal(target).astype(np.float32)
+    return (0.1 * envelope * noise).astype(np.float32), "synthetic"
+
+
+def _calibration_worker(conn, clip):
+    """校准子进程：加载完整识别引擎，按命令设置线程数并计时识别"""
+    try:
+        import torch
+        from asr_engine import RecognitionEngine
+        engine = RecognitionEngine("cpu")
+        engine.recognize(clip)  # 预热
+        conn.send(("ready", None))
+    except Exception as e:
+        conn.send(("error", str(e)))
+        return
+
+    while True:
+        command = conn.recv()
+        if command is None:
+            break
+        threads, repeats = command
+        torch.set_num_threads(threads)
+        engine.recognize(clip)  # 线程数变化后预热一次
+        conn.send(("armed", None))
+        conn.recv()  # 等待统一开始
+        t_start = time.perf_counter()
+        for _ in range(repeats):
+            engine.recognize(clip)
+        conn.send(("done", time.perf_counter() - t_start))
+
+
+def run_calibration(log=print, max_processes: Optional[int] = None) -> dict:
+    """
+    测量各个候选布局的吞吐量并返回结果（不保存）
+
+    Returns:
+        {"best": {"processes", "threads", "throughput"}, "layouts": [...], ...}
+        throughput 为每秒墙钟时间处理的音频秒数（实时倍数）
+    """
+    import psutil
+    from asr_engine import PCM_SAMPLE_RATE
+
+    cpu_cores = os.cpu_count() or 1
+    physical_cores = psutil.cpu_count(logical=False) or cpu_cores
+    available_gb = psutil.virtual_memory().available / (1024 ** 3)
+    limit = max(1, min(physical_cores, int(available_gb / ENGINE_MEMORY_GB)))
+    if max_processes:
+        limit = min(limit, max_processes)
+    layouts = candidate_layouts(physical_cores, limit)
+    pool_size = max(p for p, _ in layouts)
+
+    clip, clip_name = _calibration_clip()
+    clip_s = len(clip) / PCM_SAMPLE_RATE
+    log(f"⚙️ CPU校准: {physical_cores} 物理核心, 可用内存 {available_gb:.1f}GB, 音频 {clip_name} ({clip_s:.0f}s)")
+    log(f"⚙️ 启动 {pool_size} 个校准进程并加载模型...")
+
+    ctx = multiprocessing.get_context('spawn')
+    workers = []
+    for i in range(pool_size):
+        parent_conn, child_conn = ctx.Pipe()
+        process = ctx.Process(target=_calibration_worker, args=(child_conn, clip), daemon=True,
+                              name=f"CalibrationWorker-{i}")
+        process.start()
+        workers.append((process, parent_conn))
+
+    results = []
+    try:
+        for process, conn in workers:
+            status, detail = conn.recv()
+            if status != "ready":
+                raise RuntimeError(f"校准进程加载模型失败: {detail}")
+
+        for processes, threads in layouts:
+            active = workers[:processes]
+            for _, conn in active:
+                conn.send((threads, REPEATS))
+            for _, conn in active:
+                conn.recv()
+            t_start = time.perf_counter()
+            for _, conn in active:
+                conn.send("go")
+            elapsed = [conn.recv()[1] for _, conn in active]
+            wall = time.perf_counter() - t_start
+            throughput = processes * REPEATS * clip_s / wall
+            single_rtf = max(elapsed) / (REPEATS * clip_s)
+            results.append({
+                "processes": processes,
+                "threads": threads,
+                "throughput": round(throughput, 2),
+                "rtf": round(single_rtf, 3),
+            })
+            log(f"   - {processes} 进程 × {threads} 线程: 吞吐 {throughput:.1f}x 实时, 单路 RTF {single_rtf:.3f}")
+    finally:
+        for process, conn in workers:
+            try:
+                conn.send(None)
+            except Exception:
+                pass
+        for process, _ in workers:
+            process.join(timeout=10)
+            if process.is_alive():
+                process.terminate()
+
+    # 吞吐量相差不到 5% 时选进程数少的（内存占用更低）
+    best = max(results, key=lambda r: r["throughput"])
+    for r in sorted(results, key=lambda r: (r["processes"], -r["throughput"])):
+        if r["throughput"] >= best["throughput"] * 0.95:
+            best = r
+            break
+
+    return {
+        "best": best,
+        "layouts": results,
+        "physical_cores": physical_cores,
+        "clip": clip_name,
+        "clip_seconds": clip_s,
+        "calibrated_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    import argparse
+    parser = argparse.ArgumentParser(description="测量本机最佳的 CPU 识别进程数和线程数")
+    parser.add_argument("--show", action="store_true", help="只显示已保存的校准结果")
+    parser.add_argument("--max-processes", type=int, default=0, help="最多测试的进程数")
+    args = parser.parse_args(argv)
+
+    if args.show:
+        result = load_calibration()
+        if result is None:
+            print("本机尚未校准")
+            return 1
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+        return 0
+
+    from app_env import setup_model_cache
+    setup_model_cache()
+    result = run_calibration(max_processes=args.max_processes or None)
+    save_calibration(result)
+    best = result["best"]
+    print(f"✅ 最佳布局: {best['processes']} 进程 × {best['threads']} 线程（吞吐 {best['throughput']}x 实时），"
+          f"已保存到 {default_calibration_path()}")
+    return 0
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    sys.exit(main())
@@ -0,0 +1,398 @@
+# -*- coding: utf-8 -*-
+"""
+常驻识别引擎服务
+FunASR 模型在 CPU 上加载需要几十秒，每次开始任务都重新加载代价很高。
+守护进程加载一次模型后常驻，通过本机 socket/命名管道（multiprocessing.connection）
+接受识别请求；GUI 控制器和 funasr-batch 的桥接进程（pipeline_workers.engine_bridge_worker）
+连接它完成识别，任务结束或界面关闭后模型依然保持加载。
+
+引擎按 (设备, CPU线程数) 区分：线程数不同的任务不会连到按其他线程数加载的引擎。
+连接信息（地址、认证密钥、PID）写在 model_cache/engine/engine_<device>[_t<线程数>].json，仅本机用户可读。
+
+命令行:
+    python engine_service.py serve  [--device cpu|cuda] [--threads N] [--idle-timeout 秒]
+    python engine_service.py status [--device cpu|cuda] [--threads N]
+    python engine_service.py stop   [--device cpu|cuda] [--threads N]
+"""
+import os
+import sys
+import json
+import time
+import secrets
+import argparse
+import threading
+import subprocess
+from pathlib import Path
+from multiprocessing.connection import Listener, Client
+from typing import Callable, List, Optional
+
+from app_env import get_project_root
+
+# 守护进程空闲超时默认值（秒），0 表示永不退出
+DEFAULT_IDLE_TIMEOUT_S = 2 * 3600
+
+
+def _state_dir() -> Path:
+    state_dir = get_project_root() / "model_cache" / "engine"
+    state_dir.mkdir(parents=True, exist_ok=True)
+    return state_dir
+
+
+def engine_name(device: str, threads: int = 0) -> str:
+    """引擎标识：设备 + CPU线程数（GPU 不区分线程数，0 表示 FunASR 默认值）"""
+    threads = 0 if device == 'cuda' else max(0, int(threads or 0))
+    return f"{device}_t{threads}" if threads else device
+
+
+def _state_path(name: str) -> Path:
+    return _state_dir() / f"engine_{name}.json"
+
+
+def _lock_path(name: str) -> Path:
+    return _state_dir() / f"engine_{name}.starting"
+
+
+def _log_path(name: str) -> Path:
+    return _state_dir() / f"engine_{name}.log"
+
+
+def _read_state(name: str) -> Optional[dict]:
+    try:
+        with open(_state_path(name), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_state(name: str, state: dict):
+    path = _state_path(name)
+    tmp_path = path.with_suffix('.tmp')
+    # 文件中包含认证密钥，仅当前用户可读写
+    fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        json.dump(state, f)
+    os.replace(tmp_path, path)
+
+
+def task_request_item(task: dict) -> dict:
+    """把识别任务转换为发送给引擎的请求项（内存PCM或WAV路径）"""
+    item = {"key": Path(task['original_path']).stem}
+    if task.get('audio_pcm'):
+        item["audio_pcm"] = task['audio_pcm']
+    else:
+        item["audio_path"] = str(task['audio_path'])
+    return item
+
+
+# ---------------------------------------------------------------------------
+# 客户端
+# ---------------------------------------------------------------------------
+
+class EngineClient:
+    """常驻识别引擎的连接，一个连接同一时间只发送一个请求"""
+
+    def __init__(self, conn, state: dict):
+        self.conn = conn
+        self.state = state
+
+    @classmethod
+    def connect(cls, device: str, threads: int = 0) -> "EngineClient":
+        """连接已运行的引擎，不存在或连接失败时抛出 ConnectionError"""
+        name = engine_name(device, threads)
+        state = _read_state(name)
+        if not state:
+            raise ConnectionError(f"未找到常驻识别引擎 ({name})")
+        try:
+            conn = Client(state['address'], family=state['family'], authkey=bytes.fromhex(state['authkey']))
+        except Exception as e:
+            raise ConnectionError(f"无法连接常驻识别引擎 ({name}): {e}") from e
+        return cls(conn, state)
+
+    def _call(self, request: dict, log: Optional[Callable[[str], None]] = None):
+        self.conn.send(request)
+        response = self.conn.recv()
+        if log is not None:
+            for message in response.get('logs', []):
+                log(message)
+        if not response.get('ok'):
+            raise RuntimeError(response.get('error') or "常驻识别引擎返回错误")
+        return response.get('result')
+
+    def ping(self) -> dict:
+        return self._call({"op": "ping"})
+
+    def recognize(self, items: List[dict], log: Optional[Callable[[str], None]] = None, merge: bool = False) -> List[list]:
+        """识别若干请求项，返回与 items 对应的识别结果；merge=True 时拼接为一次识别"""
+        return self._call({"op": "recognize", "items": items, "merge": merge}, log)
+
+    def shutdown(self):
+        return self._call({"op": "shutdown"})
+
+    def close(self):
+        try:
+            self.conn.close()
+        except Exception:
+            pass
+
+
+def start_engine_process(device: str, idle_timeout_s: float = DEFAULT_IDLE_TIMEOUT_S,
+                         threads: int = 0) -> subprocess.Popen:
+    """以独立进程启动引擎守护进程（脱离当前会话，GUI 退出后继续运行）"""
+    cmd = [sys.executable, str(Path(__file__).resolve()), "serve",
+           "--device", device, "--threads", str(int(threads or 0)), "--idle-timeout", str(int(idle_timeout_s))]
+    log_file = open(_log_path(engine_name(device, threads)), 'ab')
+    kwargs = {}
+    if os.name == 'nt':
+        kwargs['creationflags'] = (subprocess.DETACHED_PROCESS | subprocess.CREATE_NEW_PROCESS_GROUP
+                                   | subprocess.CREATE_NO_WINDOW)
+    else:
+        kwargs['start_new_session'] = True
+    try:
+        return subprocess.Popen(cmd, stdin=subprocess.DEVNULL, stdout=log_file, stderr=log_file,
+                                cwd=str(get_project_root()), close_fds=True, **kwargs)
+    finally:
+        log_file.close()
+
+
+def _claim_start(device: str, threads: int, idle_timeout_s: float, stale_after_s: float,
+                 log: Callable[[str], None]) -> Optional[subprocess.Popen]:
+    """
+    尝试拿启动锁并启动守护进程，锁由其他进程持有时返回 None
+    持有者异常退出留下的过期锁（超过 stale_after_s 秒）先清理，再重新抢锁启动
+    """
+    lock_path = _lock_path(engine_name(device, threads))
+    for _ in range(2):
+        try:
+            fd = os.open(lock_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        except FileExistsError:
+            try:
+                stale = time.time() - lock_path.stat().st_mtime > stale_after_s
+            except OSError:
+                stale = True  # 锁刚被删除
+            if not stale:
+                return None
+            _remove_quietly(lock_path)
+            continue
+        os.close(fd)
+        log(f"🔄 正在启动常驻识别引擎 ({engine_name(device, threads)})，首次加载模型需要一些时间...")
+        return start_engine_process(device, idle_timeout_s, threads)
+    return None
+
+
+def ensure_engine(device: str, log: Callable[[str], None], timeout_s: float = 600.0,
+                  idle_timeout_s: float = DEFAULT_IDLE_TIMEOUT_S, threads: int = 0) -> EngineClient:
+    """
+    连接常驻识别引擎，未运行时启动它并等待模型加载完成
+
+    多个桥接进程同时调用时，只有拿到启动锁的一个会启动守护进程，其余等待其就绪；
+    等待期间启动者异常退出（启动锁被删除或过期）时由等待者接手启动。
+    threads 为 CPU 计算线程数，线程数不同的引擎各自独立。
+    """
+    try:
+        client = EngineClient.connect(device, threads)
+        info = client.ping()
+        log(f"✅ 已连接常驻识别引擎 (PID {info['pid']}, 已处理 {info['requests']} 个请求)，跳过模型加载")
+        return client
+    except Exception:
+        pass
+
+    if getattr(sys, 'frozen', False):
+        raise RuntimeError("打包版本不支持自动启动常驻识别引擎")
+
+    name = engine_name(device, threads)
+    lock_path = _lock_path(name)
+    process = _claim_start(device, threads, idle_timeout_s, timeout_s, log)
+    if process is None:
+        log("⚙️ 常驻识别引擎正在由其他进程启动，等待就绪...")
+
+    deadline = time.time() + timeout_s
+    last_error = None
+    while time.time() < deadline:
+        if process is not None and process.poll() is not None:
+            _remove_quietly(lock_path)
+            raise RuntimeError(f"常驻识别引擎启动失败 (退出码 {process.returncode})，详见 {_log_path(name)}")
+        try:
+            client = EngineClient.connect(device, threads)
+            client.ping()
+            log("✅ 常驻识别引擎已就绪")
+            return client
+        except Exception as e:
+            last_error = e
+        if process is None:
+            process = _claim_start(device, threads, idle_timeout_s, timeout_s, log)
+        time.sleep(1.0)
+    if process is not None:
+        _remove_quietly(lock_path)
+    raise TimeoutError(f"等待常驻识别引擎超时: {last_error}")
+
+
+def _remove_quietly(path: Path):
+    try:
+        path.unlink()
+    except OSError:
+        pass
+
+
+# ---------------------------------------------------------------------------
+# 服务端
+# ---------------------------------------------------------------------------
+
+def _request_input(item: dict, merge: bool):
+    from asr_engine import pcm_to_waveform, load_wav_waveform
+    if item.get('audio_pcm'):
+        return pcm_to_waveform(item['audio_pcm'])
+    audio_path = Path(item['audio_path'])
+    if not audio_path.exists():
+        raise FileNotFoundError(f"音频文件不存在: {audio_path}")
+    return load_wav_waveform(audio_path) if merge else str(audio_path)
+
+
+def serve(device: str = "cpu", idle_timeout_s: float = DEFAULT_IDLE_TIMEOUT_S, threads: int = 0):
+    """加载模型并在本机地址上提供识别服务，直到收到 shutdown 或空闲超时"""
+    from asr_engine import RecognitionEngine
+
+    def log(message: str):
+        print(f"[{time.strftime('%Y-%m-%d %H:%M:%S')}] {message}", flush=True)
+
+    threads = 0 if device == 'cuda' else max(0, int(threads or 0))
+    name = engine_name(device, threads)
+    engine = RecognitionEngine(device, log, threads=threads)
+    family = 'AF_PIPE' if os.name == 'nt' else 'AF_UNIX'
+    authkey = secrets.token_bytes(32)
+    listener = Listener(family=family, authkey=authkey)
+
+    state = {
+        "address": listener.address,
+        "family": family,
+        "authkey": authkey.hex(),
+        "pid": os.getpid(),
+        "device": device,
+        "threads": threads,
+        "started_at": time.time(),
+    }
+    _write_state(name, state)
+    _remove_quietly(_lock_path(name))
+    log(f"✅ 常驻识别引擎已启动 (PID {os.getpid()}, 设备 {device}, 地址 {listener.address})")
+
+    engine_lock = threading.Lock()  # 模型不是线程安全的，请求串行执行
+    stop_event = threading.Event()
+    stats = {"requests": 0, "last_used": time.monotonic()}
+
+    def wake_listener():
+        # accept() 阻塞时无法被 close 打断，主动连一次把它唤醒
+        try:
+            Client(listener.address, family=family, authkey=authkey).close()
+        except Exception:
+            pass
+
+    def handle_request(request: dict) -> dict:
+        op = request.get('op')
+        if op == 'ping':
+            return {"ok": True, "result": {"pid": os.getpid(), "device": device, "threads": threads,
+                                           "requests": stats["requests"]}}
+        if op == 'shutdown':
+            stop_event.set()
+            return {"ok": True, "result": None}
+        if op != 'recognize':
+            return {"ok": False, "error": f"未知请求: {op}"}
+
+        items = request.get('items') or []
+        merge = bool(request.get('merge')) and len(items) > 1
+        t_wait = time.monotonic()
+        with engine_lock:
+            stats["requests"] += 1
+            t_start = time.monotonic()
+            try:
+                inputs = [_request_input(item, merge) for item in items]
+                if merge:
+                    result = engine.recognize_merged(inputs, [item.get('key', '') for item in items])
+                else:
+                    result = [engine.recognize(model_input) for model_input in inputs]
+            except Exception as e:
+                log(f"❌ 识别请求失败: {e}")
+                return {"ok": False, "error": str(e)}
+            finally:
+                stats["last_used"] = time.monotonic()
+        logs = [f"      - 常驻引擎识别耗时: {stats['last_used'] - t_start:.1f}s (排队 {t_start - t_wait:.1f}s)"]
+        return {"ok": True, "result": result, "logs": logs}
+
+    def handle_connection(conn):
+        with conn:
+            while not stop_event.is_set():
+                try:
+                    request = conn.recv()
+                except (EOFError, OSError):
+                    return
+                response = handle_request(request)
+                try:
+                    conn.send(response)
+                except (OSError, ValueError):
+                    return
+                if stop_event.is_set():
+                    wake_listener()
+                    return
+
+    def idle_watchdog():
+        while not stop_event.wait(30):
+            if idle_timeout_s > 0 and time.monotonic() - stats["last_used"] > idle_timeout_s:
+                log(f"⚙️ 空闲超过 {int(idle_timeout_s)} 秒，引擎退出")
+                stop_event.set()
+                wake_listener()
+
+    threading.Thread(target=idle_watchdog, daemon=True, name="EngineIdleWatchdog").start()
+
+    try:
+        while not stop_event.is_set():
+            try:
+                conn = listener.accept()
+            except Exception as e:
+                # 认证失败等单个连接错误不影响服务
+                if not stop_event.is_set():
+                    log(f"⚠️ 拒绝连接: {e}")
+                continue
+            if stop_event.is_set():
+                conn.close()
+                break
+            threading.Thread(target=handle_connection, args=(conn,), daemon=True, name="EngineConnection").start()
+    finally:
+        listener.close()
+        current = _read_state(name)
+        if current and current.get('pid') == os.getpid():
+            _remove_quietly(_state_path(name))
+        engine.release()
+        log("✅ 常驻识别引擎已停止")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="engine_service", description="FunASR 常驻识别引擎")
+    parser.add_argument("command", choices=["serve", "status", "stop"])
+    parser.add_argument("--device", default="cpu", choices=["cpu", "cuda"])
+    parser.add_argument("--threads", type=int, default=0, help="CPU计算线程数（0 表示默认值）")
+    parser.add_argument("--idle-timeout", type=float, default=DEFAULT_IDLE_TIMEOUT_S,
+                        help="空闲多少秒后自动退出（0 表示不退出）")
+    args = parser.parse_args(argv)
+
+    if args.command == "serve":
+        from app_env import setup_model_cache
+        setup_model_cache()
+        serve(args.device, args.idle_timeout, args.threads)
+        return 0
+
+    try:
+        client = EngineClient.connect(args.device, args.threads)
+        info = client.ping()
+    except Exception as e:
+        print(f"常驻识别引擎未运行 ({engine_name(args.device, args.threads)}): {e}")
+        return 1
+
+    if args.command == "status":
+        print(json.dumps(info, ensure_ascii=False))
+    else:
+        client.shutdown()
+        print(f"已停止常驻识别引擎 (PID {info['pid']})")
+    client.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -214,31 +214,12 @@ class MetadataLoader(QObject):
             format_info = ""
 
             try:
-                # 尝试调用ffprobe
-                from ffmpeg_manager import get_ffprobe_path
-                ffprobe_path = get_ffprobe_path()
-
-                cmd = [
-                    ffprobe_path,
-                    "-v", "quiet",
-                    "-print_format", "json",
-                    "-show_format",
-                    "-show_streams",
-                    file_path
-                ]
-
-                result = subprocess.run(
-                    cmd,
-                    capture_output=True,
-                    text=True,
-                    timeout=5,
-                    encoding='utf-8',
-                    errors='ignore'
-                )
-
-                if result.returncode == 0:
-                    data = json.loads(result.stdout)
+                # 使用与流水线共享的探测缓存，这里探测过的文件开始处理时不会再次调用ffprobe
+                # （快速探测的结果按级别记录，缺少时长或音频流时流水线会继续加深探测）
+                from probe_cache import probe_media
+                data, _label, _error = probe_media(file_path, timeout_s=5, max_level=1)
 
+                if data:
                     # 获取时长
                     if 'format' in data and 'duration' in data['format']:
                         duration_sec = float(data['format']['duration'])
@@ -0,0 +1,3 @@
+@echo off
+REM FunASR 无界面批处理入口，参数见 python funasr_batch.py --help
+python "%~dp0funasr_batch.py" %*
@@ -0,0 +1,500 @@
+# -*- coding: utf-8 -*-
+"""
+无界面批处理入口 (funasr-batch)
+不加载 Qt/GUI，直接驱动 预处理 -> 识别 -> 后处理 三段流水线，适合无显示器的服务器夜间任务。
+
+用法示例:
+    python funasr_batch.py /data/videos --formats srt,txt --ffsubsync --summary-json summary.json
+    python funasr_batch.py --file-list files.txt --device cuda
+
+退出码:
+    0   全部成功（或全部已完成被跳过）
+    1   部分文件处理失败
+    2   参数错误/没有可处理的文件
+    3   识别引擎加载失败
+    4   运行环境不完整（未找到 FFmpeg）
+    130 被用户中断 (Ctrl+C)
+"""
+import sys
+import json
+import time
+import queue
+import logging
+import argparse
+import threading
+import multiprocessing
+from dataclasses import dataclass, field, asdict
+from pathlib import Path
+from typing import Callable, List, Optional, Tuple
+
+from pipeline_config import ProcessingConfig, SUPPORTED_MEDIA_EXT, collect_media_files
+from pipeline_transport import PipelineChannels, drain, put_sentinels, start_task_feeder, stop_processes
+from pipeline_logging import unpack_log_items, write_record
+
+EXIT_OK = 0
+EXIT_FAILURES = 1
+EXIT_USAGE = 2
+EXIT_ENGINE_ERROR = 3
+EXIT_ENVIRONMENT = 4
+EXIT_INTERRUPTED = 130
+
+# 命令行输出格式名 -> ProcessingConfig 字段
+OUTPUT_FORMATS = {
+    'srt': 'generate_srt',
+    'srt.txt': 'generate_srt_txt',
+    'txt': 'generate_txt',
+    'json': 'generate_json',
+    'md': 'generate_txt_md',
+    'docx': 'generate_docx',
+    'pdf': 'generate_pdf',
+}
+
+logger = logging.getLogger("FunASR")
+
+
+@dataclass
+class BatchSummary:
+    """批处理结果摘要（可直接序列化为JSON）"""
+    total_files: int = 0
+    skipped: int = 0
+    succeeded: int = 0
+    no_speech: int = 0  # 语音门控判定无语音、未识别的文件（只生成空输出，下次断点续传会重新处理）
+    failed: int = 0
+    failures: List[str] = field(default_factory=list)
+    no_speech_files: List[str] = field(default_factory=list)
+    elapsed_s: float = 0.0
+    exit_code: int = EXIT_OK
+    stage_timings: dict = field(default_factory=dict)  # 各步骤耗时汇总（见 stage_telemetry）
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+def _drain_logs(log_queue, log: Optional[Callable[[str], None]], limit: int = 500):
+    """
+    把工作进程的日志转发到本进程的日志输出
+    log 为 None 时按原级别写入 "FunASR" logger（-q 只显示警告和错误，调试日志只进 --log-file），
+    否则只把 INFO 及以上的消息交给 log
+    """
+    for record in unpack_log_items(drain(log_queue, limit)):
+        if log is None:
+            write_record(logger, record)
+        elif record[0] >= logging.INFO:
+            log(record[3])
+
+
+def _wait_for_engine(status_queue, log_queue, process, timeout_s: float, log) -> str:
+    """等待识别引擎加载完成，返回 'ready' / 'error' / 'timeout'"""
+    deadline = time.time() + timeout_s
+    while time.time() < deadline:
+        _drain_logs(log_queue, log)
+        try:
+            return status_queue.get(timeout=0.5)
+        except queue.Empty:
+            if not process.is_alive():
+                return "error"
+    return "timeout"
+
+
+def _dead_stage(stages: List[Tuple[str, List[multiprocessing.Process], bool]]) -> Optional[str]:
+    """
+    返回已没有存活进程、剩余文件无法再完成的阶段名，各阶段都正常时返回 None
+    stages: (阶段名, 进程列表, 是否允许全部正常退出)；预处理进程在任务取完后自行退出（退出码 0），
+    只有任务尚未投递完或有进程异常退出（退出码非 0）时才算该阶段失效
+    """
+    for name, stage_processes, may_finish in stages:
+        if not stage_processes or any(p.is_alive() for p in stage_processes):
+            continue
+        if may_finish and all(p.exitcode == 0 for p in stage_processes):
+            continue
+        return name
+    return None
+
+
+def _resolve_device(device: str) -> str:
+    if device != "auto":
+        return device
+    try:
+        import torch
+        return "cuda" if torch.cuda.is_available() else "cpu"
+    except Exception:
+        return "cpu"
+
+
+def run_batch(config: ProcessingConfig,
+              pre_workers: Optional[int] = None,
+              post_workers: Optional[int] = None,
+              log: Optional[Callable[[str], None]] = None,
+              engine_timeout_s: float = 600.0,
+              telemetry_jsonl: Optional[str] = None) -> BatchSummary:
+    """
+    在当前进程（无Qt）中运行完整流水线
+
+    Args:
+        config: 流水线配置，input_files 为待处理文件
+        pre_workers: 预处理进程数，None 表示按系统配置自动选择
+        post_workers: 后处理进程数，None 表示按系统配置自动选择
+        log: 日志回调，默认写入 "FunASR" logger
+        engine_timeout_s: 等待识别引擎加载的最长时间（秒）
+        telemetry_jsonl: 每个文件各阶段耗时的 JSON Lines 输出路径（config.metrics_port 非 0 时同时提供 /metrics）
+
+    Returns:
+        BatchSummary: 处理结果摘要，exit_code 为建议的进程退出码
+    """
+    from performance_config import PerformanceConfig
+    from pipeline_workers import (pre_processing_worker, recognition_worker, engine_bridge_worker,
+                                  post_processing_worker, segment_recognition_worker)
+    from asr_sharding import plan_segment_workers
+    from stage_telemetry import StageTelemetry
+    from job_store import JobStore, JobRecorder, filter_resumable, output_key
+
+    worker_log = log  # 工作进程日志：未指定回调时保留级别写入 logger
+    log = log or logger.info
+    t_start = time.time()
+    summary = BatchSummary(total_files=len(config.input_files))
+
+    # 任务记录：断点续传按记录判断，不可用时回退到检查输出文件
+    try:
+        job_store = JobStore(config.job_store_path or None)
+    except Exception as e:
+        log(f"⚠️ 任务记录不可用，断点续传将检查输出文件: {e}")
+        job_store = None
+
+    files = list(config.input_files)
+    if config.enable_resume:
+        files = filter_resumable(job_store, config, files)
+        summary.skipped = summary.total_files - len(files)
+        if summary.skipped > 0:
+            log(f"⏭️ 断点续传：跳过 {summary.skipped} 个已完成文件")
+
+    if not files:
+        log("所有输入文件均已完成，跳过处理")
+        if job_store is not None:
+            job_store.close()
+        summary.elapsed_s = round(time.time() - t_start, 3)
+        return summary
+
+    perf = PerformanceConfig.auto_detect()
+    pre_workers = max(1, min(pre_workers or perf.pre_proc_workers, len(files)))
+    post_workers = max(1, min(post_workers or perf.post_proc_workers, len(files)))
+
+    # 小文件优先，与GUI控制器保持一致
+    def _size_key(file_path: str) -> float:
+        try:
+            return Path(file_path).stat().st_size
+        except OSError:
+            return float('inf')
+    files.sort(key=_size_key)
+
+    channels = PipelineChannels(multiprocessing.get_context('spawn'), perf.ffmpeg_concurrent)
+    channels.create_task_queue(pre_workers * perf.task_queue_multiplier)
+    channels.create_recognition_queues(pre_workers * perf.audio_queue_multiplier, perf.result_queue_size)
+    log_queue = channels.log_queue
+    progress_queue = channels.progress_queue
+    processes: List[multiprocessing.Process] = []
+    pre_processes: List[multiprocessing.Process] = []
+    post_processes: List[multiprocessing.Process] = []
+    segment_processes: List[multiprocessing.Process] = []
+    recognition_processes: List[multiprocessing.Process] = []
+    feeder_stop = threading.Event()
+    telemetry = StageTelemetry(telemetry_jsonl, config.metrics_port, log=log)
+    jobs = JobRecorder(job_store, config)
+
+    try:
+        worker_config = asdict(config)
+        log(f"🚀 任务开始，正在启动识别引擎... (设备: {config.device.upper()})")
+        recognition_args = (channels.audio_queue, channels.result_queue, log_queue, worker_config,
+                            channels.engine_status_queue, progress_queue, channels.pause_event)
+        segment_workers = 0 if config.persistent_engine else plan_segment_workers(config.segment_workers, config.device)
+        # 识别进程数 × 线程数：GPU 按显存，CPU 按本机校准结果，命令行/配置中的显式值优先
+        recognition_workers, recognition_threads = perf.recognition_layout(config.device)
+        if perf.calibrated:
+            log(f"⚙️ CPU校准结果：{recognition_workers} 个识别进程 × {recognition_threads} 线程")
+        recognition_workers = config.recognition_workers or recognition_workers
+        worker_config['recognition_threads'] = config.recognition_threads or recognition_threads
+        if config.persistent_engine or segment_workers:
+            recognition_workers = 1
+        if segment_workers:
+            channels.create_segment_queues(segment_workers)
+            recognition_args += ((channels.segment_queue, channels.segment_result_queue),)
+            for i in range(segment_workers):
+                segment_processes.append(channels.start_process(
+                    segment_recognition_worker,
+                    (channels.segment_queue, channels.segment_result_queue, log_queue, worker_config),
+                    name=f"SegmentWorker-{i}"
+                ))
+            log(f"⚙️ 并行分段识别：{segment_workers} 个进程")
+        elif config.segment_workers >= 2:
+            log("⚠️ 并行分段识别仅支持本地CPU识别且需要足够内存，本次不启用")
+        for i in range(recognition_workers):
+            recognition_processes.append(channels.start_process(
+                engine_bridge_worker if config.persistent_engine else recognition_worker,
+                recognition_args,
+                name=f"RecognitionWorker-{i}"
+            ))
+
+        status = "ready"
+        for process in recognition_processes:
+            status = _wait_for_engine(channels.engine_status_queue, log_queue, process, engine_timeout_s, worker_log)
+            if status != "ready":
+                break
+        if status != "ready":
+            log(f"❌ 识别引擎加载失败！({status})")
+            summary.failed = len(files)
+            summary.exit_code = EXIT_ENGINE_ERROR
+            return summary
+        log("✅ 识别引擎已就绪！开始处理文件...")
+        log(f"⚙️ 分配 {pre_workers} 个预处理进程和 {post_workers} 个后处理进程, FFmpeg并发 {perf.ffmpeg_concurrent}")
+        log(f"⚙️ 待处理文件数: {len(files)}")
+        if job_store is not None:
+            job_store.begin(files, output_key(config))
+
+        for i in range(pre_workers):
+            pre_processes.append(channels.start_process(
+                pre_processing_worker,
+                (channels.task_queue, channels.audio_queue, log_queue, progress_queue, worker_config,
+                 channels.ffmpeg_semaphore, channels.pause_event, channels.result_queue),
+                name=f"PreProcessWorker-{i}"
+            ))
+        for i in range(post_workers):
+            post_processes.append(channels.start_process(
+                post_processing_worker,
+                (channels.result_queue, log_queue, progress_queue, worker_config, channels.pause_event),
+                name=f"PostProcessWorker-{i}"
+            ))
+
+        processes = pre_processes + post_processes
+        feeder = start_task_feeder(channels.task_queue, files, feeder_stop)
+
+        finished = 0
+        while finished < len(files):
+            _drain_logs(log_queue, worker_log)
+            try:
+                item = progress_queue.get(timeout=0.5)
+            except queue.Empty:
+                # 任一阶段的进程全部退出后剩余文件永远等不到结果，终止任务并以非零退出码结束
+                dead = _dead_stage([
+                    ("预处理", pre_processes, not feeder.is_alive()),
+                    ("识别", recognition_processes, False),
+                    ("分段识别", segment_processes, False),
+                    ("后处理", post_processes, False),
+                ])
+                if dead:
+                    log(f"❌ {dead}进程全部意外退出，终止剩余 {len(files) - finished} 个文件")
+                    summary.failed += len(files) - finished
+                    summary.failures.append(f"{dead}进程意外退出")
+                    break
+                continue
+
+            # 实时进度事件（FFmpeg/ASR）在无界面模式下不需要展示，只记录阶段耗时
+            if isinstance(item, dict):
+                if item.get("kind") == "stage":
+                    telemetry.record(item)
+                    jobs.add(item)
+                continue
+
+            jobs.add(item)
+            status_code, message = item[:2]
+            log(message)
+            if status_code == 1:
+                summary.succeeded += 1
+            elif status_code == 0:
+                summary.no_speech += 1
+                summary.no_speech_files.append(message)
+            elif status_code == -1:
+                summary.failed += 1
+                summary.failures.append(message)
+            finished = summary.succeeded + summary.no_speech + summary.failed
+
+        summary.exit_code = EXIT_FAILURES if summary.failed > 0 else EXIT_OK
+
+    except KeyboardInterrupt:
+        log("🛑 用户中断，正在停止所有工作进程...")
+        summary.exit_code = EXIT_INTERRUPTED
+
+    finally:
+        feeder_stop.set()
+        # 发送结束信号后等待进程退出，超时则强制终止
+        put_sentinels(channels.result_queue, post_workers)
+        put_sentinels(channels.audio_queue, len(recognition_processes))
+        put_sentinels(channels.segment_queue, len(segment_processes))
+        stop_processes(processes + recognition_processes + segment_processes, timeout=5)
+        _drain_logs(log_queue, worker_log, limit=10000)
+        channels.close()
+        jobs.flush()
+        if job_store is not None:
+            job_store.close()
+        summary.stage_timings = telemetry.brief()
+        text = telemetry.format_summary()
+        if text:
+            log("⏱️ 各步骤耗时汇总:\n" + text)
+        telemetry.close()
+        summary.elapsed_s = round(time.time() - t_start, 3)
+
+    return summary
+
+
+def build_arg_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="funasr-batch",
+        description="FunASR 无界面批处理：提取音频 -> 语音识别 -> 生成字幕/文本",
+    )
+    parser.add_argument("paths", nargs="*", help="媒体文件或文件夹（文件夹递归扫描）")
+    parser.add_argument("--file-list", help="文本文件，每行一个待处理的媒体文件路径")
+    parser.add_argument("--formats", default="srt",
+                        help=f"输出格式，逗号分隔: {','.join(OUTPUT_FORMATS)} (默认: srt)")
+    parser.add_argument("--device", choices=["auto", "cpu", "cuda"], default="auto", help="识别设备 (默认: auto)")
+    parser.add_argument("--cfr", action="store_true", help="启用VFR转CFR")
+    parser.add_argument("--ffsubsync", action="store_true", help="启用FFSubSync字幕精校")
+    parser.add_argument("--ffsubsync-vad", choices=["silero", "webrtc", "auditok"], default="silero")
+    parser.add_argument("--ffsubsync-max-offset", type=int, default=60, help="最大偏移量（秒）")
+    parser.add_argument("--ffsubsync-fast", action="store_true", help="FFSubSync快速模式（跳过帧率分析）")
+    parser.add_argument("--sync-backend", choices=["ffsubsync", "native"], default="ffsubsync",
+                        help="字幕精校后端：native 为内置 FFT 对齐（基于识别时间戳，无需 ffsubsync，默认 ffsubsync）")
+    parser.add_argument("--ffsubsync-cli", action="store_true",
+                        help="每个字幕调用 ffsubsync 命令精校（默认在后处理进程内对齐，复用已提取的音频）")
+    parser.add_argument("--in-memory-audio", action="store_true",
+                        help="音频提取为内存PCM直接送识别，不写临时WAV文件")
+    parser.add_argument("--asr-batch", type=int, default=8, metavar="N",
+                        help="短音频跨文件合并识别，每批最多N个文件（1 表示关闭，默认8）")
+    parser.add_argument("--persistent-engine", action="store_true",
+                        help="使用常驻识别引擎（首次启动后模型保持加载，后续调用无需重新加载）")
+    parser.add_argument("--calibrate-cpu", action="store_true",
+                        help="测量本机最佳的CPU识别进程数×线程数并保存，之后的任务自动使用（运行后退出）")
+    parser.add_argument("--asr-workers", type=int, default=0, metavar="N",
+                        help="识别进程数（默认：GPU按显存，CPU按校准结果）")
+    parser.add_argument("--asr-threads", type=int, default=0, metavar="N",
+                        help="CPU识别进程的计算线程数（默认按校准结果）")
+    parser.add_argument("--segment-workers", type=int, default=0, metavar="N",
+                        help="CPU模式下把长音频的语音片段分给N个进程并行识别（0 表示关闭，-1 表示按CPU校准结果）")
+    parser.add_argument("--chunk-threshold", type=float, default=1800.0, metavar="SECONDS",
+                        help="超过该时长的音频按窗口分段识别，内存占用不随时长增长（0 表示关闭，默认1800）")
+    parser.add_argument("--no-speech-gate", action="store_true",
+                        help="不跳过静音/无人声文件，全部送入识别")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="不使用识别结果缓存（默认按内容指纹复用已识别过的音频）")
+    parser.add_argument("--cache-db", default="", help="识别结果缓存数据库路径")
+    parser.add_argument("--no-resume", action="store_true", help="禁用断点续传，重新处理已完成的文件")
+    parser.add_argument("--job-db", default="", help="任务记录数据库路径（默认 model_cache/jobs.sqlite3）")
+    parser.add_argument("--no-checkpoints", action="store_true",
+                        help="不保存阶段检查点（提取的音频和识别结果），中途退出后从头处理")
+    parser.add_argument("--pre-workers", type=int, default=None, help="预处理进程数（默认自动）")
+    parser.add_argument("--post-workers", type=int, default=None, help="后处理进程数（默认自动）")
+    parser.add_argument("--engine-timeout", type=float, default=600.0, help="等待识别引擎加载的秒数")
+    parser.add_argument("--summary-json", help="将结果摘要写入该JSON文件")
+    parser.add_argument("--telemetry-jsonl", help="将每个文件各阶段耗时逐行写入该 JSON Lines 文件")
+    parser.add_argument("--metrics-port", type=int, default=0, metavar="PORT",
+                        help="在 127.0.0.1:PORT/metrics 提供 Prometheus 格式的阶段耗时指标")
+    parser.add_argument("--progress-interval", type=float, default=0.5, metavar="SECONDS",
+                        help="同一文件两次进度事件的最小间隔（默认: 0.5，0 表示不限速）")
+    parser.add_argument("--log-file", help="同时将日志写入该文件")
+    parser.add_argument("-q", "--quiet", action="store_true", help="只输出警告和最终摘要")
+    return parser
+
+
+def _setup_logging(log_file: Optional[str], quiet: bool):
+    formatter = logging.Formatter("%(asctime)s | %(levelname)s | %(message)s", "%Y-%m-%d %H:%M:%S")
+    # 工作进程的调试日志只写入 --log-file
+    logger.setLevel(logging.DEBUG if log_file else logging.INFO)
+    logger.propagate = False
+
+    stream_handler = logging.StreamHandler(sys.stderr)
+    stream_handler.setFormatter(formatter)
+    stream_handler.setLevel(logging.WARNING if quiet else logging.INFO)
+    logger.addHandler(stream_handler)
+
+    if log_file:
+        file_handler = logging.FileHandler(log_file, encoding="utf-8")
+        file_handler.setFormatter(formatter)
+        logger.addHandler(file_handler)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = build_arg_parser()
+    args = parser.parse_args(argv)
+    _setup_logging(args.log_file, args.quiet)
+
+    if args.calibrate_cpu:
+        from cpu_calibration import main as calibrate_main
+        return calibrate_main([])
+
+    # 收集输入文件
+    inputs = list(args.paths)
+    if args.file_list:
+        try:
+            with open(args.file_list, 'r', encoding='utf-8') as f:
+                inputs.extend(line.strip() for line in f if line.strip())
+        except OSError as e:
+            logger.error(f"无法读取文件列表: {e}")
+            return EXIT_USAGE
+
+    files = collect_media_files(inputs, SUPPORTED_MEDIA_EXT)
+    if not files:
+        logger.error("没有找到可处理的媒体文件")
+        return EXIT_USAGE
+
+    formats = [fmt.strip().lower() for fmt in args.formats.split(",") if fmt.strip()]
+    unknown = [fmt for fmt in formats if fmt not in OUTPUT_FORMATS]
+    if unknown or not formats:
+        logger.error(f"未知的输出格式: {', '.join(unknown) or '(空)'}，可选: {', '.join(OUTPUT_FORMATS)}")
+        return EXIT_USAGE
+
+    from app_env import setup_model_cache
+    from ffmpeg_manager import ensure_ffmpeg_is_ready
+    setup_model_cache()
+    if not ensure_ffmpeg_is_ready():
+        logger.error("FFmpeg环境未就绪，无法处理")
+        return EXIT_ENVIRONMENT
+
+    config = ProcessingConfig(
+        input_files=files,
+        cfr_enabled=args.cfr,
+        ffsubsync_enabled=args.ffsubsync,
+        ffsubsync_vad=args.ffsubsync_vad,
+        ffsubsync_max_offset=args.ffsubsync_max_offset,
+        ffsubsync_fast_mode=args.ffsubsync_fast,
+        ffsubsync_in_process=not args.ffsubsync_cli,
+        subtitle_sync_backend=args.sync_backend,
+        device=_resolve_device(args.device),
+        enable_resume=not args.no_resume,
+        audio_in_memory=args.in_memory_audio,
+        recognition_batch_files=max(1, args.asr_batch),
+        segment_workers=max(-1, args.segment_workers),
+        recognition_workers=max(0, args.asr_workers),
+        recognition_threads=max(0, args.asr_threads),
+        persistent_engine=args.persistent_engine,
+        transcription_cache=not args.no_cache,
+        speech_gate=not args.no_speech_gate,
+        chunked_recognition_threshold_s=max(0.0, args.chunk_threshold),
+        transcription_cache_path=args.cache_db,
+        job_store_path=args.job_db,
+        stage_checkpoints=not args.no_checkpoints,
+        metrics_port=max(0, args.metrics_port),
+        progress_interval_s=max(0.0, args.progress_interval),
+    )
+    for field_name in OUTPUT_FORMATS.values():
+        setattr(config, field_name, False)
+    for fmt in formats:
+        setattr(config, OUTPUT_FORMATS[fmt], True)
+
+    summary = run_batch(
+        config,
+        pre_workers=args.pre_workers,
+        post_workers=args.post_workers,
+        engine_timeout_s=args.engine_timeout,
+        telemetry_jsonl=args.telemetry_jsonl,
+    )
+
+    summary_json = json.dumps(summary.to_dict(), ensure_ascii=False, indent=2)
+    if args.summary_json:
+        try:
+            Path(args.summary_json).write_text(summary_json, encoding="utf-8")
+        except OSError as e:
+            logger.error(f"写入摘要文件失败: {e}")
+    print(summary_json)
+    return summary.exit_code
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    sys.exit(main())
@@ -0,0 +1,228 @@
+# -*- coding: utf-8 -*-
+"""
+任务记录（SQLite，WAL 模式）
+每个输入文件一行：状态、最近完成的阶段、尝试次数、错误信息、各阶段耗时和输出文件。
+控制器（GUI 的事件分发线程 / funasr-batch 主循环）每批事件在一个事务中写入，进程崩溃后记录仍然完整。
+
+断点续传按记录判断：状态为 done 且输出格式与本次相同、记录的输出文件都还在的文件直接跳过
+（只检查记录中的路径，不再按配置推算；输出被删除或移走的文件重新处理）；
+从未记录过的文件（例如升级前已处理的文件）才回退到检查输出文件，存在则补记为 done。
+queued / running 状态的文件（上次中途退出）会重新处理，尝试次数累加。
+skipped（语音门控判定无语音、只生成了空输出）和 failed 的文件同样会重新处理。
+"""
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from app_env import get_project_root
+from pipeline_config import ProcessingConfig, expected_output_paths, is_file_completed
+
+JOB_STATES = ("queued", "running", "done", "skipped", "failed")
+# 结果元组的状态码 -> 记录状态
+_RESULT_STATES = {1: "done", 0: "skipped", -1: "failed"}
+_LOOKUP_CHUNK = 500  # SQLite 单条语句的参数个数有上限，分批查询
+
+
+def default_job_store_path() -> Path:
+    return get_project_root() / "model_cache" / "jobs.sqlite3"
+
+
+def job_key(path: str) -> str:
+    """记录的主键：规范化的路径字符串（与工作进程回传的 str(Path(...)) 一致）"""
+    return str(Path(path))
+
+
+def output_key(config: ProcessingConfig) -> str:
+    """本次任务选择的输出格式（如 ".srt|.txt"），格式变化后已完成的文件需要重新处理"""
+    return "|".join(sorted(p.name[len("job"):] for p in expected_output_paths(config, "job")))
+
+
+class JobStore:
+    """文件级任务记录，path -> 状态/阶段/耗时/输出"""
+
+    def __init__(self, db_path: Optional[str] = None):
+        self.db_path = Path(db_path) if db_path else default_job_store_path()
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        # GUI 中由GUI线程（开始任务）和事件分发线程（记录结果）共用，写入由锁串行化
+        self._conn = sqlite3.connect(str(self.db_path), timeout=30, check_same_thread=False)
+        self._lock = threading.Lock()
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " path TEXT PRIMARY KEY,"
+            " state TEXT NOT NULL,"
+            " stage TEXT,"
+            " attempts INTEGER DEFAULT 0,"
+            " error TEXT,"
+            " timings TEXT,"
+            " outputs TEXT,"
+            " output_key TEXT,"
+            " updated_at REAL,"
+            " finished_at REAL)"
+        )
+        self._conn.commit()
+
+    def lookup(self, paths: Iterable[str]) -> Dict[str, Tuple[str, str]]:
+        """查询已记录的文件，返回 {job_key(path): (state, output_key)}"""
+        paths = [job_key(path) for path in paths]
+        found = {}
+        with self._lock:
+            for start in range(0, len(paths), _LOOKUP_CHUNK):
+                chunk = paths[start:start + _LOOKUP_CHUNK]
+                placeholders = ",".join("?" * len(chunk))
+                for path, state, key in self._conn.execute(
+                        f"SELECT path, state, output_key FROM jobs WHERE path IN ({placeholders})", chunk):
+                    found[path] = (state, key)
+        return found
+
+    def recorded_outputs(self, paths: Iterable[str]) -> Dict[str, Optional[List[str]]]:
+        """查询记录的输出文件，返回 {job_key(path): [输出路径] 或 None（未记录）}"""
+        paths = [job_key(path) for path in paths]
+        found = {}
+        with self._lock:
+            for start in range(0, len(paths), _LOOKUP_CHUNK):
+                chunk = paths[start:start + _LOOKUP_CHUNK]
+                placeholders = ",".join("?" * len(chunk))
+                for path, outputs in self._conn.execute(
+                        f"SELECT path, outputs FROM jobs WHERE path IN ({placeholders})", chunk):
+                    found[path] = json.loads(outputs) if outputs else None
+        return found
+
+    def begin(self, paths: Iterable[str], key: str):
+        """登记本次要处理的文件（状态 queued，尝试次数 +1）"""
+        now = time.time()
+        rows = [(job_key(path), key, now) for path in paths]
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT INTO jobs (path, state, attempts, output_key, updated_at) VALUES (?, 'queued', 1, ?, ?)"
+                " ON CONFLICT(path) DO UPDATE SET state = 'queued', stage = NULL, error = NULL,"
+                " attempts = attempts + 1, output_key = excluded.output_key, updated_at = excluded.updated_at",
+                rows)
+
+    def mark_done(self, paths: Iterable[str], key: str, outputs_for: Callable[[str], List[str]]):
+        """补记已有输出文件的文件为 done（不计入尝试次数）"""
+        now = time.time()
+        rows = [(job_key(path), json.dumps(outputs_for(path), ensure_ascii=False), key, now, now) for path in paths]
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO jobs (path, state, attempts, outputs, output_key, updated_at, finished_at)"
+                " VALUES (?, 'done', 0, ?, ?, ?, ?)", rows)
+
+    def apply(self, events: Iterable, outputs_for: Callable[[str], List[str]]):
+        """
+        在一个事务中写入一批进度事件
+        - 阶段事件（stage_event）：状态 running，记录阶段和耗时
+        - 结果元组 (状态码, 消息, 文件, 错误或跳过原因)：状态码 1/0/-1 对应 done / skipped / failed；
+          只有两个元素的旧格式没有文件路径，忽略
+        """
+        stages, results = [], []
+        for event in events:
+            if isinstance(event, dict):
+                if event.get("kind") == "stage" and event.get("file"):
+                    stages.append(event)
+            elif isinstance(event, tuple) and len(event) >= 3 and event[2]:
+                results.append(event)
+        if not stages and not results:
+            return
+
+        now = time.time()
+        with self._lock, self._conn:
+            for event in stages:
+                path = job_key(event["file"])
+                row = self._conn.execute("SELECT timings FROM jobs WHERE path = ?", (path,)).fetchone()
+                timings = json.loads(row[0]) if row and row[0] else {}
+                timings[event["stage"]] = dict(event.get("timings") or {}, total=event.get("total"))
+                self._conn.execute(
+                    "INSERT INTO jobs (path, state, stage, attempts, timings, updated_at) VALUES (?, 'running', ?, 1, ?, ?)"
+                    " ON CONFLICT(path) DO UPDATE SET state = CASE WHEN state IN ('done', 'skipped', 'failed') THEN state"
+                    " ELSE 'running' END, stage = excluded.stage, timings = excluded.timings,"
+                    " updated_at = excluded.updated_at",
+                    (path, event["stage"], json.dumps(timings), now))
+            for status_code, _message, path, *rest in results:
+                state = _RESULT_STATES.get(status_code, "failed")
+                error = rest[0] if rest and state != "done" else None
+                outputs = json.dumps(outputs_for(path), ensure_ascii=False) if state != "failed" else None
+                self._conn.execute(
+                    "INSERT INTO jobs (path, state, attempts, error, outputs, updated_at, finished_at)"
+                    " VALUES (?, ?, 1, ?, ?, ?, ?)"
+                    " ON CONFLICT(path) DO UPDATE SET state = excluded.state, error = excluded.error,"
+                    " outputs = excluded.outputs, updated_at = excluded.updated_at, finished_at = excluded.finished_at",
+                    (job_key(path), state, error, outputs, now, now))
+
+    def counts(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._conn.execute("SELECT state, COUNT(*) FROM jobs GROUP BY state").fetchall())
+
+    def forget(self, paths: Iterable[str]):
+        """删除若干文件的记录（下次按输出文件重新判断）"""
+        with self._lock, self._conn:
+            self._conn.executemany("DELETE FROM jobs WHERE path = ?", [(job_key(path),) for path in paths])
+
+    def close(self):
+        try:
+            self._conn.close()
+        except Exception:
+            pass
+
+
+def output_paths(config: ProcessingConfig, file_path: str) -> List[str]:
+    return [str(p) for p in expected_output_paths(config, file_path)]
+
+
+def filter_resumable(store: Optional["JobStore"], config: ProcessingConfig, files: List[str]) -> List[str]:
+    """
+    断点续传：返回仍需处理的文件
+    done 记录只在记录的输出文件都存在时跳过；store 为 None（任务记录不可用）时按输出文件是否存在判断
+    """
+    if store is None:
+        return [f for f in files if not is_file_completed(config, f)]
+    key = output_key(config)
+    known = store.lookup(files)
+    recorded = store.recorded_outputs(
+        [f for f in files if known.get(job_key(f)) == ("done", key)])
+    remaining, legacy_done = [], []
+    for file_path in files:
+        record = known.get(job_key(file_path))
+        if record is None:
+            if is_file_completed(config, file_path):
+                legacy_done.append(file_path)
+                continue
+        elif record == ("done", key):
+            # 记录为 done 但输出文件已被删除或移走时重新处理（没有记录输出时按配置推算）
+            outputs = recorded.get(job_key(file_path)) or output_paths(config, file_path)
+            if all(Path(p).exists() for p in outputs):
+                continue
+        remaining.append(file_path)
+    if legacy_done:
+        store.mark_done(legacy_done, key, lambda path: output_paths(config, path))
+    return remaining
+
+
+class JobRecorder:
+    """逐条收到事件的调用方（funasr-batch 主循环）使用：攒批后写入，每 interval_s 秒或满 max_events 条一个事务"""
+
+    def __init__(self, store: Optional[JobStore], config: ProcessingConfig, interval_s: float = 1.0,
+                 max_events: int = 200):
+        self.store = store
+        self.config = config
+        self.interval_s = interval_s
+        self.max_events = max_events
+        self._events = []
+        self._last_flush = time.monotonic()
+
+    def add(self, event):
+        if self.store is None:
+            return
+        self._events.append(event)
+        if len(self._events) >= self.max_events or time.monotonic() - self._last_flush >= self.interval_s:
+            self.flush()
+
+    def flush(self):
+        events, self._events = self._events, []
+        self._last_flush = time.monotonic()
+        if events and self.store is not None:
+            self.store.apply(events, lambda file_path: output_paths(self.config, file_path))
@@ -1,9 +1,10 @@
 # main.py (v5.10 - 界面优化版：增强文件列表、输出管理、配置持久化)
 import sys
 import os
-import torch
 import multiprocessing
 import subprocess
+import threading
+import importlib.util
 from pathlib import Path
 from datetime import datetime
 
@@ -17,12 +18,10 @@ from ffmpeg_manager import ensure_ffmpeg_is_ready
 from enhanced_file_list import EnhancedFileListWidget, FileStatus, FileScannerWorker
 from output_manager import OutputManagerDialog, QuickOutputPanel, find_output_files
 from config_manager import ConfigManager, ConfigPresets, UserConfig
+from app_env import setup_model_cache
 
-# 尝试导入moviepy，用于启动检查
-try:
-    from moviepy.editor import VideoFileClip
-except ImportError:
-    VideoFileClip = None
+# 日志窗口最多保留的行数（超出后丢弃最早的行，完整日志见 logs/app.log）
+LOG_VIEW_MAX_LINES = 5000
 
 # --- ffsubsync 的可用性检查 ---
 def check_ffsubsync_availability():
@@ -41,65 +40,48 @@ def check_ffsubsync_availability():
     except (FileNotFoundError, subprocess.CalledProcessError, subprocess.TimeoutExpired):
         return False
 
-# 通过环境变量控制FFSubSync功能的启用/禁用
-FFSUBSYNC_AVAILABLE = (os.getenv("APP_DISABLE_FFSUBSYNC", "0") not in ["1", "true", "True"]) \
-                      and check_ffsubsync_availability()
-
-def setup_model_cache():
-    """设置模型缓存目录和性能优化环境变量"""
-    # 修复打包后的路径问题
-    if getattr(sys, 'frozen', False):
-        # 打包后的环境
-        project_root = Path(sys.executable).parent
-    else:
-        # 开发环境
-        project_root = Path(__file__).parent
-
-    cache_dir = project_root / "model_cache" / "modelscope"
-    cache_dir.mkdir(parents=True, exist_ok=True)
-
-    # 设置所有相关的缓存环境变量，与download_models.py保持一致
-    env_vars = {
-        'MODELSCOPE_CACHE': str(cache_dir),
-        'HF_HOME': str(cache_dir),
-        'TRANSFORMERS_CACHE': str(cache_dir),
-        'HF_DATASETS_CACHE': str(cache_dir),
-        'TORCH_HOME': str(cache_dir),
-    }
-
-    for key, value in env_vars.items():
-        os.environ[key] = value
-
-    # 性能优化：控制PyTorch/BLAS线程数，防止与FFmpeg争抢CPU
-    # 每个ASR进程内部使用单线程，避免过度并发
-    threading_vars = {
-        'OMP_NUM_THREADS': '1',
-        'OPENBLAS_NUM_THREADS': '1',
-        'MKL_NUM_THREADS': '1',
-        'VECLIB_MAXIMUM_THREADS': '1',
-        'NUMEXPR_NUM_THREADS': '1',
-    }
-
-    for key, value in threading_vars.items():
-        os.environ.setdefault(key, value)
-
-    # 仅在主进程中打印一次
-    if multiprocessing.current_process().name == 'MainProcess':
-        print(f"[FOLDER] 模型缓存路径已设置为: {cache_dir}")
+def ffsubsync_disabled_by_env() -> bool:
+    """通过环境变量 APP_DISABLE_FFSUBSYNC 禁用FFSubSync功能"""
+    return os.getenv("APP_DISABLE_FFSUBSYNC", "0") in ["1", "true", "True"]
 
 setup_model_cache()
 
 # FileScannerWorker 已移至 enhanced_file_list.py
 
-class GPUDetector:
-    """检测GPU"""
-    def __init__(self):
-        self.cuda_available = torch.cuda.is_available()
+class GPUDetector(QObject):
+    """
+    在后台线程检测GPU：import torch 需要数秒，放在模块顶层会推迟窗口显示，
+    spawn 出的每个子进程重新导入本模块时也要再付一次
+    """
+    detected = pyqtSignal(str)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.cuda_available = False
+        self.recommended_device = "cpu"
+        self._done = threading.Event()
+
+    def start(self):
+        threading.Thread(target=self._detect, daemon=True, name="GPUDetector").start()
+
+    def _detect(self):
+        try:
+            import torch
+            self.cuda_available = torch.cuda.is_available()
+        except Exception:
+            self.cuda_available = False
         self.recommended_device = "cuda" if self.cuda_available else "cpu"
+        self._done.set()
+        self.detected.emit(self.recommended_device)
+
+    def is_done(self) -> bool:
+        return self._done.is_set()
 
 # DropAreaListWidget 已被 EnhancedFileListWidget 替代
 
 class MainWindow(QMainWindow):
+    dependencies_checked = pyqtSignal(dict)
+
     def __init__(self):
         super().__init__()
         self.setWindowTitle("FunASR 高效处理工具 v5.10 - 界面优化版")
@@ -120,8 +102,9 @@ class MainWindow(QMainWindow):
         self.scanner_thread = None
         self.scanner_worker = None
 
-        self.gpu_detector = GPUDetector()
-        self.device = self.gpu_detector.recommended_device
+        # GPU检测在后台进行，完成前按CPU显示，检测完成（detected 信号）后才允许开始处理
+        self.device = "cpu"
+        self.gpu_detector = GPUDetector(self)
 
         self.processing_controller = ProcessingController(self)
         self.supported_extensions = ['.mp4', '.mkv', '.avi', '.mov', '.wmv', '.flv', '.webm', '.wav', '.mp3', '.flac', '.m4a']
@@ -133,8 +116,9 @@ class MainWindow(QMainWindow):
         self._setup_ui()
         self._setup_connections()
         self._load_saved_settings()  # 加载保存的设置
+        self.gpu_detector.detected.connect(self._on_gpu_detected)
+        self.gpu_detector.start()
         self._check_dependencies()
-        self.log_message(f"系统检测到最佳设备: {self.device.upper()}")
         self.log_message("[OK] UI已就绪。引擎将在开始处理时按需加载。")
 
     def _setup_ui(self):
@@ -215,6 +199,13 @@ class MainWindow(QMainWindow):
         self.max_offset_spinbox.setToolTip("限制字幕搜索范围，值越小速度越快")
         self.max_offset_spinbox.valueChanged.connect(self._on_setting_changed)
         ffsubsync_advanced_layout.addWidget(self.max_offset_spinbox)
+
+        ffsubsync_advanced_layout.addWidget(QLabel("  对齐后端:"))
+        self.sync_backend_combo = QComboBox()
+        self.sync_backend_combo.addItems(["ffsubsync", "native (内置,基于识别时间戳)"])
+        self.sync_backend_combo.setToolTip("native: 识别时间戳与提取音频的VAD做FFT对齐，几乎无额外耗时（需要silero或webrtc）")
+        self.sync_backend_combo.currentIndexChanged.connect(self._on_setting_changed)
+        ffsubsync_advanced_layout.addWidget(self.sync_backend_combo)
         ffsubsync_advanced_layout.addStretch()
         settings_layout.addLayout(ffsubsync_advanced_layout, 4, 0, 1, 2)
 
@@ -224,6 +215,11 @@ class MainWindow(QMainWindow):
         self.resume_checkbox.stateChanged.connect(self._on_setting_changed)
         settings_layout.addWidget(self.resume_checkbox, 5, 0, 1, 2)
 
+        # 常驻识别引擎：模型加载一次后跨任务、跨会话保持
+        self.persistent_engine_checkbox = QCheckBox("常驻识别引擎 (模型保持加载，再次开始任务或重启程序无需重新加载)")
+        self.persistent_engine_checkbox.stateChanged.connect(self._on_setting_changed)
+        settings_layout.addWidget(self.persistent_engine_checkbox, 6, 0, 1, 2)
+
         self.progress_bar = QProgressBar()
         # --- 核心改动 ---
         self.status_label = QLabel("就绪。请添加文件并点击开始。")
@@ -232,6 +228,7 @@ class MainWindow(QMainWindow):
         self.stats_label = QLabel("统计信息: 等待开始...")
         
         self.log_widget = QTextEdit(); self.log_widget.setReadOnly(True)
+        self.log_widget.document().setMaximumBlockCount(LOG_VIEW_MAX_LINES)
 
         # 输出管理面板（优先级2）
         self.output_panel = QuickOutputPanel()
@@ -239,7 +236,7 @@ class MainWindow(QMainWindow):
 
         bottom_layout = QHBoxLayout()
         # --- 核心改动 ---
-        self.run_button = QPushButton("开始处理"); self.run_button.setEnabled(False)
+        self.run_button = QPushButton("正在检测设备..."); self.run_button.setEnabled(False)
         self.pause_button = QPushButton("暂停"); self.pause_button.setEnabled(False)  # 新增
         self.stop_button = QPushButton("停止处理"); self.stop_button.setEnabled(False)
         bottom_layout.addWidget(self.run_button)
@@ -272,6 +269,7 @@ class MainWindow(QMainWindow):
         self.processing_controller.state_changed.connect(self._on_processing_state_changed)
         self.processing_controller.progress_updated.connect(self._on_processing_progress)
         self.processing_controller.log_message.connect(self.log_message)
+        self.processing_controller.log_batch.connect(self.log_messages)
         self.processing_controller.error_occurred.connect(self._on_processing_error)
         self.processing_controller.processing_completed.connect(self._on_processing_completed)
         # 新增：统计信息和内存警告信号连接
@@ -295,6 +293,7 @@ class MainWindow(QMainWindow):
         self.cfr_conversion_checkbox.setChecked(self.user_config.cfr_enabled)
         self.ffsubsync_checkbox.setChecked(self.user_config.ffsubsync_enabled)
         self.resume_checkbox.setChecked(self.user_config.enable_resume)
+        self.persistent_engine_checkbox.setChecked(self.user_config.persistent_engine)
 
         # 恢复VAD算法选择
         vad_index = 0
@@ -306,6 +305,7 @@ class MainWindow(QMainWindow):
 
         # 恢复最大偏移量
         self.max_offset_spinbox.setValue(self.user_config.ffsubsync_max_offset)
+        self.sync_backend_combo.setCurrentIndex(1 if self.user_config.subtitle_sync_backend == "native" else 0)
 
     def _save_current_settings(self):
         """保存当前设置（优先级3）"""
@@ -321,6 +321,7 @@ class MainWindow(QMainWindow):
         self.user_config.cfr_enabled = self.cfr_conversion_checkbox.isChecked()
         self.user_config.ffsubsync_enabled = self.ffsubsync_checkbox.isChecked()
         self.user_config.enable_resume = self.resume_checkbox.isChecked()
+        self.user_config.persistent_engine = self.persistent_engine_checkbox.isChecked()
 
         # VAD算法
         vad_text = self.vad_combo.currentText()
@@ -328,6 +329,7 @@ class MainWindow(QMainWindow):
 
         # 最大偏移量
         self.user_config.ffsubsync_max_offset = self.max_offset_spinbox.value()
+        self.user_config.subtitle_sync_backend = self.sync_backend_combo.currentText().split()[0]
 
         # 窗口位置和大小
         self.user_config.window_width = self.width()
@@ -486,10 +488,13 @@ class MainWindow(QMainWindow):
         self.log_message("[NOTE] 文件列表已清空")
 
     def _update_run_button_state(self):
-        """更新开始按钮状态（修改版）"""
+        """更新开始按钮状态（修改版）：GPU检测完成（detected 信号）之前不可开始，界面不等待检测"""
         has_files = len(self.file_list_widget.get_all_files()) > 0
-        can_run = has_files and not self.is_processing
+        device_ready = self.gpu_detector.is_done()
+        can_run = has_files and not self.is_processing and device_ready
         self.run_button.setEnabled(can_run)
+        if not self.is_processing:
+            self.run_button.setText("开始处理" if device_ready else "正在检测设备...")
 
     def start_processing(self):
         """开始处理（修改版）"""
@@ -511,6 +516,12 @@ class MainWindow(QMainWindow):
         # 保存当前设置
         self._save_current_settings()
 
+        # 开始按钮在GPU检测完成前不可用，这里不再阻塞界面等待
+        if not self.gpu_detector.is_done():
+            self.log_message("[INFO] GPU检测尚未完成，请稍后再开始")
+            return
+        self.device = self.gpu_detector.recommended_device
+
         # 提取 VAD 算法
         vad_text = self.vad_combo.currentText()
         vad_method = vad_text.split()[0]
@@ -528,7 +539,9 @@ class MainWindow(QMainWindow):
             ffsubsync_enabled=self.ffsubsync_checkbox.isChecked(),
             ffsubsync_vad=vad_method,
             ffsubsync_max_offset=self.max_offset_spinbox.value(),
+            subtitle_sync_backend=self.sync_backend_combo.currentText().split()[0],
             enable_resume=self.resume_checkbox.isChecked(),
+            persistent_engine=self.persistent_engine_checkbox.isChecked(),
             device=self.device
         )
 
@@ -610,7 +623,8 @@ class MainWindow(QMainWindow):
         QMessageBox.information(
             self,
             "处理完成",
-            f"所有任务已执行完毕。\n成功: {results['summary']['success']}, 失败: {results['summary']['failed']}"
+            f"所有任务已执行完毕。\n成功: {results['summary']['success']}, "
+            f"未识别（无语音）: {results['summary'].get('skipped', 0)}, 失败: {results['summary']['failed']}"
         )
 
         # 不自动清空列表，让用户查看状态
@@ -633,6 +647,11 @@ class MainWindow(QMainWindow):
         timestamp = datetime.now().strftime("%H:%M:%S")
         self.log_widget.append(f"[{timestamp}] {message}")
 
+    def log_messages(self, messages):
+        """一批日志一次追加，避免逐行刷新日志窗口"""
+        timestamp = datetime.now().strftime("%H:%M:%S")
+        self.log_widget.append("\n".join(f"[{timestamp}] {message}" for message in messages))
+
     def closeEvent(self, event):
         """关闭事件（修改版）"""
         if self.is_processing:
@@ -659,18 +678,45 @@ class MainWindow(QMainWindow):
         self.processing_controller.shutdown()
         event.accept()
 
+    def _on_gpu_detected(self, device: str):
+        self.device = device
+        self.log_message(f"系统检测到最佳设备: {device.upper()}")
+        self._update_run_button_state()
+
     def _check_dependencies(self):
-        if not FFSUBSYNC_AVAILABLE:
+        """
+        在后台线程检查外部依赖，不阻塞窗口显示：
+        ffsubsync --version 需要启动一个 Python 解释器，FFmpeg 缺失时可能需要下载
+        """
+        self.dependencies_checked.connect(self._on_dependencies_checked)
+
+        def run():
+            result = {
+                "ffmpeg": ensure_ffmpeg_is_ready(),
+                "ffsubsync": not ffsubsync_disabled_by_env() and check_ffsubsync_availability(),
+                # 只查找模块，不导入（moviepy/win32com 导入本身就很慢）
+                "moviepy": importlib.util.find_spec("moviepy") is not None,
+                "word": importlib.util.find_spec("win32com") is not None,
+            }
+            self.dependencies_checked.emit(result)
+
+        threading.Thread(target=run, daemon=True, name="DependencyCheck").start()
+
+    def _on_dependencies_checked(self, result: dict):
+        if not result.get("ffmpeg"):
+            self.log_message("[WARNING] 警告: FFmpeg环境未就绪，部分功能可能无法使用。")
+
+        if not result.get("ffsubsync"):
             self.ffsubsync_checkbox.setChecked(False)
             self.ffsubsync_checkbox.setEnabled(False)
             self.ffsubsync_checkbox.setToolTip("未检测到 ffsubsync, 此功能不可用。请运行 pip install ffsubsync[all]")
             self.log_message("[WARNING] 未检测到 ffsubsync，字幕精校功能已禁用。")
 
-        # 在代码中增加检查
-        try:
-            import win32com.client
-            # 检查 Word 是否可用
-        except ImportError:
+        # moviepy 改为可选依赖，只警告不退出
+        if not result.get("moviepy"):
+            print("[WARNING] 警告: moviepy 库未安装，视频处理功能可能受限。")
+
+        if not result.get("word"):
             print("未安装 Microsoft Word，PDF 功能将禁用")
 
 def start_app():
@@ -686,25 +732,7 @@ def start_app():
 
     app = QApplication(sys.argv)
 
-    # 修改moviepy检测逻辑，兼容打包环境 - moviepy 改为可选依赖
-    moviepy_available = False
-    try:
-        if VideoFileClip is not None:
-            moviepy_available = True
-        else:
-            # 在打包环境中重新尝试导入
-            import moviepy.editor
-            moviepy_available = True
-    except ImportError:
-        moviepy_available = False
-
-    # moviepy 改为可选依赖，只警告不退出
-    if not moviepy_available:
-        print("[WARNING] 警告: moviepy 库未安装，视频处理功能可能受限。")
-
-    if not ensure_ffmpeg_is_ready():
-        print("[WARNING] 警告: FFmpeg环境未就绪，部分功能可能无法使用。")
-
+    # FFmpeg/ffsubsync/moviepy 检查和GPU检测在窗口显示后于后台进行（见 MainWindow._check_dependencies）
     window = MainWindow()
     window.show()
 
@@ -0,0 +1,192 @@
+# -*- coding: utf-8 -*-
+"""
+进程级模型注册表
+每个模型在同一进程内只加载一次，之后返回缓存的句柄：
+
+1. 加载一次：首次取用时调用加载函数，之后直接返回句柄（原来后处理每个字幕都会经 torch.hub 重新加载 Silero）
+2. 健康检查：带检查函数的句柄距上次检查超过 check_interval_s 时，取用前先检查一次，失败则丢弃并重新加载
+3. 失败记忆：加载失败的模型在本进程内不再重试，调用方按"模型不可用"降级（只记录一次日志）
+4. 预热：识别进程启动时调用 warm_models() 加载本阶段必定要用的模型；预处理/后处理进程不预热，
+   在第一个用到模型的文件上才加载（这两个阶段的导入预算不允许 torch）
+
+内置模型：silero_vad（语音门控和参考语音轨）、silero_hub（为 ffsubsync 命令准备 PyTorch Hub 缓存目录）、
+fsmn_vad / ct_punc（并行分段识别的 VAD 和标点）。本模块顶层只导入标准库，torch/funasr 在加载函数中导入。
+"""
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+
+class ModelUnavailable(RuntimeError):
+    """模型加载失败（同一进程内不再重试）"""
+
+
+@dataclass
+class ModelSpec:
+    loader: Callable[[], Any]
+    check: Optional[Callable[[Any], bool]] = None  # 返回 False 或抛出异常表示句柄已失效
+    description: str = ""
+
+
+@dataclass
+class _Entry:
+    handle: Any = None
+    loaded: bool = False
+    error: Optional[str] = None
+    load_seconds: float = 0.0
+    loads: int = 0
+    checked_at: float = 0.0
+    lock: threading.Lock = field(default_factory=threading.Lock)
+
+
+class ModelRegistry:
+    def __init__(self, check_interval_s: float = 60.0):
+        self.check_interval_s = check_interval_s
+        self._specs: Dict[str, ModelSpec] = {}
+        self._entries: Dict[str, _Entry] = {}
+        self._lock = threading.Lock()
+
+    def register(self, name: str, loader: Callable[[], Any], check: Optional[Callable[[Any], bool]] = None,
+                 description: str = ""):
+        with self._lock:
+            self._specs[name] = ModelSpec(loader, check, description or name)
+            self._entries.setdefault(name, _Entry())
+
+    def _entry(self, name: str) -> _Entry:
+        with self._lock:
+            if name not in self._specs:
+                raise KeyError(f"未注册的模型: {name}")
+            return self._entries[name]
+
+    def _healthy(self, spec: ModelSpec, entry: _Entry) -> bool:
+        if spec.check is None or time.monotonic() - entry.checked_at < self.check_interval_s:
+            return True
+        try:
+            ok = spec.check(entry.handle) is not False
+        except Exception:
+            ok = False
+        entry.checked_at = time.monotonic()
+        return ok
+
+    def get(self, name: str, log: Optional[Callable[[str], None]] = None) -> Any:
+        """
+        取用模型句柄（首次取用时加载）
+
+        Raises:
+            ModelUnavailable: 加载失败（包括之前已失败过）
+        """
+        spec = self._specs.get(name)
+        entry = self._entry(name)
+        with entry.lock:
+            if entry.error is not None:
+                raise ModelUnavailable(entry.error)
+            if entry.loaded:
+                if self._healthy(spec, entry):
+                    return entry.handle
+                if log is not None:
+                    log(f"      - ♻️ {spec.description} 健康检查未通过，重新加载")
+                entry.handle, entry.loaded = None, False
+
+            t_start = time.perf_counter()
+            try:
+                entry.handle = spec.loader()
+            except Exception as e:
+                entry.error = f"{spec.description} 加载失败: {e}"
+                if log is not None:
+                    log(f"      - ⚠️ {entry.error}")
+                raise ModelUnavailable(entry.error) from e
+            entry.loaded = True
+            entry.loads += 1
+            entry.load_seconds = time.perf_counter() - t_start
+            entry.checked_at = time.monotonic()
+            return entry.handle
+
+    def try_get(self, name: str, log: Optional[Callable[[str], None]] = None) -> Optional[Any]:
+        """同 get，加载失败时返回 None"""
+        try:
+            return self.get(name, log)
+        except ModelUnavailable:
+            return None
+
+    def warm(self, names: Iterable[str], log: Optional[Callable[[str], None]] = None) -> Dict[str, bool]:
+        """预先加载若干模型，返回 {名称: 是否可用}"""
+        results = {}
+        for name in names:
+            entry = self._entry(name)
+            was_loaded = entry.loaded
+            results[name] = self.try_get(name, log) is not None
+            if results[name] and not was_loaded and log is not None:
+                log(f"   ✅ 已预加载 {self._specs[name].description} ({entry.load_seconds:.1f}s)")
+        return results
+
+    def status(self) -> List[dict]:
+        with self._lock:
+            items = list(self._entries.items())
+        return [{"name": name, "loaded": entry.loaded, "loads": entry.loads, "error": entry.error,
+                 "load_seconds": round(entry.load_seconds, 3)} for name, entry in items]
+
+
+# --- 内置模型 ---
+def _load_silero_vad():
+    import torch
+    from silero_manager import get_silero_manager
+    torch.set_num_threads(1)
+    # 注册表负责缓存；走到这里说明是首次加载或健康检查失败，不复用管理器中的旧模型
+    model, utils = get_silero_manager().load_model(force_reload=True)
+    return model, utils[0]  # (model, get_speech_timestamps)
+
+
+def _check_silero_vad(handle) -> bool:
+    import torch
+    model = handle[0]
+    model(torch.zeros(512), 16000)
+    model.reset_states()
+    return True
+
+
+def _prepare_silero_hub():
+    from silero_manager import get_silero_manager
+    manager = get_silero_manager()
+    if not manager.setup_for_ffsubsync():
+        raise RuntimeError("本地 Silero 模型不可用，ffsubsync 将自行从 PyTorch Hub 下载")
+    return manager.ffsubsync_hub_dir
+
+
+def _check_silero_hub(hub_dir) -> bool:
+    return hub_dir.exists()
+
+
+def _load_funasr_model(model: str):
+    def load():
+        from funasr import AutoModel
+        return AutoModel(model=model, device="cpu")
+    return load
+
+
+_registry = None
+
+
+def get_registry() -> ModelRegistry:
+    """本进程的模型注册表（首次调用时登记内置模型）"""
+    global _registry
+    if _registry is None:
+        registry = ModelRegistry()
+        registry.register("silero_vad", _load_silero_vad, _check_silero_vad, "Silero VAD")
+        registry.register("silero_hub", _prepare_silero_hub, _check_silero_hub, "ffsubsync 的 Silero 模型缓存")
+        registry.register("fsmn_vad", _load_funasr_model("fsmn-vad"), description="fsmn-vad 模型")
+        registry.register("ct_punc", _load_funasr_model("ct-punc"), description="ct-punc 标点模型")
+        _registry = registry
+    return _registry
+
+
+def get_model(name: str, log: Optional[Callable[[str], None]] = None) -> Any:
+    return get_registry().get(name, log)
+
+
+def try_get_model(name: str, log: Optional[Callable[[str], None]] = None) -> Optional[Any]:
+    return get_registry().try_get(name, log)
+
+
+def warm_models(names: Iterable[str], log: Optional[Callable[[str], None]] = None) -> Dict[str, bool]:
+    return get_registry().warm(names, log)
@@ -31,6 +31,8 @@ class PerformanceConfig:
     pre_proc_workers: int = 4        # 预处理进程数
     post_proc_workers: int = 6       # 后处理进程数
     recognition_workers: int = 1     # 识别进程数
+    recognition_threads: int = 0     # 每个识别进程的计算线程数（0 表示使用 FunASR 默认值）
+    calibrated: bool = False         # 识别布局是否来自本机 CPU 校准（cpu_calibration.py）
 
     # ========== FFSubSync配置 ==========
     ffsubsync_fast_mode: bool = False      # 快速模式（跳过帧率分析）
@@ -41,8 +43,11 @@ class PerformanceConfig:
     enable_file_sorting: bool = True       # 启用文件优先级排序（小文件优先）
 
     @classmethod
-    def auto_detect(cls) -> 'PerformanceConfig':
-        """自动检测系统配置并生成推荐配置"""
+    def auto_detect(cls, detect_gpu: bool = True) -> 'PerformanceConfig':
+        """
+        自动检测系统配置并生成推荐配置
+        detect_gpu=False 时不导入 torch（只需要进程数/队列容量时使用）
+        """
         config = cls()
 
         # 检测CPU
@@ -53,12 +58,8 @@ class PerformanceConfig:
         config.memory_gb = psutil.virtual_memory().total / (1024**3)
 
         # 检测GPU显存
-        try:
-            import torch
-            if torch.cuda.is_available():
-                config.gpu_memory_gb = torch.cuda.get_device_properties(0).total_memory / (1024**3)
-        except Exception:
-            config.gpu_memory_gb = 0.0
+        if detect_gpu:
+            config.gpu_memory_gb = _detect_gpu_memory_gb()
 
         # 根据系统配置自动调整参数
         config._apply_auto_tuning()
@@ -95,6 +96,32 @@ class PerformanceConfig:
         else:
             self.recognition_workers = 1
 
+    def recognition_layout(self, device: str) -> tuple:
+        """
+        识别进程数和每个进程的线程数 (workers, threads)
+        GPU 按显存决定进程数；CPU 使用本机校准结果（未校准时 1 个进程、默认线程数）
+        """
+        if device == 'cuda':
+            if self.gpu_memory_gb <= 0:
+                self.gpu_memory_gb = _detect_gpu_memory_gb()
+            self.recognition_workers = 2 if self.gpu_memory_gb >= 12 else 1
+            self.recognition_threads = 0
+            self.calibrated = False
+            return self.recognition_workers, self.recognition_threads
+
+        from cpu_calibration import load_calibration
+        calibration = load_calibration()
+        if calibration and calibration.get('best'):
+            best = calibration['best']
+            self.recognition_workers = max(1, int(best.get('processes', 1)))
+            self.recognition_threads = max(1, int(best.get('threads', 1)))
+            self.calibrated = True
+        else:
+            self.recognition_workers = 1
+            self.recognition_threads = 0
+            self.calibrated = False
+        return self.recognition_workers, self.recognition_threads
+
     def get_summary(self) -> str:
         """获取配置摘要"""
         lines = [
@@ -115,7 +142,8 @@ class PerformanceConfig:
             "并发配置:",
             f"  - FFmpeg并发: {self.ffmpeg_concurrent}",
             f"  - 预处理进程: {self.pre_proc_workers}",
-            f"  - 识别进程: {self.recognition_workers}",
+            f"  - 识别进程: {self.recognition_workers}" + (f" × {self.recognition_threads} 线程" if self.recognition_threads else "")
+            + ("（CPU校准）" if self.calibrated else ""),
             f"  - 后处理进程: {self.post_proc_workers}",
             "",
             "FFSubSync配置:",
@@ -159,8 +187,32 @@ class PerformanceConfig:
         return config
 
 
-# 全局默认配置实例
-DEFAULT_CONFIG = PerformanceConfig.auto_detect()
+def _detect_gpu_memory_gb() -> float:
+    try:
+        import torch
+        if torch.cuda.is_available():
+            return torch.cuda.get_device_properties(0).total_memory / (1024**3)
+    except Exception:
+        pass
+    return 0.0
+
+
+# 全局默认配置实例：首次使用时才检测（检测GPU需要导入 torch，不能在导入本模块时进行）
+_default_config: Optional[PerformanceConfig] = None
+
+
+def get_default_config() -> PerformanceConfig:
+    global _default_config
+    if _default_config is None:
+        _default_config = PerformanceConfig.auto_detect()
+    return _default_config
+
+
+def __getattr__(name):
+    # 兼容 performance_config.DEFAULT_CONFIG 的写法
+    if name == "DEFAULT_CONFIG":
+        return get_default_config()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 def print_system_info():
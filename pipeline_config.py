@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+"""
+流水线配置（不依赖Qt）
+GUI 控制器和无界面批处理入口共用同一份配置与断点续传判断逻辑
+"""
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import List
+
+# 支持的媒体扩展名（与主界面文件选择保持一致）
+SUPPORTED_VIDEO_EXT = ['.mp4', '.avi', '.mov', '.mkv', '.wmv', '.flv', '.webm']
+SUPPORTED_AUDIO_EXT = ['.wav', '.mp3', '.flac', '.m4a']
+SUPPORTED_MEDIA_EXT = SUPPORTED_VIDEO_EXT + SUPPORTED_AUDIO_EXT
+
+
+@dataclass
+class ProcessingConfig:
+    input_files: List[str] = field(default_factory=list)
+    generate_srt: bool = True
+    generate_srt_txt: bool = False
+    generate_txt: bool = False
+    generate_json: bool = False
+    generate_txt_md: bool = False
+    generate_docx: bool = False
+    generate_pdf: bool = False
+    cfr_enabled: bool = False
+    ffsubsync_enabled: bool = False
+    ffsubsync_vad: str = "silero"  # 新增：VAD算法选择 (webrtc/auditok/silero) - 默认使用最准确的silero
+    ffsubsync_max_offset: int = 60  # 新增：最大偏移量（秒），限制搜索范围以提高速度
+    ffsubsync_fast_mode: bool = False  # 快速模式（跳过帧率分析）
+    ffsubsync_in_process: bool = True  # 进程内精校：复用提取的音频生成参考语音轨，不再为每个 SRT 启动 ffsubsync 命令
+    subtitle_sync_backend: str = "ffsubsync"  # 精校后端：ffsubsync / native（内置 FFT 对齐，基于识别时间戳，需要 silero 或 webrtc VAD）
+    device: str = "cpu"
+    enable_resume: bool = True  # 新增：启用断点续传
+    batch_size: int = 4  # 新增：批处理大小
+    max_memory_percent: float = 85.0  # 新增：内存使用阈值
+    audio_in_memory: bool = False  # 音频提取为内存PCM直接送识别，不写临时WAV
+    recognition_batch_files: int = 8  # 跨文件批量识别：每批最多合并的短音频数（1 表示关闭）
+    recognition_batch_max_clip_s: float = 60.0  # 参与合并的单个音频最大时长（秒）
+    recognition_batch_max_seconds: float = 300.0  # 每批合并后的总时长上限（秒）
+    recognition_batch_window_s: float = 0.2  # 凑批等待窗口（秒）
+    chunked_recognition_threshold_s: float = 1800.0  # 超过该时长（秒）的音频分段识别，0 表示关闭
+    chunk_window_s: float = 600.0  # 分段识别的窗口步长（秒）
+    chunk_overlap_s: float = 30.0  # 相邻窗口的重叠长度（秒），跨窗口的句子在下一窗口完整识别
+    recognition_workers: int = 0  # 识别进程数（0 表示自动：GPU 按显存，CPU 按本机校准结果）
+    recognition_threads: int = 0  # CPU 识别进程的计算线程数（0 表示自动：按本机校准结果）
+    segment_workers: int = 0  # CPU 并行分段识别的进程数（长音频的语音片段分发给多个进程，0 表示关闭，-1 表示按校准结果）
+    segment_min_duration_s: float = 120.0  # 达到该时长（秒）的音频才使用并行分段识别
+    segment_shard_s: float = 60.0  # 每个分片的语音时长（秒）
+    adaptive_concurrency: bool = True  # 运行中按队列深度和阶段耗时调整预处理/后处理进程数和FFmpeg并发
+    adaptive_interval_s: float = 5.0  # 自适应并发的采样间隔（秒）
+    progress_interval_s: float = 0.5  # 同一文件两次 FFmpeg/分段识别进度事件的最小间隔（秒），0 表示不限速
+    telemetry_enabled: bool = True  # 记录每个文件各阶段耗时（logs/telemetry 下的 JSON Lines 和汇总）
+    telemetry_dir: str = ""  # 阶段耗时文件目录（为空时使用 logs/telemetry）
+    metrics_port: int = 0  # Prometheus 指标端点端口（0 为不启用）
+    speech_gate: bool = True  # 识别前跳过无音频流、全程静音或无人声的文件
+    speech_gate_vad: bool = True  # 语音门控使用 Silero VAD（否则只按电平判断）
+    speech_gate_min_speech_s: float = 0.5  # VAD 检出语音少于该时长（秒）视为无语音
+    transcription_cache: bool = True  # 按内容指纹缓存识别结果，改名/移动/重复的文件跳过识别
+    transcription_cache_path: str = ""  # 缓存数据库路径（空表示 model_cache/transcription_cache.sqlite3）
+    job_store_path: str = ""  # 任务记录数据库路径（空表示 model_cache/jobs.sqlite3），断点续传按记录判断
+    stage_checkpoints: bool = True  # 提取的音频和识别结果写入任务缓存目录，中途退出后从未完成的阶段继续
+    job_cache_dir: str = ""  # 阶段检查点目录（空表示 model_cache/job_cache）
+    persistent_engine: bool = False  # 使用常驻识别引擎（模型跨任务、跨会话保持加载）
+    engine_idle_timeout_s: float = 7200.0  # 常驻引擎空闲多久后自动退出（秒，0 表示不退出）
+    supported_video_ext: List[str] = field(default_factory=lambda: list(SUPPORTED_VIDEO_EXT))
+
+
+def expected_output_paths(config: ProcessingConfig, file_path_str: str) -> List[Path]:
+    """根据配置列出某个输入文件应生成的全部输出文件路径"""
+    p = Path(file_path_str)
+    stem = p.stem
+    out_dir = p.parent
+    targets = []
+
+    if config.generate_srt:      targets.append(out_dir / f"{stem}.srt")
+    if config.generate_srt_txt:  targets.append(out_dir / f"{stem}.srt.txt")
+    if config.generate_txt:      targets.append(out_dir / f"{stem}.txt")
+    if config.generate_json:     targets.append(out_dir / f"{stem}.json")
+    if config.generate_txt_md:   targets.append(out_dir / f"{stem}.md.txt")
+    if config.generate_docx:     targets.append(out_dir / f"{stem}.docx")
+    if config.generate_pdf:      targets.append(out_dir / f"{stem}.pdf")
+    return targets
+
+
+def is_file_completed(config: ProcessingConfig, file_path_str: str) -> bool:
+    """检查文件的所有输出产物是否都已存在（断点续传）"""
+    targets = expected_output_paths(config, file_path_str)
+    # 所有目标文件都存在，且至少有一个目标文件
+    return len(targets) > 0 and all(t.exists() for t in targets)
+
+
+def is_intermediate_file(path: Path) -> bool:
+    """流水线自身产生的中间文件（提取的WAV、CFR视频），扫描目录时应跳过"""
+    stem = path.stem
+    return stem.endswith("_extracted") or stem.endswith("_CFR")
+
+
+def collect_media_files(paths: List[str], extensions: List[str] = None) -> List[str]:
+    """展开文件/文件夹参数为媒体文件列表（文件夹递归扫描，保持输入顺序并去重）"""
+    extensions = [ext.lower() for ext in (extensions or SUPPORTED_MEDIA_EXT)]
+    found = []
+    seen = set()
+
+    def _add(p: Path):
+        key = str(p.resolve())
+        if key not in seen:
+            seen.add(key)
+            found.append(str(p))
+
+    for path in paths:
+        path_obj = Path(path)
+        if path_obj.is_file():
+            if path_obj.suffix.lower() in extensions:
+                _add(path_obj)
+        elif path_obj.is_dir():
+            for file_path in sorted(path_obj.rglob('*')):
+                if (file_path.is_file() and file_path.suffix.lower() in extensions
+                        and not is_intermediate_file(file_path)):
+                    _add(file_path)
+    return found
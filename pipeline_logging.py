@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+"""
+流水线日志
+工作进程不再逐条把字符串放进 log_queue：WorkerLog 为每条日志记录级别、时间和进程名，
+攒批后一次 put 一个列表（攒满 max_batch 条、出现错误或距上次发送超过 flush_interval_s 时发送，
+后台线程定时兜底，进程退出时发送剩余部分）。
+
+主进程侧：
+- unpack_log_items 把队列中的批次（以及旧格式的纯字符串）展开成日志记录
+- write_record 按原始时间和进程名写入 logger
+- start_file_log 用 QueueHandler + QueueListener 把文件日志交给独立的写入线程
+
+级别：未显式指定时按消息开头的标记推断（❌/💥 为 ERROR，⚠️ 为 WARNING，其余为 INFO）；
+调试输出使用 debug()，只写入文件日志，不显示在界面上。本模块只导入标准库（工作进程导入预算）。
+"""
+import logging
+import queue
+import threading
+import time
+from logging.handlers import QueueHandler, QueueListener
+from multiprocessing import current_process
+from multiprocessing.util import Finalize
+from typing import Iterable, List, Tuple
+
+# 日志记录：(级别, 时间戳, 进程名, 消息)
+LogRecordTuple = Tuple[int, float, str, str]
+
+ERROR_MARKS = ("❌", "💥")
+WARNING_MARKS = ("⚠️",)
+
+
+def infer_level(message: str) -> int:
+    """按消息开头的标记推断级别（跳过缩进和列表符号）"""
+    head = message.lstrip(" -\t")[:2]
+    if head.startswith(ERROR_MARKS):
+        return logging.ERROR
+    if head.startswith(WARNING_MARKS):
+        return logging.WARNING
+    return logging.INFO
+
+
+class WorkerLog:
+    """
+    工作进程的日志缓冲
+    put(message) 与 queue.put 兼容，工作函数中可直接替换原来的 log_queue
+    """
+
+    def __init__(self, log_queue, worker: str = "", max_batch: int = 50, flush_interval_s: float = 0.2):
+        self._queue = log_queue
+        self.worker = worker or current_process().name
+        self.max_batch = max_batch
+        self.flush_interval_s = flush_interval_s
+        self._buffer: List[LogRecordTuple] = []
+        self._lock = threading.Lock()
+        self._last_flush = time.monotonic()
+        self._closed = threading.Event()
+        self._flusher = None
+        # 工作函数返回后 multiprocessing 在退出前调用，发送缓冲中剩余的日志
+        Finalize(self, self.close, exitpriority=10)
+
+    def put(self, message, block=True, timeout=None):
+        message = str(message)
+        self.log(infer_level(message), message)
+
+    def debug(self, message: str):
+        self.log(logging.DEBUG, message)
+
+    def info(self, message: str):
+        self.log(logging.INFO, message)
+
+    def warning(self, message: str):
+        self.log(logging.WARNING, message)
+
+    def error(self, message: str):
+        self.log(logging.ERROR, message)
+
+    def log(self, level: int, message: str):
+        with self._lock:
+            self._buffer.append((level, time.time(), self.worker, message))
+            due = (len(self._buffer) >= self.max_batch or level >= logging.ERROR
+                   or time.monotonic() - self._last_flush >= self.flush_interval_s)
+        if due:
+            self.flush()
+        elif self._flusher is None:
+            self._flusher = threading.Thread(target=self._run_flusher, daemon=True, name="WorkerLogFlusher")
+            self._flusher.start()
+
+    def flush(self):
+        with self._lock:
+            batch, self._buffer = self._buffer, []
+            self._last_flush = time.monotonic()
+        if not batch:
+            return
+        try:
+            self._queue.put(batch)
+        except (OSError, ValueError):
+            pass  # 队列已关闭
+
+    def close(self):
+        self._closed.set()
+        self.flush()
+
+    def _run_flusher(self):
+        while not self._closed.wait(self.flush_interval_s):
+            if self._buffer and time.monotonic() - self._last_flush >= self.flush_interval_s:
+                self.flush()
+
+
+def unpack_log_items(items: Iterable) -> List[LogRecordTuple]:
+    """展开 log_queue 中取出的元素：WorkerLog 的批次，或其他地方直接放入的字符串"""
+    records = []
+    for item in items:
+        if isinstance(item, list):
+            records.extend(item)
+        else:
+            message = str(item)
+            records.append((infer_level(message), time.time(), "", message))
+    return records
+
+
+def write_record(logger: logging.Logger, record: LogRecordTuple):
+    """按工作进程记录的时间和进程名写入 logger"""
+    level, created, worker, message = record
+    if not logger.isEnabledFor(level):
+        return
+    log_record = logger.makeRecord(logger.name, level, "", 0, message, None, None)
+    log_record.created = created
+    log_record.msecs = (created - int(created)) * 1000
+    if worker:
+        log_record.processName = worker
+    logger.handle(log_record)
+
+
+def start_file_log(logger: logging.Logger, handler: logging.Handler) -> QueueListener:
+    """logger 只把记录放进内存队列，由 QueueListener 线程交给 handler 写文件"""
+    records = queue.SimpleQueue()
+    logger.addHandler(QueueHandler(records))
+    listener = QueueListener(records, handler, respect_handler_level=True)
+    listener.start()
+    return listener
@@ -0,0 +1,266 @@
+# -*- coding: utf-8 -*-
+"""
+流水线进程间传输层
+基于原生 multiprocessing.Queue/Event/Semaphore，不再经过 Manager 服务进程：
+每次 put/get 直接走管道，避免所有日志和进度事件在 Manager 进程里串行转发。
+
+注意：原生队列只能在创建子进程时通过参数传递（继承），
+不能通过 ProcessPoolExecutor.submit 传递，因此各阶段使用独立的 Process。
+
+EventDispatcher 在后台线程中阻塞读取日志/进度/引擎状态队列，合批并合并实时进度后交给回调，
+GUI 线程不再定时轮询队列。
+"""
+import queue
+import threading
+import multiprocessing
+from dataclasses import dataclass, field
+from typing import Callable, Iterable, List, Optional
+
+from pipeline_logging import unpack_log_items
+
+
+class PipelineChannels:
+    """一次处理任务使用的全部进程间通道"""
+
+    def __init__(self, ctx=None, ffmpeg_concurrent: int = 2):
+        self.ctx = ctx or multiprocessing.get_context('spawn')
+
+        # 事件类队列不限制容量
+        self.log_queue = self.ctx.Queue()
+        self.progress_queue = self.ctx.Queue()
+        self.engine_status_queue = self.ctx.Queue()
+
+        self.pause_event = self.ctx.Event()
+        self.pause_event.set()
+
+        # FFmpeg全局并发限流
+        self.ffmpeg_concurrent = ffmpeg_concurrent
+        self.ffmpeg_semaphore = self.ctx.Semaphore(ffmpeg_concurrent)
+
+        # 流水线队列设置maxsize实现背压控制，让上游在队列满时阻塞等待
+        self.task_queue = None
+        self.audio_queue = None
+        self.result_queue = None
+
+        # 自适应并发：要求预处理/后处理进程退出的名额（由工作进程领取）
+        self.pre_retire = self.ctx.Value('i', 0)
+        self.post_retire = self.ctx.Value('i', 0)
+
+        # 并行分段识别：协调者 -> 分段识别进程的分片队列，以及结果队列
+        self.segment_queue = None
+        self.segment_result_queue = None
+
+    def create_recognition_queues(self, audio_size: int, result_size: int):
+        """创建识别阶段的输入/输出队列（maxsize<=0 表示不限制）"""
+        self.audio_queue = self.ctx.Queue(maxsize=max(0, audio_size))
+        self.result_queue = self.ctx.Queue(maxsize=max(0, result_size))
+        self.audio_capacity = max(0, audio_size)
+        self.result_capacity = max(0, result_size)
+
+    def create_task_queue(self, task_size: int):
+        """创建预处理任务队列"""
+        self.task_queue = self.ctx.Queue(maxsize=max(0, task_size))
+
+    def create_segment_queues(self, workers: int):
+        """创建并行分段识别的分片队列（容量与进程数相当，分片 PCM 不在队列中堆积）"""
+        self.segment_queue = self.ctx.Queue(maxsize=max(1, workers * 2))
+        self.segment_result_queue = self.ctx.Queue()
+
+    def all_queues(self) -> list:
+        return [q for q in (self.task_queue, self.audio_queue, self.result_queue,
+                            self.segment_queue, self.segment_result_queue,
+                            self.progress_queue, self.log_queue, self.engine_status_queue)
+                if q is not None]
+
+    def start_process(self, target: Callable, args: tuple, name: str, daemon: bool = True):
+        """
+        启动一个流水线子进程，队列通过参数继承传入
+        流水线工作函数经 worker_bootstrap 启动：子进程不重新导入 __main__（GUI），只导入本阶段需要的模块
+        """
+        from worker_bootstrap import start_stage_process
+        return start_stage_process(self.ctx, target, args, name, daemon)
+
+    def close(self):
+        """清空并关闭所有队列，不等待队列后台线程把剩余数据写完"""
+        for q in self.all_queues():
+            drain(q, limit=100000)
+            try:
+                q.cancel_join_thread()
+                q.close()
+            except Exception:
+                pass
+
+
+def drain(q, limit: int = 100) -> list:
+    """非阻塞地取出最多 limit 个元素"""
+    items = []
+    if q is None:
+        return items
+    for _ in range(limit):
+        try:
+            items.append(q.get_nowait())
+        except queue.Empty:
+            break
+        except (OSError, ValueError, EOFError):
+            # 队列已关闭
+            break
+    return items
+
+
+def put_sentinels(q, count: int, timeout: float = 0.1):
+    """向队列发送 count 个结束信号（None），队列满时放弃"""
+    if q is None:
+        return
+    for _ in range(count):
+        try:
+            q.put(None, timeout=timeout)
+        except Exception:
+            break
+
+
+def start_task_feeder(task_queue, files: Iterable[str], stop_event: Optional[threading.Event] = None) -> threading.Thread:
+    """
+    后台线程投递任务：task_queue 满时在该线程阻塞，调用方（GUI线程/主循环）不会被卡住
+    """
+    stop_event = stop_event or threading.Event()
+
+    def _feed():
+        for file_path in files:
+            while not stop_event.is_set():
+                try:
+                    task_queue.put(file_path, timeout=0.5)
+                    break
+                except queue.Full:
+                    continue
+                except (OSError, ValueError):
+                    return
+            if stop_event.is_set():
+                return
+
+    feeder = threading.Thread(target=_feed, daemon=True, name="TaskFeeder")
+    feeder.stop_event = stop_event
+    feeder.start()
+    return feeder
+
+
+def stop_processes(processes: List[multiprocessing.Process], timeout: float = 2.0) -> List[str]:
+    """等待进程退出，超时则强制终止；返回被强制终止的进程名"""
+    terminated = []
+    for process in processes:
+        if process is None:
+            continue
+        if process.is_alive():
+            process.join(timeout=timeout)
+        if process.is_alive():
+            process.terminate()
+            process.join(timeout=1)
+            terminated.append(process.name)
+    return terminated
+
+
+# 实时进度事件：同一批次内同一文件同一类只保留最新一条
+LIVE_PROGRESS_KINDS = ("ffmpeg", "asr")
+
+
+@dataclass
+class EventBatch:
+    logs: list = field(default_factory=list)  # 日志记录 (级别, 时间戳, 进程名, 消息)，见 pipeline_logging
+    statuses: List[str] = field(default_factory=list)  # 引擎状态（ready / error）
+    progress: list = field(default_factory=list)  # 按到达顺序：(状态码, 消息) 元组、阶段事件和合并后的实时进度
+    coalesced: int = 0  # 被合并掉的实时进度事件数
+
+    def __bool__(self):
+        return bool(self.logs or self.statuses or self.progress)
+
+
+def coalesce_events(items: List[tuple]) -> EventBatch:
+    """把 (来源, 事件) 列表整理成一个批次"""
+    batch = EventBatch()
+    latest = {}
+    for source, item in items:
+        if source == "log":
+            batch.logs.extend(unpack_log_items([item]))
+        elif source == "status":
+            batch.statuses.append(item)
+        else:
+            if isinstance(item, dict) and item.get("kind") in LIVE_PROGRESS_KINDS:
+                key = (item["kind"], item.get("file"))
+                if key in latest:
+                    batch.progress[latest[key]] = None
+                    batch.coalesced += 1
+                latest[key] = len(batch.progress)
+            batch.progress.append(item)
+    if batch.coalesced:
+        batch.progress = [item for item in batch.progress if item is not None]
+    return batch
+
+
+class EventDispatcher:
+    """
+    事件分发线程
+    每个队列一个读取线程阻塞等待（不轮询），事件汇入进程内队列；分发线程取出当前积压的全部事件，
+    合批后调用 on_batch，两批之间至少间隔 interval_s，事件再多也只是批次变大，不会积压。
+    on_batch 在分发线程中调用，需要线程安全（GUI 中通过 Qt 信号转到主线程）。
+    """
+
+    def __init__(self, log_queue, progress_queue, status_queue, on_batch: Callable[[EventBatch], None],
+                 interval_s: float = 0.05, max_batch: int = 5000, name: str = "EventDispatcher"):
+        self._sources = {"log": log_queue, "progress": progress_queue, "status": status_queue}
+        self._on_batch = on_batch
+        self.interval_s = interval_s
+        self.max_batch = max_batch
+        self.name = name
+        self._inbox = queue.SimpleQueue()
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+
+    def start(self):
+        for source, q in self._sources.items():
+            if q is None:
+                continue
+            reader = threading.Thread(target=self._read, args=(source, q), daemon=True, name=f"{self.name}-{source}")
+            reader.start()
+            self._threads.append(reader)
+        dispatcher = threading.Thread(target=self._run, daemon=True, name=self.name)
+        dispatcher.start()
+        self._threads.append(dispatcher)
+
+    def stop(self, timeout: float = 1.0):
+        """停止所有线程，并把已读出但尚未分发的事件作为最后一批交给回调"""
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout=timeout)
+        self._threads = []
+        self._flush(block=False)
+
+    def _read(self, source: str, q):
+        while not self._stop.is_set():
+            try:
+                item = q.get(timeout=0.2)
+            except queue.Empty:
+                continue
+            except (OSError, ValueError, EOFError):
+                return  # 队列已关闭
+            self._inbox.put((source, item))
+
+    def _flush(self, block: bool) -> bool:
+        try:
+            items = [self._inbox.get(timeout=0.2) if block else self._inbox.get_nowait()]
+        except queue.Empty:
+            return False
+        while len(items) < self.max_batch:
+            try:
+                items.append(self._inbox.get_nowait())
+            except queue.Empty:
+                break
+        batch = coalesce_events(items)
+        try:
+            self._on_batch(batch)
+        except Exception:
+            pass
+        return True
+
+    def _run(self):
+        while not self._stop.is_set():
+            if self._flush(block=True):
+                self._stop.wait(self.interval_s)
@@ -5,13 +5,29 @@ import sys
 import locale
 import traceback
 from pathlib import Path
-from utils import file_cleaner, run_silent, run_ffmpeg_with_progress
+from utils import file_cleaner, run_silent, run_ffmpeg_with_progress, run_ffmpeg_to_bytes, ProgressThrottle
+from asr_batching import collect_batch
+from probe_cache import probe_media
+from audio_levels import analyze_pcm_levels, analyze_wav_levels
+from speech_gate import check_speech
+from model_registry import try_get_model, warm_models
+from subtitle_sync import IN_PROCESS_VADS, track_cache_key, compute_speech_track
+from stage_telemetry import stage_event
+from pipeline_logging import WorkerLog
+from stage_checkpoint import open_checkpoint, job_dir
+from asr_sharding import ShardedRecognizer, load_segment_model, recognize_segment_pcms
+from asr_chunking import (recognize_chunked, wav_window_reader, pcm_window_reader,
+                          SentenceSpool, load_spooled_result, format_srt_time, write_srt_sentences,
+                          spool_has_sentences, iter_spooled_lines, write_spooled_srt, write_spooled_json,
+                          remove_spool)
+from asr_engine import (RecognitionEngine, MODEL_SIGNATURE, PCM_SAMPLE_RATE, PCM_BYTES_PER_SECOND,
+                        pcm_to_waveform, load_wav_waveform)
 import psutil
 import gc
 import time
+import multiprocessing
 import os
 import shutil  # 添加shutil用于文件复制
-from silero_manager import ensure_silero_for_ffsubsync  # Silero模型管理
 
 def _ratio_to_float(ratio_str: str) -> float:
     """将帧率比率字符串转换为浮点数 (如 "30/1" -> 30.0)"""
@@ -25,6 +41,27 @@ def _ratio_to_float(ratio_str: str) -> float:
     except (ValueError, ZeroDivisionError, AttributeError):
         return 0.0
 
+def build_cfr_args(source: str, target: str, fps: int, hwaccel: bool = False) -> list:
+    """VFR 转 CFR 的 FFmpeg 参数（不含 ffmpeg 本体）；hwaccel 为 True 时使用 NVENC 编码"""
+    if hwaccel:
+        return ["-hwaccel", "auto",  # 让FFmpeg自动选择硬件加速
+                "-i", source, "-vf", f"fps={fps}",
+                "-c:v", "h264_nvenc", "-preset", "p1", "-cq", "23", "-pix_fmt", "yuv420p",
+                "-c:a", "copy", "-threads", "2", "-y", target]
+    return ["-i", source, "-vf", f"fps={fps}",
+            "-c:v", "libx264", "-preset", "ultrafast", "-crf", "23",
+            "-c:a", "copy", "-threads", "2", "-y", target]
+
+def build_extract_args(source: str, output: str = None) -> list:
+    """提取 16kHz 单声道 PCM 的 FFmpeg 参数；output 为空时以原始 s16le 输出到 stdout"""
+    args = ['-i', source,
+            '-map', 'a:0?', '-vn', '-sn', '-dn',
+            '-acodec', 'pcm_s16le', '-ac', '1', '-ar', str(PCM_SAMPLE_RATE),
+            '-threads', '2']
+    if output is None:
+        return args + ['-f', 's16le', 'pipe:1']
+    return args + ['-y', output]
+
 def monitor_memory_usage(func_name: str, log_queue) -> float:
     """监控内存使用并记录"""
     try:
@@ -35,6 +72,16 @@ def monitor_memory_usage(func_name: str, log_queue) -> float:
     except:
         return 0.0
 
+def _claim_retirement(retire_counter) -> bool:
+    """自适应并发要求减少进程时，由先检查到的工作进程领取一个退出名额"""
+    if retire_counter is None:
+        return False
+    with retire_counter.get_lock():
+        if retire_counter.value > 0:
+            retire_counter.value -= 1
+            return True
+    return False
+
 def force_garbage_collection(log_queue, threshold_mb: float = 1000):
     """强制垃圾回收"""
     try:
@@ -52,68 +99,35 @@ def force_garbage_collection(log_queue, threshold_mb: float = 1000):
 
 # --- 后处理辅助函数 ---
 
-def _build_ffprobe_command(ffprobe_cmd: str, media_path: str,
-                           probesize: str | None, analyzeduration: str | None) -> list[str]:
-    """Build ffprobe command parameters."""
-    cmd: list[str] = [ffprobe_cmd, "-hide_banner"]
-    if probesize:
-        cmd.extend(["-probesize", probesize])
-    if analyzeduration:
-        cmd.extend(["-analyzeduration", analyzeduration])
-    cmd.extend([
-        "-v", "error",
-        "-show_entries", "stream=avg_frame_rate,r_frame_rate,codec_name,codec_type:format=duration",
-        "-of", "json",
-        media_path,
-    ])
-    return cmd
-
-def _probe_media_metadata(ffprobe_cmd: str, media_path: str, log_queue) -> tuple[dict | None, str | None, str | None]:
-    """Run ffprobe with retries to gather media metadata."""
-    attempts = [
-        ("baseline", "标准探测", "10M", "10M"),
-        ("extended", "扩展探测", "200M", "200M"),
-        ("deep", "深度探测", "0", "0"),
-    ]
-    last_error: str | None = None
-
-    for idx, (_attempt_key, label_display, probesize, analyzeduration) in enumerate(attempts):
-        cmd = _build_ffprobe_command(ffprobe_cmd, media_path, probesize, analyzeduration)
-        try:
-            result = run_silent(cmd, check=False, timeout=45)
-        except FileNotFoundError as fnf_err:
-            return None, None, f"未找到 ffprobe 可执行文件: {fnf_err}"
-        except subprocess.TimeoutExpired:
-            last_error = "探测超时"
-            if log_queue is not None and idx < len(attempts) - 1:
-                log_queue.put(f"      - ⚠️ FFProbe第{idx + 1}轮超时({label_display})，调整参数后重试")
-            continue
-        except Exception as unexpected_err:
-            return None, None, f"调用 ffprobe 失败: {unexpected_err}"
+def _log_volume_level(levels, log_queue):
+    """根据整段音频的电平统计输出提示"""
+    mean_volume = levels.mean_volume_db
+    log_queue.put(f"      - 音频平均音量: {mean_volume:.1f} dB, 峰值: {levels.max_volume_db:.1f} dB, "
+                  f"静音占比: {levels.silent_ratio:.0%}")
+
+    # 警告：音量过低可能是静音或损坏
+    if mean_volume < -60:
+        log_queue.put(f"      - ⚠️⚠️⚠️ 警告: 音频音量过低 ({mean_volume:.1f} dB)，可能为静音或损坏！")
+        log_queue.put(f"      - 建议: 使用 ffmpeg 重新编码视频文件后再识别")
+    elif mean_volume < -40:
+        log_queue.put(f"      - ⚠️ 提示: 音频音量较低，识别效果可能受影响")
+    else:
+        log_queue.put(f"      - ✅ 音频音量正常")
 
-        if result.returncode == 0:
-            try:
-                probe_data = json.loads(result.stdout)
-                if idx > 0 and log_queue is not None:
-                    log_queue.put(f"      - ℹ️ FFProbe在第{idx + 1}轮({label_display})成功")
-                return probe_data, label_display, None
-            except json.JSONDecodeError as json_err:
-                last_error = f"输出解析失败: {json_err}"
-        else:
-            stderr = (result.stderr or '').strip()
-            if stderr:
-                stderr = stderr.splitlines()[-1]
-            last_error = stderr or f"退出码 {result.returncode}"
-            if log_queue is not None and idx < len(attempts) - 1:
-                log_queue.put(f"      - ⚠️ FFProbe第{idx + 1}轮失败({label_display}): {last_error}")
-
-    return None, None, last_error
-def _format_srt_time(ms: int) -> str:
-    """将毫秒转换为SRT时间格式"""
-    seconds, milliseconds = divmod(ms, 1000)
-    minutes, seconds = divmod(seconds, 60)
-    hours, minutes = divmod(minutes, 60)
-    return f"{int(hours):02d}:{int(minutes):02d}:{int(seconds):02d},{int(milliseconds):03d}"
+def _task_audio_seconds(task: dict) -> float:
+    """识别任务的音频时长（秒），根据PCM字节数或WAV文件大小估算"""
+    if task.get('audio_pcm'):
+        return len(task['audio_pcm']) / PCM_BYTES_PER_SECOND
+    try:
+        return max(0, Path(task['audio_path']).stat().st_size - 44) / PCM_BYTES_PER_SECOND
+    except (OSError, KeyError, TypeError):
+        return 0.0
+
+def _load_task_waveform(task: dict):
+    """读取识别任务的音频为 float32 波形（内存PCM或提取出的16kHz WAV）"""
+    if task.get('audio_pcm'):
+        return pcm_to_waveform(task['audio_pcm'])
+    return load_wav_waveform(task['audio_path'])
 
 def _write_srt_from_result(rec_result: list, output_path: str):
     """
@@ -130,14 +144,7 @@ def _write_srt_from_result(rec_result: list, output_path: str):
     # 优先使用 sentence_info
     if sentence_info and isinstance(sentence_info, list):
         with open(output_path, 'w', encoding='utf-8') as f:
-            for i, sentence_data in enumerate(sentence_info):
-                start_time = _format_srt_time(sentence_data['start'])
-                end_time = _format_srt_time(sentence_data['end'])
-                text = sentence_data.get('text', '').strip()
-                if text:
-                    f.write(f"{i + 1}\n")
-                    f.write(f"{start_time} --> {end_time}\n")
-                    f.write(f"{text}\n\n")
+            write_srt_sentences(f, sentence_info)
     # 如果没有 sentence_info，尝试使用 'timestamp' 和 'text' 字段
     elif 'timestamp' in first_item and 'text' in first_item:
         with open(output_path, 'w', encoding='utf-8') as f:
@@ -147,8 +154,8 @@ def _write_srt_from_result(rec_result: list, output_path: str):
                 start_ms = timestamps[0][0] if timestamps and len(timestamps) > 0 else 0
                 end_ms = timestamps[0][1] if timestamps and len(timestamps) > 0 and len(timestamps[0]) > 1 else 1000 # 默认1秒
 
-                start_time = _format_srt_time(start_ms)
-                end_time = _format_srt_time(end_ms)
+                start_time = format_srt_time(start_ms)
+                end_time = format_srt_time(end_ms)
 
                 f.write("1\n")
                 f.write(f"{start_time} --> {end_time}\n")
@@ -159,14 +166,68 @@ def _write_srt_from_result(rec_result: list, output_path: str):
             f.write("")
 
 # --- 流水线阶段 1：预处理 (CPU) ---
-def pre_processing_worker(task_queue, audio_queue, log_queue, progress_queue, config, ffmpeg_semaphore, pause_event=None):
+def _open_transcription_cache(config, log_queue):
+    """按配置打开识别结果缓存，失败时返回 None（缓存不可用不影响正常处理）"""
+    if not config.get('transcription_cache', True):
+        return None
+    try:
+        from transcription_cache import TranscriptionCache
+        return TranscriptionCache(config.get('transcription_cache_path') or None)
+    except Exception as e:
+        log_queue.put(f"   ⚠️ 识别结果缓存不可用: {e}")
+        return None
+
+def pre_processing_worker(task_queue, audio_queue, log_queue, progress_queue, config, ffmpeg_semaphore, pause_event=None,
+                          result_queue=None, retire_counter=None):
+    log_queue = WorkerLog(log_queue)  # 带级别的日志，攒批发送
     from ffmpeg_manager import get_ffmpeg_path, get_ffprobe_path
+    from transcription_cache import pcm_fingerprint, wav_fingerprint
     FFMPEG_CMD = get_ffmpeg_path()
     FFPROBE_CMD = get_ffprobe_path()
+    cache = _open_transcription_cache(config, log_queue)
+    speech_gate_enabled = config.get('speech_gate', True)
+    progress_interval_s = float(config.get('progress_interval_s', 0.5))
+    # 进程内字幕精校：在提取出的音频上生成参考语音轨，后处理不再重新解码视频
+    track_vad = None
+    in_process_sync = (config.get('ffsubsync_in_process', True)
+                       or config.get('subtitle_sync_backend', 'ffsubsync') == 'native')
+    if (config.get('ffsubsync_enabled') and in_process_sync
+            and config.get('ffsubsync_vad', 'silero') in IN_PROCESS_VADS):
+        track_vad = config.get('ffsubsync_vad', 'silero')
+    # Silero VAD（语音门控和参考语音轨共用）不在进程启动时预热：第一个真正走到 VAD 判定的文件
+    # 经 model_registry 加载，之后复用；全部命中缓存或不需要 VAD 的进程不加载 torch（导入预算）
+
+    def cached_track(file_key):
+        if cache is None or track_vad is None:
+            return None
+        try:
+            return cache.get_track(track_cache_key(file_key, track_vad))
+        except Exception as e:
+            log_queue.put(f"      - ⚠️ 参考语音轨缓存查询失败: {e}")
+            return None
+
+    def send_to_post(task, rec_result):
+        # 跳过识别，直接交给后处理（未传入 result_queue 时经识别进程转交）
+        task['recognition_result'] = rec_result
+        task['enqueued_at'] = time.time()
+        (result_queue if result_queue is not None else audio_queue).put(task)
+
+    def skip_recognition(reason, audio_path=None, video_for_sync=None):
+        # 语音门控：无语音的文件以空结果交给后处理，不占用识别引擎
+        log_queue.put(f"      - ⏭️ 跳过识别: {reason}")
+        send_to_post({
+            "original_path": original_file_path,
+            "audio_path": audio_path,
+            "video_for_sync": video_for_sync or original_file_path,
+            "skip_reason": reason,
+        }, [])
 
     while True:
         if pause_event is not None:
             pause_event.wait()
+        if _claim_retirement(retire_counter):
+            log_queue.put(f" [预处理] 自适应并发：{multiprocessing.current_process().name} 退出")
+            break
         try:
             original_file_path = task_queue.get(timeout=1)
         except Exception:
@@ -180,18 +241,71 @@ def pre_processing_worker(task_queue, audio_queue, log_queue, progress_queue, co
         t_ffprobe = 0
         t_cfr = 0
         t_extract = 0
+        t_levels = 0
+        t_gate = None
+        t_track = None
 
         try:
             video_to_process = original_file_path
 
+            # 识别结果缓存：源文件内容指纹命中时，连音频提取也跳过
+            cache_keys = []
+            if cache is not None:
+                try:
+                    # 未变化的源文件直接取记录的指纹，不再每次完整读取一遍
+                    file_key = cache.file_key(original_file_path, MODEL_SIGNATURE)
+                    cache_keys.append(file_key)
+                    cached_result = cache.get(file_key)
+                except Exception as e:
+                    cached_result = None
+                    log_queue.put(f"      - ⚠️ 缓存查询失败: {e}")
+                if cached_result is not None:
+                    cfr_existing = p_original.parent / f"{p_original.stem}_CFR.mp4"
+                    if config['cfr_enabled'] and cfr_existing.exists():
+                        video_to_process = str(cfr_existing)
+                    log_queue.put(f"      - ♻️ 命中识别缓存（文件指纹），跳过音频提取和识别")
+                    send_to_post({
+                        "original_path": original_file_path,
+                        "audio_path": None,
+                        "video_for_sync": video_to_process,
+                        "cache_keys": cache_keys,
+                        "from_cache": True,
+                        "speech_track": cached_track(file_key),
+                    }, cached_result)
+                    continue
+
+            # 阶段检查点：上次运行已完成识别（之后在后处理中退出）时直接进入后处理
+            checkpoint = open_checkpoint(config, original_file_path)
+            if checkpoint is not None:
+                saved_result, saved_spool = checkpoint.load_result()
+                if saved_result is not None or saved_spool:
+                    cfr_existing = p_original.parent / f"{p_original.stem}_CFR.mp4"
+                    if config['cfr_enabled'] and cfr_existing.exists():
+                        video_to_process = str(cfr_existing)
+                    audio_existing = p_original.with_name(f"{p_original.stem}_extracted.wav")
+                    log_queue.put(f"      - ♻️ 从检查点恢复：识别已完成，直接进入后处理")
+                    send_to_post({
+                        "original_path": original_file_path,
+                        "audio_path": str(audio_existing) if audio_existing.exists() else None,
+                        "video_for_sync": video_to_process,
+                        "cache_keys": cache_keys,
+                        "recognition_result_path": saved_spool,
+                        "speech_track": cached_track(cache_keys[0]) if cache_keys else None,
+                    }, saved_result)
+                    continue
+
             # 【修复】在所有情况下都初始化变量并获取视频时长
             total_duration_ms = 0
             stream_info = None
+            audio_stream = None
 
             # 获取视频时长（用于进度显示）
+            # 优先使用探测缓存（文件列表已探测过或以前的会话处理过），未命中时才占用信号量调用 ffprobe
             t_probe_start = time.time()
-            with ffmpeg_semaphore:
-                probe_data, probe_label, probe_error = _probe_media_metadata(FFPROBE_CMD, original_file_path, log_queue)
+            probe_data, probe_label, probe_error = probe_media(
+                original_file_path, FFPROBE_CMD, log_queue.put, semaphore=ffmpeg_semaphore)
+            if probe_label == "缓存":
+                log_queue.put(f"      - ♻️ 使用缓存的媒体信息")
 
             if probe_data:
                 try:
@@ -239,7 +353,25 @@ def pre_processing_worker(task_queue, audio_queue, log_queue, progress_queue, co
                         pass
             t_ffprobe = time.time() - t_probe_start
 
-            if config['cfr_enabled'] and p_original.suffix.lower() in config['supported_video_ext']:
+            # 语音门控：探测未发现音频流时仍尝试提取（探测可能漏掉靠后出现的音频流），提取失败才判定为没有音频
+            no_audio_stream = speech_gate_enabled and bool(probe_data) and audio_stream is None
+
+            # 阶段检查点：上次运行已提取的音频，跳过 CFR 转换和音频提取
+            audio_in_memory = config.get('audio_in_memory', False)
+            audio_output_path = p_original.with_name(f"{p_original.stem}_extracted.wav")
+            restored_audio = None
+            if checkpoint is not None:
+                try:
+                    restored_audio = checkpoint.restore_audio(audio_in_memory, audio_output_path)
+                except Exception as e:
+                    log_queue.put(f"      - ⚠️ 检查点音频读取失败，重新提取: {e}")
+                if restored_audio is not None:
+                    cfr_existing = p_original.parent / f"{p_original.stem}_CFR.mp4"
+                    if config['cfr_enabled'] and cfr_existing.exists():
+                        video_to_process = str(cfr_existing)
+
+            if (restored_audio is None and config['cfr_enabled']
+                    and p_original.suffix.lower() in config['supported_video_ext']):
                 cfr_output_path = p_original.parent / f"{p_original.stem}_CFR.mp4"
                 log_queue.put(f"      - 正在检查是否需要CFR转换...")
 
@@ -267,13 +399,7 @@ def pre_processing_worker(task_queue, audio_queue, log_queue, progress_queue, co
                         try:
                             log_queue.put("         -> 尝试1/2: 使用NVIDIA NVENC硬件加速...")
                             with ffmpeg_semaphore:  # 使用信号量限流
-                                cfr_cmd = [
-                                    "-hwaccel", "auto",  # 让FFmpeg自动选择硬件加速
-                                    "-i", original_file_path,
-                                    "-vf", f"fps={target_fps}",
-                                    "-c:v", "h264_nvenc", "-preset", "p1", "-cq", "23", "-pix_fmt", "yuv420p",
-                                    "-c:a", "copy", "-threads", "2", "-y", str(cfr_output_path)
-                                ]
+                                cfr_cmd = build_cfr_args(original_file_path, str(cfr_output_path), target_fps, hwaccel=True)
 
                                 rc = run_silent([FFMPEG_CMD, "-nostdin", "-hide_banner", "-loglevel", "error"] + cfr_cmd, check=True)
 
@@ -290,12 +416,7 @@ def pre_processing_worker(task_queue, audio_queue, log_queue, progress_queue, co
                     if not conversion_successful:
                         log_queue.put("         -> 尝试2/2: 使用CPU进行转换 (更稳定)...")
                         with ffmpeg_semaphore:  # 使用信号量限流
-                            cfr_cmd = [
-                                "-i", original_file_path,
-                                "-vf", f"fps={target_fps}",
-                                "-c:v", "libx264", "-preset", "ultrafast", "-crf", "23",
-                                "-c:a", "copy", "-threads", "2", "-y", str(cfr_output_path)
-                            ]
+                            cfr_cmd = build_cfr_args(original_file_path, str(cfr_output_path), target_fps)
 
                             # 使用 run_silent 避免黑窗
                             rc = run_silent([FFMPEG_CMD, "-nostdin", "-hide_banner", "-loglevel", "error"] + cfr_cmd, check=True)
@@ -308,227 +429,543 @@ def pre_processing_worker(task_queue, audio_queue, log_queue, progress_queue, co
                     log_queue.put(f"      - 已是CFR，跳过转换。")
 
             # 音频提取 - 使用信号量限流和实时进度
-            audio_output_path = p_original.with_name(f"{p_original.stem}_extracted.wav")
+            audio_pcm = None
+
+            def emit_progress(event):
+                # 发送FFmpeg进度事件
+                event["file"] = str(p_original)
+                event["stage"] = "extract"
+                progress_queue.put(event)
 
             t_extract_start = time.time()
-            with ffmpeg_semaphore:  # 使用信号量限流
-                # 准备音频提取命令（不包含 ffmpeg 本体）
-                extract_cmd = [
-                    '-i', video_to_process,
-                    '-map', 'a:0?', '-vn', '-sn', '-dn',
-                    '-acodec', 'pcm_s16le', '-ac', '1', '-ar', '16000',
-                    '-threads', '2',
-                    '-y', str(audio_output_path)
-                ]
-
-                # 如果有时长信息，使用带进度的版本
-                if total_duration_ms > 0:
-                    def emit_progress(event):
-                        # 发送FFmpeg进度事件
-                        event["file"] = str(p_original)
-                        event["stage"] = "extract"
-                        progress_queue.put(event)
-
-                    rc = run_ffmpeg_with_progress(extract_cmd, total_duration_ms, emit_progress, FFMPEG_CMD)
-                    if rc != 0:
-                        raise RuntimeError(f"FFmpeg 音频提取失败，返回码: {rc}")
-                else:
-                    # 降级到普通模式（无进度）
-                    run_silent([FFMPEG_CMD, '-nostdin', '-hide_banner', '-loglevel', 'error'] + extract_cmd, check=True)
+            if restored_audio is not None:
+                log_queue.put(f"      - ♻️ 从检查点恢复：使用上次提取的音频")
+                if audio_in_memory:
+                    audio_pcm = restored_audio
+            else:
+                try:
+                    if audio_in_memory:
+                        # 零临时文件模式：FFmpeg 直接输出原始 PCM 到 stdout，不落盘
+                        with ffmpeg_semaphore:  # 使用信号量限流
+                            extract_cmd = build_extract_args(video_to_process)
+                            rc, audio_pcm, ffmpeg_err = run_ffmpeg_to_bytes(extract_cmd, total_duration_ms, emit_progress,
+                                                                            FFMPEG_CMD, progress_interval_s)
+                        if rc != 0:
+                            raise RuntimeError(f"FFmpeg 音频提取失败，返回码: {rc} {ffmpeg_err}")
+                    else:
+                        with ffmpeg_semaphore:  # 使用信号量限流
+                            # 准备音频提取命令（不包含 ffmpeg 本体）
+                            extract_cmd = build_extract_args(video_to_process, str(audio_output_path))
+
+                            # 如果有时长信息，使用带进度的版本
+                            if total_duration_ms > 0:
+                                rc = run_ffmpeg_with_progress(extract_cmd, total_duration_ms, emit_progress, FFMPEG_CMD,
+                                                              progress_interval_s)
+                                if rc != 0:
+                                    raise RuntimeError(f"FFmpeg 音频提取失败，返回码: {rc}")
+                            else:
+                                # 降级到普通模式（无进度）
+                                run_silent([FFMPEG_CMD, '-nostdin', '-hide_banner', '-loglevel', 'error'] + extract_cmd,
+                                           check=True)
+                except (RuntimeError, subprocess.CalledProcessError) as extract_err:
+                    if not no_audio_stream:
+                        raise
+                    log_queue.put(f"      - 音频提取失败: {extract_err}")
+                    skip_recognition("文件不包含音频流（探测未发现音频流且无法提取音频）", None, video_to_process)
+                    continue
+                if no_audio_stream and not (audio_pcm if audio_in_memory else audio_output_path.exists()):
+                    skip_recognition("文件不包含音频流（探测未发现音频流且 FFmpeg 未输出音频）", None, video_to_process)
+                    continue
 
             t_extract = time.time() - t_extract_start
-
-            # 【新增】验证提取的音频是否有效（快速检测静音）
-            if audio_output_path.exists():
+            if checkpoint is not None and restored_audio is None:
+                try:
+                    if audio_in_memory:
+                        checkpoint.save_audio(pcm=audio_pcm)
+                    elif audio_output_path.exists():
+                        checkpoint.save_audio(wav_path=str(audio_output_path))
+                except Exception as e:
+                    log_queue.put(f"      - ⚠️ 检查点写入失败: {e}")
+
+            # 【新增】验证提取的音频是否有效：进程内分析整段文件的电平（无需再启动 ffmpeg volumedetect）
+            audio_levels = None
+            if audio_in_memory:
+                if not audio_pcm:
+                    raise RuntimeError("FFmpeg 未输出任何音频数据")
+                log_queue.put(f"      - 内存音频大小: {len(audio_pcm):,} 字节 ({len(audio_pcm) / PCM_BYTES_PER_SECOND:.1f}s)")
+            elif audio_output_path.exists():
                 audio_size = audio_output_path.stat().st_size
                 log_queue.put(f"      - 音频文件大小: {audio_size:,} 字节")
+            else:
+                raise FileNotFoundError(f"音频文件未生成: {audio_output_path}")
 
-                # 快速音量检测（仅检查前10秒，避免耗时过长）
+            t_levels_start = time.time()
+            try:
+                if audio_in_memory:
+                    audio_levels = analyze_pcm_levels(audio_pcm)
+                else:
+                    audio_levels = analyze_wav_levels(str(audio_output_path))
+                if audio_levels is not None:
+                    _log_volume_level(audio_levels, log_queue)
+            except Exception as e:
+                log_queue.put(f"      - ⚠️ 音量检测失败: {e}")
+            t_levels = time.time() - t_levels_start
+
+            # 语音门控：全程静音或 VAD 未检出人声的文件不送入识别队列
+            if speech_gate_enabled:
+                t_gate_start = time.time()
+                if audio_in_memory:
+                    read_pcm, _total_ms, close_reader = pcm_window_reader(audio_pcm)
+                else:
+                    read_pcm, _total_ms, close_reader = wav_window_reader(str(audio_output_path))
                 try:
-                    with ffmpeg_semaphore:
-                        volume_cmd = [
-                            FFMPEG_CMD, "-nostdin", "-hide_banner",
-                            "-t", "10",  # 只检查前10秒
-                            "-i", str(audio_output_path),
-                            "-af", "volumedetect",
-                            "-f", "null", "-"
-                        ]
-                        volume_result = run_silent(volume_cmd, check=False)  # 不抛异常
-
-                        # 从stderr中查找mean_volume
-                        if volume_result.stderr:
-                            for line in volume_result.stderr.split('\n'):
-                                if 'mean_volume:' in line:
-                                    try:
-                                        volume_str = line.split(':')[1].strip().split()[0]
-                                        mean_volume = float(volume_str)
-                                        log_queue.put(f"      - 音频平均音量: {mean_volume:.1f} dB")
-
-                                        # 警告：音量过低可能是静音或损坏
-                                        if mean_volume < -60:
-                                            log_queue.put(f"      - ⚠️⚠️⚠️ 警告: 音频音量过低 ({mean_volume:.1f} dB)，可能为静音或损坏！")
-                                            log_queue.put(f"      - 建议: 使用 ffmpeg 重新编码视频文件后再识别")
-                                        elif mean_volume < -40:
-                                            log_queue.put(f"      - ⚠️ 提示: 音频音量较低，识别效果可能受影响")
-                                        else:
-                                            log_queue.put(f"      - ✅ 音频音量正常")
-                                        break
-                                    except (ValueError, IndexError):
-                                        pass
+                    decision = check_speech(audio_levels, read_pcm, log_queue.put,
+                                            use_vad=config.get('speech_gate_vad', True),
+                                            min_speech_s=float(config.get('speech_gate_min_speech_s', 0.5)))
                 except Exception as e:
-                    log_queue.put(f"      - ⚠️ 音量检测失败: {e}")
-            else:
-                raise FileNotFoundError(f"音频文件未生成: {audio_output_path}")
+                    decision = None
+                    log_queue.put(f"      - ⚠️ 语音检测失败，继续识别: {e}")
+                finally:
+                    close_reader()
+                t_gate = time.time() - t_gate_start
+                if decision is not None and decision.speech_s is not None:
+                    log_queue.put(f"      - 语音检测: 检出语音 ≥{decision.speech_s:.1f}s，用时 {t_gate:.1f}s")
+                if decision is not None and decision.skip:
+                    skip_recognition(decision.reason, None if audio_in_memory else str(audio_output_path), video_to_process)
+                    continue
+
+            # 字幕精校的参考语音轨（按源文件指纹缓存）
+            speech_track = None
+            if track_vad is not None:
+                t_track_start = time.time()
+                file_key = cache_keys[0] if cache_keys else None
+                speech_track = cached_track(file_key)
+                if speech_track is None:
+                    if audio_in_memory:
+                        read_pcm, total_ms, close_reader = pcm_window_reader(audio_pcm)
+                    else:
+                        read_pcm, total_ms, close_reader = wav_window_reader(str(audio_output_path))
+                    try:
+                        speech_track = compute_speech_track(read_pcm, total_ms, track_vad, audio_levels, log_queue.put)
+                    except Exception as e:
+                        log_queue.put(f"      - ⚠️ 参考语音轨生成失败，将使用 ffsubsync 命令精校: {e}")
+                    finally:
+                        close_reader()
+                    if speech_track is not None and cache is not None and file_key:
+                        try:
+                            cache.put_track(track_cache_key(file_key, track_vad), speech_track)
+                        except Exception as e:
+                            log_queue.put(f"      - ⚠️ 参考语音轨缓存写入失败: {e}")
+                t_track = time.time() - t_track_start
 
             # 计算总耗时并输出性能统计
             t_total = time.time() - t_start
             log_queue.put(f"   ⏱️ [性能] {p_original.name}: ffprobe={t_ffprobe:.1f}s, cfr={t_cfr:.1f}s, extract={t_extract:.1f}s, total={t_total:.1f}s")
+            media_s = total_duration_ms / 1000.0 if total_duration_ms > 0 else None
+            progress_queue.put(stage_event("pre", original_file_path, t_total, {
+                "probe": t_ffprobe, "cfr": t_cfr, "extract": t_extract, "levels": t_levels, "speech_gate": t_gate,
+                "speech_track": t_track,
+            }, media_s))
 
             recognition_task = {
                 "original_path": original_file_path,
-                "audio_path": str(audio_output_path),
-                "video_for_sync": video_to_process
+                "audio_path": None if audio_in_memory else str(audio_output_path),
+                "audio_pcm": audio_pcm,  # 内存模式下的 s16le PCM 字节，否则为 None
+                "video_for_sync": video_to_process,
+                "cache_keys": cache_keys,  # 后处理成功后以这些指纹保存识别结果
+                "audio_levels": audio_levels.to_dict() if audio_levels is not None else None,  # 逐窗口电平，供后续阶段复用
+                "media_s": media_s,  # 媒体时长（秒），各阶段计算实时率
+                "speech_track": speech_track,  # 字幕精校的参考语音轨（100Hz 0/1 字节），未启用时为 None
             }
+
+            # 识别结果缓存：解码后音频相同（重新封装、重复上传）时跳过识别
+            if cache is not None:
+                try:
+                    if audio_in_memory:
+                        pcm_key = pcm_fingerprint(audio_pcm, MODEL_SIGNATURE)
+                    else:
+                        pcm_key = wav_fingerprint(str(audio_output_path), MODEL_SIGNATURE)
+                    cache_keys.append(pcm_key)
+                    cached_result = cache.get(pcm_key)
+                except Exception as e:
+                    cached_result = None
+                    log_queue.put(f"      - ⚠️ 缓存查询失败: {e}")
+                if cached_result is not None:
+                    log_queue.put(f"      - ♻️ 命中识别缓存（音频指纹），跳过识别")
+                    recognition_task.pop('audio_pcm')
+                    recognition_task['from_cache'] = True
+                    send_to_post(recognition_task, cached_result)
+                    continue
+
+            recognition_task['enqueued_at'] = time.time()
             audio_queue.put(recognition_task)
             log_queue.put(f"   [预处理] 音频提取成功: {p_original.name}")
 
         except Exception as e:
             error_msg = str(e.stderr.strip().split('\n')[-3:]) if hasattr(e, 'stderr') and e.stderr else str(e)
             log_queue.put(f"❌ [预处理] 失败: {p_original.name}, 原因: {error_msg}")
-            progress_queue.put((-1, f"❌ 预处理失败: {p_original.name}"))
+            progress_queue.put((-1, f"❌ 预处理失败: {p_original.name}", str(p_original), f"预处理: {error_msg}"))
 
 # --- 流水线阶段 2：语音识别 (GPU/CPU) - 原始git版本 ---
-def recognition_worker(audio_queue, result_queue, log_queue, config, status_queue, progress_queue, pause_event=None):
-    model = None
+def _task_model_input(task: dict, log_queue):
+    """取出识别任务的模型输入：内存PCM转为波形，否则为音频文件路径"""
+    audio_pcm = task.pop('audio_pcm', None)
+    if audio_pcm:
+        # 内存模式：直接把波形交给模型，识别后随 task 一起丢弃，不再传给后处理
+        log_queue.put(f"      - 内存音频: {len(audio_pcm) / PCM_BYTES_PER_SECOND:.1f}s")
+        return pcm_to_waveform(audio_pcm)
+
+    # 检查音频文件是否存在
+    audio_path = Path(task['audio_path'])
+    if not audio_path.exists():
+        raise FileNotFoundError(f"音频文件不存在: {audio_path}")
+
+    log_queue.put(f"      - 音频文件路径: {audio_path}")
+    log_queue.put(f"      - 音频文件大小: {audio_path.stat().st_size} 字节")
+    return task['audio_path']
+
+def _run_recognition_loop(audio_queue, result_queue, log_queue, config, progress_queue, pause_event,
+                          recognize_one, recognize_many, recognize_pcm, device: str = 'cpu',
+                          get_sharded=None) -> int:
+    """
+    识别阶段主循环：取任务、短音频凑批、长音频分段、识别、投递结果
+    recognize_one(task) 返回单个文件的识别结果，recognize_many(tasks) 返回与 tasks 对应的结果列表，
+    recognize_pcm(pcm_bytes) 识别一段 PCM（长音频分段识别用），
+    get_sharded() 返回并行分段识别的协调者（未启用时为 None）
+    本地识别进程和常驻引擎的桥接进程共用，返回处理的文件数
+    """
     processed_count = 0
 
-    try:
-        from funasr import AutoModel
-
-        # GPU优化配置
-        device = config['device']
-        if device == 'cuda':
-            import torch
-            # 设置GPU优化
-            torch.backends.cudnn.benchmark = True
-            torch.backends.cudnn.deterministic = False
-
-            # 检测GPU内存并设置最优批处理大小
-            gpu_memory_gb = torch.cuda.get_device_properties(0).total_memory / (1024**3)
-            if gpu_memory_gb >= 24:
-                batch_size_s = 25  # 高端GPU
-                max_length = 60000
-            elif gpu_memory_gb >= 12:
-                batch_size_s = 18  # 中端GPU
-                max_length = 45000
-            elif gpu_memory_gb >= 8:
-                batch_size_s = 12  # 入门GPU
-                max_length = 30000
-            else:
-                batch_size_s = 8
-                max_length = 20000
-            log_queue.put(f"🚀 GPU优化: 显存 {gpu_memory_gb:.1f}GB, 批处理大小 {batch_size_s}")
+    # 并行分段识别：长音频的语音片段分发给多个 CPU 进程
+    sharded_min_s = float(config.get('segment_min_duration_s', 120.0))
+
+    # 长音频分段识别：超过阈值的音频按窗口逐段识别，句子写入暂存文件，内存占用与时长无关
+    chunk_threshold_s = float(config.get('chunked_recognition_threshold_s', 1800.0) or 0)
+    chunk_window_s = float(config.get('chunk_window_s', 600.0))
+    chunk_overlap_s = float(config.get('chunk_overlap_s', 30.0))
+
+    # 跨文件批量识别：短音频在时间窗口内凑批，拼接后一次 generate
+    batch_files = int(config.get('recognition_batch_files', 8) or 1)
+    batch_max_clip_s = float(config.get('recognition_batch_max_clip_s', 60.0))
+    batch_max_seconds = float(config.get('recognition_batch_max_seconds', 300.0))
+    batch_window_s = float(config.get('recognition_batch_window_s', 0.2))
+    progress_interval_s = float(config.get('progress_interval_s', 0.5))
+
+    def is_batchable(task):
+        seconds = _task_audio_seconds(task)
+        return 0 < seconds <= batch_max_clip_s
+
+    def after_recognized(task, rec_result, t_start=None, share=1, extra_timings=None):
+        """t_start: 本文件（或所在批次）开始识别的时间，share: 批次内的文件数（耗时按文件均摊）"""
+        nonlocal processed_count
+        task.pop('audio_pcm', None)  # 内存音频不再传给后处理
+        task['recognition_result'] = rec_result
+        # 阶段检查点：识别结果落盘后，后处理阶段退出也不必重新识别
+        if not task.get('from_cache') and not task.get('skip_reason'):
+            checkpoint = open_checkpoint(config, task['original_path'])
+            if checkpoint is not None:
+                try:
+                    checkpoint.save_result(rec_result, task.get('recognition_result_path'))
+                except Exception as e:
+                    log_queue.put(f"      - ⚠️ 检查点写入失败: {e}")
+        if t_start is not None:
+            seconds = (time.time() - t_start) / share
+            timings = {"asr": seconds}
+            if task.get('enqueued_at'):
+                timings["queue_wait"] = max(0.0, t_start - task['enqueued_at'])
+            timings.update(extra_timings or {})
+            progress_queue.put(stage_event("asr", task['original_path'], seconds, timings,
+                                           task.get('media_s') or _task_audio_seconds(task) or None))
+        task['enqueued_at'] = time.time()
+        result_queue.put(task)
+        log_queue.put(f"   [识别完成] -> {Path(task['original_path']).name}")
+
+        # 处理计数和内存清理
+        processed_count += 1
+
+        # 每处理3个文件进行一次内存清理
+        if processed_count % 3 == 0:
+            if device == 'cuda':
+                import torch
+                torch.cuda.empty_cache()
+            force_garbage_collection(log_queue, 600)
+            monitor_memory_usage(f"识别第{processed_count}个文件后", log_queue)
+
+    def recognize_long(task):
+        p_original = Path(task['original_path'])
+        # 暂存文件和增量字幕放在任务缓存目录，不写到源文件旁边
+        spool_path = job_dir(config, task['original_path']) / "asr_partial.jsonl"
+        audio_pcm = task.pop('audio_pcm', None)
+        if audio_pcm:
+            read_pcm, total_ms, close_reader = pcm_window_reader(audio_pcm)
+        else:
+            read_pcm, total_ms, close_reader = wav_window_reader(task['audio_path'])
+        log_queue.put(f"      - 长音频分段识别: 时长 {total_ms / 60000:.1f} 分钟, 窗口 {chunk_window_s:.0f}s, 重叠 {chunk_overlap_s:.0f}s")
+
+        spool = SentenceSpool(str(spool_path))
+        t_start = time.time()
+
+        def on_sentences(sentences, done_ms):
+            spool.append(sentences)
+            elapsed = max(time.time() - t_start, 1e-6)
+            rtf = done_ms / 1000.0 / elapsed
+            progress_queue.put({
+                "kind": "asr",
+                "file": str(p_original),
+                "stage": "recognize",
+                "done": done_ms / max(total_ms, 1),
+                "eta_s": (total_ms - done_ms) / 1000.0 / rtf if rtf > 0 else None,
+                "speed": f"{rtf:.1f}xRT",
+            })
+            log_queue.put(f"      - 分段识别进度: {done_ms / 60000:.1f}/{total_ms / 60000:.1f} 分钟, 本段 {len(sentences)} 句")
+
+        try:
+            sentence_count = recognize_chunked(read_pcm, total_ms, recognize_pcm, on_sentences,
+                                               window_s=chunk_window_s, overlap_s=chunk_overlap_s)
+        finally:
+            spool.close()
+            close_reader()
+            del audio_pcm
+        log_queue.put(f"      - 分段识别完成: 共 {sentence_count} 句")
+        task['recognition_result_path'] = str(spool_path)
+        return None
+
+    def recognize_sharded(task, sharded):
+        p_original = Path(task['original_path'])
+        audio_pcm = task.get('audio_pcm')
+        if audio_pcm:
+            read_pcm, total_ms, close_reader = pcm_window_reader(audio_pcm)
         else:
-            batch_size_s = 15
-            max_length = 30000
-
-        log_queue.put("🔄 FunASR模型加载中...")
-        model = AutoModel(
-            model="paraformer-zh",
-            vad_model="fsmn-vad",
-            punc_model="ct-punc",
-            device=device,
-            batch_size=batch_size_s,  # 动态批处理大小
-            max_end_silence_time=800
-        )
-        log_queue.put("✅ 识别引擎加载成功。")
+            read_pcm, total_ms, close_reader = wav_window_reader(task['audio_path'])
+        t_start = time.time()
+        # 分片很多时按间隔合并，只发送最新进度
+        throttle = ProgressThrottle(progress_queue.put, progress_interval_s)
+
+        def on_progress(done, total):
+            elapsed = max(time.time() - t_start, 1e-6)
+            throttle.update({
+                "kind": "asr",
+                "file": str(p_original),
+                "stage": "recognize",
+                "done": done / max(total, 1),
+                "eta_s": elapsed / done * (total - done) if done else None,
+                "speed": f"{total_ms / 1000.0 * done / max(total, 1) / elapsed:.1f}xRT",
+            })
+
+        try:
+            rec_result = sharded.recognize(read_pcm, total_ms, p_original.stem, on_progress)
+            task['_asr_timings'] = dict(sharded.last_timings)
+        finally:
+            throttle.flush()
+            close_reader()
+        log_queue.put(f"      - 并行分段识别完成: {len(rec_result[0]['sentence_info'])} 句, "
+                      f"用时 {time.time() - t_start:.1f}s")
+        return rec_result
+
+    def recognize_single(task):
+        p_original = Path(task['original_path'])
+        log_queue.put(f"   [识别中] -> {p_original.name}")
+        t_start = time.time()
+        try:
+            sharded = get_sharded() if get_sharded is not None and _task_audio_seconds(task) >= sharded_min_s else None
+            if sharded is not None:
+                try:
+                    rec_result = recognize_sharded(task, sharded)
+                    after_recognized(task, rec_result, t_start, extra_timings=task.pop('_asr_timings', None))
+                    return
+                except Exception as e:
+                    log_queue.put(f"      - ⚠️ 并行分段识别失败，改为单进程识别: {e}")
+            if chunk_threshold_s > 0 and _task_audio_seconds(task) > chunk_threshold_s:
+                after_recognized(task, recognize_long(task), t_start)
+                return
+            rec_result = recognize_one(task)
+
+            # 调试：识别结果的结构（只写入文件日志）
+            log_queue.debug(f"      - 识别结果类型: {type(rec_result)}")
+            if rec_result:
+                log_queue.debug(f"      - 识别结果长度: {len(rec_result) if isinstance(rec_result, (list, dict)) else 'N/A'}")
+                if isinstance(rec_result, list) and len(rec_result) > 0:
+                    log_queue.debug(f"      - 第一个元素类型: {type(rec_result[0])}")
+                    if isinstance(rec_result[0], dict):
+                        log_queue.debug(f"      - 第一个元素键: {list(rec_result[0].keys())}")
+
+            after_recognized(task, rec_result, t_start)
+        except Exception as e:
+            import traceback
+            detailed_error = traceback.format_exc()
+            log_queue.put(f"❌ [识别失败] {p_original.name}, 原因: {e}")
+            log_queue.put(f"   详细错误信息: {detailed_error}")
+            progress_queue.put((-1, f"❌ 识别失败: {p_original.name}", str(p_original), f"识别: {e}"))
+
+    def recognize_batch(tasks):
+        names = [Path(t['original_path']).name for t in tasks]
+        log_queue.put(f"   [批量识别] {len(tasks)} 个短音频合并识别: {', '.join(names)}")
+        t_start = time.time()
+        try:
+            per_file = recognize_many(tasks)
+        except Exception as e:
+            # 合并识别失败时逐个回退，避免一个坏文件拖累整批
+            log_queue.put(f"      - ⚠️ 批量识别失败，改为逐个识别: {e}")
+            for task in tasks:
+                recognize_single(task)
+            return
+        for task, file_result in zip(tasks, per_file):
+            after_recognized(task, file_result, t_start, share=len(tasks))
+
+    pending = []  # 凑批时取到但需单独处理的任务（以及结束信号）
+    while True:
+        if pause_event is not None:
+            pause_event.wait()
+        task = pending.pop(0) if pending else audio_queue.get()
+        if task is None: break
+
+        # 预处理阶段已命中识别缓存的任务直接转交后处理
+        if task.get('recognition_result') is not None:
+            result_queue.put(task)
+            continue
+
+        if batch_files > 1 and is_batchable(task):
+            batch, deferred, got_sentinel = collect_batch(
+                audio_queue, task, is_batchable, _task_audio_seconds,
+                max_files=batch_files, max_seconds=batch_max_seconds, window_s=batch_window_s)
+            pending.extend(deferred)
+            if got_sentinel:
+                pending.append(None)
+            if len(batch) > 1:
+                recognize_batch(batch)
+                continue
+
+        recognize_single(task)
+
+    return processed_count
+
+def recognition_worker(audio_queue, result_queue, log_queue, config, status_queue, progress_queue, pause_event=None,
+                       segment_queues=None):
+    log_queue = WorkerLog(log_queue)
+    engine = None
+    processed_count = 0
+    device = config['device']
+    sharded = None
+
+    try:
+        engine = RecognitionEngine(device, log_queue.put, int(config.get('recognition_threads', 0) or 0))
         status_queue.put("ready")
     except Exception as e:
         log_queue.put(f"💥 致命错误: 无法加载FunASR模型! {e}")
         status_queue.put("error")
         return
 
-    try:
-        while True:
-            if pause_event is not None:
-                pause_event.wait()
-            task = audio_queue.get()
-            if task is None: break
-
-            p_original = Path(task['original_path'])
-            log_queue.put(f"   [识别中] -> {p_original.name}")
-            try:
-                # 检查音频文件是否存在
-                audio_path = Path(task['audio_path'])
-                if not audio_path.exists():
-                    raise FileNotFoundError(f"音频文件不存在: {audio_path}")
-
-                log_queue.put(f"      - 音频文件路径: {audio_path}")
-                log_queue.put(f"      - 音频文件大小: {audio_path.stat().st_size} 字节")
-
-                # 使用优化的参数进行识别
-                rec_result = model.generate(
-                    input=task['audio_path'],
-                    batch_size_s=batch_size_s,  # 使用动态批处理大小
-                    sentence_timestamp=True,
-                    disable_pbar=True,  # 禁用进度条，避免多进程环境下的错误
-                    disable_log=True,   # 禁用额外日志
-                    max_end_silence_time=800
-                )
-
-                # 调试：打印识别结果的结构
-                log_queue.put(f"      - 识别结果类型: {type(rec_result)}")
-                if rec_result:
-                    log_queue.put(f"      - 识别结果长度: {len(rec_result) if isinstance(rec_result, (list, dict)) else 'N/A'}")
-                    if isinstance(rec_result, list) and len(rec_result) > 0:
-                        log_queue.put(f"      - 第一个元素类型: {type(rec_result[0])}")
-                        if isinstance(rec_result[0], dict):
-                            log_queue.put(f"      - 第一个元素键: {list(rec_result[0].keys())}")
-
-                task['recognition_result'] = rec_result
-                result_queue.put(task)
-                log_queue.put(f"   [识别完成] -> {p_original.name}")
-
-                # 处理计数和内存清理
-                processed_count += 1
-
-                # 每处理3个文件进行一次内存清理
-                if processed_count % 3 == 0:
-                    if device == 'cuda':
-                        import torch
-                        torch.cuda.empty_cache()
-                    force_garbage_collection(log_queue, 600)
-                    monitor_memory_usage(f"识别第{processed_count}个文件后", log_queue)
+    if segment_queues is not None:
+        # 并行分段识别协调者的 VAD/标点模型（失败时 get_sharded 回退到单进程识别）
+        warm_models(["fsmn_vad", "ct_punc"], log_queue.put)
 
-            except Exception as e:
-                import traceback
-                detailed_error = traceback.format_exc()
-                log_queue.put(f"❌ [识别失败] {p_original.name}, 原因: {e}")
-                log_queue.put(f"   详细错误信息: {detailed_error}")
-                progress_queue.put((-1, f"❌ 识别失败: {p_original.name}"))
+    def recognize_many(tasks):
+        waveforms = [_load_task_waveform(t) for t in tasks]
+        return engine.recognize_merged(waveforms, [Path(t['original_path']).stem for t in tasks])
 
-    finally:
-        # 清理模型
-        if model:
+    def get_sharded():
+        # 首次遇到长音频时才加载协调者的 VAD/标点模型；加载失败后不再尝试
+        nonlocal sharded
+        if sharded is None:
             try:
-                del model
-                log_queue.put(" [识别] 模型已释放")
-            except:
-                pass
+                job_queue, segment_result_queue = segment_queues
+                sharded = ShardedRecognizer(job_queue, segment_result_queue,
+                                            int(config.get('segment_workers', 0)), log_queue.put,
+                                            float(config.get('segment_shard_s', 60.0)))
+            except Exception as e:
+                log_queue.put(f"⚠️ 并行分段识别不可用，长音频改为单进程识别: {e}")
+                sharded = False
+        return sharded or None
 
-        # GPU内存清理
-        if device == 'cuda':
-            try:
-                import torch
-                torch.cuda.empty_cache()
-                log_queue.put(" [识别] GPU缓存已清理")
-            except:
-                pass
+    try:
+        processed_count = _run_recognition_loop(
+            audio_queue, result_queue, log_queue, config, progress_queue, pause_event,
+            lambda task: engine.recognize(_task_model_input(task, log_queue)),
+            recognize_many,
+            lambda pcm: engine.recognize(pcm_to_waveform(pcm)),
+            device,
+            get_sharded if segment_queues is not None else None)
+    finally:
+        # 清理模型，GPU内存清理
+        if engine:
+            engine.release()
+            log_queue.put(" [识别] 模型已释放")
 
         # 最终垃圾回收
         force_garbage_collection(log_queue, 0)
         log_queue.put(f" [识别] 工作进程结束，共处理 {processed_count} 个文件")
 
+def segment_recognition_worker(job_queue, segment_result_queue, log_queue, config):
+    """
+    并行分段识别进程：只加载 paraformer-zh，识别协调者分发的语音片段
+    模型加载失败时仍保持运行，对收到的分片回复错误，协调者据此回退到单进程识别
+    """
+    log_queue = WorkerLog(log_queue)
+    model = None
+    load_error = None
+    try:
+        model = load_segment_model('cpu', int(config.get('recognition_threads', 0) or 0))
+    except Exception as e:
+        load_error = str(e)
+        log_queue.put(f"❌ 分段识别进程模型加载失败: {e}")
+
+    processed = 0
+    while True:
+        job = job_queue.get()
+        if job is None: break
+        reply = {'job': job['job'], 'index': job['index']}
+        if model is None:
+            reply['error'] = load_error
+        else:
+            try:
+                reply['segments'] = recognize_segment_pcms(model, job['pcm'])
+                processed += 1
+            except Exception as e:
+                reply['error'] = str(e)
+        segment_result_queue.put(reply)
+
+    model = None
+    force_garbage_collection(log_queue, 0)
+    log_queue.put(f" [分段识别] 进程结束，共识别 {processed} 个分片")
+
+def engine_bridge_worker(audio_queue, result_queue, log_queue, config, status_queue, progress_queue, pause_event=None):
+    """
+    常驻识别引擎的桥接进程：与 recognition_worker 接口相同，
+    但不在本进程加载模型，而是把任务转发给 engine_service 守护进程（模型常驻，跨任务、跨会话复用）
+    """
+    log_queue = WorkerLog(log_queue)
+    from engine_service import ensure_engine, task_request_item
+    processed_count = 0
+    device = config['device']
+
+    try:
+        client = ensure_engine(device, log_queue.put, timeout_s=600,
+                               idle_timeout_s=float(config.get('engine_idle_timeout_s', 7200)),
+                               threads=int(config.get('recognition_threads', 0) or 0))
+        status_queue.put("ready")
+    except Exception as e:
+        log_queue.put(f"💥 致命错误: 无法连接常驻识别引擎! {e}")
+        status_queue.put("error")
+        return
+
+    def recognize_one(task):
+        return client.recognize([task_request_item(task)], log_queue.put)[0]
+
+    def recognize_many(tasks):
+        items = [task_request_item(t) for t in tasks]
+        return client.recognize(items, log_queue.put, merge=True)
+
+    def recognize_pcm(pcm):
+        return client.recognize([{"key": "", "audio_pcm": pcm}], log_queue.put)[0]
+
+    try:
+        processed_count = _run_recognition_loop(
+            audio_queue, result_queue, log_queue, config, progress_queue, pause_event,
+            recognize_one, recognize_many, recognize_pcm, device)
+    finally:
+        client.close()
+        log_queue.put(f" [识别] 桥接进程结束，共处理 {processed_count} 个文件（引擎保持常驻）")
+
 def _soffice_convert_to_pdf(docx_path: Path, pdf_path: Path, log_queue) -> bool:
     """
     使用 LibreOffice 将 DOCX 转换为 PDF（跨平台兜底方案）
@@ -557,7 +994,8 @@ def _soffice_convert_to_pdf(docx_path: Path, pdf_path: Path, log_queue) -> bool:
         return False
 
 # --- 流水线阶段 3：后处理 (CPU) ---
-def post_processing_worker(result_queue, log_queue, progress_queue, config, pause_event=None):
+def post_processing_worker(result_queue, log_queue, progress_queue, config, pause_event=None, retire_counter=None):
+    log_queue = WorkerLog(log_queue)
     # 在工作进程启动时，尝试导入一次所需库
     try:
         import docx
@@ -574,11 +1012,21 @@ def post_processing_worker(result_queue, log_queue, progress_queue, config, paus
         convert = None
         log_queue.put(f"   [后处理警告] 导入 'docx2pdf' 失败: {e}。PDF生成功能可能不可用。")
 
+    cache = _open_transcription_cache(config, log_queue)
+    # ffsubsync 命令使用 Silero 时所需的 PyTorch Hub 缓存目录：第一次回退到 ffsubsync 命令时经注册表准备，之后复用
+
     while True:
         if pause_event is not None:
             pause_event.wait()
+        if _claim_retirement(retire_counter):
+            log_queue.put(f" [后处理] 自适应并发：{multiprocessing.current_process().name} 退出")
+            break
         task = result_queue.get()
         if task is None: break
+        t_post_start = time.time()
+        timings = {}
+        if task.get('enqueued_at'):
+            timings['queue_wait'] = t_post_start - task['enqueued_at']
 
         p_original = Path(task['original_path'])
         p_video_for_sync = Path(task['video_for_sync'])
@@ -589,68 +1037,102 @@ def post_processing_worker(result_queue, log_queue, progress_queue, config, paus
 
         try:
             rec_result = task.get('recognition_result')
+            spool_path = task.get('recognition_result_path')
+            # 长音频分段识别的结果在暂存文件中：字幕直接复制识别时写好的增量字幕，文本和 JSON 逐句流式写出
+            spooled = rec_result is None and bool(spool_path)
             srt_path = None
 
-            has_sentence_info = (rec_result and isinstance(rec_result, list) and
-                                 len(rec_result) > 0 and isinstance(rec_result[0], dict) and
-                                 rec_result[0].get('sentence_info'))
+            if spooled:
+                has_sentence_info = spool_has_sentences(spool_path)
+            else:
+                has_sentence_info = (rec_result and isinstance(rec_result, list) and
+                                     len(rec_result) > 0 and isinstance(rec_result[0], dict) and
+                                     rec_result[0].get('sentence_info'))
 
-            if not has_sentence_info:
+            if not has_sentence_info and not task.get('skip_reason'):
                 log_queue.put(f"      - 警告: 模型在文件 '{p_original.name}' 中未识别到任何有效语音内容。")
 
-            # --- 提取完整文本 ---
-            full_text = ''
-            if has_sentence_info:
-                sentence_list = rec_result[0].get('sentence_info', [])
-                full_text = "\n".join(sentence['text'].strip() for sentence in sentence_list)
+            # --- 逐句文本（每句一行） ---
+            def text_lines():
+                if not has_sentence_info:
+                    return iter(())
+                if spooled:
+                    return iter_spooled_lines(spool_path)
+                return (sentence['text'].strip() for sentence in rec_result[0].get('sentence_info', []))
+
+            def write_text(f):
+                for i, line in enumerate(text_lines()):
+                    f.write(f"\n{line}" if i else line)
+
+            def write_srt(output_path):
+                if spooled:
+                    write_spooled_srt(spool_path, str(output_path))
+                else:
+                    _write_srt_from_result(rec_result, str(output_path))
 
             # --- 生成 SRT, TXT, MD, JSON ---
             if config.get('generate_srt'):
+                t_step = time.time()
                 srt_path = output_dir / f"{stem}.srt"
-                _write_srt_from_result(rec_result, str(srt_path))
+                write_srt(srt_path)
                 log_queue.put(f"      - ✅ SRT字幕已生成: {srt_path.name}")
+                timings['srt'] = time.time() - t_step
 
             if config.get('generate_srt_txt'):
+                t_step = time.time()
                 srt_txt_path = output_dir / f"{stem}.srt.txt"  # 使用 .srt.txt 后缀以避免冲突
-                _write_srt_from_result(rec_result, str(srt_txt_path))
+                write_srt(srt_txt_path)
                 log_queue.put(f"      - ✅ SRT(.txt)格式字幕已生成: {srt_txt_path.name}")
+                timings['srt_txt'] = time.time() - t_step
 
             if config.get('generate_txt'):
+                t_step = time.time()
                 txt_path = output_dir / f"{stem}.txt"
-                with open(txt_path, 'w', encoding='utf-8') as f: f.write(full_text)
+                with open(txt_path, 'w', encoding='utf-8') as f: write_text(f)
                 log_queue.put(f"      - ✅ TXT文本已生成: {txt_path.name}")
+                timings['txt'] = time.time() - t_step
 
             if config.get('generate_txt_md'):
+                t_step = time.time()
                 txt_md_path = output_dir / f"{stem}.md.txt"
                 with open(txt_md_path, 'w', encoding='utf-8') as f:
                     f.write(f"# {stem}\n\n")
-                    f.write(full_text)
+                    write_text(f)
                 log_queue.put(f"      - ✅ TXT(Markdown格式)文件已生成: {txt_md_path.name}")
+                timings['md'] = time.time() - t_step
 
             if config.get('generate_json'):
+                t_step = time.time()
                 json_path = output_dir / f"{stem}.json"
-                with open(json_path, 'w', encoding='utf-8') as f: json.dump(rec_result, f, ensure_ascii=False, indent=2)
+                if spooled:
+                    write_spooled_json(spool_path, p_original.stem, str(json_path))
+                else:
+                    with open(json_path, 'w', encoding='utf-8') as f: json.dump(rec_result, f, ensure_ascii=False, indent=2)
                 log_queue.put(f"      - ✅ JSON数据已生成: {json_path.name}")
+                timings['json'] = time.time() - t_step
 
             # --- DOCX 和 PDF 生成流程 ---
             needs_docx = config.get('generate_docx') or config.get('generate_pdf')
             docx_path = None
             if needs_docx:
+                t_step = time.time()
                 if docx:
                     try:
                         docx_path = output_dir / f"{stem}.docx"
                         document = docx.Document()
                         document.add_heading(stem, level=1)
-                        document.add_paragraph(full_text)
+                        document.add_paragraph("\n".join(text_lines()))
                         document.save(str(docx_path))
                         if config.get('generate_docx'):
                             log_queue.put(f"      - ✅ DOCX文件已生成: {docx_path.name}")
                     except Exception as e:
                         log_queue.put(f"      - ❌ 生成DOCX文件时出错: {e}")
                         docx_path = None
+                timings['docx'] = time.time() - t_step
 
             # --- 从 DOCX 转换到 PDF ---
             if config.get('generate_pdf'):
+                t_step = time.time()
                 if docx_path and docx_path.exists():
                     pdf_path = output_dir / f"{stem}.pdf"
                     pdf_generated = False
@@ -677,6 +1159,7 @@ def post_processing_worker(result_queue, log_queue, progress_queue, config, paus
 
                 elif needs_docx:
                     log_queue.put("      - ⚠️ 跳过PDF生成：前置的DOCX文件未能成功创建。")
+                timings['pdf'] = time.time() - t_step
 
             # --- 清理临时的DOCX文件 ---
             if docx_path and docx_path.exists() and config.get('generate_pdf') and not config.get('generate_docx'):
@@ -687,58 +1170,91 @@ def post_processing_worker(result_queue, log_queue, progress_queue, config, paus
 
             # --- 字幕精校 ---
             if config.get('ffsubsync_enabled') and srt_path and srt_path.exists() and srt_path.stat().st_size > 0:
-                log_queue.put(f"      - 开始对 '{srt_path.name}' 进行 ffsubsync 字幕精校...")
+                sync_backend = config.get('subtitle_sync_backend', 'ffsubsync')
+                log_queue.put(f"      - 开始对 '{srt_path.name}' 进行字幕精校（{sync_backend}）...")
+                t_step = time.time()
+                synced_srt_path = output_dir / f"{stem}_Ffsub.srt"
+                max_offset = config.get('ffsubsync_max_offset', 60)
+                fast_mode = config.get('ffsubsync_fast_mode', False)
+                result = None
+                in_process_done = False
 
-                # 【新增】如果使用 Silero VAD，确保模型可用
-                vad_method = config.get('ffsubsync_vad', 'silero')
-                if vad_method == 'silero':
-                    log_queue.put(f"         -> 检查 Silero VAD 模型...")
+                # 内置对齐：识别结果的句子时间戳与参考语音轨做 FFT 互相关，直接改写时间戳重新写出 SRT
+                if sync_backend == 'native' and task.get('speech_track') and has_sentence_info:
                     try:
-                        ensure_silero_for_ffsubsync()
-                        log_queue.put(f"         -> ✅ Silero 模型已就绪")
+                        from subtitle_sync import native_align, retime_result, SyncFailed
+                        try:
+                            # 对齐需要全部句子的时间戳，长音频在这里才读入暂存的句子
+                            aligned_result = load_spooled_result(spool_path, p_original.stem) if spooled else rec_result
+                            sync = native_align(task['speech_track'], aligned_result[0]['sentence_info'],
+                                                max_offset, fix_framerate=not fast_mode)
+                            _write_srt_from_result(retime_result(aligned_result, sync), str(synced_srt_path))
+                            del aligned_result
+                            log_queue.put(f"         -> 内置对齐: 偏移 {sync.offset_ms:+d}ms, 帧率比 {sync.ratio:.4f}"
+                                          f" (末尾校正 {sync.drift_ms:+d}ms), 得分 {sync.score:.0f}")
+                        except SyncFailed as e:
+                            log_queue.put(f"         -> ⚠️ 未找到可靠的对齐: {e}")
+                        in_process_done = True
                     except Exception as e:
-                        log_queue.put(f"         -> ⚠️ Silero 模型检查失败: {e}")
-                        log_queue.put(f"         -> 将尝试继续执行（可能使用 PyTorch Hub）")
-
-                synced_srt_path = output_dir / f"{stem}_Ffsub.srt"
-
-                # 构建 ffsubsync 命令
-                relative_video_path = p_video_for_sync.name
-                relative_srt_path = srt_path.name
-                relative_synced_path = synced_srt_path.name
+                        log_queue.put(f"         -> ⚠️ 内置对齐失败，改用 ffsubsync: {e}")
 
-                # 基础命令
-                sync_cmd = ['ffsubsync', str(relative_video_path), '-i', str(relative_srt_path), '-o', str(relative_synced_path)]
-
-                # 【新增】添加 VAD 算法选择
-                vad_method = config.get('ffsubsync_vad', 'silero')  # 默认使用 silero
-                if vad_method in ['webrtc', 'auditok', 'silero']:
-                    sync_cmd.extend(['--vad', vad_method])
-                    log_queue.put(f"         -> 使用 VAD 算法: {vad_method}")
-
-                # 【新增】添加最大偏移量限制（提高处理速度）
-                max_offset = config.get('ffsubsync_max_offset', 60)
-                if max_offset > 0:
-                    sync_cmd.extend(['--max-offset-seconds', str(max_offset)])
-                    log_queue.put(f"         -> 最大偏移量: {max_offset}秒")
-
-                # 【性能优化】快速模式：跳过耗时的帧率分析
-                fast_mode = config.get('ffsubsync_fast_mode', False)
-                if fast_mode:
-                    sync_cmd.extend(['--skip-infer-framerate-ratio', '--no-fix-framerate'])
-                    log_queue.put(f"         -> 快速模式: 已启用（跳过帧率分析）")
+                # 进程内精校：预处理生成的参考语音轨 + ffsubsync 库对齐，无需重新解码视频
+                if not in_process_done and task.get('speech_track') and config.get('ffsubsync_in_process', True):
+                    try:
+                        from subtitle_sync import align_subtitles, SyncFailed
+                        try:
+                            sync = align_subtitles(task['speech_track'], str(srt_path), str(synced_srt_path),
+                                                   max_offset, fix_framerate=not fast_mode)
+                            log_queue.put(f"         -> 进程内对齐: 偏移 {sync.offset_s:+.2f}秒, "
+                                          f"帧率比 {sync.scale_factor:.4f}, 得分 {sync.score:.0f}")
+                        except SyncFailed as e:
+                            log_queue.put(f"         -> ⚠️ 未找到可靠的对齐: {e}")
+                        in_process_done = True
+                    except ImportError as e:
+                        log_queue.put(f"         -> ⚠️ ffsubsync 库不可用，改用 ffsubsync 命令: {e}")
+                    except Exception as e:
+                        log_queue.put(f"         -> ⚠️ 进程内精校失败，改用 ffsubsync 命令: {e}")
 
-                # 执行 ffsubsync
-                log_queue.put(f"         -> 命令: {' '.join(sync_cmd)}")
-                result = run_silent(sync_cmd, cwd=output_dir)
+                vad_method = config.get('ffsubsync_vad', 'silero')
+                if not in_process_done and vad_method == 'silero' and try_get_model("silero_hub", log_queue.put) is None:
+                    # 本地模型未能放入 PyTorch Hub 缓存（注册表只在首次失败时记录原因），由 ffsubsync 自行加载
+                    log_queue.put(f"         -> ⚠️ 本地 Silero 模型不可用，ffsubsync 将尝试使用 PyTorch Hub")
+
+                if not in_process_done:
+                    # 构建 ffsubsync 命令
+                    relative_video_path = p_video_for_sync.name
+                    relative_srt_path = srt_path.name
+                    relative_synced_path = synced_srt_path.name
+
+                    # 基础命令
+                    sync_cmd = ['ffsubsync', str(relative_video_path), '-i', str(relative_srt_path), '-o', str(relative_synced_path)]
+
+                    # 【新增】添加 VAD 算法选择
+                    if vad_method in ['webrtc', 'auditok', 'silero']:
+                        sync_cmd.extend(['--vad', vad_method])
+                        log_queue.put(f"         -> 使用 VAD 算法: {vad_method}")
+
+                    # 【新增】添加最大偏移量限制（提高处理速度）
+                    if max_offset > 0:
+                        sync_cmd.extend(['--max-offset-seconds', str(max_offset)])
+                        log_queue.put(f"         -> 最大偏移量: {max_offset}秒")
+
+                    # 【性能优化】快速模式：跳过耗时的帧率分析
+                    if fast_mode:
+                        sync_cmd.extend(['--skip-infer-framerate-ratio', '--no-fix-framerate'])
+                        log_queue.put(f"         -> 快速模式: 已启用（跳过帧率分析）")
+
+                    # 执行 ffsubsync
+                    log_queue.put(f"         -> 命令: {' '.join(sync_cmd)}")
+                    result = run_silent(sync_cmd, cwd=output_dir)
 
                 if synced_srt_path.exists() and synced_srt_path.stat().st_size > 0:
                     try:
                         srt_path.unlink()
-                        log_queue.put(f"      - ✅ ffsubsync 精校成功！输出文件: {synced_srt_path.name}")
+                        log_queue.put(f"      - ✅ 字幕精校成功！输出文件: {synced_srt_path.name}")
 
                         # 【优化】解析 ffsubsync 输出以提取偏移信息
-                        if result.stdout:
+                        if result is not None and result.stdout:
                             for line in result.stdout.split('\n'):
                                 if 'offset' in line.lower() or 'shift' in line.lower():
                                     log_queue.put(f"         -> {line.strip()}")
@@ -755,6 +1271,8 @@ def post_processing_worker(result_queue, log_queue, progress_queue, config, paus
 
                     except OSError as e:
                         log_queue.put(f"      - 警告: ffsubsync 成功，但删除原始SRT失败: {e}")
+                elif result is None:
+                    log_queue.put(f"      - ⚠️ ffsubsync 未生成有效文件。保留原始字幕。")
                 else:
                     # 【优化】提供更详细的错误信息
                     error_details = result.stderr.strip() if result.stderr else "未知错误"
@@ -766,20 +1284,50 @@ def post_processing_worker(result_queue, log_queue, progress_queue, config, paus
                         for err_line in error_lines:
                             if err_line.strip():
                                 log_queue.put(f"         -> 错误: {err_line.strip()}")
+                timings['ffsubsync'] = time.time() - t_step
 
-            # --- 清理临时文件 ---
-            p_audio_temp = Path(task['audio_path'])
-            # 使用优化的文件清理工具
-            success = file_cleaner.safe_remove_file(str(p_audio_temp), log_queue.put)
-            if not success:
-                log_queue.put(f"      - ⚠️ WAV临时文件清理失败，将在程序退出时强制清理: {p_audio_temp.name}")
+            # --- 清理临时文件（内存音频模式下没有WAV） ---
+            if task.get('audio_path'):
+                p_audio_temp = Path(task['audio_path'])
+                # 使用优化的文件清理工具
+                success = file_cleaner.safe_remove_file(str(p_audio_temp), log_queue.put)
+                if not success:
+                    log_queue.put(f"      - ⚠️ WAV临时文件清理失败，将在程序退出时强制清理: {p_audio_temp.name}")
 
             if p_original != p_video_for_sync:
                 log_queue.put(f"      - CFR转换完成。原始文件和新的CFR文件均已保留: {p_video_for_sync.name}")
 
-            progress_queue.put((1, f"✅ 处理成功: {p_original.name}, 已生成所选格式文件。"))
+            # 保存识别结果缓存（改名、移动、重复的文件下次可直接复用）
+            if task.get('skip_reason'):
+                log_queue.put(f"      - ⏭️ 未进行识别（{task['skip_reason']}），已生成空输出文件")
+            elif cache is not None and task.get('cache_keys') and not task.get('from_cache') and (
+                    isinstance(rec_result, list) or spooled):
+                try:
+                    # 缓存保存完整结果：长音频写入缓存时临时读回暂存文件
+                    cache.put(task['cache_keys'], load_spooled_result(spool_path, p_original.stem) if spooled
+                              else rec_result, source=str(p_original))
+                except Exception as e:
+                    log_queue.put(f"      - ⚠️ 识别结果缓存写入失败: {e}")
+            elif task.get('from_cache'):
+                log_queue.put(f"      - ♻️ 本文件使用了缓存的识别结果")
+
+            # 输出已生成，删除本文件的阶段检查点
+            checkpoint = open_checkpoint(config, task['original_path'])
+            if checkpoint is not None:
+                checkpoint.clear()
+            if spooled:
+                remove_spool(spool_path)
+
+            progress_queue.put(stage_event("post", str(p_original), time.time() - t_post_start,
+                                           timings, task.get('media_s')))
+            if task.get('skip_reason'):
+                # 状态码 0：未识别（语音门控跳过），与成功分开统计，断点续传时会重新处理
+                progress_queue.put((0, f"⏭️ 已跳过: {p_original.name}（{task['skip_reason']}）",
+                                    str(p_original), task['skip_reason']))
+            else:
+                progress_queue.put((1, f"✅ 处理成功: {p_original.name}, 已生成所选格式文件。", str(p_original)))
 
         except Exception as e:
             error_msg = traceback.format_exc()
             log_queue.put(f"❌ [后处理] 失败: {p_original.name}, 原因: {error_msg}")
-            progress_queue.put((-1, f"❌ 后处理失败: {p_original.name}"))
+            progress_queue.put((-1, f"❌ 后处理失败: {p_original.name}", str(p_original), f"后处理: {e}"))
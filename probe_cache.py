@@ -0,0 +1,266 @@
+# -*- coding: utf-8 -*-
+"""
+ffprobe 结果缓存（文件列表与流水线共用）
+以前同一个文件会被探测多次：文件列表加载元信息时一次，预处理时最多再三次（逐步加大 probesize），
+且预处理的探测占用 FFmpeg 并发信号量。
+
+- 缓存键为 绝对路径 + 文件大小 + 修改时间，文件未变化时跨会话复用（SQLite，model_cache/probe_cache.sqlite3）
+- 进程内再加一层字典缓存，同一会话内每个文件最多探测一次
+- 首次探测的 probesize/analyzeduration 按容器类型选择：带索引的容器（MP4/MOV/MKV/音频）用小值，
+  无索引的流式容器（TS/FLV/AVI 等）直接用较大值；某种容器在较浅的级别失败过，以后直接从成功的级别开始
+- 缓存记录得到结果的探测级别。文件列表只做快速探测（max_level=1），结果不完整（缺少时长或音频流）时照样缓存；
+  流水线需要完整结果，命中这类浅层缓存时从下一级别继续探测，只有最深级别仍不完整的结果才视为确定；
+  更深的级别失败时（例如没有音频流的文件）保留已得到的最好结果，按最深级别记入缓存，文件不变时不再探测
+"""
+import json
+import os
+import sqlite3
+import subprocess
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Optional, Tuple
+
+from app_env import get_project_root
+
+# 探测级别：(名称, 显示名, probesize, analyzeduration)
+PROBE_LEVELS = [
+    ("light", "轻量探测", "2M", "2M"),
+    ("baseline", "标准探测", "10M", "10M"),
+    ("extended", "扩展探测", "200M", "200M"),
+    ("deep", "深度探测", "2G", "2G"),  # ffprobe 的 probesize 下限为 32，不能用 0 表示"不限"
+]
+
+# 各容器的起始探测级别（PROBE_LEVELS 下标）
+_CONTAINER_START_LEVEL = {
+    '.wav': 0, '.flac': 0, '.mp3': 0, '.m4a': 0,
+    '.mp4': 0, '.mov': 0, '.m4v': 0,
+    '.mkv': 1, '.webm': 1, '.wmv': 1,
+    '.avi': 2, '.flv': 2, '.ts': 2, '.mts': 2, '.m2ts': 2, '.mpg': 2, '.mpeg': 2,
+}
+_DEFAULT_START_LEVEL = 1
+_LEVEL_INDEX = {level[0]: i for i, level in enumerate(PROBE_LEVELS)}
+
+
+def default_cache_path() -> Path:
+    return get_project_root() / "model_cache" / "probe_cache.sqlite3"
+
+
+def _file_key(path: str) -> Optional[Tuple[str, int, int]]:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return str(Path(path).resolve()), st.st_size, st.st_mtime_ns
+
+
+class ProbeCache:
+    """ffprobe JSON 结果的持久化缓存，线程安全"""
+
+    def __init__(self, db_path: Optional[str] = None):
+        self.db_path = Path(db_path) if db_path else default_cache_path()
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._memory = {}
+        self._conn = sqlite3.connect(str(self.db_path), timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS probes ("
+            " path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER,"
+            " level TEXT, data TEXT NOT NULL, probed_at REAL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS container_levels (ext TEXT PRIMARY KEY, level INTEGER)"
+        )
+        self._conn.commit()
+
+    def get(self, path: str) -> Optional[dict]:
+        """查询缓存；文件大小或修改时间变化视为未命中"""
+        entry = self.get_entry(path)
+        return entry[0] if entry is not None else None
+
+    def get_entry(self, path: str) -> Optional[Tuple[dict, int]]:
+        """查询缓存，返回 (探测结果, 探测级别下标)；未记录级别的旧记录按最浅级别处理"""
+        key = _file_key(path)
+        if key is None:
+            return None
+        with self._lock:
+            if key in self._memory:
+                return self._memory[key]
+            row = self._conn.execute("SELECT size, mtime_ns, level, data FROM probes WHERE path = ?",
+                                     (key[0],)).fetchone()
+        if row is None or (row[0], row[1]) != key[1:]:
+            return None
+        entry = (json.loads(row[3]), _LEVEL_INDEX.get(row[2], 0))
+        with self._lock:
+            self._memory[key] = entry
+        return entry
+
+    def put(self, path: str, data: dict, level: str = ""):
+        key = _file_key(path)
+        if key is None:
+            return
+        with self._lock:
+            self._memory[key] = (data, _LEVEL_INDEX.get(level, 0))
+            with self._conn:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO probes (path, size, mtime_ns, level, data, probed_at) VALUES (?, ?, ?, ?, ?, ?)",
+                    (key[0], key[1], key[2], level, json.dumps(data, ensure_ascii=False), time.time()))
+
+    def start_level(self, path: str) -> int:
+        """按容器类型选择起始探测级别（包含历史上该容器需要的级别）"""
+        ext = Path(path).suffix.lower()
+        level = _CONTAINER_START_LEVEL.get(ext, _DEFAULT_START_LEVEL)
+        with self._lock:
+            row = self._conn.execute("SELECT level FROM container_levels WHERE ext = ?", (ext,)).fetchone()
+        return max(level, row[0]) if row else level
+
+    def remember_level(self, path: str, level: int):
+        """某容器需要比默认更深的探测时记录下来，下次直接从该级别开始"""
+        ext = Path(path).suffix.lower()
+        if level <= _CONTAINER_START_LEVEL.get(ext, _DEFAULT_START_LEVEL):
+            return
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO container_levels (ext, level) VALUES (?, ?)"
+                " ON CONFLICT(ext) DO UPDATE SET level = MAX(level, excluded.level)", (ext, level))
+
+    def close(self):
+        with self._lock:
+            try:
+                self._conn.close()
+            except Exception:
+                pass
+
+
+_shared_cache: Optional[ProbeCache] = None
+_shared_lock = threading.Lock()
+
+
+def get_probe_cache() -> Optional[ProbeCache]:
+    """进程内共享的缓存实例；数据库不可用时返回 None（退化为不缓存）"""
+    global _shared_cache
+    with _shared_lock:
+        if _shared_cache is None:
+            try:
+                _shared_cache = ProbeCache()
+            except Exception:
+                return None
+        return _shared_cache
+
+
+def build_ffprobe_command(ffprobe_cmd: str, media_path: str,
+                          probesize: Optional[str], analyzeduration: Optional[str]) -> list:
+    """构造 ffprobe 命令（完整 format/streams 信息，文件列表和流水线都够用）"""
+    cmd = [ffprobe_cmd, "-hide_banner"]
+    if probesize:
+        cmd.extend(["-probesize", probesize])
+    if analyzeduration:
+        cmd.extend(["-analyzeduration", analyzeduration])
+    cmd.extend(["-v", "error", "-show_format", "-show_streams", "-of", "json", media_path])
+    return cmd
+
+
+def _is_complete(probe_data: dict) -> bool:
+    """有时长且找到了音频流（浅层探测可能漏掉靠后出现的音频流）"""
+    streams = probe_data.get('streams') or []
+    has_duration = bool(probe_data.get('format', {}).get('duration'))
+    has_audio = any(s.get('codec_type') == 'audio' for s in streams)
+    return has_audio and has_duration
+
+
+def probe_media(media_path: str, ffprobe_cmd: Optional[str] = None,
+                log: Optional[Callable[[str], None]] = None, semaphore=None,
+                timeout_s: float = 45, max_level: Optional[int] = None,
+                cache: Optional[ProbeCache] = None) -> Tuple[Optional[dict], Optional[str], Optional[str]]:
+    """
+    获取媒体文件的 ffprobe 信息，优先使用缓存
+
+    Args:
+        semaphore: 只在真正调用 ffprobe 时持有的并发信号量（命中缓存不占用）
+        max_level: 最多尝试到的探测级别（文件列表只做快速探测）
+
+    Returns:
+        (probe_data, label, error) label 为命中缓存或成功的探测级别显示名
+        更深的探测全部失败时返回已得到的最好的浅层结果（来自缓存时 label 为 "缓存"）
+    """
+    from utils import run_silent
+
+    cache = cache if cache is not None else get_probe_cache()
+    last = len(PROBE_LEVELS) - 1 if max_level is None else min(max_level, len(PROBE_LEVELS) - 1)
+    shallow = None
+    if cache is not None:
+        entry = cache.get_entry(media_path)
+        if entry is not None:
+            data, cached_level = entry
+            if _is_complete(data) or cached_level >= last:
+                return data, "缓存", None
+            # 缓存的是较浅级别的不完整结果（例如文件列表的快速探测），从下一级别继续探测
+            shallow = entry
+
+    if ffprobe_cmd is None:
+        from ffmpeg_manager import get_ffprobe_path
+        ffprobe_cmd = get_ffprobe_path()
+
+    start = cache.start_level(media_path) if cache is not None else _DEFAULT_START_LEVEL
+    if shallow is not None:
+        start = max(start, shallow[1] + 1)
+    levels = list(range(min(start, last), last + 1))
+    last_error = None
+    # 较浅级别成功但不完整的结果：更深的级别失败时就用它 (probe_data, label)
+    best = (shallow[0], "缓存") if shallow is not None else None
+
+    for idx, level in enumerate(levels):
+        level_key, label_display, probesize, analyzeduration = PROBE_LEVELS[level]
+        cmd = build_ffprobe_command(ffprobe_cmd, media_path, probesize, analyzeduration)
+        try:
+            if semaphore is not None:
+                with semaphore:
+                    result = run_silent(cmd, check=False, timeout=timeout_s)
+            else:
+                result = run_silent(cmd, check=False, timeout=timeout_s)
+        except FileNotFoundError as fnf_err:
+            return None, None, f"未找到 ffprobe 可执行文件: {fnf_err}"
+        except subprocess.TimeoutExpired:
+            last_error = "探测超时"
+            if log is not None and idx < len(levels) - 1:
+                log(f"      - ⚠️ FFProbe{label_display}超时，调整参数后重试")
+            continue
+        except Exception as unexpected_err:
+            return None, None, f"调用 ffprobe 失败: {unexpected_err}"
+
+        if result.returncode == 0:
+            try:
+                probe_data = json.loads(result.stdout)
+            except json.JSONDecodeError as json_err:
+                last_error = f"输出解析失败: {json_err}"
+                continue
+            if not _is_complete(probe_data) and idx < len(levels) - 1:
+                # 浅层探测成功但信息不完整（缺少流或时长），加大探测范围重试
+                best = (probe_data, label_display)
+                last_error = "探测信息不完整"
+                continue
+            if cache is not None:
+                cache.put(media_path, probe_data, level_key)
+                # 没有音频流的文件在每个级别都不完整，不能据此抬高整个容器的起始级别
+                if idx > 0 and _is_complete(probe_data):
+                    cache.remember_level(media_path, level)
+            if idx > 0 and log is not None:
+                log(f"      - ℹ️ FFProbe在{label_display}成功")
+            return probe_data, label_display, None
+
+        stderr = (result.stderr or '').strip()
+        if stderr:
+            stderr = stderr.splitlines()[-1]
+        last_error = stderr or f"退出码 {result.returncode}"
+        if log is not None and idx < len(levels) - 1:
+            log(f"      - ⚠️ FFProbe{label_display}失败: {last_error}")
+
+    if best is not None:
+        # 更深的级别都失败了：已得到的结果就是这个文件能探测到的全部，按最深级别记入缓存，
+        # 文件未变化时不再从头重试（否则没有音频流的文件每个会话都要探测 4 次）
+        if cache is not None:
+            cache.put(media_path, best[0], PROBE_LEVELS[last][0])
+        return best[0], best[1], None
+    return None, None, last_error
@@ -1,20 +1,28 @@
 # processing_controller.py (v5.9 - 断点续传优化，跨进程FFmpeg限流，日志落盘)
 import multiprocessing
-from concurrent.futures import ProcessPoolExecutor
 from enum import Enum
 from dataclasses import dataclass, field
 from typing import List, Optional
 import psutil
 import gc
 import time
-import json
 import threading
 import logging
 from logging.handlers import RotatingFileHandler
 from pathlib import Path
 
 from qt_compat import QObject, pyqtSignal, QTimer
-from pipeline_workers import pre_processing_worker, recognition_worker, post_processing_worker
+from pipeline_workers import (pre_processing_worker, recognition_worker, engine_bridge_worker, post_processing_worker,
+                              segment_recognition_worker)
+from asr_sharding import plan_segment_workers
+from pipeline_config import ProcessingConfig
+from job_store import JobStore, filter_resumable, output_key, output_paths
+from performance_config import PerformanceConfig
+from adaptive_concurrency import AdaptiveConcurrency, ConcurrencyLimits, QueueSample, SemaphoreThrottle
+from stage_telemetry import StageTelemetry
+from pipeline_logging import start_file_log, write_record
+from pipeline_transport import (EventBatch, EventDispatcher, PipelineChannels, put_sentinels, start_task_feeder,
+                                stop_processes)
 
 class ResourceMonitor:
     """系统资源监控器"""
@@ -61,59 +69,6 @@ class ResourceMonitor:
             except Exception:
                 break
 
-class ProgressManager:
-    """进度管理器，支持断点续传"""
-    def __init__(self, project_dir: str = "."):
-        self.progress_file = Path(project_dir) / "processing_progress.json"
-        self.completed_files = set()
-        self.failed_files = set()
-        self.session_id = int(time.time())
-
-    def load_progress(self):
-        """加载之前的进度"""
-        if not self.progress_file.exists():
-            return {}
-        try:
-            with open(self.progress_file, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                self.completed_files = set(data.get('completed_files', []))
-                self.failed_files = set(data.get('failed_files', []))
-                return data
-        except Exception:
-            return {}
-
-    def save_progress(self, total_files: int, completed: int, failed: int):
-        """保存当前进度"""
-        progress_data = {
-            'session_id': self.session_id,
-            'timestamp': time.time(),
-            'total_files': total_files,
-            'completed_count': completed,
-            'failed_count': failed,
-            'completed_files': list(self.completed_files),
-            'failed_files': list(self.failed_files)
-        }
-        try:
-            with open(self.progress_file, 'w', encoding='utf-8') as f:
-                json.dump(progress_data, f, ensure_ascii=False, indent=2)
-        except Exception:
-            pass
-
-    def mark_completed(self, file_path: str):
-        """标记文件为已完成"""
-        self.completed_files.add(file_path)
-
-    def is_completed(self, file_path: str) -> bool:
-        """检查文件是否已完成"""
-        return file_path in self.completed_files
-
-    def clear_progress(self):
-        """清除进度记录"""
-        if self.progress_file.exists():
-            self.progress_file.unlink()
-        self.completed_files.clear()
-        self.failed_files.clear()
-
 class ProcessingState(Enum):
     IDLE = "就绪"
     ENGINE_STARTING = "识别引擎启动中"
@@ -122,25 +77,9 @@ class ProcessingState(Enum):
     ERROR = "错误"
     CANCELLED = "已取消"
 
-@dataclass
-class ProcessingConfig:
-    input_files: List[str] = field(default_factory=list)
-    generate_srt: bool = True
-    generate_srt_txt: bool = False
-    generate_txt: bool = False
-    generate_json: bool = False
-    generate_txt_md: bool = False
-    generate_docx: bool = False
-    generate_pdf: bool = False
-    cfr_enabled: bool = False
-    ffsubsync_enabled: bool = False
-    ffsubsync_vad: str = "silero"  # 新增：VAD算法选择 (webrtc/auditok/silero) - 默认使用最准确的silero
-    ffsubsync_max_offset: int = 60  # 新增：最大偏移量（秒），限制搜索范围以提高速度
-    device: str = "cpu"
-    enable_resume: bool = True  # 新增：启用断点续传
-    batch_size: int = 4  # 新增：批处理大小
-    max_memory_percent: float = 85.0  # 新增：内存使用阈值
-    supported_video_ext: List[str] = field(default_factory=lambda: ['.mp4', '.avi', '.mov', '.mkv', '.wmv', '.flv', '.webm'])
+# 界面日志只显示 INFO 及以上（调试日志只写入 logs/app.log）
+GUI_LOG_LEVEL = logging.INFO
+
 
 class ProcessingController(QObject):
     state_changed = pyqtSignal(ProcessingState)
@@ -148,52 +87,53 @@ class ProcessingController(QObject):
     error_occurred = pyqtSignal(str, str)
     processing_completed = pyqtSignal(dict)
     log_message = pyqtSignal(str)
+    log_batch = pyqtSignal(list)  # 工作进程的一批日志（只含 INFO 及以上，调试日志只写文件）
     stats_updated = pyqtSignal(dict)  # 新增：统计信息更新信号
     memory_warning = pyqtSignal(float)  # 新增：内存警告信号
+    # 分发线程 -> GUI线程：(通道代次, EventBatch)
+    _events_dispatched = pyqtSignal(int, object)
 
     def __init__(self, parent=None):
         super().__init__(parent)
         self.config: Optional[ProcessingConfig] = None
         self._engine_ready = False
         self.recognition_processes: list = []  # 【性能优化】支持多个识别进程
+        self.segment_processes: list = []  # CPU 并行分段识别进程
         self.current_state = ProcessingState.IDLE
 
-        self.manager = multiprocessing.Manager()
-        self.pause_event = self.manager.Event()
-        self.pause_event.set()
-
-        # 设置队列maxsize实现背压控制，让上游在队列满时阻塞等待
-        # 注意：将在 _start_pipeline_workers 中根据进程数动态设置
-        self.task_queue = None  # 将在启动时创建
-        self.audio_queue = None
-        self.result_queue = None
-
-        self.progress_queue = self.manager.Queue()  # 进度队列不限制
-        self.log_queue = self.manager.Queue()  # 日志队列不限制
-        self.engine_status_queue = self.manager.Queue()  # 状态队列不限制
-
-        # 【性能优化】FFmpeg全局并发限流：根据CPU核心数动态调整
-        cpu_cores = multiprocessing.cpu_count() or 1
-        if cpu_cores >= 16:
-            ffmpeg_concurrent = 6
-        elif cpu_cores >= 8:
-            ffmpeg_concurrent = 4
-        else:
-            ffmpeg_concurrent = 2
-        self.ffmpeg_semaphore = self.manager.Semaphore(ffmpeg_concurrent)
-        print(f"⚙️ 性能优化：FFmpeg并发限制 = {ffmpeg_concurrent} (基于{cpu_cores}核心)")
-
-        self.pre_process_pool: Optional[ProcessPoolExecutor] = None
-        self.post_process_pool: Optional[ProcessPoolExecutor] = None
+        # 【性能优化】FFmpeg全局并发限流：根据CPU核心数动态调整（分档表统一在 PerformanceConfig 中）
+        perf = PerformanceConfig.auto_detect(detect_gpu=False)
+        self.ffmpeg_concurrent = perf.ffmpeg_concurrent
+        print(f"⚙️ 性能优化：FFmpeg并发限制 = {self.ffmpeg_concurrent} (基于{perf.cpu_cores}核心)")
+
+        # 进程间通道：原生 multiprocessing 队列（不经过 Manager 服务进程），每个任务重新创建
+        # 日志/进度/引擎状态由分发线程阻塞读取并合批，经 _events_dispatched 信号交给GUI线程，GUI线程不轮询队列
+        self.channels: Optional[PipelineChannels] = None
+        self._dispatcher: Optional[EventDispatcher] = None
+        self._dispatch_generation = 0
+        self._events_dispatched.connect(self._on_events)
+        self._create_channels()
+
+        self.pre_processes: list = []
+        self.post_processes: list = []
+        self._task_feeder = None
+
+        # 自适应并发（任务运行中调整进程数和FFmpeg许可）
+        self._adaptive: Optional[AdaptiveConcurrency] = None
+        self._ffmpeg_throttle: Optional[SemaphoreThrottle] = None
+        # 分阶段耗时遥测（每个任务一份明细和汇总）
+        self._telemetry: Optional[StageTelemetry] = None
+        self._telemetry_stamp = ""
 
         self.is_cleaning_up = False
         self.total_files = 0
         self.completed_files = 0
+        self.skipped_files = 0  # 语音门控判定无语音、未识别的文件
         self.failed_files = 0
 
         # 新增组件
         self.resource_monitor = ResourceMonitor()
-        self.progress_manager = ProgressManager()
+        self._job_store: Optional[JobStore] = None  # 任务记录（断点续传和每个文件的状态），首次任务时打开
         self.is_paused = False
         self.peak_memory_percent = 0.0
         self._is_shutting_down = False
@@ -202,9 +142,9 @@ class ProcessingController(QObject):
         self.resource_monitor.add_callback(self._on_resource_update)
         self.resource_monitor.start_monitoring()
 
-        self.queue_check_timer = QTimer(self)
-        self.queue_check_timer.timeout.connect(self._check_queues)
-        self.queue_check_timer.start(500)  # 改为每500ms检查，减少CPU占用
+        # 自适应并发采样（只在任务运行且启用自适应并发时运行，不读取事件队列）
+        self.adapt_timer = QTimer(self)
+        self.adapt_timer.timeout.connect(self._adapt_concurrency)
 
         # 添加内存监控
         self.memory_monitor_timer = QTimer(self)
@@ -215,11 +155,69 @@ class ProcessingController(QObject):
         # 初始化文件日志系统（轮转日志）
         self._setup_file_logging()
 
+    def _create_channels(self):
+        """创建一套新的进程间通道（上一次任务中被强制终止的进程可能留下不一致的队列/信号量）"""
+        self.channels = PipelineChannels(multiprocessing.get_context('spawn'), self.ffmpeg_concurrent)
+        self.pause_event = self.channels.pause_event
+        self.ffmpeg_semaphore = self.channels.ffmpeg_semaphore
+        self.progress_queue = self.channels.progress_queue  # 进度队列不限制
+        self.log_queue = self.channels.log_queue  # 日志队列不限制
+        self.engine_status_queue = self.channels.engine_status_queue  # 状态队列不限制
+
+        # 设置队列maxsize实现背压控制，让上游在队列满时阻塞等待
+        # 注意：将在 start_processing / _start_pipeline_workers 中根据进程数动态设置
+        self.task_queue = None
+        self.audio_queue = None
+        self.result_queue = None
+
+        self._dispatch_generation += 1
+        generation = self._dispatch_generation
+        self._dispatcher = EventDispatcher(
+            self.log_queue, self.progress_queue, self.engine_status_queue,
+            lambda batch: self._dispatch_batch(generation, batch),
+            name=f"EventDispatcher-{generation}")
+        self._dispatcher.start()
+
+    def _stop_dispatcher(self):
+        """停止分发线程；此后送达的批次属于旧代次，只显示日志，不再改变任务状态"""
+        if self._dispatcher is None:
+            return
+        self._dispatch_generation += 1
+        self._dispatcher.stop()
+        self._dispatcher = None
+
+    def _dispatch_batch(self, generation: int, batch: EventBatch):
+        """在分发线程中执行：写文件日志，然后把整批事件交给GUI线程"""
+        if hasattr(self, '_logger'):
+            for record in batch.logs:
+                write_record(self._logger, record)
+            for item in batch.progress:
+                if isinstance(item, tuple):
+                    self._logger.info(item[1])
+        # 阶段和结果在分发线程中按批写入任务记录（一个事务）
+        if self._job_store is not None and self.config is not None:
+            config = self.config
+            try:
+                self._job_store.apply(batch.progress, lambda file_path: output_paths(config, file_path))
+            except Exception as e:
+                if hasattr(self, '_logger'):
+                    self._logger.warning(f"任务记录写入失败: {e}")
+        self._events_dispatched.emit(generation, batch)
+
+    def _open_job_store(self) -> Optional[JobStore]:
+        """打开任务记录，失败时返回 None（断点续传回退到检查输出文件）"""
+        if self._job_store is None:
+            try:
+                self._job_store = JobStore(self.config.job_store_path or None)
+            except Exception as e:
+                self.log_message.emit(f"⚠️ 任务记录不可用，断点续传将检查输出文件: {e}")
+        return self._job_store
+
     def _setup_file_logging(self):
         """设置文件日志系统（滚动轮转，10MB per file，保留10个备份）"""
         try:
             self._logger = logging.getLogger("FunASR")
-            self._logger.setLevel(logging.INFO)
+            self._logger.setLevel(logging.DEBUG)
 
             # 创建日志目录
             log_dir = Path(".") / "logs"
@@ -234,10 +232,11 @@ class ProcessingController(QObject):
                 delay=True
             )
             fh.setFormatter(logging.Formatter(
-                "%(asctime)s | %(levelname)s | %(message)s",
+                "%(asctime)s | %(levelname)s | %(processName)s | %(message)s",
                 "%Y-%m-%d %H:%M:%S"
             ))
-            self._logger.addHandler(fh)
+            # 文件由独立的写入线程写入，分发线程和GUI线程只把记录放进内存队列
+            self._log_listener = start_file_log(self._logger, fh)
 
             self._logger.info("=" * 60)
             self._logger.info("FunASR 应用启动")
@@ -328,6 +327,14 @@ class ProcessingController(QObject):
         kind = event.get("kind")
         file_path = event.get("file", "")
 
+        # 阶段耗时事件用于遥测和自适应并发，不计入进度
+        if kind == "stage":
+            if self._telemetry is not None:
+                self._telemetry.record(event)
+            if self._adaptive is not None:
+                self._adaptive.observe(event)
+            return
+
         if not file_path:
             return
 
@@ -344,18 +351,16 @@ class ProcessingController(QObject):
 
         # 更新进度信息
         if kind == "ffmpeg":
-            file_info["ffmpeg_done"] = event.get("done", 0.0)
+            file_info["ffmpeg_done"] = event.get("done", file_info["ffmpeg_done"])
             if "speed" in event:
                 file_info["speed"] = event["speed"]
             if "eta_s" in event:
                 file_info["eta_s"] = event["eta_s"]
         elif kind == "asr":
-            file_info["asr_done"] = event.get("done", 0.0)
+            file_info["asr_done"] = event.get("done", file_info["asr_done"])
             if "speed" in event:
                 file_info["speed"] = event["speed"]
 
-        # 计算总体进度
-        self._update_overall_progress()
 
     def _update_overall_progress(self):
         """根据各文件的实时进度更新总体进度"""
@@ -366,7 +371,7 @@ class ProcessingController(QObject):
             return
 
         # 已完成的文件数
-        completed = self.completed_files + self.failed_files
+        completed = self.completed_files + self.skipped_files + self.failed_files
 
         # 正在处理的文件的平均进度
         working_progress = 0.0
@@ -410,89 +415,80 @@ class ProcessingController(QObject):
         """重置所有与单个任务相关的状态计数器"""
         self.total_files = 0
         self.completed_files = 0
+        self.skipped_files = 0
         self.failed_files = 0
         self.is_cleaning_up = False
         self.is_paused = False
         self.pause_event.set()
-        
-        while not self.progress_queue.empty():
-            try: self.progress_queue.get_nowait()
-            except Exception: break
 
     def is_engine_ready(self) -> bool:
         return self._engine_ready
 
-    def _check_queues(self):
-        # 添加状态检查，避免在清理过程中继续访问队列
-        if self.is_cleaning_up or self.current_state in [ProcessingState.CANCELLED, ProcessingState.ERROR]:
+    def _on_events(self, generation: int, batch: EventBatch):
+        """GUI线程处理分发线程送来的一批事件（文件日志已在分发线程交给写入线程）"""
+        messages = [record[3] for record in batch.logs if record[0] >= GUI_LOG_LEVEL]
+        if messages:
+            self.log_batch.emit(messages)
+
+        # 旧通道的残余事件或清理过程中：只显示日志
+        if generation != self._dispatch_generation or self.is_cleaning_up \
+                or self.current_state in [ProcessingState.CANCELLED, ProcessingState.ERROR]:
             return
-            
+
         try:
-            # 1. 修改日志队列检查 - 添加数量限制，同时写入文件
-            log_count = 0
-            while not self.log_queue.empty() and log_count < 50:  # 限制每次最多处理50条
-                try:
-                    message = self.log_queue.get_nowait()
-                    # 同时写入文件日志和GUI
-                    if hasattr(self, '_logger'):
-                        self._logger.info(message)
-                    self.log_message.emit(message)
-                    log_count += 1
-                except:
+            # 1. 引擎状态 - 只在引擎启动阶段处理
+            # 每个识别进程各自回报状态，同时加载完成时一批中会有多条：只有状态仍为"引擎启动中"时的第一条生效，
+            # 之后的 ready/error 与逐条处理时一样忽略（否则会重复启动流水线，或对已在运行的任务执行出错清理）
+            for status in batch.statuses:
+                if self.current_state != ProcessingState.ENGINE_STARTING:
                     break
-            
-            # 2. 引擎状态检查 - 只在引擎启动阶段检查
-            if self.current_state == ProcessingState.ENGINE_STARTING:
-                try:
-                    status = self.engine_status_queue.get_nowait()
-                    if status == "ready":
-                        self.log_message.emit("✅ 识别引擎已就绪！开始处理文件...")
-                        self._engine_ready = True
-                        self._start_pipeline_workers()
-                    elif status == "error":
-                        self.log_message.emit("❌ 识别引擎加载失败！请检查日志。")
-                        self.error_occurred.emit("引擎加载失败", "无法加载FunASR模型，可能是显存不足或模型文件损坏。")
-                        self._change_state(ProcessingState.ERROR)
-                        self._cleanup_task_resources()
-                except:
-                    pass  # 队列为空是正常的
-
-            # 3. 进度检查 - 只在处理阶段检查
+                if status == "ready":
+                    self.log_message.emit("✅ 识别引擎已就绪！开始处理文件...")
+                    self._engine_ready = True
+                    self._start_pipeline_workers()
+                elif status == "error":
+                    self.log_message.emit("❌ 识别引擎加载失败！请检查日志。")
+                    self.error_occurred.emit("引擎加载失败", "无法加载FunASR模型，可能是显存不足或模型文件损坏。")
+                    self._change_state(ProcessingState.ERROR)
+                    self._cleanup_task_resources()
+                    return
+
+            # 2. 进度事件 - 只在处理阶段处理（同一文件的实时进度已在分发线程合并）
             if self.current_state == ProcessingState.PROCESSING:
-                progress_count = 0
-                while not self.progress_queue.empty() and progress_count < 20:
-                    try:
-                        item = self.progress_queue.get_nowait()
-
-                        # 处理字典格式的进度事件（FFmpeg/ASR实时进度）
-                        if isinstance(item, dict):
-                            self._handle_progress_event(item)
-                            progress_count += 1
-                            continue
-
-                        # 处理传统的 (status_code, message) 格式
-                        status_code, message = item
-                        if status_code == 1:
-                            self.completed_files += 1
-                        elif status_code == -1:
-                            self.failed_files += 1
-
-                        if hasattr(self, '_logger'):
-                            self._logger.info(message)
-                        self.log_message.emit(message)
-                        progress_count += 1
-
-                        if self.total_files > 0:
-                            progress = int(((self.completed_files + self.failed_files) / self.total_files) * 100)
-                            status_msg = f"已完成: {self.completed_files}, 失败: {self.failed_files} / 总计: {self.total_files}"
-                            self.progress_updated.emit(progress, status_msg)
-
-                        # 检查是否完成
-                        if (self.completed_files + self.failed_files) >= self.total_files:
-                            self._complete_processing()
-                            break
-                    except:
-                        break
+                live_updated = False
+                for item in batch.progress:
+                    # 处理字典格式的进度事件（FFmpeg/ASR实时进度、阶段耗时）
+                    if isinstance(item, dict):
+                        self._handle_progress_event(item)
+                        live_updated = live_updated or item.get("kind") != "stage"
+                        continue
+
+                    # 处理传统的 (status_code, message) 格式：1 成功，0 未识别（无语音），-1 失败
+                    status_code, message = item[:2]
+                    if status_code == 1:
+                        self.completed_files += 1
+                    elif status_code == 0:
+                        self.skipped_files += 1
+                    elif status_code == -1:
+                        self.failed_files += 1
+
+                    self.log_message.emit(message)
+
+                    finished = self.completed_files + self.skipped_files + self.failed_files
+                    if self.total_files > 0:
+                        progress = int((finished / self.total_files) * 100)
+                        status_msg = (f"已完成: {self.completed_files}, 跳过: {self.skipped_files}, "
+                                      f"失败: {self.failed_files} / 总计: {self.total_files}")
+                        self.progress_updated.emit(progress, status_msg)
+
+                    # 检查是否完成
+                    if finished >= self.total_files:
+                        self._complete_processing()
+                        return
+
+                # 每批只刷新一次总体进度
+                if live_updated:
+                    self._update_overall_progress()
 
         except Exception as e:
             # 静默处理通信错误，避免大量警告
@@ -513,62 +509,74 @@ class ProcessingController(QObject):
 
         # 在启动识别进程之前创建必要的队列
         # audio_queue 和 result_queue 必须在 recognition_worker 启动前就存在
+        perf = PerformanceConfig.auto_detect(detect_gpu=False)
         if self.audio_queue is None:
-            # 【性能优化】动态设置audio_queue容量，基于CPU核心数
-            cpu_cores = multiprocessing.cpu_count() or 1
-            physical_cores = cpu_cores // 2 if cpu_cores > 4 else cpu_cores
-            memory_gb = psutil.virtual_memory().total / (1024**3)
-
-            # 估算预处理进程数（与_start_pipeline_workers保持一致）
-            if memory_gb >= 32 and cpu_cores >= 16:
-                estimated_pre_proc = min(16, physical_cores)  # 优化：从12增加到16
-            elif memory_gb >= 16 and cpu_cores >= 8:
-                estimated_pre_proc = min(10, physical_cores)  # 优化：从8增加到10
-            else:
-                estimated_pre_proc = min(4, max(2, physical_cores // 2))
-
-            audio_queue_size = estimated_pre_proc * 2  # 优化：从固定4改为动态
-            self.audio_queue = self.manager.Queue(maxsize=audio_queue_size)
-            self.log_message.emit(f"⚙️ 性能优化：audio_queue容量 = {audio_queue_size} (基于{cpu_cores}核心)")
-
-        if self.result_queue is None:
-            self.result_queue = self.manager.Queue(maxsize=64)  # 【修复】设置合理容量避免内存溢出
+            # 【性能优化】动态设置audio_queue容量，基于预处理进程数（与_start_pipeline_workers保持一致）
+            audio_queue_size = perf.pre_proc_workers * perf.audio_queue_multiplier
+            # 【修复】result_queue 设置合理容量避免内存溢出
+            self.channels.create_recognition_queues(audio_queue_size, perf.result_queue_size)
+            self.audio_queue = self.channels.audio_queue
+            self.result_queue = self.channels.result_queue
+            self.log_message.emit(f"⚙️ 性能优化：audio_queue容量 = {audio_queue_size} (基于{perf.cpu_cores}核心)")
 
         self._change_state(ProcessingState.ENGINE_STARTING)
         self.log_message.emit(f"🚀 任务开始，正在启动识别引擎... (设备: {self.config.device.upper()})")
 
-        engine_config = {'device': self.config.device}
-        while not self.engine_status_queue.empty():
-            try: self.engine_status_queue.get_nowait()
-            except Exception: break
-
-        # 【性能优化】多进程识别：根据设备和显存决定进程数
-        num_recognition_workers = 1  # 默认1个
+        # 识别进程需要完整配置（跨文件批量识别、常驻引擎等参数）
+        engine_config = dict(self.config.__dict__)
 
+        # 【性能优化】多进程识别：GPU 按显存决定进程数，CPU 使用本机校准的 进程数 × 线程数
+        num_recognition_workers, recognition_threads = perf.recognition_layout(self.config.device)
         if self.config.device == 'cuda':
-            try:
-                import torch
-                if torch.cuda.is_available():
-                    gpu_memory_gb = torch.cuda.get_device_properties(0).total_memory / (1024**3)
-                    # 只有显存>=12GB才启用多进程识别
-                    if gpu_memory_gb >= 12:
-                        num_recognition_workers = 2
-                        self.log_message.emit(f"⚙️ 性能优化：GPU显存{gpu_memory_gb:.1f}GB，启用{num_recognition_workers}个识别进程")
-                    else:
-                        self.log_message.emit(f"⚙️ GPU显存{gpu_memory_gb:.1f}GB，保持1个识别进程")
-            except Exception as e:
-                self.log_message.emit(f"⚠️ 无法检测GPU显存，保持1个识别进程: {e}")
+            self.log_message.emit(f"⚙️ GPU显存{perf.gpu_memory_gb:.1f}GB，启用{num_recognition_workers}个识别进程")
+        elif perf.calibrated:
+            self.log_message.emit(f"⚙️ CPU校准结果：{num_recognition_workers} 个识别进程 × {recognition_threads} 线程")
+        else:
+            self.log_message.emit("⚙️ 本机尚未进行CPU校准（python cpu_calibration.py），使用1个识别进程")
+        if self.config.recognition_workers > 0:
+            num_recognition_workers = self.config.recognition_workers
+        if self.config.recognition_threads > 0:
+            recognition_threads = self.config.recognition_threads
+        engine_config['recognition_threads'] = recognition_threads
+
+        # 常驻引擎模式：识别进程只做转发，模型在 engine_service 守护进程中常驻，任务结束不卸载
+        if self.config.persistent_engine:
+            recognition_target = engine_bridge_worker
+            self.log_message.emit("⚙️ 使用常驻识别引擎，模型加载一次后跨任务复用")
+        else:
+            recognition_target = recognition_worker
+
+        recognition_args = (self.audio_queue, self.result_queue, self.log_queue, engine_config,
+                            self.engine_status_queue, self.progress_queue, self.pause_event)
+
+        # CPU 并行分段识别：长音频的语音片段分发给多个只加载 paraformer 的进程，协调者只能有一个
+        segment_workers = 0
+        if recognition_target is recognition_worker:
+            segment_workers = plan_segment_workers(self.config.segment_workers, self.config.device)
+        if segment_workers:
+            num_recognition_workers = 1
+        self.segment_processes = []
+        if segment_workers:
+            self.channels.create_segment_queues(segment_workers)
+            recognition_args += ((self.channels.segment_queue, self.channels.segment_result_queue),)
+            for i in range(segment_workers):
+                self.segment_processes.append(self.channels.start_process(
+                    segment_recognition_worker,
+                    (self.channels.segment_queue, self.channels.segment_result_queue, self.log_queue, engine_config),
+                    name=f"SegmentWorker-{i}"
+                ))
+            self.log_message.emit(f"⚙️ 并行分段识别：{segment_workers} 个进程，长于 {self.config.segment_min_duration_s:.0f}s 的音频并行识别")
+        elif self.config.segment_workers >= 2:
+            self.log_message.emit("⚠️ 并行分段识别仅支持本地CPU识别且需要足够内存，本次不启用")
 
         # 启动多个识别进程
         self.recognition_processes = []
         for i in range(num_recognition_workers):
-            process = multiprocessing.Process(
-                target=recognition_worker,
-                args=(self.audio_queue, self.result_queue, self.log_queue, engine_config, self.engine_status_queue, self.progress_queue, self.pause_event),
-                daemon=True,
+            process = self.channels.start_process(
+                recognition_target,
+                recognition_args,
                 name=f"RecognitionWorker-{i}"
             )
-            process.start()
             self.recognition_processes.append(process)
 
         self.log_message.emit(f"✅ 已启动 {num_recognition_workers} 个识别进程")
@@ -579,31 +587,13 @@ class ProcessingController(QObject):
         """启动流水线工作进程 - 优化版（修复重复队列创建bug）"""
         self._change_state(ProcessingState.PROCESSING)
 
-        # 断点续传：过滤已完成的文件
+        # 断点续传：按任务记录过滤已完成的文件（未记录过的文件才检查输出文件）
         files = self.config.input_files
         skipped_count = 0
+        job_store = self._open_job_store()
         if self.config.enable_resume:
-            def is_file_completed(file_path_str: str) -> bool:
-                """检查文件的所有输出产物是否都已存在"""
-                p = Path(file_path_str)
-                stem = p.stem
-                out_dir = p.parent
-                targets = []
-
-                # 根据配置检查各类输出文件
-                if self.config.generate_srt:     targets.append(out_dir / f"{stem}.srt")
-                if self.config.generate_srt_txt:  targets.append(out_dir / f"{stem}.srt.txt")
-                if self.config.generate_txt:     targets.append(out_dir / f"{stem}.txt")
-                if self.config.generate_json:    targets.append(out_dir / f"{stem}.json")
-                if self.config.generate_txt_md:      targets.append(out_dir / f"{stem}.md.txt")
-                if self.config.generate_docx:    targets.append(out_dir / f"{stem}.docx")
-                if self.config.generate_pdf:     targets.append(out_dir / f"{stem}.pdf")
-
-                # 所有目标文件都存在，且至少有一个目标文件
-                return all(t.exists() for t in targets) and len(targets) > 0
-
             original_count = len(files)
-            files = [f for f in files if not is_file_completed(f)]
+            files = filter_resumable(job_store, self.config, files)
             skipped_count = original_count - len(files)
 
             if skipped_count > 0:
@@ -620,24 +610,18 @@ class ProcessingController(QObject):
             self._complete_processing()
             return
 
-        # 智能计算工作进程数
-        cpu_cores = multiprocessing.cpu_count() or 1
-        physical_cores = cpu_cores // 2 if cpu_cores > 4 else cpu_cores
-        memory_gb = psutil.virtual_memory().total / (1024**3)
-
-        # 【性能优化】根据系统配置动态调整，更激进的并发配置
-        if memory_gb >= 32 and cpu_cores >= 16:
-            # 高性能系统
-            pre_proc_workers = min(16, physical_cores)  # 优化：从12增加到16
-            post_proc_workers = min(20, cpu_cores)      # 优化：从16增加到20
-        elif memory_gb >= 16 and cpu_cores >= 8:
-            # 中端系统
-            pre_proc_workers = min(10, physical_cores)  # 优化：从8增加到10
-            post_proc_workers = min(12, cpu_cores)      # 优化：从10增加到12
-        else:
-            # 入门系统
-            pre_proc_workers = min(4, max(2, physical_cores // 2))
-            post_proc_workers = min(6, max(2, cpu_cores // 2))
+        if job_store is not None:
+            try:
+                job_store.begin(files, output_key(self.config))
+            except Exception as e:
+                self.log_message.emit(f"⚠️ 任务记录写入失败: {e}")
+
+        # 智能计算工作进程数（分档表统一在 PerformanceConfig 中）
+        perf = PerformanceConfig.auto_detect(detect_gpu=False)
+        cpu_cores = perf.cpu_cores
+        memory_gb = perf.memory_gb
+        pre_proc_workers = perf.pre_proc_workers
+        post_proc_workers = perf.post_proc_workers
 
         # 考虑文件数量调整 - 使用过滤后的文件数
         if file_count < 5:
@@ -647,7 +631,8 @@ class ProcessingController(QObject):
         # 创建带背压控制的队列（基于进程数设置maxsize）
         # 让上游在队列满时阻塞等待，实现自然限速
         # 注意：audio_queue 和 result_queue 已经在 start_processing() 中创建
-        self.task_queue = self.manager.Queue(maxsize=pre_proc_workers * 2)
+        self.channels.create_task_queue(pre_proc_workers * perf.task_queue_multiplier)
+        self.task_queue = self.channels.task_queue
         # 【关键修复】不再重新创建 result_queue，避免识别进程和后处理进程使用不同的队列
         # result_queue 已在 start_processing() 中创建并传递给识别进程，此处复用即可
 
@@ -672,50 +657,135 @@ class ProcessingController(QObject):
         except Exception as e:
             self.log_message.emit(f"⚠️ 文件排序失败，使用原始顺序: {e}")
 
-        # 【修复】只添加一次任务到队列
-        for file_path in files:
-            self.task_queue.put(file_path)
-
         self.log_message.emit(f"⚙️ 系统配置: {cpu_cores}核心, {memory_gb:.1f}GB内存")
         self.log_message.emit(f"⚙️ 分配 {pre_proc_workers} 个预处理进程和 {post_proc_workers} 个后处理进程")
-        self.log_message.emit(f"⚙️ 队列容量: task={pre_proc_workers*2}, audio=4, result={post_proc_workers*4}")
+        self.log_message.emit(f"⚙️ 队列容量: task={pre_proc_workers * perf.task_queue_multiplier}, "
+                              f"audio={perf.pre_proc_workers * perf.audio_queue_multiplier}, result={perf.result_queue_size}")
         self.log_message.emit(f"⚙️ 待处理文件数: {len(files)}")
 
         try:
-            # 使用spawn方法确保进程隔离
-            ctx = multiprocessing.get_context('spawn')
-            self.pre_process_pool = ProcessPoolExecutor(max_workers=pre_proc_workers, mp_context=ctx)
-            
+            # 使用spawn方法确保进程隔离；原生队列需在创建进程时继承，因此不使用进程池
             # 启动预处理工作进程 - 传递FFmpeg信号量
             for i in range(pre_proc_workers):
-                self.pre_process_pool.submit(
-                    pre_processing_worker,
-                    self.task_queue,
-                    self.audio_queue,
-                    self.log_queue,
-                    self.progress_queue,
-                    self.config.__dict__,
-                    self.ffmpeg_semaphore,
-                    self.pause_event
-                )
-            
-            self.post_process_pool = ProcessPoolExecutor(max_workers=post_proc_workers, mp_context=ctx)
-            
+                self.pre_processes.append(self._start_pre_worker(i))
+
             # 启动后处理工作进程
             for i in range(post_proc_workers):
-                self.post_process_pool.submit(
-                    post_processing_worker,
-                    self.result_queue,
-                    self.log_queue,
-                    self.progress_queue,
-                    self.config.__dict__,
-                    self.pause_event
+                self.post_processes.append(self._start_post_worker(i))
+
+            # 自适应并发：上限为核心数（且不超过文件数），下限为1
+            if self.config.adaptive_concurrency:
+                limits = ConcurrencyLimits(
+                    pre_max=min(file_count, max(pre_proc_workers, cpu_cores)),
+                    post_max=min(file_count, max(post_proc_workers, cpu_cores)),
+                    ffmpeg_max=max(self.ffmpeg_concurrent, cpu_cores // 2),
                 )
+                self._adaptive = AdaptiveConcurrency(self.ffmpeg_concurrent, limits, post_proc_workers)
+                self._ffmpeg_throttle = SemaphoreThrottle(self.ffmpeg_semaphore, self.ffmpeg_concurrent)
+                self.adapt_timer.start(1000)
+
+            if self.config.telemetry_enabled or self.config.metrics_port:
+                self._start_telemetry()
+
+            # 【修复】任务由后台线程投递，task_queue 满时不会阻塞GUI线程
+            self._task_feeder = start_task_feeder(self.task_queue, files)
 
         except Exception as e:
-            self.error_occurred.emit("流水线启动失败", f"无法创建工作进程池: {e}")
+            self.error_occurred.emit("流水线启动失败", f"无法创建工作进程: {e}")
             self._cleanup_task_resources()
 
+    def _telemetry_dir(self) -> Path:
+        return Path(self.config.telemetry_dir) if self.config.telemetry_dir else Path(".") / "logs" / "telemetry"
+
+    def _start_telemetry(self):
+        """创建本次任务的阶段耗时遥测：明细写入 stage_timings_<时间>.jsonl"""
+        self._telemetry_stamp = time.strftime("%Y%m%d_%H%M%S")
+        jsonl_path = None
+        if self.config.telemetry_enabled:
+            jsonl_path = self._telemetry_dir() / f"stage_timings_{self._telemetry_stamp}.jsonl"
+        try:
+            self._telemetry = StageTelemetry(jsonl_path, self.config.metrics_port, log=self.log_message.emit)
+        except OSError as e:
+            self.log_message.emit(f"⚠️ 阶段耗时记录不可用: {e}")
+            self._telemetry = None
+
+    def _close_telemetry(self, report: bool):
+        """结束遥测；report 为 True 时输出各步骤耗时摘要并写出汇总 JSON"""
+        telemetry, self._telemetry = self._telemetry, None
+        if telemetry is None:
+            return
+        summary_path = None
+        if report:
+            text = telemetry.format_summary()
+            if text:
+                self.log_message.emit("⏱️ 各步骤耗时汇总:\n" + text)
+                if hasattr(self, '_logger'):
+                    self._logger.info("各步骤耗时汇总:\n" + text)
+            if telemetry.jsonl_path is not None:
+                summary_path = telemetry.jsonl_path.with_name(f"stage_summary_{self._telemetry_stamp}.json")
+        telemetry.close(summary_path)
+
+    def _start_pre_worker(self, index: int):
+        return self.channels.start_process(
+            pre_processing_worker,
+            (self.task_queue, self.audio_queue, self.log_queue, self.progress_queue,
+             self.config.__dict__, self.ffmpeg_semaphore, self.pause_event, self.result_queue,
+             self.channels.pre_retire),
+            name=f"PreProcessWorker-{index}"
+        )
+
+    def _start_post_worker(self, index: int):
+        return self.channels.start_process(
+            post_processing_worker,
+            (self.result_queue, self.log_queue, self.progress_queue, self.config.__dict__, self.pause_event,
+             self.channels.post_retire),
+            name=f"PostProcessWorker-{index}"
+        )
+
+    def _adapt_concurrency(self):
+        """按采样间隔检查队列深度和阶段耗时，增减预处理/后处理进程和FFmpeg许可"""
+        if self._adaptive is None or self.current_state != ProcessingState.PROCESSING:
+            return
+        self._ffmpeg_throttle.poll()
+        if time.monotonic() - self._adaptive.last_sample_at < self.config.adaptive_interval_s:
+            return
+        try:
+            sample = QueueSample(
+                task_depth=self.task_queue.qsize(),
+                audio_depth=self.audio_queue.qsize(),
+                audio_capacity=self.channels.audio_capacity,
+                result_depth=self.result_queue.qsize(),
+                result_capacity=self.channels.result_capacity,
+                pre_workers=sum(p.is_alive() for p in self.pre_processes) - self.channels.pre_retire.value,
+                post_workers=sum(p.is_alive() for p in self.post_processes) - self.channels.post_retire.value,
+                recognition_workers=max(1, len(self.recognition_processes)),
+            )
+        except NotImplementedError:
+            # macOS 上 multiprocessing.Queue.qsize 不可用
+            self.log_message.emit("⚠️ 当前平台无法读取队列深度，自适应并发已关闭")
+            self._adaptive = None
+            return
+
+        for target, delta, reason in self._adaptive.sample(sample):
+            if target == "pre":
+                if delta > 0:
+                    self.pre_processes.append(self._start_pre_worker(len(self.pre_processes)))
+                else:
+                    with self.channels.pre_retire.get_lock():
+                        self.channels.pre_retire.value += 1
+                label, value = "预处理进程", sample.pre_workers + delta
+            elif target == "post":
+                if delta > 0:
+                    self.post_processes.append(self._start_post_worker(len(self.post_processes)))
+                else:
+                    with self.channels.post_retire.get_lock():
+                        self.channels.post_retire.value += 1
+                label, value = "后处理进程", sample.post_workers + delta
+            else:
+                self._ffmpeg_throttle.resize(self._adaptive.ffmpeg_permits)
+                label, value = "FFmpeg并发", self._adaptive.ffmpeg_permits
+            self.log_message.emit(f"⚙️ 自适应并发: {label} → {value}，{reason}")
+
     def cancel_processing(self):
         if self.current_state not in [ProcessingState.ENGINE_STARTING, ProcessingState.PROCESSING]: return
         self.log_message.emit("🛑 用户请求取消处理...")
@@ -725,8 +795,10 @@ class ProcessingController(QObject):
     def _complete_processing(self):
         if self.is_cleaning_up: return
         self.log_message.emit("🎉 所有文件处理任务已完成！")
+        self._close_telemetry(report=True)
         self._change_state(ProcessingState.COMPLETED)
-        summary = {"summary": {"success": self.completed_files, "failed": self.failed_files}}
+        summary = {"summary": {"success": self.completed_files, "skipped": self.skipped_files,
+                               "failed": self.failed_files}}
         self.processing_completed.emit(summary)
         self._cleanup_task_resources()
 
@@ -741,60 +813,52 @@ class ProcessingController(QObject):
         self.is_cleaning_up = True
         self.pause_event.set()
         
-        # 停止队列检查，避免清理过程中的管道错误
-        if hasattr(self, 'queue_check_timer'):
-            self.queue_check_timer.stop()
+        # 停止事件分发，避免清理过程中的管道错误
+        self.adapt_timer.stop()
+        self._stop_dispatcher()
         self.log_message.emit("🧹 正在清理当前任务资源...")
 
-        # 1. 优雅关闭进程池
-        if self.pre_process_pool:
+        # 1. 停止任务投递并关闭工作进程
+        if self._task_feeder is not None:
+            self._task_feeder.stop_event.set()
+            self._task_feeder = None
+
+        if self.pre_processes:
             try:
-                self.pre_process_pool.shutdown(wait=False, cancel_futures=True)
-                self.log_message.emit("   - 预处理池已关闭")
+                stop_processes(self.pre_processes, timeout=0.1)
+                self.log_message.emit("   - 预处理进程已关闭")
             except Exception as e:
-                self.log_message.emit(f"   - 预处理池关闭异常: {e}")
+                self.log_message.emit(f"   - 预处理进程关闭异常: {e}")
 
-        if self.post_process_pool:
+        if self.post_processes:
             try:
                 # 发送结束信号
-                max_workers = getattr(self.post_process_pool, '_max_workers', 8)
-                for _ in range(max_workers):
-                    try: 
-                        self.result_queue.put(None, timeout=0.1)
-                    except: 
-                        pass
-                self.post_process_pool.shutdown(wait=False, cancel_futures=True)
-                self.log_message.emit("   - 后处理池已关闭")
+                put_sentinels(self.result_queue, len(self.post_processes))
+                stop_processes(self.post_processes, timeout=0.5)
+                self.log_message.emit("   - 后处理进程已关闭")
             except Exception as e:
-                self.log_message.emit(f"   - 后处理池关闭异常: {e}")
+                self.log_message.emit(f"   - 后处理进程关闭异常: {e}")
 
         # 2. 关闭识别进程（支持多进程）
         if self.recognition_processes:
             try:
-                # 向每个识别进程发送停止信号
-                for _ in self.recognition_processes:
-                    try:
-                        self.audio_queue.put(None, timeout=0.1)
-                    except:
-                        pass
-
-                # 等待所有识别进程结束
-                for i, process in enumerate(self.recognition_processes):
-                    if process.is_alive():
-                        process.join(timeout=2)
-                        if process.is_alive():
-                            process.terminate()
-                            self.log_message.emit(f"   - 识别进程 {i} 已强制终止")
+                # 向每个识别进程发送停止信号，等待结束，超时强制终止
+                put_sentinels(self.audio_queue, len(self.recognition_processes))
+                for name in stop_processes(self.recognition_processes, timeout=2):
+                    self.log_message.emit(f"   - 识别进程 {name} 已强制终止")
             except Exception as e:
                 self.log_message.emit(f"   - 识别进程关闭异常: {e}")
 
-        # 3. 清空所有队列 - 静默处理
-        for q in [self.task_queue, self.audio_queue, self.result_queue, self.progress_queue, self.log_queue, self.engine_status_queue]:
+        if self.segment_processes:
             try:
-                while not q.empty():
-                    q.get_nowait()
-            except:
-                pass
+                put_sentinels(self.channels.segment_queue, len(self.segment_processes))
+                for name in stop_processes(self.segment_processes, timeout=2):
+                    self.log_message.emit(f"   - 分段识别进程 {name} 已强制终止")
+            except Exception as e:
+                self.log_message.emit(f"   - 分段识别进程关闭异常: {e}")
+
+        # 3. 清空并关闭所有队列 - 静默处理
+        self.channels.close()
 
         # 4. 强制关闭残留进程
         try:
@@ -823,13 +887,16 @@ class ProcessingController(QObject):
 
         # 6. 重置状态
         self.recognition_processes = []  # 清空识别进程列表
+        self.segment_processes = []
         self._engine_ready = False
-        self.pre_process_pool = None
-        self.post_process_pool = None
-
-        # 7. 恢复队列检查定时器
-        if hasattr(self, 'queue_check_timer') and not self._is_shutting_down:
-            self.queue_check_timer.start(500)
+        self.pre_processes = []
+        self.post_processes = []
+        self._adaptive = None
+        self._ffmpeg_throttle = None
+        self._close_telemetry(report=False)
+        # 7. 新建通道并恢复事件分发（应用关闭时不再需要）
+        if not self._is_shutting_down:
+            self._create_channels()
 
         if self.current_state not in [ProcessingState.COMPLETED, ProcessingState.CANCELLED, ProcessingState.ERROR]:
             self._change_state(ProcessingState.IDLE)
@@ -844,8 +911,7 @@ class ProcessingController(QObject):
         self._is_shutting_down = True
         self.pause_event.set()
         self.log_message.emit("应用正在关闭，执行最后清理...")
-        if hasattr(self, 'queue_check_timer'):
-            self.queue_check_timer.stop()
+        self.adapt_timer.stop()
         if hasattr(self, 'memory_monitor_timer'):
             self.memory_monitor_timer.stop()
         self.resource_monitor.stop_monitoring()
@@ -854,10 +920,14 @@ class ProcessingController(QObject):
             self.cancel_processing()
         else:
             self._cleanup_task_resources()
-        
-        try:
-            self.manager.shutdown()
-        except Exception as e:
-            self.log_message.emit(f"关闭进程管理器时出错: {e}")
-        
+
+        self._stop_dispatcher()
+        self.channels.close()
+        if self._job_store is not None:
+            self._job_store.close()
+            self._job_store = None
+        if getattr(self, '_log_listener', None) is not None:
+            self._log_listener.stop()  # 写完队列中剩余的文件日志
+            self._log_listener = None
+
         self.log_message.emit("所有后台服务已关闭。")
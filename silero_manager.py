@@ -1,10 +1,10 @@
 """
 Silero VAD 模型管理器
 支持本地模型加载和 PyTorch Hub 回退
+模型加载后缓存在管理器中；工作进程通过 model_registry 取用（每个进程只加载一次）
 """
 import os
 import sys
-import torch
 from pathlib import Path
 
 
@@ -27,6 +27,7 @@ class SileroManager:
         self.local_model_dir = project_root / "model_cache" / "silero-vad"
         self.model = None
         self.utils = None
+        self._hub_ready = False
 
     def is_local_model_available(self):
         """检查本地模型是否可用"""
@@ -37,12 +38,18 @@ class SileroManager:
         ]
         return all(f.exists() for f in required_files)
 
-    def load_model(self, force_local=False):
+    @property
+    def ffsubsync_hub_dir(self):
+        """ffsubsync 通过 torch.hub.load('snakers4/silero-vad') 查找模型的缓存目录"""
+        return Path.home() / ".cache" / "torch" / "hub" / "snakers4_silero-vad_master"
+
+    def load_model(self, force_local=False, force_reload=False):
         """
-        加载 Silero VAD 模型
+        加载 Silero VAD 模型（已加载时直接返回缓存的模型）
 
         Args:
             force_local: 强制使用本地模型（不回退到 PyTorch Hub）
+            force_reload: 忽略已加载的模型，重新加载
 
         Returns:
             tuple: (model, utils) - 模型对象和工具函数
@@ -50,6 +57,11 @@ class SileroManager:
         Raises:
             RuntimeError: 当 force_local=True 但本地模型不可用时
         """
+        if self.model is not None and not force_reload:
+            return self.model, self.utils
+
+        import torch
+
         # 优先尝试本地模型
         if self.is_local_model_available():
             try:
@@ -111,14 +123,16 @@ class SileroManager:
         Returns:
             bool: 设置是否成功
         """
+        if self._hub_ready and self.ffsubsync_hub_dir.exists():
+            return True
         if not self.is_local_model_available():
             print("[Silero] 本地模型不可用，FFSubSync 将使用 PyTorch Hub")
             return False
 
         try:
             # 方法1: 设置 TORCH_HOME 环境变量（推荐）
-            torch_hub_dir = Path.home() / ".cache" / "torch" / "hub"
-            target_dir = torch_hub_dir / "snakers4_silero-vad_master"
+            target_dir = self.ffsubsync_hub_dir
+            target_dir.parent.mkdir(parents=True, exist_ok=True)
 
             # 如果目标目录不存在或为空，创建符号链接
             if not target_dir.exists() or not any(target_dir.iterdir()):
@@ -139,6 +153,7 @@ class SileroManager:
             else:
                 print("[Silero] PyTorch Hub 缓存已存在，跳过设置")
 
+            self._hub_ready = True
             return True
 
         except Exception as e:
@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+"""
+识别前的语音门控
+没有音频流、全程静音或没有人声的文件（批量屏幕录像很常见）仍会完整跑一次 model.generate，
+占用唯一的识别进程。预处理阶段先做廉价检查，判定无语音的文件直接以空结果交给后处理：
+
+1. 电平（audio_levels，已在提取后计算）：确定 VAD 要扫描的区间
+   - 正常文件只扫描非静音窗口
+   - 电平极低的文件（平均低于 -60dB 或没有非静音窗口）可能只是录音音量小，扫描所有非数字静音的窗口，
+     并先把每段放大到正常电平再交给 VAD
+2. VAD：Silero VAD（model_registry 中每个进程常驻一份，第一个到达门控的文件才加载）统计语音时长
+
+只有 VAD 确认没有人声才跳过：电平再低也不单独作为跳过依据；Silero 不可用、未启用 VAD 或
+待扫描部分过长（超过 max_scan_s）时不跳过，交给识别引擎处理。
+"""
+from dataclasses import dataclass
+from typing import Callable, List, Optional, Tuple
+
+from asr_engine import PCM_SAMPLE_RATE
+from audio_levels import AudioLevels, SILENT_WINDOW_DB, SILENCE_FLOOR_DB
+from model_registry import try_get_model
+
+# 低电平文件送入 VAD 前放大到的峰值（约 -6 dBFS）
+_QUIET_TARGET_PEAK = 0.5
+
+
+@dataclass
+class GateDecision:
+    skip: bool
+    reason: str = ""
+    speech_s: Optional[float] = None  # VAD 检出的语音时长（未运行 VAD 时为 None）
+    scanned_s: float = 0.0  # VAD 扫描的音频时长
+
+
+def voiced_runs(levels: AudioLevels, threshold_db: float = SILENT_WINDOW_DB) -> List[Tuple[int, int]]:
+    """电平不低于 threshold_db 的窗口合并成的连续区间 [start_ms, end_ms)"""
+    runs = []
+    window_ms = int(levels.window_s * 1000)
+    for idx, db in enumerate(levels.window_rms_db):
+        if db < threshold_db:
+            continue
+        start = idx * window_ms
+        if runs and runs[-1][1] == start:
+            runs[-1] = (runs[-1][0], start + window_ms)
+        else:
+            runs.append((start, start + window_ms))
+    return runs
+
+
+def check_speech(levels: Optional[AudioLevels], read_pcm: Callable[[int, int], bytes],
+                 log: Optional[Callable[[str], None]] = None, use_vad: bool = True,
+                 min_speech_s: float = 0.5, max_scan_s: float = 900.0) -> GateDecision:
+    """
+    判断提取出的音频是否值得送去识别
+
+    Args:
+        levels: audio_levels 的分析结果（None 表示分析失败，此时不拦截）
+        read_pcm: 读取 [start_ms, start_ms + duration_ms) 的 s16le PCM
+        min_speech_s: VAD 检出的语音少于该时长视为无语音
+        max_scan_s: 非静音部分超过该时长时跳过 VAD
+    """
+    if levels is None or not use_vad:
+        return GateDecision(skip=False)
+
+    quiet = levels.is_silent
+    # 电平极低时扫描所有非数字静音的窗口（只有纯数字静音的文件扫描范围为空）
+    runs = voiced_runs(levels, SILENCE_FLOOR_DB + 1.0) if quiet else voiced_runs(levels)
+    voiced_s = sum(end - start for start, end in runs) / 1000.0
+    if voiced_s > max_scan_s:
+        return GateDecision(skip=False)
+
+    vad = try_get_model("silero_vad", log)
+    if vad is None:
+        return GateDecision(skip=False)
+    model, get_speech_timestamps = vad
+
+    import numpy as np
+    import torch
+    speech_samples = 0
+    for start_ms, end_ms in runs:
+        pcm = read_pcm(start_ms, end_ms - start_ms)
+        if not pcm:
+            continue
+        waveform = torch.from_numpy(np.frombuffer(pcm, dtype=np.int16).astype(np.float32) / 32768.0)
+        if quiet:
+            peak = float(waveform.abs().max())
+            if peak > 0:
+                waveform = waveform * (_QUIET_TARGET_PEAK / peak)
+        for segment in get_speech_timestamps(waveform, model, sampling_rate=PCM_SAMPLE_RATE):
+            speech_samples += segment['end'] - segment['start']
+        model.reset_states()
+        if speech_samples / PCM_SAMPLE_RATE >= min_speech_s:
+            # 已确认有语音，无需扫描剩余部分
+            return GateDecision(skip=False, speech_s=speech_samples / PCM_SAMPLE_RATE, scanned_s=voiced_s)
+
+    speech_s = speech_samples / PCM_SAMPLE_RATE
+    if quiet:
+        reason = f"音频电平极低 (平均 {levels.mean_volume_db:.1f} dB) 且未检测到人声 (VAD 语音 {speech_s:.1f}s)"
+    else:
+        reason = f"未检测到人声 (VAD 语音 {speech_s:.1f}s / 非静音 {voiced_s:.1f}s)"
+    return GateDecision(skip=True, reason=reason, speech_s=speech_s, scanned_s=voiced_s)
@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+"""
+阶段检查点（任务缓存目录）
+程序在识别之后、后处理完成之前退出时，断点续传只看到输出文件缺失，会从 FFmpeg 提取和识别重新开始。
+各阶段完成后把中间结果写入任务缓存目录，重新处理时从第一个未完成的阶段进入流水线：
+
+    model_cache/job_cache/<源文件路径哈希>/
+        meta.json     源文件路径、大小、修改时间；WAV 模式下提取出的音频路径、长音频识别的暂存文件路径
+        audio.pcm     提取出的 16kHz s16le PCM（内存音频模式）
+        result.json   原始识别结果 rec_result
+        asr_partial.jsonl / asr_partial.srt   长音频分段识别的暂存文件和增量字幕（asr_chunking）
+
+- 有识别结果：跳过提取和识别，直接进入后处理
+- 只有音频：跳过 CFR 转换和音频提取，从电平分析/语音门控/识别继续
+- 后处理成功后删除该文件的目录；源文件大小或修改时间变化时检查点作废
+
+ffprobe 结果已由 probe_cache 跨会话保存，这里不再重复保存。写入先写临时文件再改名，进程中途退出不会留下半个文件。
+本模块只导入标准库。
+"""
+import hashlib
+import json
+import os
+import shutil
+import wave
+from pathlib import Path
+from typing import Optional, Tuple
+
+from app_env import get_project_root
+from asr_engine import PCM_SAMPLE_RATE
+
+
+def default_job_cache_dir() -> Path:
+    return get_project_root() / "model_cache" / "job_cache"
+
+
+def _job_dir_name(source_path: str) -> str:
+    return hashlib.blake2b(source_path.encode('utf-8'), digest_size=12).hexdigest()
+
+
+def job_dir(config: dict, source_path: str) -> Path:
+    """源文件在任务缓存目录中的子目录（不论是否启用检查点，长音频识别的暂存文件都放在这里）"""
+    root = Path(config.get('job_cache_dir') or default_job_cache_dir())
+    return root / _job_dir_name(str(Path(source_path).resolve()))
+
+
+def _source_stat(path: str) -> Optional[Tuple[int, int]]:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_size, st.st_mtime_ns
+
+
+def _write_atomic(path: Path, data: bytes):
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+class StageCheckpoint:
+    """一个源文件的检查点目录"""
+
+    def __init__(self, root: Path, source_path: str):
+        self.source_path = str(Path(source_path).resolve())
+        self.dir = Path(root) / _job_dir_name(self.source_path)
+        self._meta_path = self.dir / "meta.json"
+        self._meta = self._load_meta()
+
+    def _load_meta(self) -> dict:
+        """读取 meta.json，源文件已变化时清空目录"""
+        stat = _source_stat(self.source_path)
+        try:
+            meta = json.loads(self._meta_path.read_text(encoding='utf-8'))
+        except (OSError, ValueError):
+            meta = None
+        if meta is not None and stat is not None and meta.get("source") == self.source_path \
+                and (meta.get("size"), meta.get("mtime_ns")) == stat:
+            return meta
+        if meta is not None:
+            self.clear()
+        return {"source": self.source_path, "size": stat[0] if stat else None,
+                "mtime_ns": stat[1] if stat else None}
+
+    def _save_meta(self):
+        self.dir.mkdir(parents=True, exist_ok=True)
+        _write_atomic(self._meta_path, json.dumps(self._meta, ensure_ascii=False).encode('utf-8'))
+
+    # --- 识别结果 ---
+    def save_result(self, rec_result: Optional[list], spool_path: Optional[str] = None):
+        """识别完成：保存原始结果（长音频分段识别只记录暂存文件路径）"""
+        if isinstance(rec_result, list):
+            self.dir.mkdir(parents=True, exist_ok=True)
+            _write_atomic(self.dir / "result.json", json.dumps(rec_result, ensure_ascii=False).encode('utf-8'))
+        elif spool_path:
+            self._meta["spool_path"] = str(spool_path)
+            self._save_meta()
+            return
+        else:
+            return
+        self._save_meta()
+
+    def load_result(self) -> Tuple[Optional[list], Optional[str]]:
+        """返回 (rec_result, 暂存文件路径)，没有可用的识别结果时均为 None"""
+        try:
+            return json.loads((self.dir / "result.json").read_text(encoding='utf-8')), None
+        except (OSError, ValueError):
+            pass
+        spool_path = self._meta.get("spool_path")
+        if spool_path and Path(spool_path).exists():
+            return None, spool_path
+        return None, None
+
+    # --- 提取的音频 ---
+    def save_audio(self, pcm: Optional[bytes] = None, wav_path: Optional[str] = None):
+        """音频提取完成：内存模式保存 PCM，WAV 模式只记录已在磁盘上的 WAV 路径"""
+        if pcm:
+            self.dir.mkdir(parents=True, exist_ok=True)
+            _write_atomic(self.dir / "audio.pcm", pcm)
+        elif wav_path:
+            self._meta["wav_path"] = str(wav_path)
+        else:
+            return
+        self._save_meta()
+
+    def restore_audio(self, in_memory: bool, wav_target: Path):
+        """
+        取回上次提取的音频
+        内存模式返回 PCM 字节；WAV 模式保证 wav_target 存在并返回其路径；没有可用的音频时返回 None
+        """
+        pcm_path = self.dir / "audio.pcm"
+        wav_path = self._meta.get("wav_path")
+        wav_ok = bool(wav_path) and Path(wav_path).exists()
+        if in_memory:
+            if pcm_path.exists():
+                return pcm_path.read_bytes()
+            if wav_ok:
+                with wave.open(wav_path, 'rb') as wav_file:
+                    return wav_file.readframes(wav_file.getnframes())
+            return None
+        if wav_ok and Path(wav_path) == Path(wav_target):
+            return str(wav_target)
+        if pcm_path.exists():
+            with wave.open(str(wav_target), 'wb') as wav_file:
+                wav_file.setnchannels(1)
+                wav_file.setsampwidth(2)
+                wav_file.setframerate(PCM_SAMPLE_RATE)
+                wav_file.writeframes(pcm_path.read_bytes())
+            return str(wav_target)
+        return None
+
+    def clear(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+
+def open_checkpoint(config: dict, source_path: str) -> Optional[StageCheckpoint]:
+    """按配置打开源文件的检查点，未启用或出错时返回 None"""
+    if not config.get('stage_checkpoints', True):
+        return None
+    try:
+        return StageCheckpoint(Path(config.get('job_cache_dir') or default_job_cache_dir()), source_path)
+    except Exception:
+        return None
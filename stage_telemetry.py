@@ -0,0 +1,225 @@
+# -*- coding: utf-8 -*-
+"""
+分阶段耗时遥测
+以前各阶段耗时只出现在日志文本里（"⏱️ [性能] ... ffprobe=...s"），识别耗时根本没有记录。
+这里统一定义结构化的阶段事件，并在控制端汇总：
+
+- 工作进程每处理完一个文件，把本阶段内各步骤的耗时放进一条 stage 事件经 progress_queue 上报：
+  {"kind": "stage", "stage": "pre"|"asr"|"post", "file": ..., "media_s": 媒体时长,
+   "total": 本阶段总耗时, "timings": {"probe": 1.2, "extract": 8.5, ...}}
+- StageTelemetry 把每个步骤的耗时和实时率（耗时 / 媒体时长）累计到直方图，
+  逐条写入 JSON Lines 文件，任务结束时写出汇总；可选提供 Prometheus 文本格式的 /metrics 端点
+
+步骤名称:
+    pre:  probe, cfr, extract, levels, speech_gate
+    asr:  queue_wait, asr, vad, punctuation（后两者仅并行分段识别时单独计时）
+    post: queue_wait, srt, srt_txt, txt, md, json, docx, pdf, ffsubsync
+"""
+import json
+import time
+import threading
+from pathlib import Path
+from typing import Dict, Optional
+
+# 耗时直方图的桶边界（秒）
+SECONDS_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800, 3600)
+# 实时率直方图的桶边界（耗时 / 媒体时长）
+RTF_BUCKETS = (0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1, 2, 5)
+
+
+def stage_event(stage: str, file: str, total: float, timings: Dict[str, float],
+                media_s: Optional[float] = None) -> dict:
+    """构造一条阶段事件（工作进程中调用）"""
+    return {
+        "kind": "stage",
+        "stage": stage,
+        "file": file,
+        "media_s": media_s,
+        "total": round(total, 4),
+        "timings": {name: round(seconds, 4) for name, seconds in timings.items() if seconds is not None},
+    }
+
+
+class Histogram:
+    """累计直方图（Prometheus 语义：每个桶计数包含更小的桶）"""
+
+    def __init__(self, buckets):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * len(self.buckets)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+        for idx, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[idx] += 1
+
+    def quantile(self, q: float) -> Optional[float]:
+        """按桶估计分位数（返回所在桶的上边界）"""
+        if self.count == 0:
+            return None
+        target = q * self.count
+        for bound, cumulative in zip(self.buckets, self.counts):
+            if cumulative >= target:
+                return bound
+        return self.max
+
+    def to_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 3),
+            "mean": round(self.sum / self.count, 4) if self.count else None,
+            "max": round(self.max, 4),
+            "p50": self.quantile(0.5),
+            "p90": self.quantile(0.9),
+            "p99": self.quantile(0.99),
+            "buckets": dict(zip((str(b) for b in self.buckets), self.counts)),
+        }
+
+
+class StageTelemetry:
+    """汇总阶段事件：直方图 + JSON Lines 明细 + 可选 Prometheus 端点（线程安全）"""
+
+    def __init__(self, jsonl_path: Optional[str] = None, prometheus_port: int = 0, log=None):
+        self._lock = threading.Lock()
+        self._seconds: Dict[str, Histogram] = {}
+        self._rtf: Dict[str, Histogram] = {}
+        self._files: Dict[str, int] = {}
+        self._started_at = time.time()
+        self._log = log or (lambda message: None)
+        self.jsonl_path = Path(jsonl_path) if jsonl_path else None
+        self._jsonl = None
+        if self.jsonl_path is not None:
+            self.jsonl_path.parent.mkdir(parents=True, exist_ok=True)
+            self._jsonl = open(self.jsonl_path, 'a', encoding='utf-8')
+        self._server = None
+        if prometheus_port:
+            self._start_prometheus(prometheus_port)
+
+    def record(self, event: dict):
+        """记录一条 stage 事件"""
+        stage = event.get("stage", "")
+        media_s = event.get("media_s") or 0
+        items = dict(event.get("timings") or {})
+        if event.get("total") is not None:
+            items["total"] = event["total"]
+        with self._lock:
+            self._files[stage] = self._files.get(stage, 0) + 1
+            for name, seconds in items.items():
+                key = f"{stage}.{name}"
+                self._seconds.setdefault(key, Histogram(SECONDS_BUCKETS)).observe(seconds)
+                if media_s > 0:
+                    self._rtf.setdefault(key, Histogram(RTF_BUCKETS)).observe(seconds / media_s)
+            if self._jsonl is not None:
+                record = dict(event, ts=round(time.time(), 3))
+                record.pop("kind", None)
+                if media_s > 0 and event.get("total") is not None:
+                    record["rtf"] = round(event["total"] / media_s, 4)
+                self._jsonl.write(json.dumps(record, ensure_ascii=False) + "\n")
+                self._jsonl.flush()
+
+    def summary(self) -> dict:
+        with self._lock:
+            return {
+                "elapsed_s": round(time.time() - self._started_at, 3),
+                "files": dict(self._files),
+                "seconds": {key: h.to_dict() for key, h in sorted(self._seconds.items())},
+                "rtf": {key: h.to_dict() for key, h in sorted(self._rtf.items())},
+            }
+
+    def brief(self) -> dict:
+        """精简汇总（不含桶计数）：{"pre.extract": {"count", "sum", "mean", "p90", "max", "rtf"}, ...}"""
+        data = self.summary()
+        result = {}
+        for key, h in data["seconds"].items():
+            item = {name: h[name] for name in ("count", "sum", "mean", "p90", "max")}
+            item["rtf"] = data["rtf"].get(key, {}).get("mean")
+            result[key] = item
+        return result
+
+    def format_summary(self) -> str:
+        """按总耗时排序的可读摘要（每个步骤一行）"""
+        data = self.summary()
+        lines = []
+        for key, h in sorted(data["seconds"].items(), key=lambda kv: -kv[1]["sum"]):
+            if key.endswith(".total"):
+                continue
+            rtf = data["rtf"].get(key, {}).get("mean")
+            rtf_txt = f", RTF {rtf:.3f}" if rtf is not None else ""
+            lines.append(f"   - {key}: 共 {h['sum']:.1f}s / {h['count']} 次, 平均 {h['mean']:.2f}s, "
+                         f"P90 ≤{h['p90']}s{rtf_txt}")
+        return "\n".join(lines)
+
+    def prometheus_text(self) -> str:
+        """Prometheus 文本格式"""
+        out = []
+
+        def emit_histogram(name: str, help_text: str, histograms: Dict[str, Histogram]):
+            out.append(f"# HELP {name} {help_text}")
+            out.append(f"# TYPE {name} histogram")
+            for key, h in sorted(histograms.items()):
+                stage, _, step = key.partition(".")
+                labels = f'stage="{stage}",step="{step}"'
+                for bound, cumulative in zip(h.buckets, h.counts):
+                    out.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+                out.append(f'{name}_bucket{{{labels},le="+Inf"}} {h.count}')
+                out.append(f"{name}_sum{{{labels}}} {h.sum:.6f}")
+                out.append(f"{name}_count{{{labels}}} {h.count}")
+
+        with self._lock:
+            emit_histogram("funasr_stage_seconds", "Per-file wall time of each pipeline step", self._seconds)
+            emit_histogram("funasr_stage_rtf", "Per-file real-time factor of each pipeline step", self._rtf)
+            out.append("# HELP funasr_stage_files_total Files that finished each stage")
+            out.append("# TYPE funasr_stage_files_total counter")
+            for stage, count in sorted(self._files.items()):
+                out.append(f'funasr_stage_files_total{{stage="{stage}"}} {count}')
+        return "\n".join(out) + "\n"
+
+    def _start_prometheus(self, port: int):
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        telemetry = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = telemetry.prometheus_text().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        try:
+            self._server = ThreadingHTTPServer(("127.0.0.1", port), MetricsHandler)
+        except OSError as e:
+            self._log(f"⚠️ 无法启动 Prometheus 指标端点（端口 {port}）: {e}")
+            return
+        threading.Thread(target=self._server.serve_forever, daemon=True, name="MetricsServer").start()
+        self._log(f"⚙️ Prometheus 指标端点: http://127.0.0.1:{port}/metrics")
+
+    def close(self, summary_path: Optional[str] = None):
+        """关闭明细文件和指标端点；summary_path 不为空时写出汇总 JSON"""
+        if summary_path:
+            try:
+                Path(summary_path).parent.mkdir(parents=True, exist_ok=True)
+                with open(summary_path, 'w', encoding='utf-8') as f:
+                    json.dump(self.summary(), f, ensure_ascii=False, indent=2)
+            except OSError as e:
+                self._log(f"⚠️ 写入耗时汇总失败: {e}")
+        with self._lock:
+            if self._jsonl is not None:
+                self._jsonl.close()
+                self._jsonl = None
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
@@ -0,0 +1,282 @@
+# -*- coding: utf-8 -*-
+"""
+进程内字幕精校（以库方式调用 ffsubsync）
+原来后处理为每个 SRT 启动一次 ffsubsync 命令：新的解释器、经 torch.hub 重新加载 Silero、
+再把整段视频解码一遍做 VAD，而预处理阶段早已提取出 16kHz PCM。这里拆成两步：
+
+1. 参考语音轨：预处理阶段在已提取的 PCM 上运行 VAD（silero 使用 model_registry 中与语音门控共用的模型，webrtc 使用 webrtcvad），
+   只扫描非静音窗口，得到 100Hz 的 0/1 语音序列（每小时约 360KB），随任务传给后处理，并按源文件指纹缓存
+2. 对齐：后处理进程内用 ffsubsync 的 FFTAligner/MaxScoreAligner 把 SRT 与参考语音轨对齐，平移（及帧率缩放）后写出
+
+内置对齐后端（native）不依赖 ffsubsync：字幕的开/关序列直接取自识别结果 sentence_info 的时间戳，
+与参考语音轨做 NumPy FFT 互相关，返回以毫秒计的偏移和帧率比，改写时间戳后重新写出 SRT，几乎没有额外开销。
+
+本模块顶层只导入标准库；没有参考语音轨（auditok、缓存命中但语音轨未缓存）或 ffsubsync 库不可用时，
+调用方回退到 ffsubsync 命令。
+"""
+import copy
+import math
+from dataclasses import dataclass
+from typing import Callable, List, Optional, Tuple
+
+from asr_engine import PCM_SAMPLE_RATE
+
+TRACK_RATE = 100  # 参考语音轨每秒的帧数（与 ffsubsync.constants.SAMPLE_RATE 相同）
+IN_PROCESS_VADS = ("silero", "webrtc")  # 可在进程内生成参考语音轨的 VAD
+DEFAULT_MAX_OFFSET_S = 60  # 与 ffsubsync 命令的默认值相同
+SRT_ENCODING = "utf-8"  # 流水线写出的 SRT 均为 UTF-8
+SYNC_BACKENDS = ("ffsubsync", "native")
+FRAMERATE_RATIOS = (24.0 / 23.976, 25.0 / 23.976, 25.0 / 24.0)  # 内置对齐尝试的帧率比（及其倒数），与 ffsubsync 相同
+
+_SCAN_PIECE_MS = 600_000  # 单次送入 VAD 的最长音频（毫秒），限制内存占用
+_SAMPLES_PER_FRAME = PCM_SAMPLE_RATE // TRACK_RATE
+
+_webrtc_vad = None
+
+
+class SyncFailed(Exception):
+    """ffsubsync 未找到可靠的对齐（最大偏移范围内没有候选）"""
+
+
+@dataclass
+class SyncResult:
+    offset_s: float
+    scale_factor: float
+    score: float
+
+
+@dataclass
+class NativeSyncResult:
+    offset_ms: int  # 字幕整体平移（毫秒，正数为推后）
+    ratio: float  # 帧率比：校正后时间 = 原时间 × ratio + offset_ms
+    score: float  # 互相关峰值（与 ffsubsync 得分同一量纲）
+    drift_ms: int  # 帧率比在最后一句处造成的时间校正（毫秒）
+
+
+def track_cache_key(file_key: Optional[str], vad: str) -> Optional[str]:
+    """参考语音轨的缓存键：源文件指纹 + VAD 名称"""
+    if not file_key:
+        return None
+    return f"track:{vad}:{file_key.split(':', 1)[-1]}"
+
+
+def _scan_ranges(levels, total_ms: int) -> List[Tuple[int, int]]:
+    """需要运行 VAD 的区间 [start_ms, end_ms)：电平分析可用时只取非静音窗口，过长的区间按 _SCAN_PIECE_MS 切开"""
+    if levels is not None and levels.window_rms_db:
+        from speech_gate import voiced_runs
+        runs = voiced_runs(levels)
+    else:
+        runs = [(0, total_ms)]
+    ranges = []
+    for start, end in runs:
+        end = min(end, total_ms)
+        while start < end:
+            ranges.append((start, min(end, start + _SCAN_PIECE_MS)))
+            start += _SCAN_PIECE_MS
+    return ranges
+
+
+def _mark_silero(track: bytearray, read_pcm, ranges, log) -> bool:
+    from model_registry import try_get_model
+    vad = try_get_model("silero_vad", log)
+    if vad is None:
+        return False
+    model, get_speech_timestamps = vad
+
+    import numpy as np
+    import torch
+    for start_ms, end_ms in ranges:
+        pcm = read_pcm(start_ms, end_ms - start_ms)
+        if not pcm:
+            continue
+        base = start_ms * PCM_SAMPLE_RATE // 1000
+        waveform = torch.from_numpy(np.frombuffer(pcm, dtype=np.int16).astype(np.float32) / 32768.0)
+        for segment in get_speech_timestamps(waveform, model, sampling_rate=PCM_SAMPLE_RATE):
+            first = (base + segment['start']) // _SAMPLES_PER_FRAME
+            last = min(len(track), -(-(base + segment['end']) // _SAMPLES_PER_FRAME))
+            track[first:last] = b'\x01' * max(0, last - first)
+        model.reset_states()
+    return True
+
+
+def _mark_webrtc(track: bytearray, read_pcm, ranges, log) -> bool:
+    global _webrtc_vad
+    if _webrtc_vad is None:
+        try:
+            import webrtcvad
+            _webrtc_vad = webrtcvad.Vad(3)  # 与 ffsubsync 相同的最严格模式
+        except Exception as e:
+            _webrtc_vad = False
+            if log is not None:
+                log(f"      - ⚠️ webrtcvad 不可用: {e}")
+    if not _webrtc_vad:
+        return False
+
+    frame_bytes = _SAMPLES_PER_FRAME * 2
+    for start_ms, end_ms in ranges:
+        pcm = read_pcm(start_ms, end_ms - start_ms)
+        base = start_ms * TRACK_RATE // 1000
+        for idx in range(len(pcm) // frame_bytes):
+            frame = pcm[idx * frame_bytes:(idx + 1) * frame_bytes]
+            if base + idx < len(track) and _webrtc_vad.is_speech(frame, PCM_SAMPLE_RATE):
+                track[base + idx] = 1
+    return True
+
+
+def compute_speech_track(read_pcm: Callable[[int, int], bytes], total_ms: int, vad: str,
+                         levels=None, log: Optional[Callable[[str], None]] = None) -> Optional[bytes]:
+    """
+    在已提取的 16kHz PCM 上生成参考语音轨
+
+    Args:
+        read_pcm: 读取 [start_ms, start_ms + duration_ms) 的 s16le PCM
+        total_ms: 音频总时长（毫秒）
+        vad: silero 或 webrtc
+        levels: audio_levels 的分析结果（用于跳过静音窗口，可为 None）
+
+    Returns:
+        每 10ms 一个字节（1 为语音）的序列；VAD 不可用时返回 None
+    """
+    if vad not in IN_PROCESS_VADS or total_ms <= 0:
+        return None
+    track = bytearray(total_ms * TRACK_RATE // 1000 + 1)
+    ranges = _scan_ranges(levels, total_ms)
+    mark = _mark_silero if vad == "silero" else _mark_webrtc
+    if not mark(track, read_pcm, ranges, log):
+        return None
+    return bytes(track)
+
+
+def align_subtitles(track: bytes, srt_in: str, srt_out: str, max_offset_s: int = DEFAULT_MAX_OFFSET_S,
+                    fix_framerate: bool = True) -> SyncResult:
+    """
+    把 SRT 与参考语音轨对齐后写出（与 ffsubsync 命令的对齐过程相同，只是参考语音来自 track）
+
+    Args:
+        max_offset_s: 最大偏移（秒），0 表示使用 ffsubsync 的默认值
+        fix_framerate: 额外尝试常见的帧率比（23.976/24/25），快速模式下关闭
+
+    Raises:
+        ImportError: 未安装 ffsubsync
+        SyncFailed: 最大偏移范围内找不到对齐
+    """
+    import numpy as np
+    from ffsubsync.aligners import FFTAligner, MaxScoreAligner, FailedToFindAlignmentException
+    from ffsubsync.constants import FRAMERATE_RATIOS, SAMPLE_RATE
+    from ffsubsync.sklearn_shim import Pipeline
+    from ffsubsync.speech_transformers import make_subtitle_speech_pipeline
+    from ffsubsync.subtitle_parser import make_subtitle_parser
+    from ffsubsync.subtitle_transformers import SubtitleShifter
+
+    reference = np.frombuffer(track, dtype=np.uint8).astype(np.float64)
+    ratios = [1.0]
+    if fix_framerate:
+        ratios += list(FRAMERATE_RATIOS) + [1.0 / ratio for ratio in FRAMERATE_RATIOS]
+    parser = make_subtitle_parser("srt", encoding=SRT_ENCODING, caching=True)
+    srt_pipes = [
+        make_subtitle_speech_pipeline(fmt="srt", encoding=SRT_ENCODING, caching=True, parser=parser,
+                                      scale_factor=ratio).fit(srt_in)
+        for ratio in ratios
+    ]
+    try:
+        (score, offset_samples), best_pipe = MaxScoreAligner(
+            FFTAligner, srt_in, SAMPLE_RATE, max_offset_s or DEFAULT_MAX_OFFSET_S
+        ).fit_transform(reference, srt_pipes)
+    except FailedToFindAlignmentException as e:
+        raise SyncFailed(str(e)) from e
+
+    offset_s = offset_samples / float(SAMPLE_RATE)
+    scale_step = best_pipe.named_steps["scale"]
+    out_subs = Pipeline([("shift", SubtitleShifter(offset_s))]).fit_transform(scale_step.subs_)
+    out_subs.write_file(srt_out)
+    return SyncResult(offset_s=offset_s, scale_factor=float(scale_step.scale_factor), score=float(score))
+
+
+def _sentence_spans(sentences: list) -> List[Tuple[int, int]]:
+    spans = []
+    for sentence in sentences:
+        try:
+            start, end = int(sentence['start']), int(sentence['end'])
+        except (KeyError, TypeError, ValueError):
+            continue
+        if end > start >= 0:
+            spans.append((start, end))
+    return spans
+
+
+def _subtitle_mask(spans: List[Tuple[int, int]], ratio: float):
+    """字幕开/关序列（TRACK_RATE 帧/秒，±1 编码）"""
+    import numpy as np
+    length = int(math.ceil(max(end for _, end in spans) * ratio * TRACK_RATE / 1000)) + 1
+    mask = np.full(length, -1.0)
+    for start, end in spans:
+        first = int(start * ratio * TRACK_RATE / 1000)
+        last = int(math.ceil(end * ratio * TRACK_RATE / 1000))
+        mask[first:last] = 1.0
+    return mask
+
+
+def native_align(track: bytes, sentences: list, max_offset_s: int = DEFAULT_MAX_OFFSET_S,
+                 fix_framerate: bool = True) -> NativeSyncResult:
+    """
+    用识别结果的句子时间戳与参考语音轨做 FFT 互相关，求字幕的偏移和帧率比
+
+    Args:
+        track: compute_speech_track 生成的参考语音轨
+        sentences: rec_result[0]['sentence_info']
+        max_offset_s: 最大偏移（秒），0 表示使用默认值
+        fix_framerate: 额外尝试常见的帧率比，快速模式下关闭
+
+    Raises:
+        SyncFailed: 没有句子时间戳，或最大偏移范围内找不到正相关的对齐
+    """
+    import numpy as np
+
+    spans = _sentence_spans(sentences)
+    if not spans or not track:
+        raise SyncFailed("没有可用于对齐的句子时间戳或参考语音轨")
+    if not any(track):
+        raise SyncFailed("参考语音轨中没有检出语音")
+    reference = np.frombuffer(track, dtype=np.uint8).astype(np.float64) * 2.0 - 1.0
+    ratios = [1.0]
+    if fix_framerate:
+        ratios += list(FRAMERATE_RATIOS) + [1.0 / ratio for ratio in FRAMERATE_RATIOS]
+    masks = [(ratio, _subtitle_mask(spans, ratio)) for ratio in ratios]
+
+    # 所有候选共用一次参考语音轨的 FFT
+    fft_size = 1 << (len(reference) + max(len(mask) for _, mask in masks)).bit_length()
+    reference_fft = np.fft.rfft(reference, fft_size)
+    max_lag = int((max_offset_s or DEFAULT_MAX_OFFSET_S) * TRACK_RATE)
+
+    best = None
+    for ratio, mask in masks:
+        # corr[k] = Σ reference[t + k] · mask[t]，负的 k 在环形结果的末尾
+        corr = np.fft.irfft(reference_fft * np.conj(np.fft.rfft(mask, fft_size)), fft_size)
+        lags = np.arange(-min(max_lag, len(mask) - 1), min(max_lag, len(reference) - 1) + 1)
+        scores = corr[lags % fft_size]
+        idx = int(np.argmax(scores))
+        if best is None or scores[idx] > best[0]:
+            best = (float(scores[idx]), int(lags[idx]), ratio)
+
+    score, lag, ratio = best
+    if score <= 0:
+        raise SyncFailed(f"±{max_lag / TRACK_RATE:.0f}秒内没有正相关的对齐 (最高得分 {score:.0f})")
+    last_end = max(end for _, end in spans)
+    return NativeSyncResult(offset_ms=lag * 1000 // TRACK_RATE, ratio=ratio, score=score,
+                            drift_ms=int(round(last_end * (ratio - 1.0))))
+
+
+def retime_result(rec_result: list, sync: NativeSyncResult) -> list:
+    """按对齐结果改写识别结果中的句子和字时间戳（返回副本，不修改原结果）"""
+    def fix(ms):
+        return max(0, int(round(ms * sync.ratio + sync.offset_ms)))
+
+    first = copy.deepcopy(rec_result[0])
+    for sentence in first.get('sentence_info') or []:
+        sentence['start'] = fix(sentence['start'])
+        sentence['end'] = fix(sentence['end'])
+        if isinstance(sentence.get('timestamp'), list):
+            sentence['timestamp'] = [[fix(a), fix(b)] for a, b in sentence['timestamp']]
+    if isinstance(first.get('timestamp'), list):
+        first['timestamp'] = [[fix(a), fix(b)] for a, b in first['timestamp']]
+    return [first] + list(rec_result[1:])
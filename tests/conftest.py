@@ -0,0 +1,6 @@
+# -*- coding: utf-8 -*-
+"""纯逻辑模块的单元测试：不依赖 FunASR / PyTorch / Qt / FFmpeg"""
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+import threading
+
+from adaptive_concurrency import (AdaptiveConcurrency, ConcurrencyLimits, QueueSample, SemaphoreThrottle,
+                                  COOLDOWN_TICKS, POST_IDLE_TICKS)
+
+
+def _sample(audio_depth, result_depth=0, task_depth=10, pre=2, post=2, capacity=8):
+    return QueueSample(task_depth=task_depth, audio_depth=audio_depth, audio_capacity=capacity,
+                       result_depth=result_depth, result_capacity=capacity,
+                       pre_workers=pre, post_workers=post)
+
+
+def _controller(ffmpeg=2, post_baseline=2):
+    return AdaptiveConcurrency(ffmpeg, ConcurrencyLimits(), post_baseline)
+
+
+def test_needs_sustained_pressure_before_acting():
+    adaptive = _controller()
+    assert adaptive.sample(_sample(8)) == []
+    actions = adaptive.sample(_sample(8))
+    assert [(target, delta) for target, delta, _ in actions] == [("pre", -1), ("ffmpeg", -1)]
+    assert adaptive.ffmpeg_permits == 1
+
+
+def test_cooldown_after_adjustment():
+    adaptive = _controller()
+    adaptive.sample(_sample(8))
+    assert adaptive.sample(_sample(8))
+    for _ in range(COOLDOWN_TICKS):
+        assert adaptive.sample(_sample(8)) == []
+    assert adaptive.sample(_sample(8))
+
+
+def test_starved_recognition_adds_ffmpeg_permit_when_ffmpeg_bound():
+    adaptive = _controller(ffmpeg=1)
+    adaptive.observe({"stage": "pre", "total": 10.0, "timings": {"extract": 8.0}})
+    adaptive.sample(_sample(0))
+    assert [(t, d) for t, d, _ in adaptive.sample(_sample(0))] == [("ffmpeg", 1)]
+
+
+def test_starved_recognition_adds_pre_worker_otherwise():
+    adaptive = _controller()
+    adaptive.observe({"stage": "pre", "total": 10.0, "timings": {"extract": 1.0}})
+    adaptive.sample(_sample(0))
+    assert [(t, d) for t, d, _ in adaptive.sample(_sample(0))] == [("pre", 1)]
+
+
+def test_no_pre_worker_added_when_pre_already_outpaces_asr():
+    adaptive = _controller()
+    adaptive.observe({"stage": "pre", "total": 1.0, "timings": {"extract": 0.1}})
+    adaptive.observe({"stage": "asr", "total": 10.0})
+    adaptive.sample(_sample(0))
+    assert adaptive.sample(_sample(0)) == []
+
+
+def test_nothing_added_when_no_tasks_left():
+    adaptive = _controller()
+    adaptive.sample(_sample(0, task_depth=0))
+    assert adaptive.sample(_sample(0, task_depth=0)) == []
+
+
+def test_post_backlog_and_idle_reclaim():
+    adaptive = _controller(post_baseline=2)
+    adaptive.sample(_sample(4, result_depth=8))
+    assert ("post", 1) in [(t, d) for t, d, _ in adaptive.sample(_sample(4, result_depth=8))]
+
+    adaptive = _controller(post_baseline=2)
+    actions = []
+    for _ in range(POST_IDLE_TICKS):
+        actions = adaptive.sample(_sample(4, result_depth=0, post=3))
+    assert [(t, d) for t, d, _ in actions] == [("post", -1)]
+
+
+def test_semaphore_throttle_holds_and_returns_permits():
+    semaphore = threading.Semaphore(3)
+    throttle = SemaphoreThrottle(semaphore, 3)
+
+    throttle.resize(1)
+    assert throttle.permits == 1
+    assert semaphore.acquire(False)
+    assert not semaphore.acquire(False)
+    semaphore.release()
+
+    throttle.resize(3)
+    for _ in range(3):
+        assert semaphore.acquire(False)
+    assert not semaphore.acquire(False)
+
+
+def test_semaphore_throttle_takes_busy_permits_later():
+    semaphore = threading.Semaphore(2)
+    throttle = SemaphoreThrottle(semaphore, 2)
+    assert semaphore.acquire(False) and semaphore.acquire(False)  # 两个 FFmpeg 正在运行
+
+    throttle.resize(1)
+    assert throttle._pending == 1
+    semaphore.release()  # 一个 FFmpeg 结束
+    throttle.poll()
+    assert throttle._pending == 0 and throttle._held == 1
+    assert not semaphore.acquire(False)
+
+    # 待扣留的许可还没取到时又加回来：直接取消，不额外 release
+    throttle.resize(0)
+    throttle.resize(1)
+    assert throttle._pending == 0
+    semaphore.release()
+    assert semaphore.acquire(False)
+    assert not semaphore.acquire(False)
@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+from asr_batching import split_batch_result
+
+
+def _result(sentences):
+    return [{'key': 'batch', 'text': '', 'sentence_info': sentences}]
+
+
+def test_sentences_are_shifted_to_each_file():
+    spans = [(0, 10_000), (10_500, 20_000)]
+    rec = _result([
+        {'text': '第一句', 'start': 1000, 'end': 2000, 'timestamp': [[1000, 1500], [1500, 2000]]},
+        {'text': '第二句', 'start': 12_000, 'end': 13_000, 'timestamp': [[12_000, 13_000]]},
+    ])
+    first, second = split_batch_result(rec, spans, ['a', 'b'])
+
+    assert first[0]['key'] == 'a' and second[0]['key'] == 'b'
+    assert [s['text'] for s in first[0]['sentence_info']] == ['第一句']
+    assert (first[0]['sentence_info'][0]['start'], first[0]['sentence_info'][0]['end']) == (1000, 2000)
+    shifted = second[0]['sentence_info'][0]
+    assert (shifted['start'], shifted['end']) == (1500, 2500)
+    assert shifted['timestamp'] == [[1500, 2500]]
+    assert second[0]['timestamp'] == [[1500, 2500]]
+
+
+def test_sentence_crossing_boundary_is_split_by_char_timestamps():
+    spans = [(0, 1000), (1000, 2000)]
+    rec = _result([{
+        'text': '甲乙丙丁',
+        'start': 600, 'end': 1800,
+        'timestamp': [[600, 800], [800, 950], [1100, 1400], [1400, 1800]],
+    }])
+    first, second = split_batch_result(rec, spans, ['a', 'b'])
+
+    assert [s['text'] for s in first[0]['sentence_info']] == ['甲乙']
+    assert [s['text'] for s in second[0]['sentence_info']] == ['丙丁']
+    assert second[0]['sentence_info'][0]['start'] == 100
+    assert second[0]['sentence_info'][0]['end'] == 800
+
+
+def test_sentence_without_timestamps_goes_to_midpoint_file():
+    spans = [(0, 1000), (1000, 2000)]
+    rec = _result([{'text': '整句', 'start': 800, 'end': 1600}])
+    first, second = split_batch_result(rec, spans, ['a', 'b'])
+
+    assert first[0]['sentence_info'] == []
+    assert second[0]['sentence_info'][0]['text'] == '整句'
+    # 落在前一个文件范围内的部分截到 0
+    assert second[0]['sentence_info'][0]['start'] == 0
+    assert second[0]['sentence_info'][0]['end'] == 600
+
+
+def test_empty_result_gives_empty_entries():
+    assert split_batch_result([], [(0, 1000)], ['a']) == [
+        [{'key': 'a', 'text': '', 'timestamp': [], 'sentence_info': []}]]
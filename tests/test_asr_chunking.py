@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+import json
+
+from asr_chunking import (recognize_chunked, SentenceSpool, load_spooled_result, write_spooled_srt,
+                          write_spooled_json, spool_srt_path)
+
+# 一段 95 秒的“音频”：每 3 秒一句，每句长 2 秒
+SENTENCES = [{'text': f'第{i}句', 'start': i * 3000, 'end': i * 3000 + 2000} for i in range(32)]
+TOTAL_MS = 95_000
+
+
+def _fake_engine():
+    """read_pcm 把窗口区间编码成字节，recognize_pcm 按区间返回窗口内（相对时间）的句子，跨越窗口终点的句子被截断"""
+    calls = []
+
+    def read_pcm(start_ms, duration_ms):
+        return json.dumps([start_ms, duration_ms]).encode()
+
+    def recognize_pcm(pcm):
+        start_ms, duration_ms = json.loads(pcm)
+        end_ms = start_ms + duration_ms
+        calls.append((start_ms, end_ms))
+        sentence_info = [
+            {'text': s['text'], 'start': s['start'] - start_ms, 'end': min(s['end'], end_ms) - start_ms,
+             'timestamp': [[s['start'] - start_ms, min(s['end'], end_ms) - start_ms]]}
+            for s in SENTENCES if s['start'] >= start_ms and s['start'] < end_ms
+        ]
+        return [{'key': '', 'text': '', 'sentence_info': sentence_info}]
+
+    return read_pcm, recognize_pcm, calls
+
+
+def test_each_sentence_is_committed_once_with_absolute_times():
+    read_pcm, recognize_pcm, calls = _fake_engine()
+    committed, progress = [], []
+
+    def on_sentences(sentences, done_ms):
+        committed.extend(sentences)
+        progress.append(done_ms)
+
+    count = recognize_chunked(read_pcm, TOTAL_MS, recognize_pcm, on_sentences, window_s=20, overlap_s=5)
+
+    assert count == len(SENTENCES)
+    assert [(s['text'], s['start'], s['end']) for s in committed] == \
+        [(s['text'], s['start'], s['end']) for s in SENTENCES]
+    assert committed[5]['timestamp'] == [[15_000, 17_000]]
+    assert len(calls) > 1
+    assert progress == sorted(progress) and progress[-1] == TOTAL_MS
+
+
+def test_next_window_starts_at_last_committed_sentence():
+    read_pcm, recognize_pcm, calls = _fake_engine()
+    recognize_chunked(read_pcm, TOTAL_MS, recognize_pcm, lambda s, d: None, window_s=20, overlap_s=5)
+
+    # 第一个窗口 [0, 25s)，只提交结束时间不超过 20s 的句子（最后一句结束于 20s），第二个窗口从该处开始
+    assert calls[0] == (0, 25_000)
+    assert calls[1][0] == 20_000
+
+
+def test_silent_window_advances_to_commit_limit():
+    calls = []
+
+    def recognize_pcm(pcm):
+        calls.append(json.loads(pcm))
+        return [{'key': '', 'sentence_info': []}]
+
+    count = recognize_chunked(lambda s, d: json.dumps([s, d]).encode(), 50_000, recognize_pcm,
+                              lambda s, d: None, window_s=20, overlap_s=5)
+    assert count == 0
+    assert [start for start, _ in calls] == [0, 20_000, 40_000]
+
+
+def test_spool_roundtrip_and_incremental_srt(tmp_path):
+    spool_path = tmp_path / "job" / "asr_partial.jsonl"
+    spool = SentenceSpool(str(spool_path))
+    spool.append(SENTENCES[:2])
+    spool.append([{'text': '', 'start': 6000, 'end': 6500}] + SENTENCES[3:4])
+    spool.close()
+
+    result = load_spooled_result(str(spool_path), "key")
+    assert [s['text'] for s in result[0]['sentence_info']] == ['第0句', '第1句', '', '第3句']
+    assert result[0]['text'] == '第0句第1句第3句'
+
+    srt = spool_srt_path(str(spool_path)).read_text(encoding='utf-8')
+    assert srt.startswith("1\n00:00:00,000 --> 00:00:02,000\n第0句\n\n")
+    assert "\n4\n00:00:09,000 --> 00:00:11,000\n第3句\n" in srt
+    assert "\n3\n" not in srt  # 空句不写出但占用序号
+
+    write_spooled_srt(str(spool_path), str(tmp_path / "out.srt"))
+    assert (tmp_path / "out.srt").read_text(encoding='utf-8') == srt
+    write_spooled_json(str(spool_path), "key", str(tmp_path / "out.json"))
+    assert json.loads((tmp_path / "out.json").read_text(encoding='utf-8')) == result
@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+import pytest
+
+from job_store import JobStore, JobRecorder, filter_resumable, output_key
+from pipeline_config import ProcessingConfig
+
+
+@pytest.fixture
+def store(tmp_path):
+    job_store = JobStore(str(tmp_path / "jobs.sqlite3"))
+    yield job_store
+    job_store.close()
+
+
+@pytest.fixture
+def media(tmp_path):
+    files = []
+    for name in ("a.mp4", "b.mp4", "c.mp4"):
+        path = tmp_path / name
+        path.write_bytes(b"")
+        files.append(str(path))
+    return files
+
+
+def _finish(store, config, path, status_code=1):
+    recorder = JobRecorder(store, config)
+    recorder.add((status_code, "", path, "原因"))
+    recorder.flush()
+
+
+def test_without_store_falls_back_to_output_files(media, tmp_path):
+    config = ProcessingConfig(generate_srt=True)
+    (tmp_path / "a.srt").write_text("")
+    assert filter_resumable(None, config, media) == media[1:]
+
+
+def test_done_records_are_skipped(store, media, tmp_path):
+    config = ProcessingConfig(generate_srt=True)
+    store.begin(media, output_key(config))
+    (tmp_path / "a.srt").write_text("")
+    _finish(store, config, media[0])
+
+    assert filter_resumable(store, config, media) == media[1:]
+    assert store.counts() == {"done": 1, "queued": 2}
+
+
+def test_unfinished_failed_and_skipped_records_are_retried(store, media, tmp_path):
+    config = ProcessingConfig(generate_srt=True)
+    store.begin(media, output_key(config))
+    for name in ("b.srt", "c.srt"):
+        (tmp_path / name).write_text("")
+    _finish(store, config, media[1], status_code=-1)
+    _finish(store, config, media[2], status_code=0)
+
+    assert filter_resumable(store, config, media) == media
+    assert store.counts() == {"queued": 1, "failed": 1, "skipped": 1}
+
+
+def test_done_records_with_missing_outputs_are_requeued(store, media, tmp_path):
+    config = ProcessingConfig(generate_srt=True)
+    store.begin(media[:2], output_key(config))
+    for name in ("a.srt", "b.srt"):
+        (tmp_path / name).write_text("")
+    _finish(store, config, media[0])
+    _finish(store, config, media[1])
+    (tmp_path / "b.srt").unlink()
+
+    assert store.recorded_outputs(media[:1]) == {media[0]: [str(tmp_path / "a.srt")]}
+    assert filter_resumable(store, config, media[:2]) == media[1:2]
+
+
+def test_changed_output_formats_requeue_done_files(store, media, tmp_path):
+    config = ProcessingConfig(generate_srt=True)
+    store.begin(media[:1], output_key(config))
+    (tmp_path / "a.srt").write_text("")
+    _finish(store, config, media[0])
+
+    with_txt = ProcessingConfig(generate_srt=True, generate_txt=True)
+    assert filter_resumable(store, with_txt, media[:1]) == media[:1]
+
+
+def test_legacy_outputs_are_recorded_as_done(store, media, tmp_path):
+    config = ProcessingConfig(generate_srt=True)
+    (tmp_path / "a.srt").write_text("")
+
+    assert filter_resumable(store, config, media) == media[1:]
+    assert store.lookup(media[:1]) == {media[0]: ("done", output_key(config))}
+
+
+def test_stage_events_do_not_override_final_state(store, media):
+    config = ProcessingConfig(generate_srt=True)
+    store.begin(media[:1], output_key(config))
+    recorder = JobRecorder(store, config)
+    recorder.add({"kind": "stage", "stage": "pre", "file": media[0], "total": 1.0, "timings": {}})
+    recorder.add((-1, "", media[0], "识别失败"))
+    recorder.add({"kind": "stage", "stage": "post", "file": media[0], "total": 1.0, "timings": {}})
+    recorder.flush()
+    assert store.lookup(media[:1])[media[0]][0] == "failed"
@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+import json
+import os
+import sys
+
+import pytest
+
+from probe_cache import PROBE_LEVELS, ProbeCache, probe_media
+
+# 假的 ffprobe：记录每次调用的 probesize；probesize 达到 200M 才“看到”音频流。
+# 文件名含 noaudio 时没有音频流，再含 rejectdeep 时最深级别报错退出
+FAKE_FFPROBE = r'''
+import json, sys
+args = sys.argv
+probesize = args[args.index("-probesize") + 1]
+with open(args[-1] + ".calls", "a") as f:
+    f.write(probesize + "\n")
+if "rejectdeep" in args[-1] and probesize == "2G":
+    sys.stderr.write("invalid probesize\n")
+    sys.exit(1)
+streams = [{"codec_type": "video"}]
+if probesize in ("200M", "2G") and "noaudio" not in args[-1]:
+    streams.append({"codec_type": "audio"})
+print(json.dumps({"streams": streams, "format": {"duration": "10.0"}}))
+'''
+
+
+@pytest.fixture
+def ffprobe(tmp_path):
+    script = tmp_path / "fake_ffprobe.py"
+    script.write_text(FAKE_FFPROBE)
+    if os.name == 'nt':
+        launcher = tmp_path / "fake_ffprobe.cmd"
+        launcher.write_text(f'@"{sys.executable}" "{script}" %*\n')
+    else:
+        launcher = tmp_path / "fake_ffprobe"
+        launcher.write_text(f'#!/bin/sh\nexec "{sys.executable}" "{script}" "$@"\n')
+        launcher.chmod(0o755)
+    return str(launcher)
+
+
+@pytest.fixture
+def cache(tmp_path):
+    probe_cache = ProbeCache(str(tmp_path / "probe.sqlite3"))
+    yield probe_cache
+    probe_cache.close()
+
+
+def _calls(media):
+    with open(media + ".calls") as f:
+        return f.read().split()
+
+
+def test_hit_after_first_probe(tmp_path, ffprobe, cache):
+    media = str(tmp_path / "clip.mp4")
+    open(media, 'wb').close()
+    probe_media(media, ffprobe, cache=cache)
+    data, label, error = probe_media(media, ffprobe, cache=cache)
+    assert label == "缓存" and error is None
+    assert any(s["codec_type"] == "audio" for s in data["streams"])
+    assert _calls(media) == ["2M", "10M", "200M"]
+
+
+def test_changed_file_invalidates_entry(tmp_path, ffprobe, cache):
+    media = str(tmp_path / "clip.mp4")
+    open(media, 'wb').close()
+    cache.put(media, {"streams": [], "format": {}}, "deep")
+    assert cache.get(media) is not None
+
+    with open(media, 'ab') as f:
+        f.write(b"x")
+    assert cache.get(media) is None
+    reopened = ProbeCache(str(cache.db_path))
+    assert reopened.get(media) is None
+    reopened.close()
+
+
+def test_entry_survives_reopen_with_level(tmp_path, cache):
+    media = str(tmp_path / "clip.mp4")
+    open(media, 'wb').close()
+    cache.put(media, {"streams": [{"codec_type": "audio"}], "format": {"duration": "1"}}, "baseline")
+    reopened = ProbeCache(str(cache.db_path))
+    assert reopened.get_entry(media)[1] == 1
+    reopened.close()
+
+
+def test_shallow_entry_is_escalated(tmp_path, ffprobe, cache):
+    media = str(tmp_path / "stream.ts")
+    open(media, 'wb').close()
+
+    # 文件列表的快速探测：最多到标准探测，结果里没有音频流，照样缓存
+    data, label, _ = probe_media(media, ffprobe, max_level=1, cache=cache)
+    assert label == "标准探测"
+    assert cache.get_entry(media)[1] == 1
+    assert probe_media(media, ffprobe, max_level=1, cache=cache)[1] == "缓存"
+
+    # 流水线需要完整结果：从下一级别继续探测，得到音频流后覆盖缓存
+    data, label, _ = probe_media(media, ffprobe, cache=cache)
+    assert label == "扩展探测"
+    assert any(s["codec_type"] == "audio" for s in data["streams"])
+    assert cache.get_entry(media)[1] == 2
+    assert _calls(media) == ["10M", "200M"]
+
+
+def test_container_start_level_is_remembered(tmp_path, ffprobe, cache):
+    first = str(tmp_path / "a.mp4")
+    second = str(tmp_path / "b.mp4")
+    for path in (first, second):
+        open(path, 'wb').close()
+    probe_media(first, ffprobe, cache=cache)
+    probe_media(second, ffprobe, cache=cache)
+    assert _calls(second) == ["200M"]
+
+
+@pytest.mark.parametrize("name, last_probe", [("noaudio.mp4", "2G"), ("noaudio_rejectdeep.mp4", "2G")])
+def test_file_without_audio_is_probed_once(tmp_path, ffprobe, cache, name, last_probe):
+    media = str(tmp_path / name)
+    open(media, 'wb').close()
+
+    data, label, error = probe_media(media, ffprobe, cache=cache)
+    assert error is None
+    assert data["streams"] == [{"codec_type": "video"}]
+    assert cache.get_entry(media)[1] == len(PROBE_LEVELS) - 1
+    assert _calls(media) == ["2M", "10M", "200M", last_probe]
+
+    # 结果已按最深级别缓存：文件未变化时不再探测
+    assert probe_media(media, ffprobe, cache=cache)[:2] == (data, "缓存")
+    assert len(_calls(media)) == 4
@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+import importlib.util
+
+import pytest
+
+if importlib.util.find_spec("PySide6") is None and importlib.util.find_spec("PyQt6") is None:
+    pytest.skip("需要 PySide6 或 PyQt6", allow_module_level=True)
+
+from pipeline_transport import EventBatch
+from processing_controller import ProcessingController, ProcessingState
+
+
+@pytest.fixture
+def controller(monkeypatch):
+    controller = ProcessingController()
+    calls = {"start": 0, "cleanup": 0}
+
+    def start_pipeline_workers():
+        calls["start"] += 1
+        controller._change_state(ProcessingState.PROCESSING)
+
+    def cleanup_task_resources():
+        calls["cleanup"] += 1
+
+    monkeypatch.setattr(controller, "_start_pipeline_workers", start_pipeline_workers)
+    monkeypatch.setattr(controller, "_cleanup_task_resources", cleanup_task_resources)
+    controller._change_state(ProcessingState.ENGINE_STARTING)
+    controller.calls = calls
+    return controller
+
+
+def test_several_ready_statuses_in_one_batch_start_the_pipeline_once(controller):
+    controller._on_events(controller._dispatch_generation, EventBatch(statuses=["ready", "ready"]))
+    assert controller.calls == {"start": 1, "cleanup": 0}
+    assert controller.current_state == ProcessingState.PROCESSING
+
+
+def test_error_after_ready_in_the_same_batch_is_ignored(controller):
+    controller._on_events(controller._dispatch_generation, EventBatch(statuses=["ready", "error"]))
+    assert controller.calls == {"start": 1, "cleanup": 0}
+    assert controller.current_state == ProcessingState.PROCESSING
+
+
+def test_error_while_starting_cleans_up(controller):
+    controller._on_events(controller._dispatch_generation, EventBatch(statuses=["error", "ready"]))
+    assert controller.calls == {"start": 0, "cleanup": 1}
+    assert controller.current_state == ProcessingState.ERROR
@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+from utils import _make_progress_parser, ProgressThrottle
+
+
+def _feed(parse, out_time_ms, speed="2.0x", end=False):
+    lines = ["frame=10", f"out_time_ms={out_time_ms}", "bitrate=N/A", f"speed={speed}",
+             "progress=end" if end else "progress=continue"]
+    return [parse(line) for line in lines]
+
+
+def test_block_fields_are_merged_into_one_event():
+    events = []
+    parse = _make_progress_parser(10_000, events.append, min_interval_s=0)
+    assert all(_feed(parse, 2500))
+    assert len(events) == 1
+    event = events[0]
+    assert event["kind"] == "ffmpeg"
+    assert event["done"] == 0.25 and event["speed"] == "2.0x"
+    assert event["eta_s"] >= 0
+
+
+def test_updates_are_rate_limited_and_end_is_forced():
+    events = []
+    parse = _make_progress_parser(100_000, events.append, min_interval_s=60)
+    for ms in range(1000, 50_000, 1000):
+        _feed(parse, ms)
+    assert len(events) == 1  # 第一个块立即发送，之后在间隔内只保留最新状态
+    assert parse.throttle.pending
+
+    _feed(parse, 100_000, end=True)
+    assert len(events) == 2
+    assert events[-1]["done"] == 1.0
+
+
+def test_flush_sends_latest_pending_state():
+    events = []
+    parse = _make_progress_parser(100_000, events.append, min_interval_s=60)
+    _feed(parse, 1000)
+    _feed(parse, 7000)
+    parse.throttle.flush()
+    assert [round(e["done"], 2) for e in events] == [0.01, 0.07]
+    parse.throttle.flush()
+    assert len(events) == 2
+
+
+def test_non_progress_lines_are_rejected():
+    parse = _make_progress_parser(1000, lambda event: None)
+    assert not parse("Input #0, mov,mp4,m4a,3gp,3g2,mj2, from 'a.mp4':")
+    assert not parse("  Duration: 00:00:10.00, start: 0.000000")
+    assert parse("out_time_ms=bad")
+
+
+def test_throttle_completion_bypasses_interval():
+    events = []
+    throttle = ProgressThrottle(events.append, min_interval_s=60)
+    throttle.update({"done": 0.1})
+    throttle.update({"done": 0.5})
+    throttle.update({"done": 1.0})
+    assert [e["done"] for e in events] == [0.1, 1.0]
+    assert throttle.received == 3 and throttle.sent == 2
@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+import os
+import wave
+
+from stage_checkpoint import StageCheckpoint, open_checkpoint, job_dir
+
+
+def _source(tmp_path, content=b"media"):
+    path = tmp_path / "video.mp4"
+    path.write_bytes(content)
+    return str(path)
+
+
+def test_result_roundtrip(tmp_path):
+    source = _source(tmp_path)
+    StageCheckpoint(tmp_path / "cache", source).save_result([{"key": "video", "text": "你好"}])
+
+    restored, spool = StageCheckpoint(tmp_path / "cache", source).load_result()
+    assert restored == [{"key": "video", "text": "你好"}] and spool is None
+
+
+def test_spool_path_is_recorded(tmp_path):
+    source = _source(tmp_path)
+    spool_path = tmp_path / "asr_partial.jsonl"
+    spool_path.write_text("{}\n")
+    StageCheckpoint(tmp_path / "cache", source).save_result(None, str(spool_path))
+
+    assert StageCheckpoint(tmp_path / "cache", source).load_result() == (None, str(spool_path))
+    spool_path.unlink()
+    assert StageCheckpoint(tmp_path / "cache", source).load_result() == (None, None)
+
+
+def test_audio_restore_in_memory_and_as_wav(tmp_path):
+    source = _source(tmp_path)
+    pcm = b"\x01\x00" * 1600
+    StageCheckpoint(tmp_path / "cache", source).save_audio(pcm=pcm)
+
+    checkpoint = StageCheckpoint(tmp_path / "cache", source)
+    assert checkpoint.restore_audio(True, tmp_path / "x.wav") == pcm
+    wav_target = tmp_path / "video_extracted.wav"
+    assert checkpoint.restore_audio(False, wav_target) == str(wav_target)
+    with wave.open(str(wav_target), 'rb') as wav_file:
+        assert wav_file.readframes(wav_file.getnframes()) == pcm
+
+
+def test_changed_source_invalidates_checkpoint(tmp_path):
+    source = _source(tmp_path)
+    checkpoint = StageCheckpoint(tmp_path / "cache", source)
+    checkpoint.save_result([{"text": "旧"}])
+    assert checkpoint.dir.exists()
+
+    with open(source, 'ab') as f:
+        f.write(b"more")
+    stat = os.stat(source)
+    os.utime(source, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+    reopened = StageCheckpoint(tmp_path / "cache", source)
+    assert reopened.load_result() == (None, None)
+    assert not reopened.dir.exists()
+
+
+def test_clear_and_disabled(tmp_path):
+    source = _source(tmp_path)
+    config = {"job_cache_dir": str(tmp_path / "cache")}
+    checkpoint = open_checkpoint(config, source)
+    checkpoint.save_result([])
+    assert checkpoint.dir == job_dir(config, source)
+    checkpoint.clear()
+    assert not checkpoint.dir.exists()
+    assert open_checkpoint(dict(config, stage_checkpoints=False), source) is None
@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+"""
+流水线子进程的启动检查
+导入预算只量到导入阶段入口为止；这里经 worker_bootstrap.run_stage 真正运行工作函数，
+走完启动（模型预热、缓存打开、引擎连接）后收到结束信号退出，检查启动过程中没有加载（也没有尝试导入）
+本阶段禁止的模块。识别 / 分段识别进程启动时按设计加载模型，只检查导入预算。
+"""
+import importlib.abc
+import multiprocessing
+import subprocess
+import sys
+
+import pytest
+
+import worker_bootstrap
+from worker_bootstrap import STAGE_IMPORT_BUDGETS, STAGES
+
+# 启动时不应加载模型的阶段
+STARTUP_STAGES = ("pre", "bridge", "post")
+_WATCHED = tuple(sorted({name for budget in STAGE_IMPORT_BUDGETS.values() for name in budget.forbidden}))
+
+
+class _ImportRecorder(importlib.abc.MetaPathFinder):
+    """记录尝试导入的受监视顶层包（未安装时导入失败也会记下）"""
+
+    def __init__(self):
+        self.attempted = set()
+
+    def find_spec(self, fullname, path=None, target=None):
+        top = fullname.partition(".")[0]
+        if top in _WATCHED:
+            self.attempted.add(top)
+        return None
+
+
+def _failed_engine_start(device, idle_timeout_s=0, threads=0):
+    # 不在测试中启动真正的常驻引擎：守护进程立即退出，桥接进程按"引擎启动失败"结束
+    return subprocess.Popen([sys.executable, "-c", "raise SystemExit(3)"])
+
+
+def _startup_probe(stage, args, conn):
+    """子进程：装上导入记录器后经 run_stage 运行工作函数，报告启动中加载/尝试导入的受监视模块"""
+    before = set(sys.modules)
+    recorder = _ImportRecorder()
+    sys.meta_path.insert(0, recorder)
+    if stage == "bridge":
+        import engine_service
+        engine_service.start_engine_process = _failed_engine_start
+    error = None
+    try:
+        worker_bootstrap.run_stage(stage, args)
+    except Exception as e:
+        error = repr(e)
+    conn.send({
+        "attempted": sorted(recorder.attempted),
+        "loaded": [name for name in _WATCHED if name in sys.modules and name not in before],
+        "error": error,
+    })
+    conn.close()
+
+
+def _stage_args(stage, ctx, tmp_path):
+    """各阶段的最小参数：打开全部会在启动时用到模型的选项，输入队列为空或只有结束信号"""
+    log_queue, progress_queue, status_queue = ctx.Queue(), ctx.Queue(), ctx.Queue()
+    config = {
+        "device": "cpu",
+        "recognition_threads": 97,  # 与本机真正的常驻引擎区分
+        "transcription_cache_path": str(tmp_path / "cache.sqlite3"),
+        "speech_gate": True,
+        "speech_gate_vad": True,
+        "ffsubsync_enabled": True,
+        "ffsubsync_vad": "silero",
+    }
+    if stage == "pre":
+        # 任务队列为空：取任务超时后退出
+        return (ctx.Queue(), ctx.Queue(), log_queue, progress_queue, config, ctx.Semaphore(1), None, ctx.Queue())
+    if stage == "bridge":
+        audio_queue = ctx.Queue()
+        audio_queue.put(None)
+        return (audio_queue, ctx.Queue(), log_queue, config, status_queue, progress_queue)
+    result_queue = ctx.Queue()
+    result_queue.put(None)
+    return (result_queue, log_queue, progress_queue, config)
+
+
+def _run_startup(stage, tmp_path, timeout_s=60.0):
+    ctx = multiprocessing.get_context("spawn")
+    parent_conn, child_conn = ctx.Pipe(duplex=False)
+    # start() 之后 Process 不再持有参数，队列要保留到子进程结束
+    args = _stage_args(stage, ctx, tmp_path)
+    process = ctx.Process(target=_startup_probe, args=(stage, args, child_conn),
+                          daemon=True, name=f"StartupProbe-{stage}")
+    with worker_bootstrap._main_module_hidden():
+        process.start()
+    child_conn.close()
+    try:
+        assert parent_conn.poll(timeout_s), f"{stage} 阶段 {timeout_s:.0f} 秒内未结束启动"
+        return parent_conn.recv()
+    finally:
+        process.join(timeout=10)
+        if process.is_alive():
+            process.terminate()
+
+
+def test_startup_stages_are_registered():
+    assert set(STARTUP_STAGES) <= set(STAGES)
+
+
+@pytest.mark.parametrize("stage", STARTUP_STAGES)
+def test_stage_startup_stays_within_forbidden_modules(stage, tmp_path):
+    report = _run_startup(stage, tmp_path)
+    assert report["error"] is None
+    forbidden = set(STAGE_IMPORT_BUDGETS[stage].forbidden)
+    assert not forbidden & set(report["loaded"]), report
+    assert not forbidden & set(report["attempted"]), report
+
+
+@pytest.mark.parametrize("stage", list(STAGES))
+def test_stage_import_budget(stage):
+    report = worker_bootstrap.measure_stage_imports(stage)
+    assert "error" not in report
+    assert report["violations"] == []
@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from subtitle_sync import native_align, retime_result, SyncFailed, TRACK_RATE
+
+# 句子时间戳（毫秒），间隔不规则，互相关只有一个明显的峰
+SPANS = [(1000, 2500), (4000, 4600), (7000, 9800), (12_500, 13_000), (15_000, 17_500), (21_000, 22_000),
+         (24_300, 27_000), (30_000, 30_800), (33_000, 36_500), (40_000, 41_000)]
+
+
+def _sentences(spans):
+    return [{'text': str(i), 'start': start, 'end': end} for i, (start, end) in enumerate(spans)]
+
+
+def _track(spans, shift_ms=0, scale=1.0, length_s=60):
+    track = bytearray(length_s * TRACK_RATE)
+    for start, end in spans:
+        first = int((start * scale + shift_ms) * TRACK_RATE / 1000)
+        last = int((end * scale + shift_ms) * TRACK_RATE / 1000)
+        track[first:last] = b"\x01" * (last - first)
+    return bytes(track)
+
+
+def test_finds_offset():
+    sync = native_align(_track(SPANS, shift_ms=1500), _sentences(SPANS), max_offset_s=10, fix_framerate=False)
+    assert sync.offset_ms == 1500
+    assert sync.ratio == 1.0
+    assert sync.score > 0
+
+
+def test_finds_negative_offset():
+    sync = native_align(_track(SPANS, shift_ms=-700), _sentences(SPANS), max_offset_s=10, fix_framerate=False)
+    assert sync.offset_ms == -700
+
+
+def test_finds_framerate_ratio():
+    ratio = 25.0 / 23.976
+    sync = native_align(_track(SPANS, scale=ratio), _sentences(SPANS), max_offset_s=10)
+    assert sync.ratio == pytest.approx(ratio)
+    assert abs(sync.offset_ms) <= 20
+    assert sync.drift_ms == int(round(41_000 * (ratio - 1.0)))
+
+
+def test_offset_outside_range_is_not_reported():
+    sync_or_error = None
+    try:
+        sync_or_error = native_align(_track(SPANS, shift_ms=8000), _sentences(SPANS), max_offset_s=2,
+                                     fix_framerate=False)
+    except SyncFailed:
+        pass
+    assert sync_or_error is None or abs(sync_or_error.offset_ms) <= 2000
+
+
+def test_rejects_empty_inputs():
+    with pytest.raises(SyncFailed):
+        native_align(_track(SPANS), [], fix_framerate=False)
+    with pytest.raises(SyncFailed):
+        native_align(bytes(6000), _sentences(SPANS), fix_framerate=False)
+
+
+def test_retime_result_returns_copy():
+    rec_result = [{'timestamp': [[1000, 1200]],
+                   'sentence_info': [{'start': 1000, 'end': 2000, 'timestamp': [[1000, 1200]]}]}]
+    sync = native_align(_track(SPANS, shift_ms=500), _sentences(SPANS), max_offset_s=10, fix_framerate=False)
+    retimed = retime_result(rec_result, sync)
+    assert retimed[0]['sentence_info'][0]['start'] == 1500
+    assert retimed[0]['timestamp'] == [[1500, 1700]]
+    assert rec_result[0]['sentence_info'][0]['start'] == 1000
@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+import os
+
+import pytest
+
+import transcription_cache
+from transcription_cache import TranscriptionCache, file_fingerprint
+
+
+@pytest.fixture
+def cache(tmp_path):
+    transcription = TranscriptionCache(str(tmp_path / "cache.sqlite3"))
+    yield transcription
+    transcription.close()
+
+
+@pytest.fixture
+def hashed(monkeypatch):
+    calls = []
+
+    def counting_fingerprint(path, model_signature):
+        calls.append(path)
+        return file_fingerprint(path, model_signature)
+
+    monkeypatch.setattr(transcription_cache, "file_fingerprint", counting_fingerprint)
+    return calls
+
+
+def test_unchanged_file_is_hashed_once(tmp_path, cache, hashed):
+    media = tmp_path / "a.mp4"
+    media.write_bytes(b"video")
+    first = cache.file_key(str(media), "model")
+    assert cache.file_key(str(media), "model") == first == file_fingerprint(str(media), "model")
+    assert len(hashed) == 1
+
+    # 重新打开数据库（下一个会话）也不再计算
+    reopened = TranscriptionCache(str(cache.db_path))
+    assert reopened.file_key(str(media), "model") == first
+    reopened.close()
+    assert len(hashed) == 1
+
+
+def test_changed_file_or_model_is_rehashed(tmp_path, cache, hashed):
+    media = tmp_path / "a.mp4"
+    media.write_bytes(b"video")
+    first = cache.file_key(str(media), "model")
+
+    media.write_bytes(b"other video")
+    st = media.stat()
+    os.utime(media, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+    changed = cache.file_key(str(media), "model")
+    assert changed != first
+    assert cache.file_key(str(media), "model-v2") != changed
+    assert len(hashed) == 3
+
+
+def test_results_are_found_by_any_key(cache):
+    cache.put(["file:a", None, "pcm:b"], [{"key": "a", "text": "你好"}], source="a.mp4")
+    assert cache.get("pcm:b") == [{"key": "a", "text": "你好"}]
+    assert cache.get("file:c") is None
+    assert cache.get(None) is None
@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+"""
+识别结果缓存（按内容寻址）
+断点续传只检查源文件旁边的输出文件是否存在，改名、移动或重复上传的视频都会被重新识别。
+这里按内容指纹缓存原始 rec_result（SQLite），命中后跳过 FFmpeg/ASR 直接进入后处理：
+
+- 文件指纹 file:<hash>  源文件完整内容 + 模型签名，改名/移动/复制的文件在预处理开始前即可命中；
+                        按 (绝对路径, 大小, 修改时间) 记住计算结果，未变化的文件只在第一次读取全部内容
+- 音频指纹 pcm:<hash>   解码后的 16kHz PCM + 模型签名，重新封装（音轨不变）的文件在提取音频后命中
+
+同一数据库还保存字幕精校的参考语音轨（subtitle_sync，键为 track:<vad>:<文件指纹>），
+识别结果命中文件指纹时无需提取音频即可进程内精校。
+
+多个工作进程可同时读写（WAL 模式），每个进程使用自己的连接。
+"""
+import os
+import json
+import time
+import zlib
+import hashlib
+import sqlite3
+from pathlib import Path
+from typing import Iterable, Optional
+
+from app_env import get_project_root
+
+_HASH_CHUNK = 4 * 1024 * 1024
+
+
+def default_cache_path() -> Path:
+    return get_project_root() / "model_cache" / "transcription_cache.sqlite3"
+
+
+def _digest(model_signature: str):
+    h = hashlib.blake2b(digest_size=20)
+    h.update(model_signature.encode('utf-8'))
+    h.update(b'\0')
+    return h
+
+
+def file_fingerprint(path: str, model_signature: str) -> str:
+    """源文件内容指纹（与文件名、路径、修改时间无关）"""
+    h = _digest(model_signature)
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(_HASH_CHUNK)
+            if not chunk:
+                break
+            h.update(chunk)
+    return f"file:{h.hexdigest()}"
+
+
+def pcm_fingerprint(pcm: bytes, model_signature: str) -> str:
+    """解码后 PCM 数据的指纹"""
+    h = _digest(model_signature)
+    h.update(pcm)
+    return f"pcm:{h.hexdigest()}"
+
+
+def wav_fingerprint(wav_path: str, model_signature: str) -> str:
+    """提取出的 WAV 的音频数据指纹（只对采样数据计算，与 pcm_fingerprint 结果一致）"""
+    import wave
+    h = _digest(model_signature)
+    with wave.open(str(wav_path), 'rb') as wav_file:
+        frames_per_chunk = _HASH_CHUNK // max(1, wav_file.getsampwidth() * wav_file.getnchannels())
+        while True:
+            chunk = wav_file.readframes(frames_per_chunk)
+            if not chunk:
+                break
+            h.update(chunk)
+    return f"pcm:{h.hexdigest()}"
+
+
+class TranscriptionCache:
+    """识别结果缓存，key -> rec_result（JSON）"""
+
+    def __init__(self, db_path: Optional[str] = None):
+        self.db_path = Path(db_path) if db_path else default_cache_path()
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.db_path), timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS transcripts ("
+            " key TEXT PRIMARY KEY,"
+            " result TEXT NOT NULL,"
+            " source TEXT,"
+            " created_at REAL,"
+            " last_used REAL,"
+            " hits INTEGER DEFAULT 0)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS speech_tracks ("
+            " key TEXT PRIMARY KEY,"
+            " track BLOB NOT NULL,"
+            " created_at REAL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS file_fingerprints ("
+            " path TEXT PRIMARY KEY,"
+            " size INTEGER,"
+            " mtime_ns INTEGER,"
+            " signature TEXT,"
+            " fingerprint TEXT NOT NULL)"
+        )
+        self._conn.commit()
+
+    def file_key(self, path: str, model_signature: str) -> str:
+        """
+        源文件的文件指纹（file_fingerprint）
+        路径、大小、修改时间和模型签名与上次相同时直接返回记录的指纹，不再读取整个文件
+        """
+        st = os.stat(path)
+        resolved = str(Path(path).resolve())
+        row = self._conn.execute("SELECT size, mtime_ns, signature, fingerprint FROM file_fingerprints WHERE path = ?",
+                                 (resolved,)).fetchone()
+        if row is not None and tuple(row[:3]) == (st.st_size, st.st_mtime_ns, model_signature):
+            return row[3]
+        # 记录计算前的大小和修改时间：计算期间文件被改写时，下次按变化重新计算
+        fingerprint = file_fingerprint(path, model_signature)
+        with self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO file_fingerprints (path, size, mtime_ns, signature, fingerprint)"
+                " VALUES (?, ?, ?, ?, ?)", (resolved, st.st_size, st.st_mtime_ns, model_signature, fingerprint))
+        return fingerprint
+
+    def get(self, key: Optional[str]) -> Optional[list]:
+        """查询缓存，未命中返回 None"""
+        if not key:
+            return None
+        row = self._conn.execute("SELECT result FROM transcripts WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        with self._conn:
+            self._conn.execute("UPDATE transcripts SET hits = hits + 1, last_used = ? WHERE key = ?",
+                               (time.time(), key))
+        return json.loads(row[0])
+
+    def put(self, keys: Iterable[Optional[str]], rec_result: list, source: str = ""):
+        """以多个指纹保存同一份识别结果"""
+        payload = json.dumps(rec_result, ensure_ascii=False)
+        now = time.time()
+        rows = [(key, payload, source, now, now) for key in keys if key]
+        if not rows:
+            return
+        with self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO transcripts (key, result, source, created_at, last_used, hits)"
+                " VALUES (?, ?, ?, ?, ?, 0)", rows)
+
+    def get_track(self, key: Optional[str]) -> Optional[bytes]:
+        """查询参考语音轨，未命中返回 None"""
+        if not key:
+            return None
+        row = self._conn.execute("SELECT track FROM speech_tracks WHERE key = ?", (key,)).fetchone()
+        return zlib.decompress(row[0]) if row is not None else None
+
+    def put_track(self, key: Optional[str], track: bytes):
+        """保存参考语音轨（0/1 序列，压缩后通常只有几 KB）"""
+        if not key or not track:
+            return
+        with self._conn:
+            self._conn.execute("INSERT OR REPLACE INTO speech_tracks (key, track, created_at) VALUES (?, ?, ?)",
+                               (key, zlib.compress(track), time.time()))
+
+    def close(self):
+        try:
+            self._conn.close()
+        except Exception:
+            pass
@@ -2,6 +2,7 @@
 import os
 import time
 import shutil
+import threading
 import traceback
 import subprocess
 from pathlib import Path
@@ -44,15 +45,103 @@ def run_silent(cmd, **kw):
     return subprocess.run(cmd, **kw)
 
 
-def run_ffmpeg_with_progress(base_cmd: list, total_ms: int, emit, ffmpeg_path: str = "ffmpeg"):
+class ProgressThrottle:
+    """
+    进度事件限速器：合并多次更新的字段，每个文件每 min_interval_s 最多发送一次最新状态
+    完成（done >= 1）或调用 flush() 时立即发送尚未发出的状态
+    """
+
+    def __init__(self, emit, min_interval_s: float = 0.5):
+        self.emit = emit
+        self.min_interval_s = max(0.0, min_interval_s)
+        self.state = {}
+        self.pending = False
+        self.sent = 0
+        self.received = 0
+        self._last_sent = 0.0
+
+    def update(self, fields: dict, force: bool = False):
+        self.state.update(fields)
+        self.pending = True
+        self.received += 1
+        if force or self.state.get("done", 0) >= 1.0 or time.monotonic() - self._last_sent >= self.min_interval_s:
+            self.flush()
+
+    def flush(self):
+        if not self.pending:
+            return
+        self.emit(dict(self.state))
+        self.pending = False
+        self.sent += 1
+        self._last_sent = time.monotonic()
+
+    def __call__(self, fields: dict):
+        self.update(fields)
+
+
+def _make_progress_parser(total_ms: int, emit, min_interval_s: float = 0.5):
+    """
+    创建 FFmpeg -progress 输出的逐行解析器
+    FFmpeg 每个进度块以 progress=continue/end 结尾：块内的 out_time_ms 和 speed 合并成一个事件
+    （done、eta_s、speed 同时给出），并按 min_interval_s 限速，只发送最新状态
+
+    Args:
+        total_ms: 文件总时长（毫秒）
+        emit: 回调函数，接收进度事件字典
+        min_interval_s: 同一文件两次进度事件的最小间隔（秒），0 表示每个进度块都发送
+
+    Returns:
+        Callable[[str], bool]: 解析一行，是进度行返回 True
+    """
+    state = {"last_ms": 0, "last_t": time.time()}
+    throttle = ProgressThrottle(emit, min_interval_s)
+    block = {"kind": "ffmpeg"}
+
+    def parse(line: str) -> bool:
+        if line.startswith("out_time_ms="):
+            try:
+                cur_ms = int(line.split("=", 1)[1].strip())
+                done = min(1.0, cur_ms / max(1, total_ms))
+                now = time.time()
+                dt = max(1e-3, now - state["last_t"])
+                v = max(1, cur_ms - state["last_ms"]) / dt  # ms/s
+                eta = max(0, (total_ms - cur_ms) / v)
+                block.update(done=done, eta_s=eta)
+                state["last_ms"], state["last_t"] = cur_ms, now
+            except (ValueError, IndexError):
+                pass
+            return True
+        if line.startswith("speed="):
+            try:
+                block["speed"] = line.split("=", 1)[1].strip()
+            except IndexError:
+                pass
+            return True
+        if line.startswith("progress="):
+            # 进度块结束：合并后的状态交给限速器，progress=end 时立即发送
+            if len(block) > 1:
+                throttle.update(block, force=line.strip() == "progress=end")
+                block.clear()
+                block["kind"] = "ffmpeg"
+            return True
+        # 其余 -progress 字段（frame=, bitrate= 等）
+        return "=" in line and " " not in line.strip()
+
+    parse.throttle = throttle
+    return parse
+
+
+def run_ffmpeg_with_progress(base_cmd: list, total_ms: int, emit, ffmpeg_path: str = "ffmpeg",
+                             min_interval_s: float = 0.5):
     """
     执行 FFmpeg 命令并实时报告进度
 
     Args:
         base_cmd: FFmpeg 参数列表（从 -i 开始，不包含 ffmpeg 本体）
         total_ms: 文件总时长（毫秒）
-        emit: 回调函数，接收进度事件字典
+        emit: 回调函数，接收合并后的进度事件字典
         ffmpeg_path: FFmpeg 可执行文件路径
+        min_interval_s: 两次进度事件的最小间隔（秒）
 
     Returns:
         int: 进程返回码
@@ -76,32 +165,69 @@ def run_ffmpeg_with_progress(base_cmd: list, total_ms: int, emit, ffmpeg_path: s
         creationflags=creationflags
     )
 
-    last_ms = 0
-    last_t = time.time()
-
+    parse = _make_progress_parser(total_ms, emit, min_interval_s)
     for line in p.stdout:
-        if line.startswith("out_time_ms="):
-            try:
-                cur_ms = int(line.split("=", 1)[1].strip())
-                done = min(1.0, cur_ms / max(1, total_ms))
-                now = time.time()
-                dt = max(1e-3, now - last_t)
-                v = max(1, cur_ms - last_ms) / dt  # ms/s
-                eta = max(0, (total_ms - cur_ms) / v)
-                emit({"kind": "ffmpeg", "done": done, "eta_s": eta})
-                last_ms, last_t = cur_ms, now
-            except (ValueError, IndexError):
-                pass
-        elif line.startswith("speed="):
-            try:
-                speed = line.split("=", 1)[1].strip()
-                emit({"kind": "ffmpeg", "speed": speed})
-            except IndexError:
-                pass
+        parse(line)
 
     rc = p.wait()
+    parse.throttle.flush()
     return rc
 
+
+def run_ffmpeg_to_bytes(base_cmd: list, total_ms: int = 0, emit=None, ffmpeg_path: str = "ffmpeg",
+                        min_interval_s: float = 0.5):
+    """
+    执行 FFmpeg 命令并把输出（-f xxx pipe:1）读入内存，进度信息走 stderr
+
+    Args:
+        base_cmd: FFmpeg 参数列表（从 -i 开始，输出必须是 pipe:1）
+        total_ms: 文件总时长（毫秒），>0 且提供 emit 时报告进度
+        emit: 回调函数，接收合并后的进度事件字典
+        ffmpeg_path: FFmpeg 可执行文件路径
+        min_interval_s: 两次进度事件的最小间隔（秒）
+
+    Returns:
+        tuple: (返回码, 输出字节, stderr中的错误信息)
+    """
+    with_progress = emit is not None and total_ms > 0
+    full_cmd = [ffmpeg_path, "-nostdin", "-hide_banner", "-loglevel", "error"]
+    if with_progress:
+        full_cmd += ["-progress", "pipe:2"]
+    full_cmd += list(base_cmd)
+
+    creationflags = CREATE_NO_WINDOW if os.name == "nt" else 0
+
+    p = subprocess.Popen(
+        full_cmd,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        stdin=subprocess.DEVNULL,
+        shell=False,
+        creationflags=creationflags
+    )
+
+    # stderr 在后台线程读取，避免管道写满导致 FFmpeg 阻塞
+    error_lines = []
+    parse = _make_progress_parser(total_ms, emit, min_interval_s) if with_progress else None
+
+    def _read_stderr():
+        for raw in p.stderr:
+            line = raw.decode("utf-8", errors="ignore")
+            if parse is not None and parse(line):
+                continue
+            if line.strip():
+                error_lines.append(line.rstrip())
+
+    stderr_thread = threading.Thread(target=_read_stderr, daemon=True)
+    stderr_thread.start()
+
+    data = p.stdout.read()
+    rc = p.wait()
+    stderr_thread.join(timeout=5)
+    if parse is not None:
+        parse.throttle.flush()
+    return rc, data, "\n".join(error_lines[-20:])
+
 class FileCleaner:
     """优化的文件清理工具，解决文件占用和清理失败问题"""
     
@@ -0,0 +1,224 @@
+# -*- coding: utf-8 -*-
+"""
+流水线子进程的轻量启动入口
+spawn 子进程启动时，multiprocessing 会先在子进程里重新导入父进程的 __main__ 模块
+（GUI 下是 main.py，连带 PySide6、控制器和全部界面组件），然后才导入 target 所在的模块。
+启动 20 个后处理进程只为写 SRT，却要加载 20 次整套界面。
+
+这里为每个阶段提供单独的入口：
+1. 启动子进程时不让子进程重新导入 __main__（流水线的 target 都不在 __main__ 中）
+2. 子进程的 target 是本模块的 run_stage（只依赖标准库），按阶段名导入该阶段的工作函数
+3. 每个阶段有导入预算（禁止加载的重量级模块、模块数、导入耗时），超出时在日志中警告；
+   python worker_bootstrap.py 逐个阶段测量并检查预算，超出时退出码为 1
+
+本模块顶层只能导入标准库。
+"""
+import sys
+import time
+import importlib
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+
+
+@dataclass(frozen=True)
+class StageEntry:
+    module: str
+    function: str
+    log_arg: int  # 参数中 log_queue 的位置（预算警告写入该队列）
+
+
+@dataclass(frozen=True)
+class ImportBudget:
+    forbidden: Tuple[str, ...]  # 导入阶段入口后不允许出现的顶层包
+    max_modules: int  # sys.modules 中的模块总数上限
+    max_seconds: float  # 导入阶段入口的耗时上限（秒）
+
+
+STAGES: Dict[str, StageEntry] = {
+    "pre": StageEntry("pipeline_workers", "pre_processing_worker", 2),
+    "recognition": StageEntry("pipeline_workers", "recognition_worker", 2),
+    "bridge": StageEntry("pipeline_workers", "engine_bridge_worker", 2),
+    "segment": StageEntry("pipeline_workers", "segment_recognition_worker", 2),
+    "post": StageEntry("pipeline_workers", "post_processing_worker", 1),
+}
+
+# 所有阶段都不应加载界面；识别类阶段的模型库在工作函数内按需导入，也不计入导入预算
+_GUI_MODULES = ("PySide6", "PyQt6", "qt_compat", "processing_controller", "enhanced_file_list")
+_MODEL_MODULES = ("torch", "funasr", "modelscope", "torchaudio")
+
+STAGE_IMPORT_BUDGETS: Dict[str, ImportBudget] = {
+    "pre": ImportBudget(_GUI_MODULES + _MODEL_MODULES + ("numpy",), 260, 1.0),
+    "recognition": ImportBudget(_GUI_MODULES + _MODEL_MODULES, 260, 1.5),
+    "bridge": ImportBudget(_GUI_MODULES + _MODEL_MODULES + ("numpy",), 260, 1.0),
+    "segment": ImportBudget(_GUI_MODULES + _MODEL_MODULES, 260, 1.5),
+    "post": ImportBudget(_GUI_MODULES + _MODEL_MODULES + ("numpy",), 260, 1.0),
+}
+
+
+def stage_for(target: Callable) -> Optional[str]:
+    """工作函数对应的阶段名（不是流水线工作函数时返回 None）"""
+    module = getattr(target, "__module__", None)
+    name = getattr(target, "__name__", None)
+    for stage, entry in STAGES.items():
+        if entry.module == module and entry.function == name:
+            return stage
+    return None
+
+
+def _top_level_loaded(names: Tuple[str, ...]) -> List[str]:
+    return [name for name in names if name in sys.modules]
+
+
+def load_stage(stage: str) -> Tuple[Callable, dict]:
+    """
+    导入阶段的工作函数并对照导入预算
+
+    Returns:
+        (工作函数, {"seconds", "modules", "violations": [...]})
+    """
+    entry = STAGES[stage]
+    budget = STAGE_IMPORT_BUDGETS[stage]
+    t_start = time.perf_counter()
+    target = getattr(importlib.import_module(entry.module), entry.function)
+    seconds = time.perf_counter() - t_start
+
+    modules = len(sys.modules)
+    violations = []
+    # multiprocessing 总会登记 __mp_main__ 别名；带 __file__ 说明父进程的主模块被重新导入了
+    main_file = getattr(sys.modules.get("__mp_main__"), "__file__", None)
+    if main_file:
+        violations.append(f"重新导入了主模块 {main_file}")
+    loaded = _top_level_loaded(budget.forbidden)
+    if loaded:
+        violations.append(f"加载了 {', '.join(loaded)}")
+    if modules > budget.max_modules:
+        violations.append(f"模块数 {modules} > {budget.max_modules}")
+    if seconds > budget.max_seconds:
+        violations.append(f"导入耗时 {seconds:.2f}s > {budget.max_seconds:.2f}s")
+    return target, {"seconds": round(seconds, 4), "modules": modules, "violations": violations}
+
+
+def run_stage(stage: str, args: tuple):
+    """子进程入口：导入阶段工作函数，超出导入预算时警告，然后运行"""
+    target, report = load_stage(stage)
+    if report["violations"]:
+        log_queue = args[STAGES[stage].log_arg]
+        try:
+            log_queue.put(f"⚠️ [{stage}] 子进程导入超出预算: {'; '.join(report['violations'])}")
+        except Exception:
+            pass
+    target(*args)
+
+
+_main_lock = threading.Lock()
+
+
+@contextmanager
+def _main_module_hidden():
+    """
+    暂时隐藏 __main__ 的 __file__/__spec__：spawn 按这两个属性决定子进程是否重新导入主模块
+    （打包后的 Windows 程序本来就不会重新导入，无影响）
+    """
+    main = sys.modules.get("__main__")
+    if main is None:
+        yield
+        return
+    with _main_lock:
+        saved = {attr: main.__dict__[attr] for attr in ("__file__", "__spec__") if attr in main.__dict__}
+        main.__dict__.pop("__file__", None)
+        main.__spec__ = None
+        try:
+            yield
+        finally:
+            main.__dict__.pop("__spec__", None)
+            main.__dict__.update(saved)
+
+
+def start_stage_process(ctx, target: Callable, args: tuple, name: str, daemon: bool = True):
+    """
+    启动流水线子进程：已登记的工作函数经 run_stage 启动且不重新导入 __main__；
+    其他 target 按原样启动
+    """
+    stage = stage_for(target)
+    if stage is None:
+        process = ctx.Process(target=target, args=args, daemon=daemon, name=name)
+        process.start()
+        return process
+    process = ctx.Process(target=run_stage, args=(stage, args), daemon=daemon, name=name)
+    with _main_module_hidden():
+        process.start()
+    return process
+
+
+def _import_probe(stage: str, conn):
+    """预算测量子进程：只导入阶段入口并报告"""
+    try:
+        _, report = load_stage(stage)
+        report["loaded"] = _top_level_loaded(STAGE_IMPORT_BUDGETS[stage].forbidden)
+        conn.send(report)
+    except Exception as e:
+        conn.send({"error": str(e)})
+    finally:
+        conn.close()
+
+
+def measure_stage_imports(stage: str, ctx=None, timeout_s: float = 60.0) -> dict:
+    """在新的 spawn 子进程中测量一个阶段入口的导入开销（与流水线子进程的启动方式相同）"""
+    import multiprocessing
+    ctx = ctx or multiprocessing.get_context('spawn')
+    parent_conn, child_conn = ctx.Pipe(duplex=False)
+    process = ctx.Process(target=_import_probe, args=(stage, child_conn), daemon=True,
+                          name=f"ImportProbe-{stage}")
+    t_start = time.perf_counter()
+    with _main_module_hidden():
+        process.start()
+    child_conn.close()
+    try:
+        if not parent_conn.poll(timeout_s):
+            raise TimeoutError(f"{timeout_s:.0f}秒内未收到 {stage} 阶段的测量结果")
+        report = parent_conn.recv()
+    except EOFError:
+        report = {"error": f"测量子进程异常退出 (exitcode={process.exitcode})"}
+    finally:
+        process.join(timeout=5)
+        if process.is_alive():
+            process.terminate()
+    report["spawn_seconds"] = round(time.perf_counter() - t_start, 4)
+    return report
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    import argparse
+    parser = argparse.ArgumentParser(description="测量各流水线阶段子进程的导入开销并检查导入预算")
+    parser.add_argument("--stages", default=",".join(STAGES), help="要测量的阶段，逗号分隔")
+    args = parser.parse_args(argv)
+
+    exit_code = 0
+    for stage in [s.strip() for s in args.stages.split(",") if s.strip()]:
+        if stage not in STAGES:
+            print(f"❌ 未知阶段: {stage}")
+            return 2
+        report = measure_stage_imports(stage)
+        if "error" in report:
+            print(f"❌ {stage}: 导入失败: {report['error']}")
+            exit_code = 1
+            continue
+        budget = STAGE_IMPORT_BUDGETS[stage]
+        mark = "❌" if report["violations"] else "✅"
+        print(f"{mark} {stage}: 导入 {report['seconds']:.3f}s (预算 {budget.max_seconds:.1f}s), "
+              f"{report['modules']} 个模块 (预算 {budget.max_modules}), 启动总耗时 {report['spawn_seconds']:.2f}s")
+        for violation in report["violations"]:
+            print(f"   - {violation}")
+        if report["violations"]:
+            exit_code = 1
+    return exit_code
+
+
+if __name__ == "__main__":
+    import multiprocessing
+    multiprocessing.freeze_support()
+    # 通过模块名调用：测量子进程的 target 必须能在不导入 __main__ 的子进程中找到
+    from worker_bootstrap import main as _main
+    sys.exit(_main())